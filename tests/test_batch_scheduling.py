@@ -0,0 +1,71 @@
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+import logging
+import os
+import torrentpy
+from torrentpy.batch import estimate_job_cost
+
+
+class TestBatchScheduling(unittest.TestCase):
+
+    def setUp(self):
+        self.fld = mkdtemp() + os.sep
+        with open(self.fld + 'batch.csv', 'w') as my_file:
+            my_file.write(
+                'catchment,outlet,dt_data_start,dt_data_end,dt_save_start,dt_save_end,variable_h,'
+                'data_increment_in_minutes,save_increment_in_minutes,simu_increment_in_minutes,warm_up_in_days\n'
+                'CatchmentSemiDistributedName,OutletName,01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                '01/06/2009 09:00:00,10/06/2009 09:00:00,q_h2o,1440,1440,1440,0\n'
+                'CatchmentLumpedName,OutletName,01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                '01/06/2009 09:00:00,10/06/2011 09:00:00,q_h2o,1440,1440,60,0\n'
+                'CatchmentSemiDistributedName,OutletName,01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                '01/06/2009 09:00:00,10/06/2009 09:00:00,q_h2o,1440,1440,60,10\n'
+            )
+        self.handlers = list(logging.getLogger('TORRENTpy').handlers)
+        self.batch = torrentpy.Batch(torrentpy.KnowledgeBase(), self.fld + 'batch.csv', 'examples/in/', self.fld,
+                                     catchment_h='SMART', river_h='SMART')
+
+    def tearDown(self):
+        my_logger = logging.getLogger('TORRENTpy')
+        for handler in list(my_logger.handlers):
+            if handler not in self.handlers:
+                my_logger.removeHandler(handler)
+                handler.close()
+        rmtree(self.fld)
+
+    def test_cost(self):
+        # 9 links x 10 days x 2 models
+        self.assertEqual(9 * 10 * 2, estimate_job_cost(self.batch.jobs[0]))
+        # 9 links x (10 days + 10 days of warm-up) hourly x 2 models
+        self.assertEqual(9 * (217 + 240) * 2, estimate_job_cost(self.batch.jobs[2]))
+
+    def test_largest_first(self):
+        self.assertEqual([self.batch.jobs[i] for i in [1, 2, 0]], self.batch._get_schedule())
+
+    def test_fields(self):
+        with open(self.fld + 'fields.csv', 'w') as my_file:
+            my_file.write(
+                'catchment,outlet,dt_data_start,dt_data_end,dt_save_start,dt_save_end,variable_h,'
+                'data_increment_in_minutes,save_increment_in_minutes,simu_increment_in_minutes,spin_up_tolerance\n'
+                'nan,1e3,01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                '01/06/2009 09:00:00,10/06/2009 09:00:00,q_h2o,1440,1440,60,1e-3\n'
+            )
+        my_job = torrentpy.Batch(torrentpy.KnowledgeBase(), self.fld + 'fields.csv', 'examples/in/', self.fld).jobs[0]
+
+        # only the arguments known to be real numbers are read as floats
+        self.assertEqual(('nan', '1e3'), (my_job['catchment'], my_job['outlet']))
+        self.assertEqual(0.001, my_job['spin_up_tolerance'])
+        self.assertEqual(60, my_job['simu_increment_in_minutes'])
+
+    def test_processes(self):
+        self.assertEqual(2, self.batch._get_processes(2, None, None))
+        self.assertEqual(3, self.batch._get_processes(8, None, None))
+        self.assertEqual(1, self.batch._get_processes(8, 1000, 600))
+        self.assertEqual(1, self.batch._get_processes(8, 1000, 2000))
+        with self.assertRaises(Exception):
+            self.batch._get_processes(8, 1000, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
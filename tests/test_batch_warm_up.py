@@ -0,0 +1,85 @@
+import unittest
+from io import open
+from shutil import rmtree
+from tempfile import mkdtemp
+import logging
+import os
+import torrentpy
+from torrentpy.batch import set_up_and_run_job, set_up_network, set_up_timeframe, set_up_database
+
+
+class TestBatchWarmUp(unittest.TestCase):
+
+    def setUp(self):
+        self.fld = mkdtemp() + os.sep
+        with open(self.fld + 'batch.csv', 'w') as my_file:
+            my_file.write(
+                u'catchment,outlet,out_fld,dt_data_start,dt_data_end,dt_save_start,dt_save_end,variable_h,'
+                u'data_increment_in_minutes,save_increment_in_minutes,simu_increment_in_minutes,warm_up_in_days\n'
+                u'CatchmentSemiDistributedName,OutletName,{0}a{1},01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                u'01/06/2009 09:00:00,06/06/2009 09:00:00,q_h2o,1440,1440,60,3\n'
+                u'CatchmentSemiDistributedName,OutletName,{0}b{1},01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                u'01/06/2009 09:00:00,09/06/2009 09:00:00,q_h2o,1440,1440,60,3\n'
+                u'CatchmentSemiDistributedName,OutletName,{0}c{1},01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                u'02/06/2009 09:00:00,09/06/2009 09:00:00,q_h2o,1440,1440,60,3\n'.format(self.fld, os.sep)
+            )
+        self.handlers = list(logging.getLogger('TORRENTpy').handlers)
+        self.kb = torrentpy.KnowledgeBase()
+        self.batch = torrentpy.Batch(self.kb, self.fld + 'batch.csv', 'examples/in/', self.fld,
+                                     catchment_h='SMART', river_h='SMART',
+                                     meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'])
+
+    def tearDown(self):
+        my_logger = logging.getLogger('TORRENTpy')
+        for handler in list(my_logger.handlers):
+            if handler not in self.handlers:
+                my_logger.removeHandler(handler)
+                handler.close()
+        rmtree(self.fld)
+
+    def test_plan(self):
+        my_plan = self.batch.get_warm_up_plan()
+
+        self.assertEqual([[0, 1], [2]], [my_group['jobs'] for my_group in my_plan])
+        self.assertEqual(3, my_plan[0]['warm_up_in_days'])
+
+        # the jobs sharing a warm-up start from the states cached for the first one
+        my_cache = self.fld + 'cache' + os.sep
+        set_up_and_run_job(self.kb, dict(self.batch.jobs[0], warm_up_cache=my_cache), warm_up_only=True)
+        self.assertEqual(1, len(os.listdir(my_cache)))
+        my_args = self.batch.jobs[1]
+        nw = set_up_network(self.kb, my_args)
+        tf = set_up_timeframe(my_args)
+        nw._get_initial_conditions(set_up_database(nw, tf, self.kb, my_args), tf, my_cache)
+        self.assertEqual(0, nw.spin_up_cycles)
+
+    def test_launch(self):
+        self.batch.launch(processes=2)
+
+        # the results are the same as for the jobs running their own warm-up
+        for my_job in self.batch.jobs:
+            my_reference_fld = my_job['out_fld'][:-1] + '_reference' + os.sep
+            set_up_and_run_job(self.kb, dict(my_job, out_fld=my_reference_fld))
+            with open('{}CatchmentSemiDistributedName_0000.node'.format(my_job['out_fld'])) as my_file:
+                my_launched = my_file.read()
+            with open('{}CatchmentSemiDistributedName_0000.node'.format(my_reference_fld)) as my_file:
+                self.assertEqual(my_launched, my_file.read())
+
+    def test_launch_failure(self):
+        # a job on a catchment without input files fails, without stopping the other jobs
+        with open(self.fld + 'batch.csv', 'a') as my_file:
+            my_file.write(u'CatchmentUnknownName,OutletName,{0}d{1},01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                          u'01/06/2009 09:00:00,06/06/2009 09:00:00,q_h2o,1440,1440,60,3\n'.format(self.fld, os.sep))
+        my_batch = torrentpy.Batch(self.kb, self.fld + 'batch.csv', 'examples/in/', self.fld,
+                                   catchment_h='SMART', river_h='SMART',
+                                   meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'])
+
+        with self.assertRaises(Exception) as my_context:
+            my_batch.launch(processes=2)
+        self.assertIn('1 of 4 jobs failed: CatchmentUnknownName at OutletName', str(my_context.exception))
+        for my_job in self.batch.jobs:
+            self.assertTrue(os.path.isfile('{}CatchmentSemiDistributedName_0000.node'.format(my_job['out_fld'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from datetime import datetime
+import logging
+import torrentpy
+from torrentpy.batch import WorkerCache, set_up_and_run_job
+
+
+class TestBatchWorkerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.kb = torrentpy.KnowledgeBase()
+        self.args = {
+            'catchment': 'CatchmentSemiDistributedName', 'outlet': 'OutletName',
+            'in_fld': 'examples/in/CatchmentSemiDistributedName_OutletName/',
+            'out_fld': 'examples/out/CatchmentSemiDistributedName_OutletName/',
+            'variable_h': 'q_h2o', 'variables_q': None, 'water_quality': False, 'verbose': False,
+            'catchment_h': 'SMART', 'river_h': 'SMART', 'lake_h': None,
+            'catchment_q': None, 'river_q': None, 'lake_q': None,
+            'links_extra': {'aar': 1200, 'r-o_ratio': 0.45, 'r-o_split': (0.10, 0.15, 0.15, 0.30, 0.30)},
+            'dt_data_start': datetime(2008, 1, 1, 9), 'dt_data_end': datetime(2012, 12, 31, 9),
+            'dt_save_start': datetime(2009, 6, 1, 9), 'dt_save_end': datetime(2009, 6, 3, 9),
+            'data_increment_in_minutes': 1440, 'save_increment_in_minutes': 1440, 'simu_increment_in_minutes': 1440,
+            'expected_simu_slice_length': 0, 'warm_up_in_days': 0, 'in_format': 'csv', 'out_format': 'csv',
+            'meteo_cumulative': ['rain', 'peva'], 'meteo_average': ['airt', 'soit'],
+            'contamination_cumulative': [], 'contamination_average': [],
+            'warm_up_cache': None, 'spin_up_tolerance': None, 'spin_up_max_cycles': 10,
+            'out_precision': 'float64', 'instrument': False, 'profile': False
+        }
+
+    def test_objects_reused_between_jobs(self):
+        my_cache = WorkerCache(size=1)
+        my_logger = logging.getLogger('TORRENTpy')
+
+        set_up_and_run_job(self.kb, self.args, my_cache)
+        my_first = my_cache.get(self.kb, self.args)
+        set_up_and_run_job(self.kb, self.args, my_cache)
+        my_second = my_cache.get(self.kb, self.args)
+
+        self.assertIs(my_first[0], my_second[0])
+        self.assertIs(my_first[1], my_second[1])
+        self.assertIs(my_first[2].meteo, my_second[2].meteo)
+        self.assertIsNot(my_first[2], my_second[2])
+
+        # a different TimeFrame reuses the Network but not the inputs
+        my_args = dict(self.args, dt_save_end=datetime(2009, 6, 4, 9))
+        my_third = my_cache.get(self.kb, my_args)
+        self.assertIs(my_first[0], my_third[0])
+        self.assertIsNot(my_first[2].meteo, my_third[2].meteo)
+
+        # the handlers of the Networks evicted are closed and detached
+        my_cache.clear()
+        self.assertEqual(0, len(my_cache.entries))
+        for handler in my_first[0].log_handlers:
+            self.assertNotIn(handler, my_logger.handlers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+from datetime import datetime
+from torrentpy.timeframe import CalendarCovariates
+from torrentpy.models.catchment.inca import _get_seasonal_growth
+
+
+class TestCalendarCovariates(unittest.TestCase):
+
+    def setUp(self):
+        self.covariates = CalendarCovariates([datetime(2012, 2, 29, 9), datetime(2013, 12, 31, 23)])
+
+    def test_covariates(self):
+        self.assertEqual([60.0, 365.0], self.covariates.day_of_year.tolist())
+        self.assertEqual([366.0, 365.0], self.covariates.days_in_year.tolist())
+        self.assertEqual([9, 23], self.covariates.hour.tolist())
+        self.assertEqual(1, self.covariates.index[datetime(2013, 12, 31, 23)])
+
+    def test_derived_computed_once(self):
+        my_first = self.covariates.get_derived(('seasonal_growth', 50.0), _get_seasonal_growth, 50.0)
+        my_second = self.covariates.get_derived(('seasonal_growth', 50.0), _get_seasonal_growth, 50.0)
+        self.assertIs(my_first, my_second)
+        self.assertEqual(2, len(my_first))
+        self.assertIsNot(my_first, self.covariates.get_derived(('seasonal_growth', 40.0), _get_seasonal_growth, 40.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
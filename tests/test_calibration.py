@@ -0,0 +1,115 @@
+import unittest
+from csv import DictReader
+from datetime import datetime
+import numpy as np
+import torrentpy
+from torrentpy.calibration import Calibration, read_gauge_flow, nse, kge, log_nse
+
+
+class TestCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld='examples/out/CatchmentSemiDistributedName_OutletName/',
+            variable_h='q_h2o'
+        )
+
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2008 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2012 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/01/2011 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('20/01/2011 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=60,
+            expected_simu_slice_length=72,
+            warm_up_in_days=3
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        self.db = torrentpy.DataBase(
+            self.nw, self.tf, self.kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit']
+        )
+
+        self.nw.set_links_models(self.kb, catchment_h='SMART', river_h='SMART')
+
+        # the flow is observed at midnight, the save steps are at 9am
+        self.observed = read_gauge_flow(
+            'examples/in/CatchmentSemiDistributedName_OutletName/'
+            'CatchmentSemiDistributedName_OutletName_20080101_20121231.flow', shift_in_minutes=540)
+
+        self.calibration = Calibration(self.nw, self.tf, self.db, self.observed,
+                                       {'c_p_t': (0.5, 1.5), 'c_p_gk': (0.5, 2.0)}, multiplicative=True)
+
+    def test_read_gauge_flow(self):
+        my_lumped = read_gauge_flow(
+            'examples/in/CatchmentLumpedName_OutletName/CatchmentLumpedName_OutletName_GaugeCode.flow')
+        self.assertEqual(my_lumped[datetime(1976, 7, 19, 1)], 0.729)
+        self.assertEqual(self.observed[datetime(2008, 1, 1, 9)], 4.147)
+        # missing values are left out
+        self.assertNotIn(datetime(2008, 12, 24, 9), self.observed)
+
+    def test_objectives(self):
+        my_observed = np.array([1.0, 2.0, 4.0, 3.0])
+        self.assertEqual(nse(my_observed, my_observed), 1.0)
+        self.assertEqual(log_nse(my_observed, my_observed), 1.0)
+        self.assertAlmostEqual(kge(my_observed, my_observed), 1.0, places=12)
+        self.assertAlmostEqual(nse(np.full(4, 2.5), my_observed), 0.0, places=12)
+
+    def test_evaluate_matches_simulate(self):
+        self.nw.simulate(self.db, self.tf, out_format='csv')
+        with open('{}{}_{}.node'.format(self.nw.out_fld, self.nw.catchment, self.calibration.gauge_node)) as my_file:
+            my_simulated = {datetime.strptime(row['DateTime'], '%Y-%m-%d %H:%M:%S'): float(row['q_h2o'])
+                            for row in DictReader(my_file)}
+        my_score = nse(np.array([my_simulated[step] for step in self.calibration.steps]), self.calibration.observed)
+
+        my_evaluated, my_abandoned = self.calibration.evaluate(self.calibration.get_initial_values())
+
+        self.assertFalse(my_abandoned)
+        self.assertAlmostEqual(my_evaluated, my_score, places=5)
+
+    def test_early_abandonment(self):
+        my_poor = [0.5, 2.0]
+        my_score, my_abandoned = self.calibration.evaluate(my_poor)
+        my_bound, my_abandoned_with_threshold = self.calibration.evaluate(my_poor, threshold=my_score + 0.5)
+
+        self.assertFalse(my_abandoned)
+        self.assertTrue(my_abandoned_with_threshold)
+        self.assertLess(my_bound, my_score + 0.5)
+        self.assertGreaterEqual(my_bound, my_score)
+
+    def test_run(self):
+        my_initial, _ = self.calibration.evaluate(self.calibration.get_initial_values())
+        my_result = self.calibration.run(max_evaluations=5, seed=0)
+
+        self.assertEqual(len(my_result['history']), 5)
+        self.assertGreaterEqual(my_result['score'], my_initial)
+        # the Models are left with the best parameters found
+        my_link = self.nw.links[0]
+        my_smart = [model for model in my_link.all_models if 'c_p_t' in model.parameters_names][0]
+        self.assertAlmostEqual(my_smart.parameters['c_p_t'],
+                               self.calibration.space.targets[0][2]['c_p_t'] * my_result['parameters']['c_p_t'])
+        self.assertAlmostEqual(self.calibration.evaluate([my_result['parameters'][name]
+                                                          for name in self.calibration.space.names])[0],
+                               my_result['score'])
+
+    def test_run_parallel(self):
+        my_result = self.calibration.run(max_evaluations=5, processes=2, seed=0)
+
+        self.assertEqual(len(my_result['history']), 5)
+        self.assertEqual(max([h[1] for h in my_result['history'] if not h[2]]), my_result['score'])
+        # the score found by the workers is reproduced in this process with the best parameters
+        self.assertAlmostEqual(self.calibration.evaluate([my_result['parameters'][name]
+                                                          for name in self.calibration.space.names])[0],
+                               my_result['score'])
+
+
+if __name__ == '__main__':
+    unittest.main()
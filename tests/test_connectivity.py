@@ -0,0 +1,68 @@
+import unittest
+from csv import DictReader
+from shutil import copy, rmtree
+from tempfile import mkdtemp
+import os
+from torrentpy.utils.connectivity import network_from_connectivity, _create_network
+from torrentpy.inout import open_csv_rb
+
+
+class TestConnectivity(unittest.TestCase):
+
+    def setUp(self):
+        self.fld = mkdtemp() + os.sep
+
+    def tearDown(self):
+        rmtree(self.fld)
+
+    @staticmethod
+    def _read_network(file_path):
+        with open_csv_rb(file_path) as my_file:
+            return sorted((row['NodeDown'], row['WaterBody'], row['NodeUp']) for row in DictReader(my_file))
+
+    def test_example(self):
+        copy('examples/in/CatchmentSemiDistributedName_OutletName/CatchmentSemiDistributedName_OutletName.connectivity',
+             self.fld)
+        network_from_connectivity(self.fld, 'CatchmentSemiDistributedName', 'OutletName')
+
+        # the nodes are numbered level by level from the outlet, in the order of the connectivity file
+        self.assertEqual(sorted([('0000', 'OutletName', '0001'), ('0001', 'RiverReachA', '0002'),
+                                 ('0002', 'RiverReachC', '0003'), ('0002', 'RiverReachB', '0004'),
+                                 ('0003', 'RiverReachF', '0005'), ('0003', 'RiverReachE', '0006'),
+                                 ('0004', 'RiverReachD', '0007'), ('0007', 'RiverReachG', '0008'),
+                                 ('0008', 'RiverReachH', '0009')]),
+                         self._read_network(self.fld + 'CatchmentSemiDistributedName_OutletName.network'))
+
+    def test_large_network(self):
+        # a chain of 6,000 links with a tributary for each link needs more than 10,000 nodes (i.e. 5-digit codes)
+        my_connectivity = list()
+        for i in range(1, 6000):
+            my_connectivity.append(('L{}'.format(i - 1), 'L{}'.format(i)))
+            my_connectivity.append(('L{}'.format(i - 1), 'T{}'.format(i)))
+        my_network, my_nodes = _create_network(my_connectivity, 'L0')
+
+        self.assertEqual(len(my_connectivity) + 1, len(my_network))
+        self.assertEqual(len(my_network) + 1, len(my_nodes))
+        self.assertEqual(('00000', '00001'), my_network['L0'])
+        self.assertEqual(set([5]), set(len(node) for node in my_nodes))
+        self.assertEqual(my_network['L1'][1], my_network['L2'][0])
+
+    def test_invalid_connectivity(self):
+        # the links draining to another outlet are left out
+        my_network, my_nodes = _create_network([('A', 'B'), ('X', 'Y')], 'A')
+        self.assertEqual(['A', 'B'], list(my_network))
+        # the links downstream of the outlet are left out too
+        my_network, my_nodes = _create_network([('A', 'B'), ('B', 'C'), ('C', 'D')], 'B')
+        self.assertEqual(['B', 'C', 'D'], list(my_network))
+        self.assertEqual(('0000', '0001'), my_network['B'])
+        my_network, my_nodes = _create_network([('A', 'B'), ('A', 'E'), ('B', 'C'), ('C', 'D')], 'C')
+        self.assertEqual(['C', 'D'], list(my_network))
+        # a cycle cannot be turned into a network
+        with self.assertRaises(Exception):
+            _create_network([('A', 'B'), ('B', 'A')], 'A')
+        with self.assertRaises(Exception):
+            _create_network([('A', 'B'), ('C', 'D'), ('D', 'C')], 'A')
+
+
+if __name__ == '__main__':
+    unittest.main()
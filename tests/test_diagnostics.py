@@ -0,0 +1,39 @@
+import unittest
+from datetime import datetime, timedelta
+from torrentpy.diagnostics import Diagnostics, get_description
+
+
+class TestDiagnostics(unittest.TestCase):
+
+    def setUp(self):
+        self.slice = [datetime(2009, 6, 1, 9) + timedelta(hours=h) for h in range(5)]
+
+    def test_counts_per_slice_and_link(self):
+        my_diagnostics = Diagnostics(samples=2)
+        my_diagnostics.start_slice('simulation', self.slice)
+        for step in self.slice[1:]:
+            my_diagnostics.record('RiverReachA', 'SMART # Volume in OVE Store has gone negative', step)
+            my_diagnostics.record('RiverReachB', ('INCAL # Quantity reset', 'no3', 'ove'), step)
+        my_diagnostics.end_slice()
+        my_diagnostics.start_slice('simulation', self.slice)
+        my_diagnostics.record('RiverReachA', 'SMART # Volume in OVE Store has gone negative', self.slice[1])
+        my_diagnostics.end_slice()
+
+        self.assertEqual({('RiverReachA', 'SMART # Volume in OVE Store has gone negative'): 5,
+                          ('RiverReachB', 'INCAL # Quantity reset [NO3, OVE]'): 4},
+                         my_diagnostics.get_counts())
+        my_report = my_diagnostics.get_report()
+        self.assertEqual(2, len(my_report['slices']))
+        self.assertEqual(4, my_report['slices'][0]['events']['INCAL # Quantity reset [NO3, OVE]']['count'])
+        self.assertEqual([self.slice[1].isoformat(), self.slice[2].isoformat()],
+                         my_report['timestamps']['INCAL # Quantity reset [NO3, OVE]']['RiverReachB'])
+
+    def test_no_samples_by_default(self):
+        my_diagnostics = Diagnostics()
+        my_diagnostics.record('RiverReachA', 'event', self.slice[1])
+        self.assertEqual({}, my_diagnostics.timestamps)
+        self.assertEqual('event', get_description('event'))
+
+
+if __name__ == '__main__':
+    unittest.main()
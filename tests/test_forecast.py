@@ -0,0 +1,99 @@
+import unittest
+from csv import DictReader
+from datetime import datetime
+from glob import glob
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
+import os
+import numpy as np
+import torrentpy
+from torrentpy.forecast import EnsembleForecast
+from torrentpy.inout import open_csv_rb, open_csv_wb
+
+
+class TestForecast(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = mkdtemp()
+        self.out_fld = os.path.join(self.folder, 'out', '')
+        os.makedirs(self.out_fld)
+        # copy of the inputs where the rain is given for three members of an ensemble (the other inputs are shared)
+        self.in_fld = os.path.join(self.folder, 'in', '')
+        copytree('examples/in/CatchmentSemiDistributedName_OutletName/', self.in_fld)
+        for my_rain_file in glob('{}*.rain'.format(self.in_fld)):
+            with open_csv_rb(my_rain_file) as my_file:
+                my_rows = list(DictReader(my_file))
+            with open_csv_wb(my_rain_file) as my_file:
+                my_file.write(u'DateTime,rain:low,rain:mid,rain:high\n')
+                for row in my_rows:
+                    my_file.write(u'{},{},{},{}\n'.format(row['DateTime'], 0.5 * float(row['rain']), row['rain'],
+                                                          1.5 * float(row['rain'])))
+
+    def tearDown(self):
+        rmtree(self.folder)
+
+    @staticmethod
+    def _set_up(in_fld, out_fld, save_start, save_end, warm_up_in_days, members=None):
+        nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld=in_fld,
+            out_fld=out_fld,
+            variable_h='q_h2o',
+            verbose=False
+        )
+        tf = torrentpy.TimeFrame(
+            dt_data_start=datetime(2008, 1, 1, 9), dt_data_end=datetime(2012, 12, 31, 9),
+            dt_save_start=save_start, dt_save_end=save_end,
+            data_increment_in_minutes=1440, save_increment_in_minutes=1440, simu_increment_in_minutes=60,
+            expected_simu_slice_length=96, warm_up_in_days=warm_up_in_days
+        )
+        kb = torrentpy.KnowledgeBase()
+        db = torrentpy.DataBase(nw, tf, kb, in_format='csv',
+                                meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'], members=members)
+        nw.set_links_models(kb, catchment_h='SMART', river_h='SMART')
+
+        return nw, tf, db
+
+    def test_forecast(self):
+        my_snapshot = os.path.join(self.folder, 'states.json')
+        my_in_fld = 'examples/in/CatchmentSemiDistributedName_OutletName/'
+
+        # simulation up to the time of the forecast, and simulation over the whole period for comparison
+        nw, tf, db = self._set_up(my_in_fld, None, datetime(2009, 6, 1, 9), datetime(2009, 6, 10, 9), 2)
+        nw.simulate(db, tf, out_states=my_snapshot)
+        nw, tf, db = self._set_up(my_in_fld, None, datetime(2009, 6, 1, 9), datetime(2009, 6, 20, 9), 2)
+        my_reference = nw.simulate(db, tf).get_node('0000', 'q_h2o')[-10:]
+
+        nw, tf, db = self._set_up(self.in_fld, self.out_fld, datetime(2009, 6, 11, 9), datetime(2009, 6, 20, 9), 0,
+                                  members=['low', 'mid', 'high'])
+        my_forecast = EnsembleForecast(nw, tf, db, my_snapshot, ['0000'], percentiles=(0, 50, 100),
+                                       thresholds={'0000': {'q_h2o': [0.0, float(np.median(my_reference))]}})
+        my_results = my_forecast.run(out_format='csv')
+
+        # the flow increases with the rain, so the median is the member with the rain unchanged, which continues
+        # the simulation from where it stopped
+        self.assertTrue(np.allclose(my_reference, my_results.get_percentile('0000', 'q_h2o', 50), rtol=1e-9))
+        # the members only differ once it rains
+        my_spread = my_results.get_percentile('0000', 'q_h2o', 100) - my_results.get_percentile('0000', 'q_h2o', 0)
+        self.assertEqual(0.0, my_spread[0])
+        self.assertGreater(my_spread[-1], 0.0)
+        self.assertTrue(np.all(my_results.get_exceedance('0000', 'q_h2o', 0.0) == 1.0))
+        self.assertTrue(set(my_results.get_exceedance('0000', 'q_h2o', float(np.median(my_reference))))
+                        <= {0.0, 1 / 3.0, 2 / 3.0, 1.0})
+
+        # the statistics are written in a file as the forecast goes
+        with open_csv_rb('{}CatchmentSemiDistributedName_0000.forecast'.format(self.out_fld)) as my_file:
+            my_rows = list(DictReader(my_file))
+        self.assertEqual(10, len(my_rows))
+        self.assertAlmostEqual(float(my_rows[-1]['q_h2o:p50']), my_reference[-1], places=5)
+
+        # a snapshot for another time cannot be used
+        nw, tf, db = self._set_up(self.in_fld, None, datetime(2009, 6, 12, 9), datetime(2009, 6, 20, 9), 0,
+                                  members=['low', 'mid', 'high'])
+        with self.assertRaises(Exception):
+            EnsembleForecast(nw, tf, db, my_snapshot, ['0000'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from datetime import datetime
+import numpy as np
+import torrentpy
+from torrentpy.diagnostics import Diagnostics
+from torrentpy.models import INCAr
+
+
+class TestINCAVectorised(unittest.TestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld='examples/out/CatchmentSemiDistributedName_OutletName/',
+            variable_h='q_h2o',
+            variables_q=['c_no3', 'c_nh4', 'c_dph', 'c_pph', 'c_sed'],
+            water_quality=True,
+        )
+
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2008 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2012 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('10/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=60,
+            expected_simu_slice_length=72,
+            warm_up_in_days=0
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        self.db = torrentpy.DataBase(
+            self.nw, self.tf, self.kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit'],
+            contamination_cumulative=['m_no3', 'm_nh4', 'm_p_ino', 'm_p_org'],
+            contamination_average=[]
+        )
+
+        for link in self.nw.links:
+            link.extra.update(
+                {'aar': 1200, 'r-o_ratio': 0.45, 'r-o_split': (0.10, 0.15, 0.15, 0.30, 0.30)}
+            )
+
+        self.nw.set_links_models(
+            self.kb,
+            catchment_h='SMART', river_h='SMART',
+            catchment_q='INCA', river_q='INCA'
+        )
+
+    def _run_first_slice(self, vectorise):
+        self.nw.vectorise = vectorise
+        my_simu_slice = self.tf.simu_slices[0]
+        self.nw.diagnostics.clear()
+        self.nw.diagnostics.start_slice('simulation', my_simu_slice)
+
+        self.db.set_db_for_links_and_nodes(my_simu_slice)
+        for link in self.nw.links:
+            for model in link.all_models:
+                self.db.simulation[link.name][my_simu_slice[0]].update(model.initialise(link))
+
+        self.nw._run(self.db, self.tf, my_simu_slice)
+
+        return {name: {dt: dict(self.db.simulation[name][dt]) for dt in my_simu_slice}
+                for name in self.db.simulation}, self.nw.diagnostics.get_counts()
+
+    def test_vectorised_matches_scalar(self):
+        my_scalar, my_scalar_counts = self._run_first_slice(vectorise=False)
+        my_vectorised, my_vectorised_counts = self._run_first_slice(vectorise=True)
+
+        self.assertEqual(my_scalar_counts, my_vectorised_counts)
+
+        for name in my_scalar:
+            for dt in my_scalar[name]:
+                self.assertEqual(sorted(my_scalar[name][dt]), sorted(my_vectorised[name][dt]))
+                for var in my_scalar[name][dt]:
+                    self.assertAlmostEqual(my_scalar[name][dt][var], my_vectorised[name][dt][var],
+                                           delta=1e-12 * abs(my_scalar[name][dt][var]),
+                                           msg='{} {} {}'.format(name, dt, var))
+
+
+class TestINCArVectorised(unittest.TestCase):
+
+    def test_run_links_matches_run(self):
+        # links covering the branches of the kernel: frozen, no inflow, empty store, no outflow, negative quantity
+        my_random = np.random.RandomState(42)
+        my_cases = [
+            # temp, q_in, v_old, v_new, q_out
+            (12.0, 1.5, 900.0, 950.0, 1.2),
+            (-3.0, 1.5, 900.0, 950.0, 1.2),
+            (25.0, 0.0, 900.0, 950.0, 1.2),
+            (12.0, 1.5, 0.0, 950.0, 1.2),
+            (12.0, 1.5, 900.0, 0.0, 0.0),
+            (80.0, 0.1, 10.0, 10.0, 50.0),
+        ]
+        nb_links = len(my_cases)
+        temp, q_in, v_old, v_new, q_out = np.array(my_cases).T
+        c_in = my_random.uniform(0.0, 1e-2, (5, nb_links))
+        p_att = my_random.uniform(0.8, 1.0, (5, nb_links))
+        s_m = my_random.uniform(0.0, 10.0, (5, nb_links))
+        cst = [np.full(nb_links, value) for value in (0.2, 0.3, 1e-3, 1e-3)]
+
+        my_vectorised = Diagnostics()
+        my_vectorised.start_slice('simulation', [None, datetime(2009, 1, 1), datetime(2009, 1, 1)])
+        c_out, s_m_new, events = INCAr._run_links(3600.0, temp, c_in, p_att, s_m, *(cst + [q_in, v_old, v_new, q_out]))
+        for my_event, my_mask in events:
+            for i in np.flatnonzero(my_mask):
+                my_vectorised.record(str(i), my_event, datetime(2009, 1, 1))
+
+        my_scalar = Diagnostics()
+        my_scalar.start_slice('simulation', [None, datetime(2009, 1, 1), datetime(2009, 1, 1)])
+        for i in range(nb_links):
+            my_out = INCAr._run(str(i), datetime(2009, 1, 1), my_scalar, 3600.0, temp[i],
+                                *(list(c_in[:, i]) + list(p_att[:, i]) + list(s_m[:, i]) + [c[i] for c in cst] +
+                                  [q_in[i], v_old[i], v_new[i], q_out[i]]))
+            self.assertEqual(list(my_out[0:5]), c_out[:, i].tolist())
+            self.assertEqual(list(my_out[5:10]), s_m_new[:, i].tolist())
+
+        self.assertEqual(my_scalar.get_counts(), my_vectorised.get_counts())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import csv
+import shutil
+import tempfile
+import torrentpy
+from torrentpy.models import SMARTc, SMARTr
+
+
+class TestInferParameters(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp() + os.sep
+        self.nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld=self.folder,
+            variable_h='q_h2o'
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_inference_for_links_matches_link_by_link(self):
+        for my_class, my_category in [(SMARTc, 'c'), (SMARTr, 'r')]:
+            my_models = [my_class(my_category, 'SMART') for link in self.nw.links]
+            my_class.set_parameters_for_links(my_models, self.nw.links, self.nw._get_descriptors_columns(self.nw.links),
+                                              'Catchment', 'Outlet', self.folder, self.folder)
+
+            with open('{}Catchment_Outlet.SMART{}.parameters'.format(self.folder, my_category)) as my_file:
+                my_rows = list(csv.DictReader(my_file))
+            self.assertEqual([link.name for link in self.nw.links], [row['WaterBody'] for row in my_rows])
+
+            for model, link in zip(my_models, self.nw.links):
+                my_expected = my_class._infer_parameters_from_descriptors(link.descriptors)
+                self.assertEqual(sorted(my_expected), sorted(model.parameters))
+                for name in my_expected:
+                    self.assertAlmostEqual(float(my_expected[name]), model.parameters[name],
+                                           delta=1e-12 * abs(float(my_expected[name])))
+                    self.assertEqual(model.parameters[name], link.models_parameters[name])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from datetime import datetime
+from multiprocessing import Process
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+import os
+from torrentpy.batch import run_queue_worker
+from torrentpy.jobqueue import JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = mkdtemp()
+        self.args = {
+            'catchment': 'CatchmentSemiDistributedName', 'outlet': 'OutletName',
+            'in_fld': 'examples/in/CatchmentSemiDistributedName_OutletName/',
+            'out_fld': None,
+            'variable_h': 'q_h2o', 'variables_q': None, 'water_quality': False, 'verbose': False,
+            'catchment_h': 'SMART', 'river_h': 'SMART', 'lake_h': None,
+            'catchment_q': None, 'river_q': None, 'lake_q': None,
+            'dt_data_start': datetime(2008, 1, 1, 9), 'dt_data_end': datetime(2012, 12, 31, 9),
+            'dt_save_start': datetime(2009, 6, 1, 9), 'dt_save_end': datetime(2009, 6, 3, 9),
+            'data_increment_in_minutes': 1440, 'save_increment_in_minutes': 1440, 'simu_increment_in_minutes': 1440,
+            'expected_simu_slice_length': 0, 'warm_up_in_days': 0, 'in_format': 'csv', 'out_format': 'csv',
+            'meteo_cumulative': ['rain', 'peva'], 'meteo_average': ['airt', 'soit'],
+            'contamination_cumulative': [], 'contamination_average': [],
+            'warm_up_cache': None, 'spin_up_tolerance': None, 'spin_up_max_cycles': 10,
+            'out_precision': 'float64', 'instrument': False, 'profile': False
+        }
+
+    def tearDown(self):
+        rmtree(self.folder)
+
+    def _expire(self, queue, name):
+        my_past = time() - 2 * queue.lease_timeout
+        os.utime(os.path.join(queue.folder, 'running', name), (my_past, my_past))
+
+    def test_lease_expiry(self):
+        my_queue = JobQueue(os.path.join(self.folder, 'queue'), lease_timeout=60, max_attempts=2)
+        my_name = my_queue.put([self.args])[0]
+
+        my_claimed, my_record = my_queue.claim()
+        self.assertEqual(my_name, my_claimed)
+        self.assertEqual(self.args, my_record['job'])
+        self.assertIsNone(my_queue.claim())
+        # a job whose lease is renewed stays with its worker
+        self.assertEqual(0, my_queue.requeue_expired())
+
+        # a job whose worker crashed is put back in the queue, and fails after too many attempts
+        self._expire(my_queue, my_name)
+        self.assertEqual(1, my_queue.requeue_expired())
+        self.assertEqual({'pending': 1, 'running': 0, 'done': 0, 'failed': 0}, my_queue.get_status())
+        my_queue.claim()
+        self._expire(my_queue, my_name)
+        my_queue.requeue_expired()
+        self.assertEqual({'pending': 0, 'running': 0, 'done': 0, 'failed': 1}, my_queue.get_status())
+        self.assertEqual(2, my_queue.get_records('failed')[my_name]['attempts'])
+
+    def test_claim_starts_lease(self):
+        my_queue = JobQueue(os.path.join(self.folder, 'queue'), lease_timeout=60)
+        my_name = my_queue.put([self.args])[0]
+        # the job was submitted longer ago than the lease timeout
+        my_past = time() - 2 * my_queue.lease_timeout
+        os.utime(os.path.join(my_queue.folder, 'pending', my_name), (my_past, my_past))
+
+        # the job is not expired as soon as it is claimed (i.e. before its lease is first renewed)
+        my_queue.renew = lambda name: True
+        my_queue.claim()
+        self.assertEqual(0, my_queue.requeue_expired())
+        self.assertEqual({'pending': 0, 'running': 1, 'done': 0, 'failed': 0}, my_queue.get_status())
+
+    def test_workers(self):
+        my_folder = os.path.join(self.folder, 'queue')
+        my_jobs = list()
+        for i in range(4):
+            my_out_fld = os.path.join(self.folder, 'out{}'.format(i), '')
+            my_jobs.append(dict(self.args, out_fld=my_out_fld, dt_save_end=datetime(2009, 6, 3 + i, 9)))
+        JobQueue(my_folder).put(my_jobs)
+
+        my_workers = [Process(target=run_queue_worker, args=(my_folder,), kwargs={'wait_in_seconds': 0.1})
+                      for _ in range(2)]
+        for my_worker in my_workers:
+            my_worker.start()
+        for my_worker in my_workers:
+            my_worker.join()
+
+        my_queue = JobQueue(my_folder)
+        self.assertEqual({'pending': 0, 'running': 0, 'done': 4, 'failed': 0}, my_queue.get_status())
+        for my_record in my_queue.get_records('done').values():
+            self.assertEqual(1, my_record['attempts'])
+            self.assertGreaterEqual(my_record['finished'], my_record['started'])
+            self.assertTrue(os.path.isfile('{}CatchmentSemiDistributedName_0000.node'.format(
+                my_record['job']['out_fld'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
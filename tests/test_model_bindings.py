@@ -0,0 +1,36 @@
+import unittest
+from torrentpy.models import Model, INCAc
+from torrentpy.network import Link
+
+
+class TestModelBindings(unittest.TestCase):
+
+    def setUp(self):
+        self.link = Link('RiverReachA', ('0001', '0002'))
+
+    def test_getters_follow_declared_names(self):
+        my_model = INCAc('c', 'INCA')
+        my_bindings = my_model.bind(self.link)
+
+        my_frame = {name: float(i) for i, name in enumerate(my_model.states_names + ['c_s_v_h2o_ove'])}
+        self.assertEqual(tuple(float(i) for i in range(len(my_model.states_names))),
+                         my_bindings.get_states(my_frame))
+        self.assertEqual('0002', my_bindings.node_up)
+        self.assertIs(my_bindings, my_model.bindings)
+
+        my_new_frame = dict()
+        my_bindings.set_states(my_new_frame, range(len(my_model.states_names)))
+        self.assertEqual(my_frame['c_s_m_sed_soil'], my_new_frame['c_s_m_sed_soil'])
+
+    def test_input_without_source(self):
+        my_model = Model('c', 'DUMMY')
+        my_model.inputs_names = ['c_in_rain']
+        with self.assertRaises(Exception):
+            my_model.bind(self.link)
+
+        my_model.inputs_sources = {'c_in_rain': ('meteo', 'rain')}
+        self.assertEqual((), my_model.bind(self.link).get_parameters({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
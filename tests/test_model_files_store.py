@@ -0,0 +1,57 @@
+import unittest
+import os
+import shutil
+import tempfile
+from torrentpy.models import SMARTc
+from torrentpy.models.model import ModelFilesStore
+from torrentpy.network import Link
+
+
+class TestModelFilesStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file = os.path.join(self.folder, 'Catchment_Outlet.SMARTc.parameters')
+        self.model = SMARTc('c', 'SMART')
+        with open(self.file, 'w') as my_file:
+            my_file.write(','.join(['WaterBody'] + self.model.parameters_names) + '\n')
+            for waterbody in ['RiverReachA', 'RiverReachB', 'RiverReachA']:
+                my_file.write(','.join([waterbody] + ['1.0'] * len(self.model.parameters_names)) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_duplicates_and_missing_reported(self):
+        my_store = ModelFilesStore()
+        with self.assertRaises(Exception) as my_context:
+            my_store.get_parameters(self.file, self.model)
+        self.assertIn('RiverReachA', str(my_context.exception))
+
+        with open(self.file, 'w') as my_file:
+            my_file.write(','.join(['WaterBody'] + self.model.parameters_names) + '\n')
+            my_file.write(','.join(['RiverReachA'] + ['1.0'] * len(self.model.parameters_names)) + '\n')
+        my_store = ModelFilesStore(expected_waterbodies={('SMART', 'c'): ['RiverReachA', 'RiverReachC']})
+        with self.assertRaises(Exception) as my_context:
+            my_store.get_parameters(self.file, self.model)
+        self.assertIn('RiverReachC', str(my_context.exception))
+
+    def test_file_read_once(self):
+        with open(self.file, 'w') as my_file:
+            my_file.write(','.join(['WaterBody'] + self.model.parameters_names) + '\n')
+            for waterbody in ['RiverReachA', 'RiverReachB']:
+                my_file.write(','.join([waterbody] + ['1.0'] * len(self.model.parameters_names)) + '\n')
+        my_store = ModelFilesStore()
+        self.model.store = my_store
+        self.model._set_parameters_with_file(Link('RiverReachA', ('0001', '0002')), 'Catchment', 'Outlet',
+                                             self.folder + os.sep)
+        os.remove(self.file)
+
+        my_model = SMARTc('c', 'SMART')
+        my_model.store = my_store
+        my_model._set_parameters_with_file(Link('RiverReachB', ('0002', '0003')), 'Catchment', 'Outlet',
+                                           self.folder + os.sep)
+        self.assertEqual(1.0, my_model.parameters['c_p_t'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import pickle
+import numpy as np
+import torrentpy
+
+
+class TestNetworkTopology(unittest.TestCase):
+
+    def setUp(self):
+        self.nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld=None,
+            variable_h='q_h2o',
+            verbose=False
+        )
+
+    def test_views(self):
+        my_topology = self.nw.topology
+
+        # the Links and the Nodes are identified by their positions, the Nodes in order of first appearance
+        self.assertEqual(['RiverReachH', 'RiverReachB', 'RiverReachC', 'RiverReachA', 'RiverReachF', 'RiverReachG',
+                          'RiverReachD', 'RiverReachE', 'OutletName'], [link.name for link in self.nw.links])
+        self.assertEqual(['0008', '0009', '0002', '0003', '0004', '0001', '0006', '0005', '0007', '0000'],
+                         [node.name for node in self.nw.nodes])
+        self.assertEqual(('0002', '0004'), self.nw.links_mapping['RiverReachC'].connections)
+        self.assertEqual(1, self.nw.links_mapping['RiverReachC'].category)
+        self.assertEqual(self.nw.descriptors['area'][2], self.nw.links_mapping['RiverReachC'].descriptors['area'])
+
+        # the Links routed by and added to a Node are given by the compressed sparse rows
+        self.assertEqual([0, 1, 1, 3, 4, 6, 7, 7, 8, 8, 9], my_topology.routing_indptr.tolist())
+        self.assertEqual([0, 1, 2, 6, 4, 7, 3, 5, 8], my_topology.routing_indices.tolist())
+        self.assertEqual(['RiverReachB', 'RiverReachC'], [link.name for link in self.nw.nodes_mapping['0002'].routing])
+        self.assertEqual(['RiverReachA'], [link.name for link in self.nw.nodes_mapping['0002'].adding])
+        self.assertEqual([], self.nw.nodes_mapping['0009'].routing)
+        self.assertIs(self.nw.nodes_mapping['0002'].routing, self.nw.nodes_mapping['0002'].routing)
+
+        # the objects hold no dictionary of attributes
+        self.assertFalse(hasattr(self.nw.links[0], '__dict__'))
+        self.assertFalse(hasattr(self.nw.nodes[0], '__dict__'))
+
+    def test_setters(self):
+        my_link = self.nw.links_mapping['RiverReachC']
+        self.assertEqual(self.nw.descriptors['area'][2], my_link.get_descriptor('area'))
+        self.assertIsNone(my_link.get_descriptor('unknown'))
+
+        # the descriptors given are written in the columns of the Network
+        my_descriptors = dict(my_link.descriptors, area=1.0)
+        my_link.descriptors = my_descriptors
+        self.assertEqual(1.0, self.nw.descriptors['area'][2])
+        self.assertEqual(my_descriptors, my_link.descriptors)
+
+        # the descriptors can also be changed one by one (but not deleted)
+        my_link.descriptors['area'] = 2.0
+        my_link.descriptors.update({'FARL': 0.5})
+        self.assertEqual((2.0, 0.5), (self.nw.descriptors['area'][2], self.nw.descriptors['FARL'][2]))
+        self.assertEqual(2.0, self.nw.links_mapping['RiverReachC'].descriptors['area'])
+        with self.assertRaises(TypeError):
+            del my_link.descriptors['area']
+
+        my_link.extra = {'aar': 1200}
+        self.nw.nodes[0].extra = {'gauge': True}
+        self.assertEqual({'aar': 1200}, my_link.extra)
+        self.assertEqual({'gauge': True}, self.nw.nodes[0].extra)
+
+    def test_pickle(self):
+        nw = pickle.loads(pickle.dumps(self.nw, 2))
+
+        self.assertIs(nw.topology, nw.links[0]._topology)
+        self.assertEqual(['RiverReachB', 'RiverReachC'], [link.name for link in nw.nodes_mapping['0002'].routing])
+        self.assertTrue(np.array_equal(self.nw.topology.categories, nw.topology.categories))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from datetime import datetime
+from shutil import rmtree
+from tempfile import mkdtemp
+import logging
+import os
+import numpy as np
+import torrentpy
+from torrentpy.inout import get_precision_dtype
+
+try:
+    from netCDF4 import Dataset
+except ImportError:
+    Dataset = None
+
+
+class TestOutputPrecision(unittest.TestCase):
+
+    def setUp(self):
+        self.out_fld = mkdtemp() + os.sep
+        self.nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld=self.out_fld,
+            variable_h='q_h2o',
+            verbose=False
+        )
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime(2008, 1, 1, 9), dt_data_end=datetime(2012, 12, 31, 9),
+            dt_save_start=datetime(2009, 6, 1, 9), dt_save_end=datetime(2009, 6, 5, 9),
+            data_increment_in_minutes=1440, save_increment_in_minutes=1440, simu_increment_in_minutes=60,
+            expected_simu_slice_length=48, warm_up_in_days=0
+        )
+        kb = torrentpy.KnowledgeBase()
+        self.db = torrentpy.DataBase(self.nw, self.tf, kb, in_format='csv',
+                                     meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'])
+        self.nw.set_links_models(kb, catchment_h='SMART', river_h='SMART')
+
+    def tearDown(self):
+        for handler in self.nw.log_handlers:
+            logging.getLogger('TORRENTpy').removeHandler(handler)
+            handler.close()
+        rmtree(self.out_fld)
+
+    def test_precision_dtype(self):
+        self.assertIs(np.float64, get_precision_dtype('float64'))
+        self.assertIs(np.float32, get_precision_dtype('float32'))
+        with self.assertRaises(Exception):
+            get_precision_dtype('float16')
+        with self.assertRaises(Exception):
+            self.nw.simulate(self.db, self.tf, out_format='csv', out_precision='double')
+
+    @unittest.skipIf(Dataset is None, "the package 'netCDF4' is not installed")
+    def test_netcdf_float32(self):
+        self.nw.simulate(self.db, self.tf, out_format='netcdf', out_precision='float32')
+
+        # the values are stored in single precision, the DateTime always in double precision
+        with Dataset('{}CatchmentSemiDistributedName_0000.node.nc'.format(self.out_fld), 'r') as my_file:
+            self.assertEqual(np.float32, my_file.variables['q_h2o'].dtype)
+            self.assertEqual(np.float64, my_file.variables['DateTime'].dtype)
+            self.assertEqual(len(self.tf.save_series) - 1, len(my_file.variables['q_h2o'][:]))
+        with Dataset('{}CatchmentSemiDistributedName_RiverReachC.outputs.nc'.format(self.out_fld), 'r') as my_file:
+            self.assertTrue(all(my_file.variables[name].dtype == np.float32
+                                for name in my_file.variables if name != 'DateTime'))
+
+
+if __name__ == '__main__':
+    unittest.main()
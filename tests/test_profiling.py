@@ -0,0 +1,101 @@
+import unittest
+import json
+from datetime import datetime
+from shutil import rmtree
+from tempfile import mkdtemp
+import logging
+import os
+import torrentpy
+from torrentpy.profiling import Instrumentation
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.out_fld = mkdtemp() + os.sep
+        self.nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld=self.out_fld,
+            variable_h='q_h2o',
+            variables_q=['c_no3', 'c_nh4', 'c_dph', 'c_pph', 'c_sed'],
+            water_quality=True,
+            verbose=False
+        )
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime(2008, 1, 1, 9), dt_data_end=datetime(2012, 12, 31, 9),
+            dt_save_start=datetime(2009, 6, 1, 9), dt_save_end=datetime(2009, 6, 5, 9),
+            data_increment_in_minutes=1440, save_increment_in_minutes=1440, simu_increment_in_minutes=60,
+            expected_simu_slice_length=48, warm_up_in_days=0
+        )
+        kb = torrentpy.KnowledgeBase()
+        self.db = torrentpy.DataBase(self.nw, self.tf, kb, in_format='csv',
+                                     meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'],
+                                     contamination_cumulative=['m_no3', 'm_nh4', 'm_p_ino', 'm_p_org'],
+                                     contamination_average=[])
+        for link in self.nw.links:
+            link.extra.update({'aar': 1200, 'r-o_ratio': 0.45, 'r-o_split': (0.10, 0.15, 0.15, 0.30, 0.30)})
+        self.nw.set_links_models(kb, catchment_h='SMART', river_h='SMART', catchment_q='INCA', river_q='INCA')
+
+    def tearDown(self):
+        for handler in self.nw.log_handlers:
+            logging.getLogger('TORRENTpy').removeHandler(handler)
+            handler.close()
+        rmtree(self.out_fld)
+
+    def test_instrumentation(self):
+        self.nw.simulate(self.db, self.tf, instrument=True)
+        my_report = self.nw.instrumentation.get_report()
+
+        # one record for each simulation slice, with the time spent in each phase
+        self.assertEqual(len(self.tf.simu_slices), len(my_report['slices']))
+        self.assertEqual([len(my_slice) - 1 for my_slice in self.tf.simu_slices],
+                         [my_slice['steps'] for my_slice in my_report['slices']])
+        for my_slice in my_report['slices']:
+            self.assertEqual('simulation', my_slice['stage'])
+            self.assertTrue(all(my_slice[phase] >= 0.0 for phase in Instrumentation.phases))
+            self.assertGreaterEqual(my_slice['total'], sum(my_slice[phase] for phase in Instrumentation.phases))
+        self.assertEqual(set(Instrumentation.phases + ['total', 'steps']), set(my_report['totals']))
+        self.assertTrue(my_report['peak_memory_mb'] is None or my_report['peak_memory_mb'] >= 0.0)
+
+        # the report is saved in the output folder
+        with open('{}CatchmentSemiDistributedName_OutletName.simu.report.json'.format(self.out_fld)) as my_file:
+            my_saved = json.load(my_file)
+        self.assertEqual(len(self.tf.simu_slices), len(my_saved['slices']))
+        self.assertEqual(my_report['totals']['steps'], my_saved['totals']['steps'])
+
+    def test_profiler(self):
+        self.nw.simulate(self.db, self.tf, profile=True)
+        my_records = self.nw.profiler.records
+
+        # the Models able to simulate a whole slice are called once per slice, the others once per time step, and
+        # the time of all the Models is attributed to each Link (even for the Models able to simulate several Links)
+        my_slices = len(self.tf.simu_slices)
+        my_steps = sum(len(my_slice) - 1 for my_slice in self.tf.simu_slices)
+        my_expected = dict()
+        for link in self.nw.links:
+            my_expected[('c', 'SMARTc', link.name)] = my_slices
+            my_expected[('r', 'SMARTr', link.name)] = my_slices
+            my_expected[('c', 'INCAc', link.name)] = my_steps
+            my_expected[('r', 'INCAr', link.name)] = my_steps
+        self.assertEqual(my_expected, {my_key: my_record[0] for my_key, my_record in my_records.items()})
+        self.assertEqual(len(self.nw.links) * my_steps, self.nw.profiler.get_summary_by_model()['INCAc']['calls'])
+
+        # the folded stacks give the time in microseconds for each Model and Link
+        with open('{}CatchmentSemiDistributedName_OutletName.simu.profile.folded'.format(self.out_fld)) as my_file:
+            my_lines = my_file.read().splitlines()
+        self.assertEqual(len(my_expected), len(my_lines))
+        for my_line in my_lines:
+            my_stack, my_microseconds = my_line.rsplit(' ', 1)
+            my_frames = my_stack.split(';')
+            self.assertEqual(4, len(my_frames))
+            self.assertEqual('simulate', my_frames[0])
+            self.assertIn(my_frames[1], ['catchment', 'river'])
+            self.assertIn(my_frames[3], self.nw.links_mapping)
+            self.assertGreaterEqual(int(my_microseconds), 0)
+        self.assertIn('simulate;catchment;INCAc;RiverReachC', [my_line.rsplit(' ', 1)[0] for my_line in my_lines])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime
+import numpy as np
+import torrentpy
+from torrentpy.sensitivity import Sensitivity, get_morris_samples, get_morris_indices, get_saltelli_samples, \
+    get_sobol_indices
+
+
+class TestSensitivity(unittest.TestCase):
+
+    @staticmethod
+    def _function(samples):
+        # one metric linear in the first dimension, one metric depending on the product of the first two dimensions
+        return np.column_stack([2.0 * samples[:, 0] + 0.5 * samples[:, 2],
+                                samples[:, 0] * samples[:, 1]])
+
+    def test_morris(self):
+        my_samples = get_morris_samples(3, 20, 4, np.random.RandomState(0))
+
+        self.assertEqual((20 * 4, 3), my_samples.shape)
+        self.assertTrue(np.all((my_samples >= 0.0) & (my_samples <= 1.0)))
+        my_steps = np.diff(my_samples.reshape((20, 4, 3)), axis=1)
+        self.assertTrue(np.all(np.sum(my_steps != 0.0, axis=2) == 1))
+        self.assertTrue(np.allclose(np.abs(my_steps[my_steps != 0.0]), 4 / 6.0))
+
+        my_indices = get_morris_indices(my_samples, self._function(my_samples), 20)
+        self.assertTrue(np.allclose(my_indices['mu'][:, 0], [2.0, 0.0, 0.5]))
+        self.assertTrue(np.allclose(my_indices['sigma'][:, 0], [0.0, 0.0, 0.0]))
+        self.assertEqual(0.0, my_indices['mu_star'][2, 1])
+        self.assertGreater(my_indices['sigma'][0, 1], 0.0)
+
+    def test_sobol(self):
+        my_samples = get_saltelli_samples(3, 4000, np.random.RandomState(0))
+        my_indices = get_sobol_indices(self._function(my_samples), 4000, 3)
+
+        # the variance of the first metric is 16/17 due to the first dimension and 1/17 to the third one
+        self.assertTrue(np.allclose(my_indices['S1'][:, 0], [16 / 17.0, 0.0, 1 / 17.0], atol=0.03))
+        self.assertTrue(np.allclose(my_indices['ST'][:, 0], [16 / 17.0, 0.0, 1 / 17.0], atol=0.03))
+        # the second metric has interactions (total indices above first-order indices)
+        self.assertGreater(my_indices['ST'][0, 1], my_indices['S1'][0, 1] + 0.05)
+
+    def test_network(self):
+        nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld=None,
+            variable_h='q_h2o',
+            verbose=False
+        )
+        tf = torrentpy.TimeFrame(
+            dt_data_start=datetime(2008, 1, 1, 9), dt_data_end=datetime(2012, 12, 31, 9),
+            dt_save_start=datetime(2009, 6, 1, 9), dt_save_end=datetime(2009, 6, 10, 9),
+            data_increment_in_minutes=1440, save_increment_in_minutes=1440, simu_increment_in_minutes=1440,
+            expected_simu_slice_length=0, warm_up_in_days=0
+        )
+        kb = torrentpy.KnowledgeBase()
+        db = torrentpy.DataBase(nw, tf, kb, in_format='csv',
+                                meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'])
+        nw.set_links_models(kb, catchment_h='SMART', river_h='SMART')
+        my_initial = nw.links[0].models_parameters['c_p_t']
+
+        my_analysis = Sensitivity(nw, tf, db, {'c_p_t': (0.8, 1.2), 'r_p_rk': (0.5, 2.0)},
+                                  {'mean': ('0000', 'q_h2o', np.mean), 'peak': ('0000', 'q_h2o', np.max)},
+                                  multiplicative=True)
+        my_results = my_analysis.morris(trajectories=2, seed=0)
+
+        self.assertEqual(['mean', 'peak'], sorted(my_results))
+        self.assertEqual(['c_p_t', 'r_p_rk'], sorted(my_results['mean']['mu_star']))
+        # more rain means more flow on average
+        self.assertGreater(my_results['mean']['mu']['c_p_t'], 0.0)
+        # the parameters are given back to the Models
+        self.assertEqual(my_initial, nw.links[0].models_parameters['c_p_t'])
+
+        # the samples simulated in parallel give the same metrics
+        my_samples = [[0.9, 1.0], [1.1, 1.5]]
+        self.assertTrue(np.array_equal(my_analysis.evaluate_samples(my_samples),
+                                       my_analysis.evaluate_samples(my_samples, processes=2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
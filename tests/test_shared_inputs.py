@@ -0,0 +1,51 @@
+import unittest
+from datetime import datetime
+from shutil import rmtree
+from tempfile import mkdtemp
+import os
+import torrentpy
+from torrentpy.database import save_shared_inputs, load_shared_inputs
+from torrentpy.batch import read_inputs
+
+
+class TestSharedInputs(unittest.TestCase):
+
+    def setUp(self):
+        self.fld = mkdtemp() + os.sep
+        self.args = {
+            'catchment': 'CatchmentSemiDistributedName', 'outlet': 'OutletName',
+            'in_fld': 'examples/in/CatchmentSemiDistributedName_OutletName/', 'water_quality': True,
+            'dt_data_start': datetime(2008, 1, 1, 9), 'dt_data_end': datetime(2012, 12, 31, 9),
+            'dt_save_start': datetime(2009, 6, 1, 9), 'dt_save_end': datetime(2009, 6, 10, 9),
+            'data_increment_in_minutes': 1440, 'save_increment_in_minutes': 1440, 'simu_increment_in_minutes': 60,
+            'expected_simu_slice_length': 0, 'warm_up_in_days': 2, 'in_format': 'csv',
+            'meteo_cumulative': ['rain', 'peva'], 'meteo_average': ['airt', 'soit'],
+            'contamination_cumulative': ['m_no3', 'm_nh4', 'm_p_ino', 'm_p_org'], 'contamination_average': []
+        }
+
+    def tearDown(self):
+        rmtree(self.fld)
+
+    def test_memory_mapped_inputs_match(self):
+        my_meteo, my_contamination = read_inputs(self.args)
+        my_shared = save_shared_inputs(my_meteo, my_contamination, self.fld + 'inputs.npy')
+        my_shared_meteo, my_shared_contamination = load_shared_inputs(self.fld + 'inputs.npy', *my_shared)
+
+        for my_inputs, my_shared_inputs in [(my_meteo, my_shared_meteo), (my_contamination, my_shared_contamination)]:
+            self.assertEqual(sorted(my_inputs), sorted(my_shared_inputs))
+            for link in my_inputs:
+                self.assertEqual(sorted(my_inputs[link]), sorted(my_shared_inputs[link]))
+                for data_type in my_inputs[link]:
+                    my_series = my_shared_inputs[link][data_type]
+                    self.assertEqual(sorted(my_inputs[link][data_type].items()), sorted(my_series.items()))
+                    self.assertIs(float, type(my_series[self.args['dt_save_start']]))
+
+    def test_without_contamination(self):
+        my_meteo, my_contamination = read_inputs(dict(self.args, water_quality=False))
+        self.assertIsNone(my_contamination)
+        my_shared = save_shared_inputs(my_meteo, my_contamination, self.fld + 'inputs.npy')
+        self.assertIsNone(load_shared_inputs(self.fld + 'inputs.npy', *my_shared)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime
+import torrentpy
+
+
+class TestSimulateBySlice(unittest.TestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld='examples/out/CatchmentSemiDistributedName_OutletName/',
+            variable_h='q_h2o',
+            variables_q=['c_no3', 'c_nh4', 'c_dph', 'c_pph', 'c_sed'],
+            water_quality=True,
+        )
+
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2008 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2012 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('10/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=60,
+            expected_simu_slice_length=72,
+            warm_up_in_days=0
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        self.db = torrentpy.DataBase(
+            self.nw, self.tf, self.kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit'],
+            contamination_cumulative=['m_no3', 'm_nh4', 'm_p_ino', 'm_p_org'],
+            contamination_average=[]
+        )
+
+        for link in self.nw.links:
+            link.extra.update(
+                {'aar': 1200, 'r-o_ratio': 0.45, 'r-o_split': (0.10, 0.15, 0.15, 0.30, 0.30)}
+            )
+
+        self.nw.set_links_models(
+            self.kb,
+            catchment_h='SMART', river_h='SMART',
+            catchment_q='INCA', river_q='INCA'
+        )
+
+    def _run_first_slice(self, by_slice):
+        self.nw.by_slice = by_slice
+        my_simu_slice = self.tf.simu_slices[0]
+
+        self.db.set_db_for_links_and_nodes(my_simu_slice)
+        for link in self.nw.links:
+            for model in link.all_models:
+                self.db.simulation[link.name][my_simu_slice[0]].update(model.initialise(link))
+
+        self.nw._run(self.db, self.tf, my_simu_slice)
+
+        return {name: {dt: dict(self.db.simulation[name][dt]) for dt in my_simu_slice}
+                for name in self.db.simulation}
+
+    def test_by_slice_matches_by_step(self):
+        my_by_step = self._run_first_slice(by_slice=False)
+        my_by_slice = self._run_first_slice(by_slice=True)
+
+        self.assertEqual(my_by_step, my_by_slice)
+
+    def test_nodes_levels(self):
+        my_levels = self.nw._get_nodes_levels()
+
+        self.assertEqual(sorted(self.nw.nodes_mapping), sorted([node.name for level in my_levels for node in level]))
+        my_seen = set()
+        for my_level in my_levels:
+            for node in my_level:
+                for link in node.routing:
+                    self.assertIn(link.connections[1], my_seen)
+            my_seen.update([node.name for node in my_level])
+
+    def test_slice_plan(self):
+        # the levels and the groups of Models are gathered once for all the slices
+        my_plan = self.nw._get_slice_plan()
+        self._run_first_slice(by_slice=True)
+        self.assertIs(my_plan, self.nw._get_slice_plan())
+        self.assertEqual(sum(len(my_level[0]) for my_level in my_plan[1]), len(self.nw.nodes))
+
+        # they are gathered again if the Models are grouped differently
+        self.nw.vectorise = not self.nw.vectorise
+        self.assertIsNot(my_plan, self.nw._get_slice_plan())
+
+
+if __name__ == '__main__':
+    unittest.main()
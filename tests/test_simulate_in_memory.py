@@ -0,0 +1,100 @@
+import unittest
+from csv import DictReader
+from datetime import datetime
+from shutil import rmtree
+from tempfile import mkdtemp
+import os
+import torrentpy
+
+
+class TestSimulateInMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.out_fld = mkdtemp() + os.sep
+
+    def tearDown(self):
+        rmtree(self.out_fld)
+
+    @staticmethod
+    def _set_up(out_fld):
+        nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld=out_fld,
+            variable_h='q_h2o',
+            variables_q=['c_no3', 'c_nh4', 'c_dph', 'c_pph', 'c_sed'],
+            water_quality=True,
+        )
+
+        tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2008 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2012 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('10/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=60,
+            expected_simu_slice_length=72,
+            warm_up_in_days=2
+        )
+
+        kb = torrentpy.KnowledgeBase()
+
+        db = torrentpy.DataBase(
+            nw, tf, kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit'],
+            contamination_cumulative=['m_no3', 'm_nh4', 'm_p_ino', 'm_p_org'],
+            contamination_average=[]
+        )
+
+        for link in nw.links:
+            link.extra.update(
+                {'aar': 1200, 'r-o_ratio': 0.45, 'r-o_split': (0.10, 0.15, 0.15, 0.30, 0.30)}
+            )
+
+        nw.set_links_models(
+            kb,
+            catchment_h='SMART', river_h='SMART',
+            catchment_q='INCA', river_q='INCA'
+        )
+
+        return nw, tf, db
+
+    def _read_csv(self, nw, name, extension):
+        with open('{}{}_{}.{}'.format(self.out_fld, nw.catchment, name, extension)) as my_file:
+            return [row for row in DictReader(my_file)]
+
+    def test_in_memory_matches_files(self):
+        my_nw, my_tf, my_db = self._set_up(self.out_fld)
+        self.assertIsNone(my_nw.simulate(my_db, my_tf, out_format='csv'))
+
+        my_before = sorted(os.walk('examples'))
+        nw, tf, db = self._set_up(None)
+        my_results = nw.simulate(db, tf, out_nodes=['0000', '0004'], out_links=['RiverReachC'])
+        # nothing was written in the folders of the examples
+        self.assertEqual(my_before, sorted(os.walk('examples')))
+        self.assertEqual(len(nw.log_handlers), 1)
+
+        self.assertEqual(my_results.datetimes, tf.save_series[1:])
+        self.assertEqual(sorted(my_results.nodes), ['0000', '0004'])
+        self.assertEqual(list(my_results.links), ['RiverReachC'])
+
+        for node in ['0000', '0004']:
+            for i, row in enumerate(self._read_csv(my_nw, node, 'node')):
+                self.assertEqual(row['DateTime'], str(my_results.datetimes[i]))
+                for variable in nw.variables:
+                    self.assertAlmostEqual(my_results.get_node(node, variable)[i], float(row[variable]),
+                                           delta=1e-6 * abs(float(row[variable])))
+        for extension in ['inputs', 'states', 'outputs']:
+            for i, row in enumerate(self._read_csv(my_nw, 'RiverReachC', extension)):
+                for variable in row:
+                    if variable != 'DateTime':
+                        self.assertAlmostEqual(my_results.get_link('RiverReachC', variable)[i], float(row[variable]),
+                                               delta=1e-6 * abs(float(row[variable])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from datetime import datetime
+import numpy as np
+import torrentpy
+from torrentpy.calibration import Calibration
+
+
+class TestUpstreamNetwork(unittest.TestCase):
+
+    def _simulate(self, upstream_of=None):
+        nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld=None,
+            variable_h='q_h2o',
+            verbose=False,
+            upstream_of=upstream_of
+        )
+        self.tf = tf = torrentpy.TimeFrame(
+            dt_data_start=datetime(2008, 1, 1, 9), dt_data_end=datetime(2012, 12, 31, 9),
+            dt_save_start=datetime(2009, 6, 1, 9), dt_save_end=datetime(2009, 7, 1, 9),
+            data_increment_in_minutes=1440, save_increment_in_minutes=1440, simu_increment_in_minutes=60,
+            expected_simu_slice_length=96, warm_up_in_days=3
+        )
+        kb = torrentpy.KnowledgeBase()
+        db = torrentpy.DataBase(nw, tf, kb, in_format='csv',
+                                meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'])
+        nw.set_links_models(kb, catchment_h='SMART', river_h='SMART')
+
+        return nw, db, nw.simulate(db, tf)
+
+    def test_upstream_of_node(self):
+        nw, db, my_results = self._simulate('0004')
+
+        # the Links upstream of the Node, and the Link whose catchment is pouring into the Node
+        self.assertEqual(['RiverReachC', 'RiverReachF', 'RiverReachE'], [link.name for link in nw.links])
+        self.assertEqual(['0002', '0004', '0006', '0007'], sorted(nw.nodes_mapping))
+        self.assertEqual(sorted(nw.links_mapping), sorted(db.meteo))
+
+        # the results at the Node are the same as with the whole Network
+        my_reference = self._simulate()[2]
+        self.assertTrue(np.array_equal(my_reference.get_node('0004', 'q_h2o'), my_results.get_node('0004', 'q_h2o')))
+
+    def test_upstream_of_link(self):
+        nw = self._simulate('RiverReachD')[0]
+        self.assertEqual(['RiverReachH', 'RiverReachG', 'RiverReachD'], [link.name for link in nw.links])
+
+        self.assertEqual('RiverReachD', nw.outlet_link)
+
+        with self.assertRaises(Exception):
+            self._simulate('RiverReachZ')
+
+    def test_calibration(self):
+        # the flow simulated at the Node with the whole Network is used as the observations
+        my_reference = self._simulate()[2].get_node('0004', 'q_h2o')
+        my_observed = dict(zip(self.tf.save_series[1:], my_reference))
+        nw, db = self._simulate('0004')[:2]
+        self.assertEqual('RiverReachC', nw.outlet_link)
+
+        # the gauge is the Node the Network is restricted to the upstream part of
+        my_calibration = Calibration(nw, self.tf, db, my_observed, {'c_p_t': (0.5, 1.5)}, multiplicative=True)
+        self.assertEqual('0004', my_calibration.gauge_node)
+        self.assertAlmostEqual(1.0, my_calibration.evaluate(my_calibration.get_initial_values())[0], places=9)
+        my_result = my_calibration.run(max_evaluations=3, seed=0)
+        self.assertEqual(3, len(my_result['history']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from datetime import datetime
+from glob import glob
+from shutil import rmtree
+from tempfile import mkdtemp
+import os
+import torrentpy
+from torrentpy.states import get_warm_up_key
+
+
+class TestWarmUpCache(unittest.TestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld='examples/out/CatchmentSemiDistributedName_OutletName/',
+            variable_h='q_h2o',
+            variables_q=['c_no3', 'c_nh4', 'c_dph', 'c_pph', 'c_sed'],
+            water_quality=True,
+        )
+
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2008 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2012 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('10/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=60,
+            expected_simu_slice_length=48,
+            warm_up_in_days=3
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        self.db = torrentpy.DataBase(
+            self.nw, self.tf, self.kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit'],
+            contamination_cumulative=['m_no3', 'm_nh4', 'm_p_ino', 'm_p_org'],
+            contamination_average=[]
+        )
+
+        for link in self.nw.links:
+            link.extra.update(
+                {'aar': 1200, 'r-o_ratio': 0.45, 'r-o_split': (0.10, 0.15, 0.15, 0.30, 0.30)}
+            )
+
+        self.nw.set_links_models(
+            self.kb,
+            catchment_h='SMART', river_h='SMART',
+            catchment_q='INCA', river_q='INCA'
+        )
+
+        self.cache_fld = mkdtemp() + os.sep
+
+    def tearDown(self):
+        rmtree(self.cache_fld)
+
+    def test_cache_hit_matches_warm_up(self):
+        # first call runs the warm-up and stores the states in the cache
+        my_run_lines = self.nw._get_initial_conditions(self.db, self.tf, warm_up_cache=self.cache_fld)
+        self.assertEqual(1, len(glob('{}*.states.json'.format(self.cache_fld))))
+
+        # second call retrieves the states from the cache
+        my_cached_lines = self.nw._get_initial_conditions(self.db, self.tf, warm_up_cache=self.cache_fld)
+
+        # round all values to 12 decimals and compare
+        for my_lines in [my_run_lines, my_cached_lines]:
+            for name in my_lines:
+                for var in my_lines[name]:
+                    my_lines[name][var] = round(my_lines[name][var], 12)
+
+        self.assertDictEqual(my_run_lines, my_cached_lines)
+
+    def test_key_depends_on_parameters(self):
+        my_key = get_warm_up_key(self.nw, self.db, self.tf)
+        self.assertEqual(my_key, get_warm_up_key(self.nw, self.db, self.tf))
+
+        # modifying one parameter of one model must invalidate the key
+        my_model = self.nw.links[0].c_models[0]
+        my_parameter = my_model.parameters_names[0]
+        my_model.parameters[my_parameter] *= 2.0
+        self.assertNotEqual(my_key, get_warm_up_key(self.nw, self.db, self.tf))
+
+    def test_spin_up_cycles(self):
+        # a tolerance that cannot be met runs the maximum number of cycles
+        self.nw._get_initial_conditions(self.db, self.tf, spin_up_tolerance=1e-300, spin_up_max_cycles=2)
+        self.assertEqual(2, self.nw.spin_up_cycles)
+
+        # a tolerance above any possible relative change converges after the first cycle
+        self.nw._get_initial_conditions(self.db, self.tf, spin_up_tolerance=10.0, spin_up_max_cycles=2)
+        self.assertEqual(1, self.nw.spin_up_cycles)
+
+
+if __name__ == '__main__':
+    unittest.main()
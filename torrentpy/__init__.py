@@ -23,5 +23,8 @@ from .knowledgebase import KnowledgeBase
 from .database import DataBase
 from .timeframe import TimeFrame
 from .batch import Batch
+from .calibration import Calibration
+from .sensitivity import Sensitivity
+from .forecast import EnsembleForecast
 
 from .utils import connectivity
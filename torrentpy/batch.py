@@ -18,13 +18,24 @@
 # You should have received a copy of the GNU General Public License
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
-from multiprocessing import Pool, cpu_count, log_to_stderr
+from multiprocessing import Pool, cpu_count, log_to_stderr, get_logger
+from collections import OrderedDict
 from csv import DictReader
 from datetime import datetime
-from os import path, remove, sep
+from os import path, remove, sep, getpid
+from shutil import rmtree
+from socket import gethostname
+from tempfile import mkdtemp
+from time import sleep
+from timeit import default_timer
 import logging
+import gc
 
 from torrentpy import *
+from .models.model import ModelFilesStore
+from .inout import open_csv_rb
+from .database import get_nd_input_data_from_file, save_shared_inputs, load_shared_inputs
+from .jobqueue import JobQueue, Lease
 
 
 class Batch(object):
@@ -84,8 +95,10 @@ class Batch(object):
                         my_dict_job[field] = True
                     elif row[field] == 'False':  # it is a boolean
                         my_dict_job[field] = False
+                    elif field in ['spin_up_tolerance']:  # it is a real number (if given)
+                        my_dict_job[field] = float(row[field]) if row[field] else None
                     else:
-                        try:  # it is a numerical value (assume it is an integer, because not argument requires float)
+                        try:  # it is a numerical value (assume it is an integer, no other argument requires a float)
                             my_dict_job[field] = int(row[field])
                         except ValueError:  # it is not a numerical value, keep it as a string
                             my_dict_job[field] = str(row[field])
@@ -109,7 +122,9 @@ class Batch(object):
             'catchment_h': None, 'river_h': None, 'lake_h': None, 'variables_q': None,
             'catchment_q': None, 'river_q': None, 'lake_q': None,
             'meteo_cumulative': [], 'meteo_average': [], 'contamination_cumulative': [],
-            'contamination_average': [], 'warm_up_in_days': 0, 'water_quality': False
+            'contamination_average': [], 'warm_up_in_days': 0, 'water_quality': False,
+            'warm_up_cache': None, 'spin_up_tolerance': None, 'spin_up_max_cycles': 10,
+            'out_precision': 'float64', 'instrument': False, 'profile': False
         }
 
         # check if mandatory arguments are all defined, if not, raise Exception
@@ -132,25 +147,483 @@ class Batch(object):
             dict_args['out_fld'] = \
                 ''.join([self.out_dir, '{}_{}'.format(dict_args['catchment'], dict_args['outlet']), sep])
 
-    def launch(self):
+    def launch(self, processes=None, cache_size=4, memory_limit_in_mb=None, memory_per_job_in_mb=None,
+               share_inputs=True, share_warm_ups=True):
+        """
+        This method runs all the jobs of the batch in a pool of long-lived worker processes. The KnowledgeBase is sent
+        once to each worker (rather than with each job), and each worker keeps a bounded cache of the Networks (with
+        their Models and parameters), the parameters and constants files, and the input data for the most recently
+        used catchments (see class WorkerCache), so that the jobs on the same catchment do not read the same files
+        again. The memory is kept under control by evicting the least recently used catchments from the cache rather
+        than by recycling the processes.
+
+        The jobs are sent to the workers from the most costly to the least costly (see function 'estimate_job_cost'),
+        so that a long job does not start when the other workers have nothing left to do.
+
+        The input data needed by several jobs (i.e. jobs on the same catchment with the same TimeFrame and input
+        arguments) are read once before starting the workers, and written in binary files that the workers
+        memory-map read-only, so that the workers share one copy of the input data in memory.
+
+        The jobs with the same warm-up run (i.e. the same Network, Models, inputs, and warm-up window, but e.g. a
+        different end of the save period or a different output format) are grouped (see method 'get_warm_up_plan'),
+        the plan is logged, and the warm-up of each group is run once before the jobs, which then start from the
+        states at the end of the warm-up (through the warm-up cache of the jobs, or a temporary one).
+
+        The jobs that fail do not stop the others, and an exception listing the failed jobs is raised once all the
+        jobs have run.
+
+        N.B. The input files are assumed not to be modified while the batch is running.
+
+        :param processes: maximum number of simultaneous jobs (default is the number of processors available)
+        :type processes: int
+        :param cache_size: number of catchments (i.e. combinations of catchment and outlet) kept in the cache of
+            each worker (0 not to keep anything between jobs)
+        :type cache_size: int
+        :param memory_limit_in_mb: memory available for the workers of the batch (optional, requires
+            'memory_per_job_in_mb'), the number of simultaneous jobs is reduced so as not to exceed it
+        :type memory_limit_in_mb: float
+        :param memory_per_job_in_mb: peak memory of a worker (e.g. as reported in the instrumentation report of the
+            most costly job, see argument 'instrument' of Network.simulate, including its cache)
+        :type memory_per_job_in_mb: float
+        :param share_inputs: whether to share the input data needed by several jobs between the workers
+        :type share_inputs: bool
+        :param share_warm_ups: whether to run the warm-up shared by several jobs only once
+        :type share_warm_ups: bool
+        """
         logger = logging.getLogger('TORRENTpy.bh')
 
-        cores = cpu_count()
-        pool = Pool(processes=cores, maxtasksperchild=1)
-        # 'processes' is the number of simultaneous runs (children) allowed (maximum = number of processors available)
-        # 'maxtasksperchild' is set to 1 to kill each child after task completion to make sure to clean memory properly
+        cores = self._get_processes(processes, memory_limit_in_mb, memory_per_job_in_mb)
+        if share_warm_ups:
+            my_plan = self.get_warm_up_plan()
+            log_warm_up_plan(my_plan)
+        logger.warning("Running {} jobs on {} processes.".format(self.size, cores))
+
+        my_folder = mkdtemp(prefix='torrentpy_inputs_')
+        try:
+            my_shared_inputs = self._share_inputs(my_folder) if share_inputs else dict()
+
+            pool = Pool(processes=cores, initializer=_initialise_worker,
+                        initargs=(self.kb, self.log_file, cache_size, my_shared_inputs))
+            # 'processes' is the number of simultaneous runs (children) allowed (maximum = number of processors)
+            # the children are kept alive for the whole batch, their memory is managed by their WorkerCache
+
+            arguments = self._get_schedule()
+
+            if share_warm_ups:
+                # run the warm-up of each group once (in parallel) before the jobs depending on it start
+                my_warm_ups, arguments = self._share_warm_ups(my_plan, arguments, '{}{}warm_up{}'.format(
+                    my_folder, sep, sep))
+                pool.map(run_warm_up_in_worker, my_warm_ups, chunksize=1)
+
+            # the jobs are sent in the order of the schedule, and the outcome of each of them is collected so that the
+            # failures are reported (the exception is logged in detail by the worker)
+            my_results = [(my_args, pool.apply_async(run_job_in_worker, (my_args,))) for my_args in arguments]
+            my_failures = list()
+            for my_args, my_result in my_results:
+                try:
+                    my_result.get()
+                except Exception as e:
+                    my_failures.append('{} at {} in {} ({})'.format(my_args['catchment'], my_args['outlet'],
+                                                                   my_args['out_fld'], e))
+
+            pool.close()
+            pool.join()
+        finally:
+            rmtree(my_folder, ignore_errors=True)
+
+        if my_failures:
+            msg = "Ending TORRENTpy Batch Session, {} of {} jobs failed: {}.".format(
+                len(my_failures), self.size, '; '.join(my_failures))
+            logger.error(msg)
+            raise Exception(msg)
+        logger.warning("Ending TORRENTpy Batch Session.")
+
+    def submit(self, folder, lease_timeout=600, max_attempts=3):
+        """
+        This method puts all the jobs of the batch in the queue kept in the given folder (e.g. on a filesystem shared
+        by several machines), from the most costly to the least costly, so that they can be run by any number of
+        workers on any number of hosts (see function 'run_queue_worker').
+
+        :param folder: path of the folder of the queue (see class JobQueue)
+        :type folder: str
+        :param lease_timeout: time in seconds after which a job whose lease was not renewed is put back in the queue
+        :type lease_timeout: float
+        :param max_attempts: maximum number of times a job is claimed before it is considered failed
+        :type max_attempts: int
+        :return: JobQueue object for the folder (e.g. to follow the progress of the jobs)
+        :rtype: JobQueue
+        """
+        logger = logging.getLogger('TORRENTpy.bh')
 
-        arguments = [(self.kb, kwargs, self.log_file) for kwargs in self.jobs]
+        my_queue = JobQueue(folder, lease_timeout, max_attempts)
+        my_queue.put(self._get_schedule())
+        logger.warning("Submitted {} jobs to the queue in {}.".format(self.size, folder))
 
-        pool.imap_unordered(run_job_unpacked, iterable=arguments)
+        return my_queue
 
-        pool.close()
-        pool.join()
+    def _share_inputs(self, folder):
+        """
+        This method reads the input data needed by more than one job once, and writes them in binary files in the
+        given folder (see function 'save_shared_inputs'). If the input data for some jobs cannot be read, these jobs
+        will read them themselves (and report the error).
 
-        logger.warning("Ending TORRENTpy Batch Session.")
+        :param folder: path to the folder where to write the binary files
+        :type folder: str
+        :return: dictionary {key: inputs key (see function 'get_inputs_key'),
+                             value: (file path, layout of the data, list of DateTime)}
+        :rtype: dict
+        """
+        logger = logging.getLogger('TORRENTpy.bh')
+
+        my_groups = OrderedDict()
+        for my_job in self.jobs:
+            my_groups.setdefault(get_inputs_key(my_job), list()).append(my_job)
+
+        my_shared_inputs = dict()
+        for my_key, my_jobs in my_groups.items():
+            if len(my_jobs) < 2:
+                continue
+            my_file_path = '{}{}{}.npy'.format(folder, sep, len(my_shared_inputs))
+            try:
+                my_meteo, my_contamination = read_inputs(my_jobs[0])
+                my_layout, my_datetimes = save_shared_inputs(my_meteo, my_contamination, my_file_path)
+            except Exception:
+                logger.warning("The input data for {} at {} could not be shared, each job will read them.".format(
+                    my_jobs[0]['catchment'], my_jobs[0]['outlet']))
+                continue
+            if my_datetimes:
+                my_shared_inputs[my_key] = (my_file_path, my_layout, my_datetimes)
+
+        return my_shared_inputs
+
+    def get_warm_up_plan(self):
+        """
+        This method groups the jobs of the batch that have a warm-up period by their warm-up run (see function
+        'get_warm_up_group_key'), each group needing to run its warm-up only once.
+
+        :return: list of the groups in the order of their first job
+            [{'catchment': catchment, 'outlet': outlet, 'dt_save_start': start of the warm-up,
+              'warm_up_in_days': duration of the warm-up, 'jobs': list of the positions of the jobs in the batch}]
+        :rtype: list
+        """
+        my_groups = OrderedDict()
+        for i, my_job in enumerate(self.jobs):
+            if my_job['warm_up_in_days']:
+                my_key = get_warm_up_group_key(my_job)
+                if my_key not in my_groups:
+                    my_groups[my_key] = {'catchment': my_job['catchment'], 'outlet': my_job['outlet'],
+                                         'dt_save_start': my_job['dt_save_start'],
+                                         'warm_up_in_days': my_job['warm_up_in_days'], 'jobs': list()}
+                my_groups[my_key]['jobs'].append(i)
+
+        return list(my_groups.values())
+
+    def _share_warm_ups(self, plan, arguments, folder):
+        """
+        This method gives a warm-up cache to the jobs of the groups of the plan containing more than one job (the
+        temporary folder given, unless the jobs already have one), and selects the job whose warm-up is to be run
+        first for each of these groups.
+
+        :param plan: groups of jobs sharing the same warm-up (see method 'get_warm_up_plan')
+        :type plan: list
+        :param arguments: list of the dictionaries of arguments of the jobs in the order they are to be run
+        :type arguments: list
+        :param folder: path to the folder to use as warm-up cache for the jobs that do not have one
+        :type folder: str
+        :return: list of the arguments of the warm-ups to run, and list of the arguments of the jobs to run
+        :rtype: tuple
+        """
+        my_shared = dict()  # key: id of the arguments of the job, value: arguments with a warm-up cache
+        my_warm_ups = list()
+        for my_group in plan:
+            if len(my_group['jobs']) < 2:
+                continue
+            for i in my_group['jobs']:
+                my_job = self.jobs[i]
+                my_shared[id(my_job)] = dict(my_job, warm_up_cache=my_job['warm_up_cache'] or folder)
+            my_warm_ups.append(my_shared[id(self.jobs[my_group['jobs'][0]])])
+
+        return my_warm_ups, [my_shared.get(id(my_job), my_job) for my_job in arguments]
+
+    def _get_processes(self, processes, memory_limit_in_mb, memory_per_job_in_mb):
+        """
+        This method determines the number of worker processes to use given the limits provided (never more than
+        the number of jobs, and at least one).
+        """
+        logger = logging.getLogger('TORRENTpy.bh')
 
+        if processes is not None and processes < 1:
+            logger.error("The number of processes for the batch session must be at least 1.")
+            raise Exception("The number of processes for the batch session must be at least 1.")
+        my_processes = processes if processes else cpu_count()
+
+        if memory_limit_in_mb:
+            if not memory_per_job_in_mb:
+                logger.error("The memory limit for the batch session requires the memory per job to be given.")
+                raise Exception("The memory limit for the batch session requires the memory per job to be given.")
+            if memory_per_job_in_mb > memory_limit_in_mb:
+                logger.warning("The memory per job exceeds the memory limit for the batch session, "
+                               "the jobs will run one at a time.")
+            my_processes = min(my_processes, int(memory_limit_in_mb // memory_per_job_in_mb))
+
+        return max(1, min(my_processes, self.size))
+
+    def _get_schedule(self):
+        """
+        This method orders the jobs from the most costly to the least costly (longest processing time first), the
+        jobs with the same cost on the same catchment following each other, so that the catchments kept in the
+        caches of the workers are reused before being evicted.
+
+        :return: list of the dictionaries of arguments of the jobs in the order they are to be sent to the workers
+        :rtype: list
+        """
+        my_costs = [estimate_job_cost(my_job) for my_job in self.jobs]
+
+        return [my_job for my_cost, my_job in sorted(zip(my_costs, self.jobs),
+                                                      key=lambda x: (-x[0], x[1]['catchment'], x[1]['outlet']))]
+
+
+def log_warm_up_plan(plan):
+    """
+    This function logs the groups of jobs sharing the same warm-up run (see method 'Batch.get_warm_up_plan').
+    """
+    logger = logging.getLogger('TORRENTpy.bh')
 
-def set_up_and_run_job(kb, dict_args):
+    logger.warning("Warm-up plan: {} distinct warm-up(s) for {} job(s) with a warm-up period.".format(
+        len(plan), sum(len(my_group['jobs']) for my_group in plan)))
+    for my_group in plan:
+        logger.warning("> {} at {}: warm-up of {} day(s) from {} for job(s) {}.".format(
+            my_group['catchment'], my_group['outlet'], my_group['warm_up_in_days'],
+            my_group['dt_save_start'].strftime('%d/%m/%Y %H:%M:%S'), ', '.join(str(i) for i in my_group['jobs'])))
+
+
+def estimate_job_cost(dict_args):
+    """
+    This function estimates the cost of a job as the number of Links in the network file, times the number of
+    simulation time steps (including the warm-up period, repeated as many times as the spin-up may require), times
+    the number of Models per Link. The estimate is only meant to compare the jobs with one another.
+
+    :param dict_args: dictionary of the arguments of the job (see Batch._check_all_args)
+    :type dict_args: dict
+    :return: estimated cost of the job
+    :rtype: int
+    """
+    # number of Links (zero if the network file cannot be read, the job will fail as soon as it starts)
+    try:
+        my_links = len(get_links_names(dict_args))
+    except IOError:
+        my_links = 0
+
+    # number of simulation time steps
+    my_steps = int((dict_args['dt_save_end'] - dict_args['dt_save_start']).total_seconds() // 60 //
+                   dict_args['simu_increment_in_minutes']) + 1
+    my_warm_up_steps = int(dict_args['warm_up_in_days'] * 1440 // dict_args['simu_increment_in_minutes'])
+    if dict_args['spin_up_tolerance']:
+        my_warm_up_steps *= dict_args['spin_up_max_cycles']
+
+    # number of Models per Link
+    my_names = ['catchment_h', 'river_h', 'lake_h']
+    if dict_args['water_quality']:
+        my_names += ['catchment_q', 'river_q', 'lake_q']
+    my_models = max(1, len([name for name in my_names if dict_args.get(name)]))
+
+    return my_links * (my_steps + my_warm_up_steps) * my_models
+
+
+class WorkerCache(object):
+    """
+    This class keeps, in a worker process of a Batch, the objects that can be reused from one job to the next for the
+    same catchment (i.e. the same combination of catchment and outlet): the ModelFilesStore (i.e. the parameters and
+    constants files already read), the Networks with their Models and parameters (one for each variant of the
+    Network arguments), and the TimeFrame and the input data (one for each variant of the TimeFrame and input
+    arguments). The number of catchments kept, and the number of variants kept for each catchment, are bounded, the
+    least recently used ones being evicted first.
+    """
+    def __init__(self, size=4, variants=2):
+        # maximum number of catchments kept
+        self.size = size
+        # maximum number of Networks (and of inputs) kept for each catchment
+        self.variants = variants
+        # entries for each catchment, least recently used first
+        # {key: (catchment, outlet), value: {'store': ModelFilesStore, 'networks': OrderedDict, 'inputs': OrderedDict}}
+        self.entries = OrderedDict()
+
+    def get(self, kb, dict_args, shared_inputs=None):
+        """
+        This method returns the Network (with its Models assigned), the TimeFrame and the DataBase for the given job,
+        reusing the ones kept for a previous job when the corresponding arguments are the same.
+
+        :param kb: KnowledgeBase object containing the Models
+        :type kb: KnowledgeBase
+        :param dict_args: dictionary of the arguments of the job (see Batch._check_all_args)
+        :type dict_args: dict
+        :param shared_inputs: input data shared by the Batch (see method 'Batch._share_inputs')
+        :type shared_inputs: dict
+        :return: Network, TimeFrame, and DataBase objects
+        :rtype: tuple
+        """
+        my_entry = self._get_entry((dict_args['catchment'], dict_args['outlet']))
+
+        my_key = get_network_key(dict_args)
+        nw = _get_variant(my_entry['networks'], my_key)
+        if nw is None:
+            nw = set_up_network(kb, dict_args, store=my_entry['store'])
+            for my_evicted in _add_variant(my_entry['networks'], my_key, nw, self.variants):
+                release_network(my_evicted)
+
+        my_key = get_inputs_key(dict_args)
+        my_inputs = _get_variant(my_entry['inputs'], my_key)
+        if my_inputs is None:
+            tf = set_up_timeframe(dict_args)
+            db = set_up_database(nw, tf, kb, dict_args, inputs=get_shared_inputs(dict_args, shared_inputs))
+            _add_variant(my_entry['inputs'], my_key, (tf, db.meteo, db.contamination), self.variants)
+        else:
+            tf = my_inputs[0]
+            db = set_up_database(nw, tf, kb, dict_args, inputs=my_inputs[1:])
+
+        return nw, tf, db
+
+    def clear(self):
+        """
+        This method evicts all the catchments from the cache.
+        """
+        while self.entries:
+            self._evict()
+
+    def _get_entry(self, key):
+        try:
+            my_entry = self.entries.pop(key)
+        except KeyError:
+            while self.entries and len(self.entries) >= self.size:
+                self._evict()
+            my_entry = {'store': ModelFilesStore(), 'networks': OrderedDict(), 'inputs': OrderedDict()}
+        if self.size > 0:
+            self.entries[key] = my_entry  # (re)insert as most recently used
+
+        return my_entry
+
+    def _evict(self):
+        my_key, my_entry = self.entries.popitem(last=False)
+        for nw in my_entry['networks'].values():
+            release_network(nw)
+        my_entry.clear()
+        gc.collect()
+
+
+def _get_variant(variants, key):
+    try:
+        my_value = variants.pop(key)
+    except KeyError:
+        return None
+    variants[key] = my_value  # reinsert as most recently used
+
+    return my_value
+
+
+def _add_variant(variants, key, value, size):
+    my_evicted = list()
+    while variants and len(variants) >= size:
+        my_evicted.append(variants.popitem(last=False)[1])
+    variants[key] = value
+
+    return my_evicted
+
+
+def get_links_names(dict_args):
+    """
+    This function returns the names of the Links in the network file for a job (without setting up the Network).
+    """
+    with open_csv_rb('{}{}_{}.network'.format(
+            dict_args['in_fld'], dict_args['catchment'], dict_args['outlet'])) as my_file:
+        return [row['WaterBody'] for row in DictReader(my_file)]
+
+
+def read_inputs(dict_args):
+    """
+    This function reads the input data for all the Links in the network file for a job (as a DataBase would, but
+    without setting up the Network).
+
+    :return: meteo and contamination nested dictionaries (contamination is None if no water quality)
+    :rtype: tuple
+    """
+    tf = set_up_timeframe(dict_args)
+    my_links = get_links_names(dict_args)
+    my_meteo = {link: get_nd_input_data_from_file(
+        dict_args['meteo_cumulative'], dict_args['meteo_average'], tf, dict_args['catchment'], link,
+        dict_args['in_format'], dict_args['in_fld'], 'meteorology') for link in my_links}
+    my_contamination = None
+    if dict_args['water_quality']:
+        my_contamination = {link: get_nd_input_data_from_file(
+            dict_args['contamination_cumulative'], dict_args['contamination_average'], tf, dict_args['catchment'],
+            link, dict_args['in_format'], dict_args['in_fld'], 'contamination') for link in my_links}
+
+    return my_meteo, my_contamination
+
+
+def get_shared_inputs(dict_args, shared_inputs):
+    """
+    This function returns the input data for a job if they were shared by the Batch (see method
+    'Batch._share_inputs'), memory-mapped read-only, or None if they were not.
+    """
+    if shared_inputs:
+        my_shared = shared_inputs.get(get_inputs_key(dict_args))
+        if my_shared:
+            return load_shared_inputs(*my_shared)
+    return None
+
+
+def get_network_key(dict_args):
+    """
+    This function returns the key identifying the Network (with its Models) to use for a job, i.e. the arguments of
+    the job that are used to set up the Network.
+    """
+    return tuple(repr(dict_args.get(arg)) for arg in [
+        'catchment', 'outlet', 'in_fld', 'out_fld', 'variable_h', 'variables_q', 'water_quality', 'verbose',
+        'catchment_h', 'river_h', 'lake_h', 'catchment_q', 'river_q', 'lake_q', 'links_extra', 'nodes_extra'])
+
+
+def get_inputs_key(dict_args):
+    """
+    This function returns the key identifying the TimeFrame and the input data to use for a job, i.e. the arguments
+    of the job that are used to set up the TimeFrame and to read the input files.
+    """
+    return tuple(repr(dict_args.get(arg)) for arg in [
+        'catchment', 'outlet', 'in_fld', 'water_quality',
+        'dt_data_start', 'dt_data_end', 'dt_save_start', 'dt_save_end',
+        'data_increment_in_minutes', 'save_increment_in_minutes', 'simu_increment_in_minutes',
+        'expected_simu_slice_length', 'warm_up_in_days', 'in_format',
+        'meteo_cumulative', 'meteo_average', 'contamination_cumulative', 'contamination_average'])
+
+
+def get_warm_up_group_key(dict_args):
+    """
+    This function returns the key identifying the warm-up run of a job, i.e. the arguments of the job that have an
+    influence on the states at the end of the warm-up period (the Network and its Models, the warm-up window, the
+    input data, and the spin-up), but not the end of the save period or the outputs. The jobs with the same key also
+    have the same key in the warm-up cache (see function 'get_warm_up_key'), as long as the input files are the same.
+    """
+    return tuple(repr(dict_args.get(arg)) for arg in [
+        'catchment', 'outlet', 'in_fld', 'variable_h', 'variables_q', 'water_quality',
+        'catchment_h', 'river_h', 'lake_h', 'catchment_q', 'river_q', 'lake_q', 'links_extra', 'nodes_extra',
+        'dt_data_start', 'dt_save_start', 'warm_up_in_days',
+        'data_increment_in_minutes', 'save_increment_in_minutes', 'simu_increment_in_minutes',
+        'expected_simu_slice_length', 'in_format',
+        'meteo_cumulative', 'meteo_average', 'contamination_cumulative', 'contamination_average',
+        'spin_up_tolerance', 'spin_up_max_cycles', 'warm_up_cache'])
+
+
+def release_network(nw):
+    """
+    This function closes and detaches the logging handlers created for the given Network (e.g. when it is evicted
+    from a WorkerCache), so that a long-lived process does not accumulate open log files.
+    """
+    logger = logging.getLogger('TORRENTpy')
+    for handler in nw.log_handlers or []:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def set_up_network(kb, dict_args, store=None):
 
     nw = Network(
         catchment=dict_args['catchment'],
@@ -171,7 +644,23 @@ def set_up_and_run_job(kb, dict_args):
         for node in nw.nodes:
             node.extra.update(dict_args['nodes_extra'])
 
-    tf = TimeFrame(
+    nw.set_links_models(
+        kb,
+        catchment_h=dict_args['catchment_h'],
+        river_h=dict_args['river_h'],
+        lake_h=dict_args['lake_h'],
+        catchment_q=dict_args['catchment_q'],
+        river_q=dict_args['river_q'],
+        lake_q=dict_args['lake_q'],
+        store=store
+    )
+
+    return nw
+
+
+def set_up_timeframe(dict_args):
+
+    return TimeFrame(
         dt_data_start=dict_args['dt_data_start'],
         dt_data_end=dict_args['dt_data_end'],
         dt_save_start=dict_args['dt_save_start'],
@@ -183,29 +672,173 @@ def set_up_and_run_job(kb, dict_args):
         warm_up_in_days=dict_args['warm_up_in_days']
     )
 
-    db = DataBase(
+
+def set_up_database(nw, tf, kb, dict_args, inputs=None):
+
+    return DataBase(
         nw, tf, kb,
         in_format=dict_args['in_format'],
         meteo_cumulative=dict_args['meteo_cumulative'],
         meteo_average=dict_args['meteo_average'],
         contamination_cumulative=dict_args['contamination_cumulative'],
-        contamination_average=dict_args['contamination_average']
+        contamination_average=dict_args['contamination_average'],
+        inputs=inputs
     )
 
-    nw.set_links_models(
-        kb,
-        catchment_h=dict_args['catchment_h'],
-        river_h=dict_args['river_h'],
-        lake_h=dict_args['lake_h'],
-        catchment_q=dict_args['catchment_q'],
-        river_q=dict_args['river_q'],
-        lake_q=dict_args['lake_q']
-    )
 
-    nw.simulate(
-        db, tf,
-        out_format=dict_args['out_format']
-    )
+def set_up_and_run_job(kb, dict_args, cache=None, shared_inputs=None, warm_up_only=False):
+
+    if cache is not None:
+        nw, tf, db = cache.get(kb, dict_args, shared_inputs)
+    else:
+        nw = set_up_network(kb, dict_args)
+        tf = set_up_timeframe(dict_args)
+        db = set_up_database(nw, tf, kb, dict_args, inputs=get_shared_inputs(dict_args, shared_inputs))
+
+    # attach the logging handlers of the Network for the time of the job only (they may have been detached after a
+    # previous job, and the handlers of the other Networks kept in the cache must not receive the messages)
+    logger = logging.getLogger('TORRENTpy')
+    for handler in nw.log_handlers or []:
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
+    try:
+        if warm_up_only:  # only store the states at the end of the warm-up period in the warm-up cache
+            nw._get_initial_conditions(db, tf, dict_args['warm_up_cache'], dict_args['spin_up_tolerance'],
+                                       dict_args['spin_up_max_cycles'])
+            return
+        nw.simulate(
+            db, tf,
+            out_format=dict_args['out_format'],
+            warm_up_cache=dict_args['warm_up_cache'],
+            spin_up_tolerance=dict_args['spin_up_tolerance'],
+            spin_up_max_cycles=dict_args['spin_up_max_cycles'],
+            out_precision=dict_args['out_precision'],
+            instrument=dict_args['instrument'],
+            profile=dict_args['profile']
+        )
+    finally:
+        if cache is not None:
+            for handler in nw.log_handlers or []:
+                logger.removeHandler(handler)
+        else:
+            release_network(nw)
+
+
+# state of a worker process of a Batch (set once by '_initialise_worker' when the process starts)
+_worker = {'kb': None, 'cache': None, 'shared_inputs': None}
+
+
+def _initialise_worker(kb, log_file, cache_size, shared_inputs=None):
+    # set up all the loggers required (two required because it is difficult to catch the exception from multiple jobs)
+    mp_logger = log_to_stderr()
+    mp_logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(log_file)
+    handler.setFormatter(logging.Formatter(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                                           datefmt="%d/%m/%Y - %H:%M:%S"))
+    logger = logging.getLogger('TORRENTpy.bh')
+    logger.addHandler(handler)
+    # keep the KnowledgeBase, the cache, and the input data shared by the Batch for all the jobs run by the worker
+    _worker['kb'] = kb
+    _worker['cache'] = WorkerCache(size=cache_size) if cache_size > 0 else None
+    _worker['shared_inputs'] = shared_inputs
+
+
+def run_job_in_worker(args):
+    # run the job with the KnowledgeBase and the cache of the worker, and catch and raise exceptions when they show up
+    mp_logger = get_logger()  # already set up to log to stderr when the worker started
+    logger = logging.getLogger('TORRENTpy.bh')
+    try:
+        set_up_and_run_job(_worker['kb'], args, _worker['cache'], _worker['shared_inputs'])
+    except Exception as e:
+        mp_logger.error("Exception for arguments ({}, {})".format(args['catchment'], args['outlet']))
+        logger.error("Exception for arguments ({}, {})".format(args['catchment'], args['outlet']))
+        logger.exception(e)
+        if _worker['cache'] is not None:  # do not reuse objects that may have been left in an inconsistent state
+            _worker['cache'].clear()
+        raise e
+
+
+def run_warm_up_in_worker(args):
+    # run the warm-up of the job with the KnowledgeBase and the cache of the worker, an exception is only logged
+    # because the jobs can still run their warm-up themselves
+    logger = logging.getLogger('TORRENTpy.bh')
+    try:
+        set_up_and_run_job(_worker['kb'], args, _worker['cache'], _worker['shared_inputs'], warm_up_only=True)
+    except Exception as e:
+        logger.warning("The warm-up for {} at {} could not be shared, each job will run it.".format(
+            args['catchment'], args['outlet']))
+        logger.exception(e)
+        if _worker['cache'] is not None:  # do not reuse objects that may have been left in an inconsistent state
+            _worker['cache'].clear()
+
+
+def run_queue_worker(folder, kb=None, lease_timeout=600, max_attempts=3, cache_size=4, wait_in_seconds=10,
+                     max_jobs=None):
+    """
+    This function runs the jobs of the queue in the given folder one after the other until there is no job left to
+    run (i.e. no pending job, and no running job that could be put back in the queue). It can be started in any
+    number of processes on any number of hosts sharing the folder. The worker keeps a cache of the objects that can
+    be reused from one job to the next (see class WorkerCache).
+
+    :param folder: path of the folder of the queue (see class JobQueue, e.g. filled with Batch.submit)
+    :type folder: str
+    :param kb: KnowledgeBase object for the jobs (optional, a new one is created if not given)
+    :type kb: KnowledgeBase
+    :param lease_timeout: time in seconds after which a job whose lease was not renewed is put back in the queue
+    :type lease_timeout: float
+    :param max_attempts: maximum number of times a job is claimed before it is considered failed
+    :type max_attempts: int
+    :param cache_size: number of catchments kept in the cache of the worker (0 not to keep anything between jobs)
+    :type cache_size: int
+    :param wait_in_seconds: time to wait before checking again when the only jobs left are running elsewhere
+    :type wait_in_seconds: float
+    :param max_jobs: maximum number of jobs to run before stopping (optional, no maximum if not given)
+    :type max_jobs: int
+    :return: number of jobs run by the worker (including the jobs that failed)
+    :rtype: int
+    """
+    logger = logging.getLogger('TORRENTpy.bh')
+
+    my_queue = JobQueue(folder, lease_timeout, max_attempts)
+    my_kb = kb if kb else KnowledgeBase()
+    my_cache = WorkerCache(size=cache_size) if cache_size > 0 else None
+    my_host = gethostname()
+
+    my_count = 0
+    while max_jobs is None or my_count < max_jobs:
+        my_queue.requeue_expired()
+        my_claim = my_queue.claim()
+        if my_claim is None:
+            if my_queue.get_status()['running']:  # some jobs may be put back in the queue if their worker crashed
+                sleep(wait_in_seconds)
+                continue
+            break
+
+        my_name, my_record = my_claim
+        my_record.update({'host': my_host, 'pid': getpid(), 'started': datetime.now()})
+        my_lease = Lease(my_queue, my_name)
+        my_lease.start()
+        my_start = default_timer()
+        try:
+            set_up_and_run_job(my_kb, my_record['job'], my_cache)
+        except Exception as e:
+            logger.error("Exception for job {}.".format(my_name))
+            logger.exception(e)
+            my_record.update({'finished': datetime.now(), 'seconds': default_timer() - my_start, 'error': repr(e)})
+            my_lease.stop()
+            my_queue.fail(my_name, my_record)
+            if my_cache is not None:  # do not reuse objects that may have been left in an inconsistent state
+                my_cache.clear()
+        else:
+            my_record.update({'finished': datetime.now(), 'seconds': default_timer() - my_start})
+            my_lease.stop()
+            my_queue.complete(my_name, my_record)
+        my_count += 1
+
+    if my_cache is not None:
+        my_cache.clear()
+
+    return my_count
 
 
 def run_job(kb, args, log_file):
@@ -225,6 +858,9 @@ def run_job(kb, args, log_file):
         logger.error("Exception for arguments ({}, {})".format(args['catchment'], args['outlet']))
         logger.exception(e)
         raise e
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
 
 
 def run_job_unpacked(args):
@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from multiprocessing import Pool
+from datetime import datetime, timedelta
+from logging import getLogger
+import logging
+import csv
+import numpy as np
+
+from .inout import open_csv_rb
+from .results import SimulationResults
+
+
+class Calibration(object):
+    """
+    This class calibrates the parameters of the Models of a Network against the flow observed at a gauge using the
+    Dynamically Dimensioned Search (DDS) algorithm (Tolson and Shoemaker, 2007). Each candidate set of parameters is
+    simulated in memory (the Network, the TimeFrame, and the DataBase are loaded once and reused for all the
+    candidates), only the simulated flow at the gauge Node is kept, and it is scored against the observations with an
+    objective function (to be maximised). Several candidates can be simulated at once in parallel workers.
+
+    When the objective function allows it (i.e. NSE and log-NSE, whose sum of squared errors can only grow as the
+    simulation goes on), a candidate is abandoned at the end of a simulation slice as soon as it can no longer beat the
+    best candidate found so far.
+    """
+    def __init__(self, nw, tf, db, observed, parameters, objective='NSE', gauge_node=None, multiplicative=False,
+                 spin_up_tolerance=None, spin_up_max_cycles=10):
+        """
+        :param nw: Network object whose Links were assigned Models
+        :type nw: Network
+        :param tf: TimeFrame object for the calibration period
+        :type tf: TimeFrame
+        :param db: DataBase object containing the input data for the Links of the Network
+        :type db: DataBase
+        :param observed: observed flow at the gauge {key: DateTime, value: flow}, only the DateTime matching the
+            save steps of the TimeFrame are used (see function 'read_gauge_flow')
+        :type observed: dict
+        :param parameters: bounds of the parameters to calibrate {key: parameter name, value: (lower, upper)}, a
+            parameter is set for all the Models of all the Links having a parameter with this name
+        :type parameters: dict
+        :param objective: name of the objective function ('NSE', 'KGE', or 'logNSE')
+        :type objective: str
+        :param gauge_node: name of the Node where the flow is observed (optional, if not given, the Node the Network
+            is restricted to the upstream part of, or the Node downstream of the most downstream Link)
+        :type gauge_node: str
+        :param multiplicative: whether the calibrated values are factors applied to the parameters the Links were
+            given initially (e.g. to keep their spatial pattern) rather than values given to all the Links
+        :type multiplicative: bool
+        :param spin_up_tolerance: relative change in the slow states below which the warm-up period is considered
+            converged (optional, if not given the warm-up period is run only once for each candidate)
+        :type spin_up_tolerance: float
+        :param spin_up_max_cycles: maximum number of times the warm-up period is repeated to reach convergence
+        :type spin_up_max_cycles: int
+        """
+        logger = getLogger('TORRENTpy.cl')
+
+        if not nw.links_have_models:
+            logger.error("The Links of the Network must be assigned Models before the calibration.")
+            raise Exception("The Links of the Network must be assigned Models before the calibration.")
+        if objective not in OBJECTIVES:
+            logger.error("The objective function {} is not available for the calibration.".format(objective))
+            raise Exception("The objective function {} is not available for the calibration.".format(objective))
+
+        self.nw = nw
+        self.tf = tf
+        self.db = db
+        # name of the objective function
+        self.objective = objective
+        # name of the Node where the flow is observed
+        if gauge_node:
+            self.gauge_node = gauge_node
+        elif nw.upstream_of in nw.nodes_mapping and nw.upstream_of not in nw.links_mapping:  # upstream of a Node
+            self.gauge_node = nw.upstream_of
+        else:
+            self.gauge_node = nw.links_mapping[nw.outlet_link].connections[0]
+        if self.gauge_node not in nw.nodes_mapping:
+            logger.error("The gauge Node {} does not exist in the Network.".format(self.gauge_node))
+            raise Exception("The gauge Node {} does not exist in the Network.".format(self.gauge_node))
+        # parameters to calibrate, with their bounds, and the Models they are set for
+        self.space = ParametersSpace(nw, parameters, multiplicative)
+        # observations for the save steps of the TimeFrame (only the steps with an observation are kept)
+        self.steps = [step for step in tf.save_series[1:] if step in observed]
+        if len(self.steps) < 2:
+            logger.error("There are not enough observations at the gauge for the save steps of the TimeFrame.")
+            raise Exception("There are not enough observations at the gauge for the save steps of the TimeFrame.")
+        self.observed = np.array([observed[step] for step in self.steps], dtype=np.float64)
+        self.positions = {step: i for i, step in enumerate(self.steps)}
+        # warm-up arguments
+        self.spin_up_tolerance = spin_up_tolerance
+        self.spin_up_max_cycles = spin_up_max_cycles
+
+    def get_initial_values(self):
+        """
+        This method gives the values of the parameters to start the search from (see ParametersSpace).
+        """
+        return self.space.get_initial_values()
+
+    def set_parameters(self, values):
+        """
+        This method gives the values of a candidate to the Models of the Links of the Network.
+        """
+        self.space.set_parameters(values)
+
+    def evaluate(self, values, threshold=None):
+        """
+        This method simulates the Network in memory with the given values of the parameters, and scores the flow
+        simulated at the gauge Node against the observations.
+
+        :param values: values in the order of the names of the parameters
+        :type values: sequence
+        :param threshold: score the candidate must be able to beat not to be abandoned (optional, if not given or if
+            the objective function does not allow it, the candidate is never abandoned)
+        :type threshold: float
+        :return: score of the candidate (an upper bound of the score if it was abandoned), whether it was abandoned
+        :rtype: tuple
+        """
+        nw, tf, db = self.nw, self.tf, self.db
+
+        self.set_parameters(values)
+
+        nw.instrumentation = None
+        nw.profiler = None
+        nw.diagnostics.clear()
+
+        my_objective = OBJECTIVES[self.objective]
+        my_observed = my_objective.transform(self.observed, self.observed)
+        my_total = np.sum((my_observed - np.mean(my_observed)) ** 2)
+        my_bounded = (threshold is not None) and my_objective.bounded and (my_total > 0.0)
+        my_results = SimulationResults(nw, tf, nodes=[self.gauge_node], links=[])
+        my_flows = my_results.get_node(self.gauge_node, nw.variable_h)
+        my_indices = np.array([my_results.positions[step] for step in self.steps], dtype=int)
+        my_state = {'count': 0, 'errors': 0.0}
+
+        def my_gauge_slice(my_db, my_simu_slice, my_save_slice):
+            my_results.update(my_db, my_save_slice)
+            my_start = my_state['count']
+            my_state['count'] += sum(1 for step in my_save_slice[1:] if step in self.positions)
+            if my_bounded:
+                my_simulated = my_flows[my_indices[my_start:my_state['count']]]
+                my_state['errors'] += np.sum((my_objective.transform(my_simulated, self.observed) -
+                                              my_observed[my_start:my_state['count']]) ** 2)
+                return (1.0 - my_state['errors'] / my_total) < threshold
+
+        my_last_lines = nw._get_initial_conditions(db, tf, None, self.spin_up_tolerance, self.spin_up_max_cycles)
+        if nw._simulate_slices(db, tf, my_last_lines, my_gauge_slice):
+            return float(1.0 - my_state['errors'] / my_total), True
+
+        return float(my_objective.score(my_flows[my_indices], self.observed)), False
+
+    def run(self, max_evaluations=500, processes=1, perturbation=0.2, seed=None, early_abandonment=True):
+        """
+        This method searches the parameters maximising the objective function with the Dynamically Dimensioned
+        Search algorithm. If several processes are used, as many candidates are generated from the best candidate at
+        each iteration and simulated in parallel (each worker holding a copy of the Network, the TimeFrame, and the
+        DataBase for the whole search). At the end, the Models of the Network are given the best parameters found.
+
+        :param max_evaluations: number of candidates to simulate (including the initial one)
+        :type max_evaluations: int
+        :param processes: number of candidates simulated in parallel
+        :type processes: int
+        :param perturbation: standard deviation of the perturbations as a fraction of the range of the parameters
+        :type perturbation: float
+        :param seed: seed of the random number generator (optional)
+        :type seed: int
+        :param early_abandonment: whether to abandon the candidates that can no longer beat the best one
+        :type early_abandonment: bool
+        :return: best parameters {key: parameter name, value: value}, best score, and history of the search
+            [(values, score, abandoned)] in the order the candidates were generated
+        :rtype: dict
+        """
+        logger = getLogger('TORRENTpy.cl')
+
+        if max_evaluations < 1 or processes < 1:
+            logger.error("The numbers of evaluations and processes for the calibration must be at least 1.")
+            raise Exception("The numbers of evaluations and processes for the calibration must be at least 1.")
+
+        my_random = np.random.RandomState(seed)
+        my_pool = Pool(processes=processes, initializer=_initialise_worker, initargs=(self,)) \
+            if processes > 1 else None
+
+        try:
+            my_best = self.get_initial_values()
+            my_best_score, _ = self.evaluate(my_best)
+            my_history = [(my_best.tolist(), my_best_score, False)]
+            logger.warning("Calibration - Initial {} {:.6f}.".format(self.objective, my_best_score))
+
+            my_count = 1
+            while my_count < max_evaluations:
+                my_candidates = list()
+                for _ in range(min(processes, max_evaluations - my_count)):
+                    my_count += 1
+                    my_candidates.append(self._get_candidate(my_best, my_count, max_evaluations,
+                                                             perturbation, my_random))
+                my_threshold = my_best_score if early_abandonment else None
+                if my_pool:
+                    my_results = my_pool.map(_evaluate_in_worker, [(c, my_threshold) for c in my_candidates])
+                else:
+                    my_results = [self.evaluate(c, my_threshold) for c in my_candidates]
+
+                my_improved = False
+                for my_candidate, (my_score, my_abandoned) in zip(my_candidates, my_results):
+                    my_history.append((my_candidate.tolist(), my_score, my_abandoned))
+                    if not my_abandoned and my_score >= my_best_score:
+                        my_best, my_best_score = my_candidate, my_score
+                        my_improved = True
+                if my_improved:
+                    logger.info("Calibration - Evaluation {}: best {} {:.6f}.".format(
+                        my_count, self.objective, my_best_score))
+        finally:
+            if my_pool:
+                my_pool.close()
+                my_pool.join()
+
+        self.set_parameters(my_best)
+        logger.warning("Calibration - Final {} {:.6f} after {} evaluations ({} abandoned).".format(
+            self.objective, my_best_score, len(my_history), sum(1 for h in my_history if h[2])))
+
+        return {'parameters': dict(zip(self.space.names, my_best.tolist())), 'score': my_best_score,
+                'history': my_history}
+
+    def _get_candidate(self, best, evaluation, max_evaluations, perturbation, random):
+        # probability for each parameter to be perturbed (decreasing with the number of evaluations)
+        my_probability = 1.0 - np.log(evaluation) / np.log(max_evaluations) if max_evaluations > 1 else 1.0
+        my_lower, my_upper = self.space.lower, self.space.upper
+        my_selected = random.uniform(size=len(my_lower)) < my_probability
+        if not np.any(my_selected):
+            my_selected[random.randint(len(my_lower))] = True
+
+        my_range = my_upper - my_lower
+        my_candidate = np.array(best, dtype=np.float64)
+        my_candidate[my_selected] += perturbation * my_range[my_selected] * random.standard_normal(
+            int(np.sum(my_selected)))
+        # reflect the values beyond the bounds, and clip them if they are still beyond
+        my_candidate = np.where(my_candidate < my_lower, 2.0 * my_lower - my_candidate, my_candidate)
+        my_candidate = np.where(my_candidate > my_upper, 2.0 * my_upper - my_candidate, my_candidate)
+
+        return np.clip(my_candidate, my_lower, my_upper)
+
+
+class ParametersSpace(object):
+    """
+    This class defines the parameters of the Models of a Network to explore (e.g. to calibrate them or to analyse
+    their sensitivity) with their bounds, and it gives sets of values for these parameters to the Models. A parameter
+    is set for all the Models of all the Links having a parameter with this name, either as a value given to all the
+    Links, or as a factor applied to the value each Link was given initially (e.g. to keep their spatial pattern).
+    """
+    def __init__(self, nw, parameters, multiplicative=False):
+        """
+        :param nw: Network object whose Links were assigned Models
+        :type nw: Network
+        :param parameters: bounds of the parameters {key: parameter name, value: (lower, upper)}
+        :type parameters: dict
+        :param multiplicative: whether the values are factors applied to the initial values of the parameters
+        :type multiplicative: bool
+        """
+        logger = getLogger('TORRENTpy.cl')
+
+        # names of the parameters and their bounds (in the same order)
+        self.names = sorted(parameters)
+        self.lower = np.array([float(parameters[name][0]) for name in self.names])
+        self.upper = np.array([float(parameters[name][1]) for name in self.names])
+        if np.any(self.lower >= self.upper):
+            logger.error("The lower bounds of the parameters must be strictly below their upper bounds.")
+            raise Exception("The lower bounds of the parameters must be strictly below their upper bounds.")
+        self.multiplicative = multiplicative
+        # parameters dictionaries of the Models having the parameters, and their initial values
+        # [(Link, dict of the parameters of the Model, {key: parameter name, value: initial value})]
+        self.targets = self._get_targets(nw)
+
+    def _get_targets(self, nw):
+        logger = getLogger('TORRENTpy.cl')
+
+        my_targets = list()
+        my_found = set()
+        for link in nw.links:
+            for model in link.all_models:
+                my_names = [name for name in self.names if name in model.parameters_names]
+                if my_names:
+                    my_targets.append((link, model.parameters, {name: model.parameters[name] for name in my_names}))
+                    my_found.update(my_names)
+        for name in self.names:
+            if name not in my_found:
+                logger.error("The parameter {} is not a parameter of the Models of the Network.".format(name))
+                raise Exception("The parameter {} is not a parameter of the Models of the Network.".format(name))
+
+        return my_targets
+
+    def get_initial_values(self):
+        """
+        This method gives the initial values of the parameters, i.e. a factor of 1 for multiplicative parameters,
+        otherwise the average of the initial values of the Links (within the bounds).
+
+        :return: array of the values in the order of the names of the parameters
+        :rtype: numpy.ndarray
+        """
+        if self.multiplicative:
+            my_values = np.ones(len(self.names))
+        else:
+            my_values = np.array([np.mean([my_initial[name] for _, _, my_initial in self.targets if name in my_initial])
+                                  for name in self.names])
+
+        return np.clip(my_values, self.lower, self.upper)
+
+    def scale(self, samples):
+        """
+        This method converts samples in the unit hypercube into values within the bounds of the parameters.
+
+        :param samples: array of samples in [0, 1] (one row per sample, one column per parameter)
+        :type samples: numpy.ndarray
+        :rtype: numpy.ndarray
+        """
+        return self.lower + np.asarray(samples) * (self.upper - self.lower)
+
+    def set_parameters(self, values):
+        """
+        This method gives a set of values to the Models of the Links of the Network.
+
+        :param values: values in the order of the names of the parameters
+        :type values: sequence
+        """
+        my_values = dict(zip(self.names, values))
+        for link, my_parameters, my_initial in self.targets:
+            for name in my_initial:
+                my_value = my_initial[name] * my_values[name] if self.multiplicative else my_values[name]
+                my_parameters[name] = float(my_value)
+                link.models_parameters[name] = float(my_value)
+
+    def reset(self):
+        """
+        This method gives the Models of the Links of the Network their initial values of the parameters back.
+        """
+        for link, my_parameters, my_initial in self.targets:
+            my_parameters.update(my_initial)
+            link.models_parameters.update(my_initial)
+
+
+class Objective(object):
+    """
+    This class defines an objective function comparing simulated and observed flows (the higher the better, 1 being
+    a perfect fit).
+    """
+    def __init__(self, function, transform=None, bounded=False):
+        # function computing the score from the simulated and the observed arrays
+        self.function = function
+        # function transforming the simulated values (given the observed values) before computing a squared error
+        self.transform = transform if transform else get_flow
+        # boolean stating whether the score is '1 - sum of squared errors (of transformed values) / constant', i.e.
+        # whether the score of a partial simulation is an upper bound of the score of the whole simulation
+        self.bounded = bounded
+
+    def score(self, simulated, observed):
+        return self.function(simulated, observed)
+
+
+def get_flow(values, observed):
+    """
+    This function leaves the flow as it is (i.e. no transformation).
+    """
+    return values
+
+
+def nse(simulated, observed):
+    """
+    This function computes the Nash-Sutcliffe Efficiency of the simulated flow.
+    """
+    return 1.0 - np.sum((simulated - observed) ** 2) / np.sum((observed - np.mean(observed)) ** 2)
+
+
+def get_log_flow(values, observed):
+    """
+    This function transforms the flow into its logarithm, adding one hundredth of the average observed flow to avoid
+    taking the logarithm of zero (Pushpalatha et al., 2012).
+    """
+    return np.log(np.maximum(values, 0.0) + np.mean(observed) / 100.0)
+
+
+def log_nse(simulated, observed):
+    """
+    This function computes the Nash-Sutcliffe Efficiency of the logarithm of the simulated flow (putting the
+    emphasis on low flows).
+    """
+    return nse(get_log_flow(simulated, observed), get_log_flow(observed, observed))
+
+
+def kge(simulated, observed):
+    """
+    This function computes the Kling-Gupta Efficiency of the simulated flow (Gupta et al., 2009).
+    """
+    my_sim_std = np.std(simulated)
+    my_r = np.corrcoef(simulated, observed)[0, 1] if my_sim_std > 0.0 else 0.0
+    my_alpha = my_sim_std / np.std(observed)
+    my_beta = np.mean(simulated) / np.mean(observed)
+
+    return 1.0 - np.sqrt((my_r - 1.0) ** 2 + (my_alpha - 1.0) ** 2 + (my_beta - 1.0) ** 2)
+
+
+OBJECTIVES = {
+    'NSE': Objective(nse, bounded=True),
+    'logNSE': Objective(log_nse, transform=get_log_flow, bounded=True),
+    'KGE': Objective(kge)
+}
+
+
+def read_gauge_flow(file_path, shift_in_minutes=0):
+    """
+    This function reads the flow observed at a gauge in a CSV file (with the columns 'DateTime' and 'flow'), the
+    DateTime being either in the format 'YYYY-MM-DD HH:MM:SS' or 'DD/MM/YYYY HH:MM'. The steps with a missing or a
+    negative flow are left out.
+
+    :param file_path: path of the flow file
+    :type file_path: str
+    :param shift_in_minutes: time added to the DateTime of the file (e.g. to match the save steps of the TimeFrame)
+    :type shift_in_minutes: int
+    :return: dictionary {key: DateTime, value: flow}
+    :rtype: dict
+    """
+    logger = getLogger('TORRENTpy.cl')
+
+    my_shift = timedelta(minutes=shift_in_minutes)
+    my_flows = dict()
+    try:
+        with open_csv_rb(file_path) as my_file:
+            my_reader = csv.DictReader(my_file)
+            if ('DateTime' not in my_reader.fieldnames) or ('flow' not in my_reader.fieldnames):
+                logger.error("The fields DateTime and flow must exist in {}.".format(file_path))
+                raise Exception("The fields DateTime and flow must exist in {}.".format(file_path))
+            for row in my_reader:
+                try:
+                    my_flow = float(row['flow'])
+                except ValueError:
+                    continue
+                if not my_flow >= 0.0:
+                    continue
+                my_flows[_get_datetime(row['DateTime'], file_path) + my_shift] = my_flow
+    except IOError:
+        logger.error("File {} could not be found.".format(file_path))
+        raise Exception("File {} could not be found.".format(file_path))
+
+    return my_flows
+
+
+def _get_datetime(text, file_path):
+    for my_format in ('%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M'):
+        try:
+            return datetime.strptime(text, my_format)
+        except ValueError:
+            pass
+    getLogger('TORRENTpy.cl').error("The DateTime {} in {} is not in a valid format.".format(text, file_path))
+    raise Exception("The DateTime {} in {} is not in a valid format.".format(text, file_path))
+
+
+# state of the calibration in a worker process (the Calibration object it was given when it started)
+_worker = dict()
+
+
+def _initialise_worker(calibration):
+    # the progress of each candidate is not reported by the workers
+    logging.getLogger('TORRENTpy').setLevel(logging.WARNING)
+    _worker['calibration'] = calibration
+
+
+def _evaluate_in_worker(args):
+    my_values, my_threshold = args
+
+    return _worker['calibration'].evaluate(my_values, my_threshold)
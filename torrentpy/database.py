@@ -21,6 +21,7 @@
 from logging import getLogger
 from datetime import timedelta
 from glob import glob
+import numpy as np
 
 from .inout import read_csv_timeseries_with_data_checks, \
     read_netcdf_timeseries_with_data_checks
@@ -32,7 +33,7 @@ from .timeframe import get_required_resolution, \
 class DataBase(object):
     def __init__(self, network, timeframe, knowledgebase, in_format,
                  meteo_cumulative=list(), meteo_average=list(),
-                 contamination_cumulative=list(), contamination_average=list()):
+                 contamination_cumulative=list(), contamination_average=list(), inputs=None, members=None):
         self._nw = network
         self._tf = timeframe
         self._kb = knowledgebase
@@ -46,11 +47,38 @@ class DataBase(object):
         self.contamination_average = contamination_average
         # for simulation
         self.simulation = None
+        # for an ensemble of inputs (e.g. meteorological forecasts), names of the members, and inputs of each member
+        # {key: member, value: (meteo, contamination)}, the inputs of the current member being 'meteo' and
+        # 'contamination'
+        self.members = list(members) if members else None
+        self.ensemble = None
+
+        # set the input database as required (unless the inputs were already read for the same Network and TimeFrame,
+        # e.g. kept by a Batch worker, given as a tuple (meteo, contamination))
+        if inputs:
+            self.meteo, self.contamination = inputs
+        else:
+            self._set_db_for_meteo_links(in_format)
+            if network.water_quality:
+                self._set_db_for_contamination_links(in_format)
+            if self.members:
+                self.ensemble = {member: (self.meteo[member],
+                                          self.contamination[member] if self.contamination else None)
+                                 for member in self.members}
+                self.set_member(self.members[0])
+
+    def set_member(self, member):
+        """
+        This method makes the inputs of the given member of the ensemble the inputs used by the Models.
 
-        # set the input database as required
-        self._set_db_for_meteo_links(in_format)
-        if network.water_quality:
-            self._set_db_for_contamination_links(in_format)
+        :param member: name of the member
+        :type member: str
+        """
+        logger = getLogger('TORRENTpy.db')
+        if not self.ensemble or member not in self.ensemble:
+            logger.error("The member {} is not part of the ensemble of the DataBase.".format(member))
+            raise Exception("The member {} is not part of the ensemble of the DataBase.".format(member))
+        self.meteo, self.contamination = self.ensemble[member]
 
     def _set_db_for_meteo_links(self, in_format):
         """
@@ -66,7 +94,10 @@ class DataBase(object):
         for link in self._nw.links:
             db_meteo[link.name] = get_nd_input_data_from_file(self.meteo_cumulative, self.meteo_average,
                                                               self._tf, self._nw.catchment, link.name,
-                                                              in_format, self._nw.in_fld, 'meteorology')
+                                                              in_format, self._nw.in_fld, 'meteorology',
+                                                              self.members)
+        if self.members:  # key: member, value: {key: waterbody, value: data frame}
+            db_meteo = {member: {link: db_meteo[link][member] for link in db_meteo} for member in self.members}
         self.meteo = db_meteo
 
     def _set_db_for_contamination_links(self, in_format):
@@ -84,7 +115,11 @@ class DataBase(object):
             db_contamination[link.name] = get_nd_input_data_from_file(self.contamination_cumulative,
                                                                       self.contamination_average,
                                                                       self._tf, self._nw.catchment, link.name,
-                                                                      in_format, self._nw.in_fld, 'contamination')
+                                                                      in_format, self._nw.in_fld, 'contamination',
+                                                                      self.members)
+        if self.members:  # key: member, value: {key: waterbody, value: data frame}
+            db_contamination = {member: {link: db_contamination[link][member] for link in db_contamination}
+                                for member in self.members}
 
         self.contamination = db_contamination
 
@@ -118,12 +153,13 @@ class DataBase(object):
         self.simulation = dict__nd_data
 
 
-def get_nd_input_data_from_file(cml, avg, tf, catchment, link, in_file_format, in_folder, data_category):
+def get_nd_input_data_from_file(cml, avg, tf, catchment, link, in_file_format, in_folder, data_category,
+                                members=None):
     logger = getLogger('TORRENTpy.db')
     if in_file_format == 'netcdf':
-        return get_nd_input_data_from_netcdf_file(cml, avg, tf, catchment, link, in_folder, data_category)
+        return get_nd_input_data_from_netcdf_file(cml, avg, tf, catchment, link, in_folder, data_category, members)
     elif in_file_format == 'csv':
-        return get_nd_input_data_from_csv_file(cml, avg, tf, catchment, link, in_folder, data_category)
+        return get_nd_input_data_from_csv_file(cml, avg, tf, catchment, link, in_folder, data_category, members)
     else:
         logger.error("The input format type \'{}\' cannot be read by TORRENTpy, "
                      "choose from: \'csv\', \'netcdf\'.".format(in_file_format))
@@ -131,7 +167,7 @@ def get_nd_input_data_from_file(cml, avg, tf, catchment, link, in_file_format, i
                         "choose from: \'csv\', \'netcdf\'.".format(in_file_format))
 
 
-def get_nd_input_data_from_csv_file(cml, avg, tf, catchment, link, in_folder, data_category):
+def get_nd_input_data_from_csv_file(cml, avg, tf, catchment, link, in_folder, data_category, members=None):
     logger = getLogger('TORRENTpy.db')
 
     nd_data_simu = {c: dict() for c in cml + avg}
@@ -163,11 +199,13 @@ def get_nd_input_data_from_csv_file(cml, avg, tf, catchment, link, in_folder, da
             tf.data_needed_start, tf.simu_start,
             timedelta(minutes=tf.data_gap), timedelta(minutes=tf.simu_gap))
 
-        nd_data_simu[data_type] = rescale_time_resolution_of_regular_cumulative_data(
-            my_nd_data_data[data_type],
-            tf.data_needed_start, tf.data_needed_end, timedelta(minutes=tf.data_gap),
-            time_delta_res,
-            tf.simu_start, tf.simu_end, timedelta(minutes=tf.simu_gap))
+        nd_data_simu[data_type] = _get_members_series(
+            my_nd_data_data, data_type, members,
+            lambda my_series: rescale_time_resolution_of_regular_cumulative_data(
+                my_series,
+                tf.data_needed_start, tf.data_needed_end, timedelta(minutes=tf.data_gap),
+                time_delta_res,
+                tf.simu_start, tf.simu_end, timedelta(minutes=tf.simu_gap)))
 
         del my_nd_data_data
 
@@ -198,18 +236,23 @@ def get_nd_input_data_from_csv_file(cml, avg, tf, catchment, link, in_folder, da
             tf.data_needed_start, tf.simu_start,
             timedelta(minutes=tf.data_gap), timedelta(minutes=tf.simu_gap))
 
-        nd_data_simu[data_type] = rescale_time_resolution_of_regular_mean_data(
-            my_nd_data_data[data_type],
-            tf.data_needed_start, tf.data_needed_end, timedelta(minutes=tf.data_gap),
-            time_delta_res,
-            tf.simu_start, tf.simu_end, timedelta(minutes=tf.simu_gap))
+        nd_data_simu[data_type] = _get_members_series(
+            my_nd_data_data, data_type, members,
+            lambda my_series: rescale_time_resolution_of_regular_mean_data(
+                my_series,
+                tf.data_needed_start, tf.data_needed_end, timedelta(minutes=tf.data_gap),
+                time_delta_res,
+                tf.simu_start, tf.simu_end, timedelta(minutes=tf.simu_gap)))
 
         del my_nd_data_data
 
+    if members:
+        return {member: {data_type: nd_data_simu[data_type][member] for data_type in nd_data_simu}
+                for member in members}
     return nd_data_simu
 
 
-def get_nd_input_data_from_netcdf_file(cml, avg, tf, catchment, link, in_folder, data_category):
+def get_nd_input_data_from_netcdf_file(cml, avg, tf, catchment, link, in_folder, data_category, members=None):
     logger = getLogger('TORRENTpy.db')
 
     nd_data_simu = {c: dict() for c in cml + avg}
@@ -243,11 +286,13 @@ def get_nd_input_data_from_netcdf_file(cml, avg, tf, catchment, link, in_folder,
             tf.data_needed_start, tf.simu_start,
             timedelta(minutes=tf.data_gap), timedelta(minutes=tf.simu_gap))
 
-        nd_data_simu[data_type] = rescale_time_resolution_of_regular_cumulative_data(
-            my_nd_data_data[data_type],
-            tf.data_needed_start, tf.data_needed_end, timedelta(minutes=tf.data_gap),
-            time_delta_res,
-            tf.simu_start, tf.simu_end, timedelta(minutes=tf.simu_gap))
+        nd_data_simu[data_type] = _get_members_series(
+            my_nd_data_data, data_type, members,
+            lambda my_series: rescale_time_resolution_of_regular_cumulative_data(
+                my_series,
+                tf.data_needed_start, tf.data_needed_end, timedelta(minutes=tf.data_gap),
+                time_delta_res,
+                tf.simu_start, tf.simu_end, timedelta(minutes=tf.simu_gap)))
 
         del my_nd_data_data
 
@@ -272,12 +317,162 @@ def get_nd_input_data_from_netcdf_file(cml, avg, tf, catchment, link, in_folder,
             tf.data_needed_start, tf.simu_start,
             timedelta(minutes=tf.data_gap), timedelta(minutes=tf.simu_gap))
 
-        nd_data_simu[data_type] = rescale_time_resolution_of_regular_mean_data(
-            my_nd_data_data[data_type],
-            tf.data_needed_start, tf.data_needed_end, timedelta(minutes=tf.data_gap),
-            time_delta_res,
-            tf.simu_start, tf.simu_end, timedelta(minutes=tf.simu_gap))
+        nd_data_simu[data_type] = _get_members_series(
+            my_nd_data_data, data_type, members,
+            lambda my_series: rescale_time_resolution_of_regular_mean_data(
+                my_series,
+                tf.data_needed_start, tf.data_needed_end, timedelta(minutes=tf.data_gap),
+                time_delta_res,
+                tf.simu_start, tf.simu_end, timedelta(minutes=tf.simu_gap)))
 
         del my_nd_data_data
 
+    if members:
+        return {member: {data_type: nd_data_simu[data_type][member] for data_type in nd_data_simu}
+                for member in members}
     return nd_data_simu
+
+
+def _get_members_series(data, data_type, members, rescale):
+    """
+    This function rescales the series of a data type read in an input file. If members of an ensemble are given, it
+    returns a dictionary {key: member, value: series} where the series of a member is read in the column
+    '<data type>:<member>' of the file, or in the column '<data type>' (shared by all the members) if the file
+    does not have a column for the member.
+    """
+    logger = getLogger('TORRENTpy.db')
+
+    if not members:
+        return rescale(data[data_type])
+
+    my_series = dict()
+    my_shared = None
+    for member in members:
+        my_column = '{}:{}'.format(data_type, member)
+        if my_column in data:
+            my_series[member] = rescale(data[my_column])
+        elif data_type in data:
+            if my_shared is None:
+                my_shared = rescale(data[data_type])
+            my_series[member] = my_shared
+        else:
+            logger.error("The data type {} is not available for the member {}.".format(data_type, member))
+            raise Exception("The data type {} is not available for the member {}.".format(data_type, member))
+
+    return my_series
+
+
+class InputSeries(object):
+    """
+    This class gives access to the values of one input series (i.e. one data type for one Link) stored as a row
+    of an array (e.g. memory-mapped from a file shared by several processes), in the same way as a dictionary
+    {key: DateTime, value: value} would, the values being returned as Python floats. The mapping of the DateTime to
+    their position in the row is shared by all the series.
+    """
+    __slots__ = ('_index', '_values')
+
+    def __init__(self, index, values):
+        # mapping of the DateTime to their position in the row {key: DateTime, value: position}
+        self._index = index
+        # one-dimensional array of the values
+        self._values = values
+
+    def __getitem__(self, dt):
+        return self._values.item(self._index[dt])
+
+    def __contains__(self, dt):
+        return dt in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, dt, default=None):
+        my_position = self._index.get(dt)
+        return default if my_position is None else self._values.item(my_position)
+
+    def keys(self):
+        return list(self._index)
+
+    def items(self):
+        return [(dt, self._values.item(my_position)) for dt, my_position in self._index.items()]
+
+
+def save_shared_inputs(meteo, contamination, file_path):
+    """
+    This function writes the input data read for the Links of a Network (as stored in the attributes 'meteo' and
+    'contamination' of a DataBase) in one array in a binary file, so that they can be memory-mapped by several
+    processes (see function 'load_shared_inputs'). All the series must be for the same DateTime.
+
+    :param meteo: nested dictionaries {key: link, value: {key: data type, value: {key: DateTime, value: value}}}
+    :type meteo: dict
+    :param contamination: nested dictionaries (same structure as meteo, or None if there is no contamination data)
+    :type contamination: dict
+    :param file_path: location where to save the binary file (.npy)
+    :type file_path: str
+    :return: layout of the data {key: 'meteo'/'contamination', value: {key: link, value: list of data types} or
+        None}, the series being stored as rows of the array in this order, and the list of the DateTime in the order
+        of the columns of the array
+    :rtype: tuple
+    """
+    logger = getLogger('TORRENTpy.db')
+    my_layout = dict()
+    my_rows = list()
+    my_datetimes = None
+    for category, my_inputs in [('meteo', meteo), ('contamination', contamination)]:
+        if my_inputs is None:
+            my_layout[category] = None
+            continue
+        my_layout[category] = dict()
+        for link in sorted(my_inputs):
+            my_layout[category][link] = sorted(my_inputs[link])
+            for data_type in my_layout[category][link]:
+                if my_datetimes is None:
+                    my_datetimes = sorted(my_inputs[link][data_type])
+                elif len(my_inputs[link][data_type]) != len(my_datetimes):
+                    logger.error("The input series {} for {} does not cover the same period.".format(data_type, link))
+                    raise Exception("The input series {} for {} does not cover the same period.".format(
+                        data_type, link))
+                my_rows.append(my_inputs[link][data_type])
+
+    my_datetimes = my_datetimes if my_datetimes else []
+    my_array = np.empty((len(my_rows), len(my_datetimes)), dtype=np.float64)
+    for i, my_dict in enumerate(my_rows):
+        my_array[i, :] = [my_dict[dt] for dt in my_datetimes]
+    np.save(file_path, my_array)
+
+    return my_layout, my_datetimes
+
+
+def load_shared_inputs(file_path, layout, datetimes):
+    """
+    This function memory-maps (read-only) the input data written by function 'save_shared_inputs', and returns them
+    in the structure of the attributes 'meteo' and 'contamination' of a DataBase, each series being an InputSeries.
+
+    :param file_path: location of the binary file (.npy)
+    :type file_path: str
+    :param layout: layout of the data as returned by function 'save_shared_inputs'
+    :type layout: dict
+    :param datetimes: list of the DateTime in the order of the columns of the array
+    :type datetimes: list
+    :return: meteo and contamination nested dictionaries (contamination is None if there is no contamination data)
+    :rtype: tuple
+    """
+    my_array = np.load(file_path, mmap_mode='r')
+    my_index = {dt: i for i, dt in enumerate(datetimes)}
+    my_inputs = dict()
+    my_row = 0
+    for category in ['meteo', 'contamination']:
+        if layout[category] is None:
+            my_inputs[category] = None
+            continue
+        my_inputs[category] = dict()
+        for link in sorted(layout[category]):
+            my_inputs[category][link] = dict()
+            for data_type in layout[category][link]:
+                my_inputs[category][link][data_type] = InputSeries(my_index, my_array[my_row])
+                my_row += 1
+
+    return my_inputs['meteo'], my_inputs['contamination']
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from logging import getLogger
+from io import open
+import json
+
+
+class Diagnostics(object):
+    """
+    This class counts the events reported by the Models during the simulation (e.g. a store going negative and being
+    reset to zero) for each Link, each type of event, and each simulation slice. Recording an event only increments a
+    counter (no message is formatted), the counts are summarised and logged at the end of each slice. Optionally, the
+    DateTime of the first occurrences of each event for each Link can be kept (up to a given number).
+
+    An event is identified by a message (a constant string), or by a tuple whose first element is the message and the
+    other elements are details (e.g. the contaminant and the store concerned).
+    """
+    def __init__(self, samples=0):
+        # maximum number of DateTime kept for each event and each Link (0 not to keep any)
+        self.samples = samples
+        # list of the counts for each slice (in the order they were run)
+        # [{'stage': stage, 'start': DateTime, 'end': DateTime, 'counts': {key: (link, event), value: count}}]
+        self.slices = list()
+        # counts for the slice currently running {key: (link, event), value: count}
+        self.current = dict()
+        # DateTime of the first occurrences {key: (link, event), value: list of DateTime}
+        self.timestamps = dict()
+
+    def clear(self, samples=0):
+        """
+        This method discards all the counts and timestamps recorded so far.
+
+        :param samples: maximum number of DateTime to keep for each event and each Link
+        :type samples: int
+        """
+        self.samples = samples
+        self.slices = list()
+        self.current = dict()
+        self.timestamps = dict()
+
+    def record(self, waterbody, event, step):
+        """
+        This method records one occurrence of the given event for the given Link and time step.
+
+        :param waterbody: name of the Link
+        :type waterbody: str
+        :param event: message, or tuple (message, details...), identifying the event
+        :type event: str or tuple
+        :param step: DateTime of the time step
+        :type step: datetime.datetime
+        """
+        my_key = (waterbody, event)
+        try:
+            self.current[my_key] += 1
+        except KeyError:
+            self.current[my_key] = 1
+        if self.samples:
+            my_timestamps = self.timestamps.setdefault(my_key, list())
+            if len(my_timestamps) < self.samples:
+                my_timestamps.append(step)
+
+    def start_slice(self, stage, simu_slice):
+        """
+        This method starts the counts for a new simulation slice.
+
+        :param stage: stage of the simulation the slice belongs to ('warm-up' or 'simulation')
+        :type stage: str
+        :param simu_slice: list of DateTime to be simulated
+        :type simu_slice: list
+        """
+        self.current = dict()
+        self.slices.append({'stage': stage, 'start': simu_slice[1], 'end': simu_slice[-1], 'counts': self.current})
+
+    def end_slice(self):
+        """
+        This method closes the counts for the slice currently running, and logs their summary per type of event.
+        """
+        logger = getLogger('TORRENTpy.dg')
+        my_summary = self._get_summary(self.current)
+        for my_event in sorted(my_summary):
+            logger.info("> Diagnostics: '{}' occurred {} times for {} link(s).".format(
+                my_event, my_summary[my_event]['count'], len(my_summary[my_event]['links'])))
+        self.current = dict()
+
+    def get_counts(self):
+        """
+        This method gathers the counts of all the slices for each Link and each event.
+
+        :return: dictionary {key: (link, event description), value: count}
+        :rtype: dict
+        """
+        my_counts = dict()
+        for my_slice in self.slices:
+            for (my_link, my_event), my_count in my_slice['counts'].items():
+                my_key = (my_link, get_description(my_event))
+                my_counts[my_key] = my_counts.get(my_key, 0) + my_count
+
+        return my_counts
+
+    def get_report(self):
+        """
+        This method gathers the counts for each slice, and the timestamps kept, in a dictionary.
+
+        :return: dictionary with the counts per event for each slice, and the timestamps per Link and event
+            {'slices': [{'stage': stage, 'start': DateTime, 'end': DateTime,
+                         'events': {key: event, value: {'count': count, 'links': {key: link, value: count}}}}],
+             'timestamps': {key: event, value: {key: link, value: list of DateTime}}}
+        :rtype: dict
+        """
+        my_slices = list()
+        for my_slice in self.slices:
+            my_events = dict()
+            for (my_link, my_event), my_count in my_slice['counts'].items():
+                my_dict = my_events.setdefault(get_description(my_event), {'count': 0, 'links': dict()})
+                my_dict['count'] += my_count
+                my_dict['links'][my_link] = my_count
+            my_slices.append({'stage': my_slice['stage'], 'start': my_slice['start'].isoformat(),
+                              'end': my_slice['end'].isoformat(), 'events': my_events})
+
+        my_timestamps = dict()
+        for (my_link, my_event), my_steps in self.timestamps.items():
+            my_timestamps.setdefault(get_description(my_event), dict())[my_link] = \
+                [my_step.isoformat() for my_step in my_steps]
+
+        return {'slices': my_slices, 'timestamps': my_timestamps}
+
+    def save_report(self, file_path):
+        """
+        This method writes the report in a JSON file.
+
+        :param file_path: location where to save the JSON file
+        :type file_path: str
+        """
+        with open(file_path, 'w', encoding='utf-8') as my_file:
+            my_file.write(u'{}'.format(json.dumps(self.get_report(), indent=2, sort_keys=True)))
+
+    @staticmethod
+    def _get_summary(counts):
+        my_summary = dict()
+        for (my_link, my_event), my_count in counts.items():
+            my_dict = my_summary.setdefault(get_description(my_event), {'count': 0, 'links': set()})
+            my_dict['count'] += my_count
+            my_dict['links'].add(my_link)
+
+        return my_summary
+
+
+def get_description(event):
+    """
+    This function returns the description of an event recorded by a Diagnostics object as a string.
+
+    :param event: message, or tuple (message, details...), identifying the event
+    :type event: str or tuple
+    :return: description of the event (e.g. 'INCAL # Quantity has gone negative, reset to zero [NO3, OVE]')
+    :rtype: str
+    """
+    if isinstance(event, tuple):
+        return '{} [{}]'.format(event[0], ', '.join([str(detail).upper() for detail in event[1:]]))
+    return event
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from logging import getLogger
+from datetime import timedelta
+import csv
+import numpy as np
+
+from .inout import open_csv_wb, open_csv_ab
+from .states import load_snapshot
+
+
+class EnsembleForecast(object):
+    """
+    This class runs a forecast for an ensemble of inputs (e.g. meteorological forecasts), all the members starting
+    from the same states (e.g. the snapshot taken at the end of a simulation up to the time of the forecast, see the
+    argument 'out_states' of the method 'simulate' of the Network). The Network, the TimeFrame, and the DataBase
+    holding the inputs of all the members are set up once, and the members are advanced together slice by slice:
+    only the states of each member at the end of the last slice are kept, and the values of the members at the
+    requested Nodes are reduced to percentiles and exceedance probabilities for each slice (rather than written in
+    files for each member).
+    """
+    def __init__(self, nw, tf, db, states, nodes, variables=None, percentiles=(5, 25, 50, 75, 95), thresholds=None):
+        """
+        :param nw: Network object whose Links were assigned Models
+        :type nw: Network
+        :param tf: TimeFrame object for the forecast period (without warm-up period)
+        :type tf: TimeFrame
+        :param db: DataBase object containing the input data of the members of the ensemble (see argument 'members')
+        :type db: DataBase
+        :param states: path to the snapshot of the states to start from (see function 'save_snapshot'), or dictionary
+            of the states for each link and node {key: link/node, value: {key: variable, value: value}}
+        :type states: str or dict
+        :param nodes: names of the Nodes to forecast
+        :type nodes: list
+        :param variables: names of the variables to forecast for the Nodes (optional, all the variables if not given)
+        :type variables: list
+        :param percentiles: percentiles of the members to compute at each save step (between 0 and 100)
+        :type percentiles: sequence
+        :param thresholds: thresholds whose probabilities of exceedance to compute at each save step (optional)
+            {key: node, value: {key: variable, value: list of thresholds}}
+        :type thresholds: dict
+        """
+        logger = getLogger('TORRENTpy.fc')
+
+        if not nw.links_have_models:
+            logger.error("The Links of the Network must be assigned Models before the forecast.")
+            raise Exception("The Links of the Network must be assigned Models before the forecast.")
+        if not db.members:
+            logger.error("The DataBase must contain the inputs of the members of an ensemble for the forecast.")
+            raise Exception("The DataBase must contain the inputs of the members of an ensemble for the forecast.")
+        if tf.warm_up:
+            logger.error("The TimeFrame of the forecast cannot have a warm-up period, the forecast starts from the "
+                         "states given.")
+            raise Exception("The TimeFrame of the forecast cannot have a warm-up period, the forecast starts from the "
+                            "states given.")
+
+        self.nw = nw
+        self.tf = tf
+        self.db = db
+
+        # states of the Network at the start of the forecast (i.e. for the step before the first simulation step)
+        if isinstance(states, dict):
+            self.states = states
+        else:
+            my_step, self.states = load_snapshot(states)
+            if not my_step == tf.simu_slices[0][0]:
+                logger.error("The snapshot of states is for {}, the forecast starts from {}.".format(
+                    my_step.strftime('%d/%m/%Y %H:%M:%S'), tf.simu_slices[0][0].strftime('%d/%m/%Y %H:%M:%S')))
+                raise Exception("The snapshot of states is for {}, the forecast starts from {}.".format(
+                    my_step.strftime('%d/%m/%Y %H:%M:%S'), tf.simu_slices[0][0].strftime('%d/%m/%Y %H:%M:%S')))
+        for name in [link.name for link in nw.links] + [node.name for node in nw.nodes]:
+            if name not in self.states:
+                logger.error("The states of {} are missing to start the forecast.".format(name))
+                raise Exception("The states of {} are missing to start the forecast.".format(name))
+
+        # Nodes and variables to forecast
+        self.nodes = list(nodes)
+        self.variables = list(variables) if variables else list(nw.variables)
+        for name in self.nodes:
+            if name not in nw.nodes_mapping:
+                logger.error("The Node {} does not exist in the Network.".format(name))
+                raise Exception("The Node {} does not exist in the Network.".format(name))
+        for variable in self.variables:
+            if variable not in nw.variables:
+                logger.error("The variable {} is not simulated for the Nodes.".format(variable))
+                raise Exception("The variable {} is not simulated for the Nodes.".format(variable))
+        # statistics of the members to compute
+        self.percentiles = [float(percentile) for percentile in percentiles]
+        self.thresholds = thresholds if thresholds else dict()
+        for name in self.thresholds:
+            for variable in self.thresholds[name]:
+                if name not in self.nodes or variable not in self.variables:
+                    logger.error("The thresholds for {} at the Node {} are not for a variable forecast.".format(
+                        variable, name))
+                    raise Exception("The thresholds for {} at the Node {} are not for a variable forecast.".format(
+                        variable, name))
+
+    def run(self, out_format=None):
+        """
+        This method runs the forecast for all the members of the ensemble, slice by slice, and reduces the values of
+        the members at the requested Nodes to percentiles and exceedance probabilities for each save step (as with
+        the 'summary' method for the output files, i.e. the values are averaged across the simulation time steps
+        included in each save step).
+
+        :param out_format: format of the output files to write the statistics in as the forecast goes ('csv'), or
+            None to keep them in memory only
+        :type out_format: str
+        :return: statistics of the members at the requested Nodes
+        :rtype: EnsembleResults
+        """
+        logger = getLogger('TORRENTpy.fc')
+
+        nw, tf, db = self.nw, self.tf, self.db
+
+        if out_format:
+            if not out_format == 'csv':
+                logger.error("The output format type \'{}\' cannot be written by TORRENTpy for a forecast, "
+                             "choose from: \'csv\'.".format(out_format))
+                raise Exception("The output format type \'{}\' cannot be written by TORRENTpy for a forecast, "
+                                "choose from: \'csv\'.".format(out_format))
+            if nw.out_fld is None:
+                logger.error("The Network has no output folder to write the output files in.")
+                raise Exception("The Network has no output folder to write the output files in.")
+
+        nw.instrumentation = None
+        nw.profiler = None
+        nw.diagnostics.clear()
+
+        my_results = EnsembleResults(tf, self.nodes, self.variables, self.percentiles, self.thresholds)
+        if out_format:
+            my_results.create_files(nw)
+
+        # all the members start from the same states
+        my_last_lines = {member: {name: dict(self.states[name]) for name in self.states} for member in db.members}
+        # offsets of the simulation time steps included in a save step (ending with the save step itself)
+        my_offsets = [timedelta(minutes=my_sub_step * tf.simu_gap)
+                      for my_sub_step in range(0, -(tf.save_gap // tf.simu_gap), -1)]
+
+        logger.info("Starting the forecast for {} members.".format(len(db.members)))
+        for my_simu_slice, my_save_slice in zip(tf.simu_slices, tf.save_slices):
+            logger.info("Running Period {} - {}.".format(my_simu_slice[1].strftime('%d/%m/%Y %H:%M:%S'),
+                                                         my_simu_slice[-1].strftime('%d/%m/%Y %H:%M:%S')))
+            # values of the members at the save steps of the slice {key: node, value: {key: variable, value: array}}
+            my_values = {name: {variable: np.zeros((len(db.members), len(my_save_slice) - 1), dtype=np.float64)
+                                for variable in self.variables}
+                         for name in self.nodes}
+
+            for m, member in enumerate(db.members):
+                db.set_member(member)
+                nw.diagnostics.start_slice('forecast', my_simu_slice)
+                db.set_db_for_links_and_nodes(my_simu_slice)
+
+                # Get the states of the member at the end of the previous slice
+                for link in nw.links:
+                    db.simulation[link.name][my_simu_slice[0]].update(my_last_lines[member][link.name])
+                for node in nw.nodes:
+                    db.simulation[node.name][my_simu_slice[0]].update(my_last_lines[member][node.name])
+
+                # Simulate
+                nw._run(db, tf, my_simu_slice)
+
+                # Keep the values of the member at the requested Nodes
+                for j, step in enumerate(my_save_slice[1:]):
+                    for name in self.nodes:
+                        my_frames = [db.simulation[name][step + my_offset] for my_offset in my_offsets]
+                        for variable in self.variables:
+                            my_values[name][variable][m, j] = \
+                                sum(my_frame[variable] for my_frame in my_frames) / len(my_frames)
+
+                # Save the states of the member (last time step) for the next slice
+                for link in nw.links:
+                    my_last_lines[member][link.name].update(db.simulation[link.name][my_simu_slice[-1]])
+                for node in nw.nodes:
+                    my_last_lines[member][node.name].update(db.simulation[node.name][my_simu_slice[-1]])
+
+                # "Garbage collection"
+                db.simulation = None
+                nw.diagnostics.end_slice()
+
+            my_results.update(my_save_slice, my_values)
+            if out_format:
+                my_results.update_files(nw, my_save_slice)
+
+        logger.warning("Ending TORRENTpy forecast for {} at {}.".format(nw.catchment, nw.outlet))
+
+        return my_results
+
+
+class EnsembleResults(object):
+    """
+    This class holds the statistics of the members of an ensemble forecast at the requested Nodes, as arrays for
+    the save steps of the TimeFrame, i.e. the percentiles of the members and the probabilities of exceedance of the
+    thresholds (the proportion of the members strictly above each threshold).
+    """
+    def __init__(self, tf, nodes, variables, percentiles, thresholds):
+        # list of the DateTime of the save steps (i.e. the index of the arrays)
+        self.datetimes = tf.save_series[1:]
+        # mapping of the position of each save step in the arrays
+        self.positions = {step: i for i, step in enumerate(self.datetimes)}
+        self.percentiles = list(percentiles)
+        # arrays of the percentiles {key: node, value: {key: variable, value: array (percentile, save step)}}
+        self.nodes = {name: {variable: np.zeros((len(self.percentiles), len(self.datetimes)), dtype=np.float64)
+                             for variable in variables}
+                      for name in nodes}
+        # arrays of the probabilities of exceedance
+        # {key: node, value: {key: variable, value: {key: threshold, value: array}}}
+        self.exceedances = {name: {variable: {threshold: np.zeros(len(self.datetimes), dtype=np.float64)
+                                              for threshold in thresholds[name][variable]}
+                                   for variable in thresholds[name]}
+                            for name in thresholds}
+
+    def update(self, timeslice, values):
+        """
+        This method reduces the values of the members for the save steps of a slice to their statistics.
+
+        :param timeslice: list of DateTime to be saved (the first one being the last one of the previous slice)
+        :type timeslice: list
+        :param values: values of the members {key: node, value: {key: variable, value: array (member, save step)}}
+        :type values: dict
+        """
+        my_positions = [self.positions[step] for step in timeslice[1:]]
+        for name, my_arrays in self.nodes.items():
+            for variable, my_array in my_arrays.items():
+                my_array[:, my_positions] = np.percentile(values[name][variable], self.percentiles, axis=0)
+        for name, my_variables in self.exceedances.items():
+            for variable, my_thresholds in my_variables.items():
+                for threshold, my_array in my_thresholds.items():
+                    my_array[my_positions] = np.mean(values[name][variable] > threshold, axis=0)
+
+    def get_percentile(self, node, variable, percentile):
+        """
+        This method returns the series of a percentile of the members for a variable at a Node.
+
+        :return: array of the values for each save step (see attribute 'datetimes')
+        :rtype: numpy.ndarray
+        """
+        return self.nodes[node][variable][self.percentiles.index(float(percentile))]
+
+    def get_exceedance(self, node, variable, threshold):
+        """
+        This method returns the series of the probability of exceedance of a threshold for a variable at a Node.
+
+        :return: array of the probabilities for each save step (see attribute 'datetimes')
+        :rtype: numpy.ndarray
+        """
+        return self.exceedances[node][variable][threshold]
+
+    def _get_headers(self, name):
+        my_headers = list()
+        for variable in sorted(self.nodes[name]):
+            my_headers += ['{}:p{:g}'.format(variable, percentile) for percentile in self.percentiles]
+            my_headers += ['{}:>{:g}'.format(variable, threshold)
+                           for threshold in sorted(self.exceedances.get(name, dict()).get(variable, dict()))]
+        return my_headers
+
+    def create_files(self, nw):
+        """
+        This method creates a CSV file of statistics for each requested Node in the output folder of the Network.
+        """
+        for name in self.nodes:
+            with open_csv_wb('{}{}_{}.forecast'.format(nw.out_fld, nw.catchment, name)) as my_file:
+                my_writer = csv.writer(my_file, delimiter=',')
+                my_writer.writerow(['DateTime'] + self._get_headers(name))
+
+    def update_files(self, nw, timeslice):
+        """
+        This method appends the statistics for the save steps of a slice to the CSV files of the requested Nodes.
+        """
+        for name in self.nodes:
+            my_variables = sorted(self.nodes[name])
+            with open_csv_ab('{}{}_{}.forecast'.format(nw.out_fld, nw.catchment, name)) as my_file:
+                my_writer = csv.writer(my_file, delimiter=',')
+                for step in timeslice[1:]:
+                    i = self.positions[step]
+                    my_row = [step.strftime('%Y-%m-%d %H:%M:%S')]
+                    for variable in my_variables:
+                        my_row += ['%e' % value for value in self.nodes[name][variable][:, i]]
+                        my_thresholds = self.exceedances.get(name, dict()).get(variable, dict())
+                        my_row += ['%f' % my_thresholds[threshold][i] for threshold in sorted(my_thresholds)]
+                    my_writer.writerow(my_row)
@@ -115,6 +115,11 @@ def read_netcdf_timeseries_with_data_checks(netcdf_file, tf, data_check=True):
             except KeyError:
                 logger.error("Field {} does not exist in {}.".format('DateTime', netcdf_file))
                 raise Exception("Field {} does not exist in {}.".format('DateTime', netcdf_file))
+            # names of the members for the variables with a member dimension (e.g. an ensemble of forecasts)
+            my_members = None
+            if 'Member' in fields:
+                fields.remove('Member')
+                my_members = [str(member) for member in my_file.variables['Member'][:]]
 
             for field in fields:
                 if not len(my_file.variables['DateTime']) == len(my_file.variables[field]):
@@ -124,13 +129,21 @@ def read_netcdf_timeseries_with_data_checks(netcdf_file, tf, data_check=True):
                         "Fields {} and {} do not have the same length in {}.".format(field, 'DateTime', netcdf_file))
 
             list_dt = [datetime(1970, 1, 1) + timedelta(seconds=tstamp) for tstamp in my_file.variables['DateTime'][:]]
-            list_vals = {field: my_file.variables[field][:] for field in fields}
-
+            list_vals = dict()
             for field in fields:
+                my_vals = my_file.variables[field][:]
+                if my_vals.ndim == 2:
+                    # a variable with a member dimension is read as one field '<variable>:<member>' per member
+                    for i, member in enumerate(my_members or [str(j) for j in range(my_vals.shape[1])]):
+                        list_vals['{}:{}'.format(field, member)] = my_vals[:, i]
+                else:
+                    list_vals[field] = my_vals
+
+            for field in list_vals:
                 my_nd_variables[str(field)] = dict()
 
             for idx, dt in enumerate(list_dt):
-                for field in fields:
+                for field in list_vals:
                     my_nd_variables[str(field)][dt] = float(list_vals[field][idx])
 
             if data_check:
@@ -151,11 +164,34 @@ def read_netcdf_timeseries_with_data_checks(netcdf_file, tf, data_check=True):
         raise Exception("File {} could not be found.".format(netcdf_file))
 
 
-def create_simulation_files(network, out_file_format):
+def get_precision_dtype(precision):
+    """
+    This function returns the numpy data type corresponding to the floating point precision requested for the
+    output files. The simulation itself is always run in double precision, the precision only applies to what
+    is stored in the output files.
+
+    :param precision: floating point precision ('float64' or 'float32')
+    :type precision: str
+    :return: numpy data type
+    """
+    logger = getLogger('TORRENTpy.io')
+    if precision == 'float64':
+        return np.float64
+    elif precision == 'float32':
+        return np.float32
+    else:
+        logger.error("The output precision \'{}\' is not supported by TORRENTpy, "
+                     "choose from: \'float64\', \'float32\'.".format(precision))
+        raise Exception("The output precision \'{}\' is not supported by TORRENTpy, "
+                        "choose from: \'float64\', \'float32\'.".format(precision))
+
+
+def create_simulation_files(network, out_file_format, precision='float64'):
     logger = getLogger('TORRENTpy.io')
+    my_dtype = get_precision_dtype(precision)
     if out_file_format == 'netcdf':
         if Dataset:
-            create_simulation_files_netcdf(network)
+            create_simulation_files_netcdf(network, my_dtype)
         else:
             logger.error("The use of 'netcdf' as the output file format requires the package 'netCDF4', "
                          "please install it and retry, or choose another file format.")
@@ -210,13 +246,17 @@ def create_simulation_files_csv(network):
             my_writer.writerow(['DateTime'] + network.variables)
 
 
-def create_simulation_files_netcdf(network):
+def create_simulation_files_netcdf(network, dtype=np.float64):
     """
     This function creates a NetCDF4 file for each node and for each link and it adds the relevant headers for the
     inputs, the states, and the outputs.
 
+    N.B. The 'DateTime' variable is always stored in double precision because single precision cannot represent
+    the number of seconds since 1970 to the second.
+
     :param network: Network object for the simulated catchment
     :type network: Network
+    :param dtype: numpy data type used to store the inputs, states, outputs, and nodes variables
     """
     logger = getLogger('TORRENTpy.io')
     logger.info("Creating files for results.")
@@ -236,21 +276,21 @@ def create_simulation_files_netcdf(network):
             t = my_file.createVariable("DateTime", np.float64, ('DateTime',), zlib=True)
             t.units = 'seconds since 1970-01-01 00:00:00.0'
             for my_input in my_inputs:
-                my_file.createVariable(my_input, np.float64, ('DateTime',), zlib=True, complevel=1)
+                my_file.createVariable(my_input, dtype, ('DateTime',), zlib=True, complevel=1)
 
         with Dataset('{}{}_{}.states.nc'.format(network.out_fld, network.catchment, link.name), 'w') as my_file:
             my_file.createDimension('DateTime', None)
             t = my_file.createVariable('DateTime', np.float64, ('DateTime',), zlib=True)
             t.units = 'seconds since 1970-01-01 00:00:00.0'
             for my_state in my_states:
-                my_file.createVariable(my_state, np.float64, ('DateTime',), zlib=True, complevel=1)
+                my_file.createVariable(my_state, dtype, ('DateTime',), zlib=True, complevel=1)
 
         with Dataset('{}{}_{}.outputs.nc'.format(network.out_fld, network.catchment, link.name), 'w') as my_file:
             my_file.createDimension('DateTime', None)
             t = my_file.createVariable('DateTime', np.float64, ('DateTime',), zlib=True)
             t.units = 'seconds since 1970-01-01 00:00:00.0'
             for my_output in my_outputs:
-                my_file.createVariable(my_output, np.float64, ('DateTime',), zlib=True, complevel=1)
+                my_file.createVariable(my_output, dtype, ('DateTime',), zlib=True, complevel=1)
 
     # Create the NetCDF4 files with headers for the nodes
     for node in network.nodes:
@@ -259,7 +299,7 @@ def create_simulation_files_netcdf(network):
             t = my_file.createVariable('DateTime', np.float64, ("DateTime",), zlib=True)
             t.units = 'seconds since 1970-01-01 00:00:00.0'
             for my_variable in network.variables:
-                my_file.createVariable(my_variable, np.float64, ('DateTime',), zlib=True, complevel=1)
+                my_file.createVariable(my_variable, dtype, ('DateTime',), zlib=True, complevel=1)
 
 
 def update_simulation_files(network, timeframe, timeslice, database, out_file_format, method='raw'):
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from logging import getLogger
+from datetime import datetime
+from io import open
+from threading import Thread, Event
+from time import time
+import socket
+import json
+import os
+
+
+class JobQueue(object):
+    """
+    This class is a queue of Batch jobs kept in a folder (e.g. on a filesystem shared by several machines), so that
+    any number of workers on any number of hosts can run the jobs of a Batch (see function 'run_queue_worker').
+
+    Each job is a JSON file holding the dictionary of the arguments of the job, which moves from the sub-folder
+    'pending' to 'running' when a worker claims it, and then to 'done' or 'failed' (with the host, the process, and
+    the timings of the run, or the error). A job is claimed by renaming its file, which is atomic, so that a job is
+    never claimed by two workers. A worker renews the lease on the job it runs by touching its file; if a worker
+    crashes, its job is put back in the queue once the lease has not been renewed for longer than the lease timeout
+    (or it fails if it was already attempted the maximum number of times).
+    """
+    states = ['pending', 'running', 'done', 'failed']
+
+    def __init__(self, folder, lease_timeout=600, max_attempts=3):
+        """
+        :param folder: path of the folder of the queue (created if it does not exist)
+        :type folder: str
+        :param lease_timeout: time in seconds after which a job whose lease was not renewed is put back in the queue
+        :type lease_timeout: float
+        :param max_attempts: maximum number of times a job is claimed before it is considered failed
+        :type max_attempts: int
+        """
+        self.folder = folder
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        for state in self.states:
+            if not os.path.isdir(self._get_path(state)):
+                try:
+                    os.makedirs(self._get_path(state))
+                except OSError:  # created by another worker in the meantime
+                    pass
+
+    def _get_path(self, state, name=''):
+        return os.path.join(self.folder, state, name)
+
+    def put(self, jobs):
+        """
+        This method adds jobs to the queue. The jobs are claimed in the order they are given.
+
+        :param jobs: list of the dictionaries of the arguments of the jobs (see Batch._check_all_args)
+        :type jobs: list
+        :return: list of the names of the jobs in the queue
+        :rtype: list
+        """
+        my_start = sum(len(self.get_names(state)) for state in self.states)
+        my_names = list()
+        for i, my_job in enumerate(jobs):
+            my_name = '{:06d}_{}_{}.json'.format(my_start + i, my_job['catchment'], my_job['outlet'])
+            self._write(self._get_path('pending', my_name), {'job': my_job, 'attempts': 0})
+            my_names.append(my_name)
+
+        return my_names
+
+    def claim(self):
+        """
+        This method claims the first pending job of the queue.
+
+        :return: name of the job and its record {'job': dictionary of arguments, 'attempts': number of claims}, or
+            None if there is no pending job
+        :rtype: tuple
+        """
+        for my_name in self.get_names('pending'):
+            try:
+                # the lease starts before the job is moved (the file keeps its time of modification), so that the
+                # other workers never see a job that was just claimed as expired
+                os.utime(self._get_path('pending', my_name), None)
+                os.rename(self._get_path('pending', my_name), self._get_path('running', my_name))
+            except OSError:  # claimed by another worker in the meantime
+                continue
+            my_record = self._read(self._get_path('running', my_name))
+            my_record['attempts'] += 1
+
+            return my_name, my_record
+
+        return None
+
+    def renew(self, name):
+        """
+        This method renews the lease on a running job.
+
+        :return: whether the job was still running under the lease (i.e. it was not put back in the queue)
+        :rtype: bool
+        """
+        try:
+            os.utime(self._get_path('running', name), None)
+            return True
+        except OSError:
+            return False
+
+    def complete(self, name, record):
+        """
+        This method moves a running job to the jobs done, with its record (e.g. the host and the timings).
+        """
+        self._finish('done', name, record)
+
+    def fail(self, name, record):
+        """
+        This method moves a running job to the jobs failed, with its record (e.g. the host and the error).
+        """
+        self._finish('failed', name, record)
+
+    def _finish(self, state, name, record):
+        logger = getLogger('TORRENTpy.qu')
+
+        self._write(self._get_path(state, name), record)
+        try:
+            os.remove(self._get_path('running', name))
+        except OSError:
+            logger.warning("The lease on the job {} had expired before it finished.".format(name))
+            # do not run the job again if it was put back in the queue (but not claimed yet)
+            try:
+                os.remove(self._get_path('pending', name))
+            except OSError:
+                pass
+
+    def requeue_expired(self):
+        """
+        This method puts back in the queue the running jobs whose lease was not renewed for longer than the lease
+        timeout (e.g. because their worker crashed), or it moves them to the jobs failed if they were already claimed
+        the maximum number of times.
+
+        :return: number of jobs whose lease had expired
+        :rtype: int
+        """
+        logger = getLogger('TORRENTpy.qu')
+
+        my_count = 0
+        my_now = time()
+        for my_name in self.get_names('running'):
+            my_path = self._get_path('running', my_name)
+            my_expired = '{}.{}.{}.expired'.format(my_path, socket.gethostname(), os.getpid())
+            try:
+                if my_now - os.path.getmtime(my_path) <= self.lease_timeout:
+                    continue
+                # take the job over before deciding what to do with it (only one worker can do so)
+                os.rename(my_path, my_expired)
+            except OSError:  # finished, renewed, or taken over by another worker in the meantime
+                continue
+            my_record = self._read(my_expired)
+            my_record['attempts'] += 1
+            if my_record['attempts'] >= self.max_attempts:
+                my_record['error'] = "The lease expired after {} attempt(s).".format(my_record['attempts'])
+                self._write(self._get_path('failed', my_name), my_record)
+                logger.warning("The job {} failed, its lease expired {} times.".format(my_name, my_record['attempts']))
+            else:
+                self._write(self._get_path('pending', my_name), my_record)
+                logger.warning("The lease on the job {} expired, it was put back in the queue.".format(my_name))
+            os.remove(my_expired)
+            my_count += 1
+
+        return my_count
+
+    def get_names(self, state):
+        """
+        This method lists the names of the jobs in the given state, in the order they were put in the queue.
+
+        :param state: state of the jobs ('pending', 'running', 'done', or 'failed')
+        :type state: str
+        :rtype: list
+        """
+        return sorted(name for name in os.listdir(self._get_path(state)) if name.endswith('.json'))
+
+    def get_status(self):
+        """
+        This method counts the jobs in each state.
+
+        :return: dictionary {key: state, value: number of jobs}
+        :rtype: dict
+        """
+        return {state: len(self.get_names(state)) for state in self.states}
+
+    def get_records(self, state):
+        """
+        This method reads the records of the jobs in the given state.
+
+        :return: dictionary {key: name of the job, value: record of the job}
+        :rtype: dict
+        """
+        my_records = dict()
+        for my_name in self.get_names(state):
+            try:
+                my_records[my_name] = self._read(self._get_path(state, my_name))
+            except (IOError, OSError):  # moved to another state in the meantime
+                pass
+
+        return my_records
+
+    @staticmethod
+    def _write(file_path, record):
+        # the file is written under a temporary name before being renamed so that it is never read partially written
+        my_tmp_file = '{}.{}.{}.tmp'.format(file_path, socket.gethostname(), os.getpid())
+        with open(my_tmp_file, 'w', encoding='utf-8') as my_content:
+            my_content.write(u'{}'.format(json.dumps(record, sort_keys=True, default=_encode)))
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+        os.rename(my_tmp_file, file_path)
+
+    @staticmethod
+    def _read(file_path):
+        with open(file_path, 'r', encoding='utf-8') as my_content:
+            return json.load(my_content, object_hook=_decode)
+
+
+def _encode(obj):
+    if isinstance(obj, datetime):
+        return {'DateTime': obj.strftime('%d/%m/%Y %H:%M:%S')}
+    raise TypeError("{} is not JSON serialisable.".format(repr(obj)))
+
+
+def _decode(my_dict):
+    if list(my_dict) == ['DateTime']:
+        return datetime.strptime(my_dict['DateTime'], '%d/%m/%Y %H:%M:%S')
+    return my_dict
+
+
+class Lease(Thread):
+    """
+    This class renews the lease on a running job of a JobQueue in the background (three times per lease timeout)
+    until it is stopped.
+    """
+    def __init__(self, queue, job):
+        Thread.__init__(self)
+        self.daemon = True
+        # JobQueue object the job belongs to
+        self.queue = queue
+        # name of the job in the queue
+        self.job = job
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.queue.lease_timeout / 3.0):
+            if not self.queue.renew(self.job):
+                break
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
@@ -24,16 +24,24 @@ from datetime import timedelta
 from calendar import isleap
 import os
 import csv
+import numpy as np
 
 from ..model import Model
 from ...inout import open_csv_wb, open_csv_ab
 
+# events counted by the Diagnostics (with the contaminant, and the store if not the soil, as details)
+_STORE_RESET = 'INCAL # Quantity in Store has gone negative, quantity reset to zero'
+_SOIL_RESET = 'INCAL # Quantity in SOIL Store has gone negative, quantity reset to zero'
+
 
 class INCAc(Model):
     def __init__(self, category, identifier):
         Model.__init__(self, category, identifier)
         # set model variables names
-        self.inputs_names = ['c_in_temp', 'c_in_m_no3', 'c_in_m_nh4', 'c_in_m_p_ino', 'c_in_m_o_org']
+        self.inputs_names = ['c_in_temp', 'c_in_m_no3', 'c_in_m_nh4', 'c_in_m_p_ino', 'c_in_m_p_org']
+        self.inputs_sources = {'c_in_temp': ('meteo', 'soit'), 'c_in_m_no3': ('contamination', 'm_no3'),
+                               'c_in_m_nh4': ('contamination', 'm_nh4'), 'c_in_m_p_ino': ('contamination', 'm_p_ino'),
+                               'c_in_m_p_org': ('contamination', 'm_p_org')}
         self.parameters_names = ['c_p_att_no3_ove', 'c_p_att_nh4_ove', 'c_p_att_dph_ove', 'c_p_att_pph_ove',
                                  'c_p_att_sed_ove', 'c_p_att_no3_dra', 'c_p_att_nh4_dra', 'c_p_att_dph_dra',
                                  'c_p_att_pph_dra', 'c_p_att_sed_dra', 'c_p_att_no3_int', 'c_p_att_nh4_int',
@@ -43,19 +51,22 @@ class INCAc(Model):
                                  'c_p_att_sed_dgw', 'c_p_att_no3_soil', 'c_p_att_nh4_soil', 'c_p_att_p_org_ra_soil',
                                  'c_p_att_p_ino_ra_soil', 'c_p_att_p_org_fb_soil', 'c_p_att_p_ino_fb_soil',
                                  'c_p_att_sed_soil']
-        self.states_names = ['c_s_c_no3_ove', 'c_s_c_no3_dra', 'c_s_c_no3_int', 'c_s_c_no3_sgw', 'c_s_c_no3_dgw',
-                             'c_s_c_nh4_ove', 'c_s_c_nh4_dra', 'c_s_c_nh4_int', 'c_s_c_nh4_sgw', 'c_s_c_nh4_dgw',
-                             'c_s_c_dph_ove', 'c_s_c_dph_dra', 'c_s_c_dph_int', 'c_s_c_dph_sgw', 'c_s_c_dph_dgw',
-                             'c_s_c_pph_ove', 'c_s_c_pph_dra', 'c_s_c_pph_int', 'c_s_c_pph_sgw', 'c_s_c_pph_dgw',
-                             'c_s_c_sed_ove', 'c_s_c_sed_dra', 'c_s_c_sed_int', 'c_s_c_sed_sgw', 'c_s_c_sed_dgw',
+        self.states_names = ['c_s_c_no3_ove', 'c_s_c_nh4_ove', 'c_s_c_dph_ove', 'c_s_c_pph_ove', 'c_s_c_sed_ove',
+                             'c_s_c_no3_dra', 'c_s_c_nh4_dra', 'c_s_c_dph_dra', 'c_s_c_pph_dra', 'c_s_c_sed_dra',
+                             'c_s_c_no3_int', 'c_s_c_nh4_int', 'c_s_c_dph_int', 'c_s_c_pph_int', 'c_s_c_sed_int',
+                             'c_s_c_no3_sgw', 'c_s_c_nh4_sgw', 'c_s_c_dph_sgw', 'c_s_c_pph_sgw', 'c_s_c_sed_sgw',
+                             'c_s_c_no3_dgw', 'c_s_c_nh4_dgw', 'c_s_c_dph_dgw', 'c_s_c_pph_dgw', 'c_s_c_sed_dgw',
                              'c_s_c_no3_soil', 'c_s_c_nh4_soil', 'c_s_c_p_org_ra_soil', 'c_s_c_p_ino_ra_soil',
                              'c_s_m_p_org_fb_soil', 'c_s_m_p_ino_fb_soil', 'c_s_m_sed_soil']
-        self.constants_names = ['c_cst_mob_no3_ove', 'c_cst_mob_no3_dra', 'c_cst_mob_no3_int', 'c_cst_mob_no3_sgw',
-                                'c_cst_mob_no3_dgw', 'c_cst_mob_nh4_ove', 'c_cst_mob_nh4_dra', 'c_cst_mob_nh4_int',
-                                'c_cst_mob_nh4_sgw', 'c_cst_mob_nh4_dgw', 'c_cst_mob_dph_ove', 'c_cst_mob_dph_dra',
-                                'c_cst_mob_dph_int', 'c_cst_mob_dph_sgw', 'c_cst_mob_dph_dgw', 'c_cst_mob_pph_ove',
-                                'c_cst_mob_pph_dra', 'c_cst_mob_pph_int', 'c_cst_mob_pph_sgw', 'c_cst_mob_pph_dgw',
-                                'c_cst_mob_sed_ove', 'c_cst_mob_sed_dra', 'c_cst_mob_sed_int', 'c_cst_mob_sed_sgw',
+        self.slow_states_names = ['c_s_c_no3_sgw', 'c_s_c_no3_dgw', 'c_s_c_dph_sgw', 'c_s_c_dph_dgw',
+                                  'c_s_c_no3_soil', 'c_s_c_nh4_soil', 'c_s_c_p_org_ra_soil', 'c_s_c_p_ino_ra_soil',
+                                  'c_s_m_p_org_fb_soil', 'c_s_m_p_ino_fb_soil', 'c_s_m_sed_soil']
+        self.constants_names = ['c_cst_mob_no3_ove', 'c_cst_mob_nh4_ove', 'c_cst_mob_dph_ove', 'c_cst_mob_pph_ove',
+                                'c_cst_mob_sed_ove', 'c_cst_mob_no3_dra', 'c_cst_mob_nh4_dra', 'c_cst_mob_dph_dra',
+                                'c_cst_mob_pph_dra', 'c_cst_mob_sed_dra', 'c_cst_mob_no3_int', 'c_cst_mob_nh4_int',
+                                'c_cst_mob_dph_int', 'c_cst_mob_pph_int', 'c_cst_mob_sed_int', 'c_cst_mob_no3_sgw',
+                                'c_cst_mob_nh4_sgw', 'c_cst_mob_dph_sgw', 'c_cst_mob_pph_sgw', 'c_cst_mob_sed_sgw',
+                                'c_cst_mob_no3_dgw', 'c_cst_mob_nh4_dgw', 'c_cst_mob_dph_dgw', 'c_cst_mob_pph_dgw',
                                 'c_cst_mob_sed_dgw', 'c_cst_sed_daily_thr', 'c_cst_sed_k', 'c_cst_sed_p',
                                 'c_cst_soil_test_p', 'c_cst_soil_c1n', 'c_cst_soil_c3n', 'c_cst_soil_c4n',
                                 'c_cst_soil_c5n', 'c_cst_soil_c6n', 'c_cst_soil_c7n', 'c_cst_soil_c1p',
@@ -71,6 +82,14 @@ class INCAc(Model):
                               'c_out_c_no3_dgw', 'c_out_c_nh4_dgw', 'c_out_c_dph_dgw', 'c_out_c_pph_dgw',
                               'c_out_c_sed_dgw', 'c_out_c_no3', 'c_out_c_nh4', 'c_out_c_dph', 'c_out_c_pph',
                               'c_out_c_sed']
+        # set variables names inherited from the hydrological model
+        self.inherited_parameters_names = ['c_p_z']
+        self.inherited_states_names = ['c_s_v_h2o_ove', 'c_s_v_h2o_dra', 'c_s_v_h2o_int', 'c_s_v_h2o_sgw',
+                                       'c_s_v_h2o_dgw', 'c_s_v_h2o_ly1', 'c_s_v_h2o_ly2', 'c_s_v_h2o_ly3',
+                                       'c_s_v_h2o_ly4', 'c_s_v_h2o_ly5', 'c_s_v_h2o_ly6']
+        self.inherited_fluxes_names = ['c_out_q_h2o_ove', 'c_out_q_h2o_dra', 'c_out_q_h2o_int', 'c_out_q_h2o_sgw',
+                                       'c_out_q_h2o_dgw', 'c_pr_eff_rain_to_ove', 'c_pr_eff_rain_to_dra',
+                                       'c_pr_eff_rain_to_int', 'c_pr_eff_rain_to_sgw', 'c_pr_eff_rain_to_dgw']
 
     def set_constants(self, input_folder):
         self._set_constants_with_file(input_folder)
@@ -82,6 +101,10 @@ class INCAc(Model):
         else:
             self._infer_parameters(link, catchment, outlet, output_folder)
 
+    @staticmethod
+    def set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder):
+        Model._set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder)
+
     def _infer_parameters(self, link, catchment, outlet, output_folder):
 
         dict_for_file = self._infer_parameters_from_descriptors(link.descriptors)
@@ -89,20 +112,21 @@ class INCAc(Model):
         my_dict = dict(dict_for_file)
         dict_for_file["WaterBody"] = link.name
 
-        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                           self.identifier, self.category)):
-            with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ["WaterBody"] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writerow(dict_for_file)
-        else:
-            with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ["WaterBody"] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writeheader()
-                my_writer.writerow(dict_for_file)
+        if output_folder:  # the inferred parameters are only saved if there is an output folder
+            if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                               self.identifier, self.category)):
+                with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ["WaterBody"] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writerow(dict_for_file)
+            else:
+                with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ["WaterBody"] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writeheader()
+                    my_writer.writerow(dict_for_file)
 
         self.parameters = my_dict
         link.models_parameters.update(my_dict)
@@ -112,28 +136,139 @@ class INCAc(Model):
         return self._initialise_states()
 
     def simulate(self, db, tf, step, link, logger):
+        my_bindings = self.bindings if self.bindings else self.bind(link)
+        previous = step + timedelta(minutes=-tf.simu_gap)
+        my_frame_prev = db.simulation[link.name][previous]
+        my_frame = db.simulation[link.name][step]
+        area_m2 = my_bindings.area
 
-        self._simulate(link.name, link.descriptors,
-                       step, tf.simu_gap,
-                       link.models_parameters, self.constants,
-                       db.simulation, db.meteo, db.contamination,
-                       logger)
-
-    def _simulate(self, waterbody, dict_desc,
-                  datetime_time_step, time_gap,
-                  dict_param, dict_const,
-                  dict_data_frame, dict_meteo, dict_loads,
-                  logger):
-
-        inca_in = self._get_in(waterbody, datetime_time_step, time_gap,
-                               dict_data_frame, dict_desc, dict_param, dict_meteo, dict_loads, dict_const)
+        # bring in hydrology parameters, states, and outputs necessary for water quality model
+        my_hd_states_prev = my_bindings.get_inherited_states(my_frame_prev)
+        my_hd_states = my_bindings.get_inherited_states(my_frame)
+        my_hd_fluxes = my_bindings.get_inherited_fluxes(my_frame)
+        lvl_total_start = sum(my_hd_states_prev[5:11]) / area_m2 * 1e3  # soil column level at beginning [mm]
+        lvl_total_end = sum(my_hd_states[5:11]) / area_m2 * 1e3  # soil column level at end [mm]
+
+        # bring in constants, model inputs, parameter values, states, and constants + hydrology inheritance
+        inca_in = \
+            (area_m2, tf.simu_gap * 60.0) + \
+            my_bindings.get_inputs(db, step, previous) + \
+            my_bindings.get_parameters(link.models_parameters) + \
+            my_bindings.get_states(my_frame_prev) + \
+            my_bindings.get_constants(self.constants) + \
+            my_bindings.get_inherited_parameters(link.models_parameters) + \
+            my_hd_fluxes[0:5] + my_hd_states_prev[0:5] + my_hd_states[0:5] + \
+            (lvl_total_start, lvl_total_end) + my_hd_fluxes[5:10]
+
+        # bring in the calendar covariate (computed once for all the time steps)
+        seasonal_growth = tf.covariates.get_derived(
+            ('seasonal_growth', self.constants['c_cst_day_grow']), _get_seasonal_growth,
+            self.constants['c_cst_day_grow'])[tf.covariates.index[step]]
+
+        inca_out = self._run(link.name, step, self.diagnostics, *inca_in, seasonal_growth=seasonal_growth)
+
+        # store water quality outputs and updated states in data frame
+        my_bindings.set_outputs(my_frame, inca_out[0:30])
+        my_bindings.set_states(my_frame, inca_out[30:62])
 
-        inca_out = self._run(waterbody, datetime_time_step, logger, *inca_in)
+    @staticmethod
+    def simulate_links(models, db, tf, step, links, logger):
+        """
+        This method runs the Model for several Links at once for a given time step. The inputs, parameters,
+        constants, and states of all the Links are gathered in arrays (stores x contaminants x links) so that the
+        calculations are vectorised across the Links. The results are the same as running 'simulate' Link by Link.
+
+        :param models: list of INCAc objects (one for each Link, in the same order as the Links)
+        :type models: list
+        :param db: DataBase object containing the simulation data frames and the input data
+        :type db: DataBase
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param step: DateTime of the time step to simulate
+        :type step: datetime.datetime
+        :param links: list of Link objects to simulate
+        :type links: list
+        :param logger: logger to use for the simulation messages
+        :type logger: logging.Logger
+        """
+        stores = ['ove', 'dra', 'int', 'sgw', 'dgw']
+        stores_contaminants = ['no3', 'nh4', 'dph', 'pph', 'sed']
+        soil_contaminants = ['no3', 'nh4', 'p_org_ra', 'p_ino_ra', 'p_org_fb', 'p_ino_fb', 'sed']
+        nb_links = len(links)
+
+        previous = step + timedelta(minutes=-tf.simu_gap)
+        my_frames_prev = [db.simulation[link.name][previous] for link in links]
+        my_frames = [db.simulation[link.name][step] for link in links]
+        my_params = [link.models_parameters for link in links]
+        my_consts = [model.constants for model in models]
+
+        # bring in inputs and store them in data frames
+        my_inputs = [
+            [db.meteo[link.name]['soit'][step], db.contamination[link.name]['m_no3'][step],
+             db.contamination[link.name]['m_nh4'][step], db.contamination[link.name]['m_p_ino'][step],
+             db.contamination[link.name]['m_p_org'][step]] for link in links]
+        for my_frame, my_values in zip(my_frames, my_inputs):
+            my_frame.update(zip(['c_in_temp', 'c_in_m_no3', 'c_in_m_nh4', 'c_in_m_p_ino', 'c_in_m_p_org'], my_values))
+        my_inputs = np.array(my_inputs, dtype=np.float64).T
+
+        # bring in parameters, states, and constants (stores x contaminants x links, or soil contaminants x links)
+        p_att = _get_array(my_params, ['c_p_att_{}_{}'.format(c, s)
+                                       for s in stores for c in stores_contaminants]).reshape((5, 5, nb_links))
+        p_att_soil = _get_array(my_params, ['c_p_att_{}_soil'.format(c) for c in soil_contaminants])
+        s_c = _get_array(my_frames_prev, ['c_s_c_{}_{}'.format(c, s)
+                                          for s in stores for c in stores_contaminants]).reshape((5, 5, nb_links))
+        s_soil = _get_array(my_frames_prev, ['c_s_c_no3_soil', 'c_s_c_nh4_soil', 'c_s_c_p_org_ra_soil',
+                                             'c_s_c_p_ino_ra_soil', 'c_s_m_p_org_fb_soil', 'c_s_m_p_ino_fb_soil',
+                                             'c_s_m_sed_soil'])
+        cst_mob = _get_array(my_consts, ['c_cst_mob_{}_{}'.format(c, s)
+                                         for s in stores for c in stores_contaminants]).reshape((5, 5, nb_links))
+        my_names = [name for name in models[0].constants_names if not name.startswith('c_cst_mob_')]
+        cst = dict(zip(my_names, _get_array(my_consts, my_names)))
 
-        self._get_out(waterbody, datetime_time_step, dict_data_frame, *inca_out)
+        # bring in hydrology parameters, states, and outputs necessary for water quality model
+        area_m2 = np.array([link.get_descriptor('area') for link in links], dtype=np.float64)
+        c_p_z = _get_array(my_params, ['c_p_z'])[0]
+        my_layers = ['c_s_v_h2o_ly{}'.format(i) for i in range(1, 7)]
+        lvl_total_start = sum(_get_array(my_frames_prev, my_layers)) / area_m2 * 1e3
+        lvl_total_end = sum(_get_array(my_frames, my_layers)) / area_m2 * 1e3
+        v_old = _get_array(my_frames_prev, ['c_s_v_h2o_{}'.format(s) for s in stores])
+        v_new = _get_array(my_frames, ['c_s_v_h2o_{}'.format(s) for s in stores])
+        q_out = _get_array(my_frames, ['c_out_q_h2o_{}'.format(s) for s in stores])
+        eff_rain = _get_array(my_frames, ['c_pr_eff_rain_to_{}'.format(s) for s in stores])
+
+        # bring in the calendar covariate (computed once for all the time steps, for each distinct constant)
+        my_index = tf.covariates.index[step]
+        my_growth = {day_grow: tf.covariates.get_derived(('seasonal_growth', day_grow), _get_seasonal_growth,
+                                                         day_grow)[my_index]
+                     for day_grow in set(model.constants['c_cst_day_grow'] for model in models)}
+        seasonal_growth = np.array([my_growth[model.constants['c_cst_day_grow']] for model in models])
+
+        c_out, s_c, s_soil, resets = INCAc._run_links(
+            step, tf.simu_gap * 60.0, area_m2, my_inputs, p_att, p_att_soil, s_c, s_soil, cst_mob, cst,
+            c_p_z, q_out, v_old, v_new, lvl_total_start, lvl_total_end, eff_rain, seasonal_growth)
+
+        # count the stores reset to zero (events identical to the ones of the scalar implementation)
+        diagnostics = models[0].diagnostics
+        for (contaminant, store), my_mask in resets:
+            for i in np.flatnonzero(my_mask):
+                if store == 'soil':
+                    diagnostics.record(links[i].name, (_SOIL_RESET, contaminant), step)
+                else:
+                    diagnostics.record(links[i].name, (_STORE_RESET, contaminant, store), step)
+
+        # store water quality outputs and states in data frames
+        my_names = \
+            ['c_out_c_{}_{}'.format(c, s) for s in stores for c in stores_contaminants] + \
+            ['c_out_c_{}'.format(c) for c in stores_contaminants] + \
+            ['c_s_c_{}_{}'.format(c, s) for s in stores for c in stores_contaminants] + \
+            ['c_s_c_no3_soil', 'c_s_c_nh4_soil', 'c_s_c_p_org_ra_soil', 'c_s_c_p_ino_ra_soil',
+             'c_s_m_p_org_fb_soil', 'c_s_m_p_ino_fb_soil', 'c_s_m_sed_soil']
+        my_values = np.concatenate([c_out.reshape((30, nb_links)), s_c.reshape((25, nb_links)), s_soil]).T.tolist()
+        for my_frame, my_link_values in zip(my_frames, my_values):
+            my_frame.update(zip(my_names, my_link_values))
 
     @staticmethod
-    def _run(waterbody, datetime_time_step, logger,
+    def _run(waterbody, datetime_time_step, diagnostics,
              area_m2, time_gap_sec,
              c_in_temp, c_in_m_no3, c_in_m_nh4, c_in_m_p_ino, c_in_m_p_org,
              c_p_att_no3_ove, c_p_att_nh4_ove, c_p_att_dph_ove, c_p_att_pph_ove, c_p_att_sed_ove,
@@ -166,7 +301,9 @@ class INCAc(Model):
              c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw,
              lvl_total_start, lvl_total_end,
              c_pr_eff_rain_to_ove, c_pr_eff_rain_to_dra, c_pr_eff_rain_to_int,
-             c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw):
+             c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw,
+             # calendar covariate (computed from the DateTime if not given)
+             seasonal_growth=None):
         """
         This function was written by Thibault Hallouin but is largely inspired by the work of Eva Mockler and
         Michael Bruen, namely for the work published in: Mockler, E., Bruen, M., Desta, M., Misstear, B., Environmental
@@ -343,6 +480,9 @@ class INCAc(Model):
         _____ c_out_c_dph           dissolved phosphorus in total outflow [kg/m3]
         _____ c_out_c_pph           particulate phosphorus in total outflow [kg/m3]
         _____ c_out_c_sed           sediment concentration in total outflow [kg/m3]
+
+        Calendar Covariate
+        _ seasonal_growth           seasonal plant growth factor for the time step [-] (see '_get_seasonal_growth')
         """
 
         # # 2. Water Quality
@@ -353,11 +493,13 @@ class INCAc(Model):
 
         sediment_threshold = c_cst_sed_daily_thr * time_factor
 
-        day_of_year = float(datetime_time_step.timetuple().tm_yday)
-        if isleap(datetime_time_step.timetuple().tm_year):
-            days_in_year = 366.0
-        else:
-            days_in_year = 365.0
+        if seasonal_growth is None:
+            day_of_year = float(datetime_time_step.timetuple().tm_yday)
+            if isleap(datetime_time_step.timetuple().tm_year):
+                days_in_year = 366.0
+            else:
+                days_in_year = 365.0
+            seasonal_growth = 0.66 + 0.34 * sin(2.0 * pi * (day_of_year - c_cst_day_grow) / days_in_year)
 
         flow_threshold_for_erosion = {
             'ove': c_cst_flow_thr_mm_for_ero_ove,  # [mm]
@@ -539,9 +681,7 @@ class INCAc(Model):
                     (dict_flows_mm_hd[store] / 1e3 * area_m2) * dict_states_wq['soil'][contaminant] * mobilisation
                 m_store = m_store_att + m_mobilised - dict_outputs_hd[store] * time_gap_sec * c_store
                 if (m_store < 0.0) or (dict_states_hd[store] < c_cst_vol_tolerance):
-                    logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                          ' - ', contaminant.upper(), ' Quantity in ', store.upper(),
-                                          ' Store has gone negative, quantity reset to zero']))
+                    diagnostics.record(waterbody, (_STORE_RESET, contaminant, store), datetime_time_step)
                     dict_states_wq[store][contaminant] = 0.0
                 else:
                     dict_states_wq[store][contaminant] = m_store / dict_states_hd[store]
@@ -573,9 +713,7 @@ class INCAc(Model):
                     m_store_att + m_sediment - \
                     dict_outputs_hd[store] * time_gap_sec * dict_c_outflow[store][contaminant]
                 if (m_store < 0.0) or (dict_states_hd[store] < c_cst_vol_tolerance):
-                    logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                          ' - ', contaminant.upper(), ' Quantity in ', store.upper(),
-                                          ' Store has gone negative, quantity reset to zero']))
+                    diagnostics.record(waterbody, (_STORE_RESET, contaminant, store), datetime_time_step)
                     dict_states_wq[store][contaminant] = 0.0
                 else:
                     dict_states_wq[store][contaminant] = m_store / dict_states_hd[store]
@@ -625,9 +763,7 @@ class INCAc(Model):
                 m_store_att + m_particulate_p - \
                 dict_outputs_hd[store] * time_gap_sec * dict_c_outflow[store][contaminant]
             if (m_store < 0.0) or (dict_states_hd[store] < c_cst_vol_tolerance):
-                logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                      ' - ', contaminant.upper(), ' Quantity in ', store.upper(),
-                                      ' Store has gone negative, quantity reset to zero']))
+                diagnostics.record(waterbody, (_STORE_RESET, contaminant, store), datetime_time_step)
                 dict_states_wq[store][contaminant] = 0.0
             else:
                 dict_states_wq[store][contaminant] = m_store / dict_states_hd[store]
@@ -652,9 +788,7 @@ class INCAc(Model):
                     (dict_flows_mm_hd[store] / 1e3 * area_m2) * dict_states_wq['soil'][contaminant] * mobilisation
                 m_store = m_store_att + m_mobilised - dict_outputs_hd[store] * time_gap_sec * c_store
                 if (m_store < 0.0) or (dict_states_hd[store] < c_cst_vol_tolerance):
-                    logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                          ' - ', contaminant.upper(), ' Quantity in ', store.upper(),
-                                          ' Store has gone negative, quantity reset to zero']))
+                    diagnostics.record(waterbody, (_STORE_RESET, contaminant, store), datetime_time_step)
                     dict_states_wq[store][contaminant] = 0.0
                 else:
                     dict_states_wq[store][contaminant] = m_store / dict_states_hd[store]
@@ -669,7 +803,7 @@ class INCAc(Model):
             s1 = 1.0
         elif s1 < 0.0:
             s1 = 0.0
-        s2 = 0.66 + 0.34 * sin(2.0 * pi * (day_of_year - c_cst_day_grow) / days_in_year)  # seasonal plant growth
+        s2 = seasonal_growth  # seasonal plant growth
         c3_no3 = c_cst_soil_c3n * (1.047 ** (c_in_temp - 20.0))
         pu_no3 = c3_no3 * s1 * s2  # plant uptake [-/day]
         c1 = c_cst_soil_c1n * (1.047 ** (c_in_temp - 20.0))
@@ -692,8 +826,7 @@ class INCAc(Model):
         m_soil = dict_states_wq['soil']['no3'] * (lvl_total_start / 1e3 * area_m2)  # mass in soil at beg. of time step
         m_soil_new = m_soil * attenuation + ni * time_factor + dict_mass_applied['no3'] - dict_m_mobilised['no3']
         if (m_soil_new < 0.0) or ((lvl_total_end / 1e3 * area_m2) < c_cst_vol_tolerance):
-            logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - NO3 Quantity in SOIL Store has gone negative, quantity reset to zero.']))
+            diagnostics.record(waterbody, (_SOIL_RESET, 'no3'), datetime_time_step)
             dict_states_wq['soil']['no3'] = 0.0
         else:
             dict_states_wq['soil']['no3'] = m_soil_new / (lvl_total_end / 1e3 * area_m2)
@@ -717,8 +850,7 @@ class INCAc(Model):
         m_soil = dict_states_wq['soil']['nh4'] * (lvl_total_start / 1e3 * area_m2)
         m_soil_new = m_soil * attenuation + dict_mass_applied['nh4'] - (mi + ni) * time_factor - dict_m_mobilised['nh4']
         if (m_soil_new < 0.0) or ((lvl_total_end / 1e3 * area_m2) < c_cst_vol_tolerance):
-            logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - NH4 Quantity in SOIL Store has gone negative, quantity reset to zero.']))
+            diagnostics.record(waterbody, (_SOIL_RESET, 'nh4'), datetime_time_step)
             dict_states_wq['soil']['nh4'] = 0.0
         else:
             dict_states_wq['soil']['nh4'] = m_soil_new / (lvl_total_end / 1e3 * area_m2)
@@ -748,8 +880,7 @@ class INCAc(Model):
         # assumed that all p_ino applied is in the readily available form
         # assumed that half of the dph mobilised from soil is inorganic
         if (m_soil_new < 0.0) or ((lvl_total_end / 1e3 * area_m2) < c_cst_vol_tolerance):
-            logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - P_INO_RA Quantity in SOIL Store has gone negative, quantity reset to zero.']))
+            diagnostics.record(waterbody, (_SOIL_RESET, 'p_ino_ra'), datetime_time_step)
             dict_states_wq['soil']['p_ino_ra'] = 0.0
         else:
             dict_states_wq['soil']['p_ino_ra'] = m_soil_new / (lvl_total_end / 1e3 * area_m2)
@@ -767,8 +898,7 @@ class INCAc(Model):
             (conversion_p_ino_ra_into_fb - conversion_p_ino_fb_into_ra) * time_factor
         # assumed that half of the pph mobilised from soil is inorganic
         if (m_soil_new < 0.0) or ((lvl_total_end / 1e3 * area_m2) < c_cst_vol_tolerance):
-            logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - P_INO_FB Quantity in SOIL Store has gone negative, quantity reset to zero.']))
+            diagnostics.record(waterbody, (_SOIL_RESET, 'p_ino_fb'), datetime_time_step)
             dict_states_wq['soil']['p_ino_fb'] = 0.0
         else:
             dict_states_wq['soil']['p_ino_fb'] = m_soil_new  # store state in kg
@@ -794,8 +924,7 @@ class INCAc(Model):
         # assumed that all p_org applied is in the readily available form
         # assumed that half of the dph mobilised from soil is organic
         if (m_soil_new < 0.0) or ((lvl_total_end / 1e3 * area_m2) < c_cst_vol_tolerance):
-            logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - P_ORG_RA Quantity in SOIL Store has gone negative, quantity reset to zero.']))
+            diagnostics.record(waterbody, (_SOIL_RESET, 'p_org_ra'), datetime_time_step)
             dict_states_wq['soil']['p_org_ra'] = 0.0
         else:
             dict_states_wq['soil']['p_org_ra'] = m_soil_new / (lvl_total_end / 1e3 * area_m2)
@@ -813,8 +942,7 @@ class INCAc(Model):
             (conversion_p_org_ra_into_fb - conversion_p_org_fb_into_ra) * time_factor
         # assumed that half of the pph mobilised from soil is organic
         if (m_soil_new < 0.0) or ((lvl_total_end / 1e3 * area_m2) < c_cst_vol_tolerance):
-            logger.debug(''.join(['INCAL # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - P_ORG_FB Quantity in SOIL Store has gone negative, quantity reset to zero.']))
+            diagnostics.record(waterbody, (_SOIL_RESET, 'p_org_fb'), datetime_time_step)
             dict_states_wq['soil']['p_org_fb'] = 0.0
         else:
             dict_states_wq['soil']['p_org_fb'] = m_soil_new  # store state in kg
@@ -862,372 +990,194 @@ class INCAc(Model):
             dict_states_wq['soil']['p_ino_fb'], dict_states_wq['soil']['sed']
 
     @staticmethod
-    def _get_in(waterbody, datetime_time_step, time_gap_min,
-                dict_data_frame, dict_desc, dict_param, dict_meteo, dict_loads, dict_const):
+    def _run_links(datetime_time_step, time_gap_sec, area_m2, c_in, p_att, p_att_soil, s_c, s_soil, cst_mob, cst,
+                   c_p_z, q_out, v_old, v_new, lvl_total_start, lvl_total_end, eff_rain, seasonal_growth):
         """
-        This function is the interface between the data models of the simulator and the model.
-        It provides the inputs, parameters, processes, and states to the model.
-        It also saves the inputs into the data frame.
-        It can only return a tuple of scalar variables.
+        This function is the vectorised equivalent of the function '_run' for several Links at once. Each argument
+        is an array whose last dimension is the Links. The stores are ordered as ['ove', 'dra', 'int', 'sgw', 'dgw'],
+        the contaminants in the stores as ['no3', 'nh4', 'dph', 'pph', 'sed'], and the contaminants in the soil as
+        ['no3', 'nh4', 'p_org_ra', 'p_ino_ra', 'p_org_fb', 'p_ino_fb', 'sed'].
+
+        :param datetime_time_step: DateTime of the time step to simulate
+        :param time_gap_sec: time gap between two simulation time steps [seconds]
+        :param area_m2: catchment areas [m2] (links)
+        :param c_in: inputs (temp, m_no3, m_nh4, m_p_ino, m_p_org) x links
+        :param p_att: attenuation factors stores x contaminants x links
+        :param p_att_soil: attenuation factors soil contaminants x links
+        :param s_c: concentrations at the beginning of the time step stores x contaminants x links
+        :param s_soil: states at the beginning of the time step soil contaminants x links
+        :param cst_mob: mobilisation factors stores x contaminants x links
+        :param cst: dictionary of the other constants {key: constant name, value: array (links)}
+        :param c_p_z: soil depth (links)
+        :param q_out: flows leaving the stores during the time step stores x links [m3/s]
+        :param v_old: volumes in stores at the beginning of the time step stores x links [m3]
+        :param v_new: volumes in stores at the end of the time step stores x links [m3]
+        :param lvl_total_start: level in the whole soil column at the beginning of the time step (links) [mm]
+        :param lvl_total_end: level in the whole soil column at the end of the time step (links) [mm]
+        :param eff_rain: effective rainfall contributing to the stores during the time step stores x links [mm]
+        :param seasonal_growth: seasonal plant growth factor for the time step (links) [-]
+        :return: outflow concentrations (stores + total) x contaminants x links, updated concentrations
+            stores x contaminants x links, updated soil states soil contaminants x links, and the list of the stores
+            reset to zero [((contaminant, store), boolean array (links))]
         """
-        # bring in catchment constants
-        area_m2 = dict_desc['area']
-        time_gap_sec = time_gap_min * 60.0
-
-        # bring in water quality model inputs
-        c_in_temp = dict_meteo[waterbody]["soit"][datetime_time_step]
-        c_in_m_no3 = dict_loads[waterbody]['m_no3'][datetime_time_step]
-        c_in_m_nh4 = dict_loads[waterbody]['m_nh4'][datetime_time_step]
-        c_in_m_p_ino = dict_loads[waterbody]['m_p_ino'][datetime_time_step]
-        c_in_m_p_org = dict_loads[waterbody]['m_p_org'][datetime_time_step]
-
-        # store water quality model input in data frame
-        dict_data_frame[waterbody][datetime_time_step]['c_in_temp'] = c_in_temp
-        dict_data_frame[waterbody][datetime_time_step]['c_in_m_no3'] = c_in_m_no3
-        dict_data_frame[waterbody][datetime_time_step]['c_in_m_nh4'] = c_in_m_nh4
-        dict_data_frame[waterbody][datetime_time_step]['c_in_m_p_ino'] = c_in_m_p_ino
-        dict_data_frame[waterbody][datetime_time_step]['c_in_m_p_org'] = c_in_m_p_org
-
-        # bring in water quality model parameters
-        c_p_att_no3_ove = dict_param['c_p_att_no3_ove']
-        c_p_att_nh4_ove = dict_param['c_p_att_nh4_ove']
-        c_p_att_dph_ove = dict_param['c_p_att_dph_ove']
-        c_p_att_pph_ove = dict_param['c_p_att_pph_ove']
-        c_p_att_sed_ove = dict_param['c_p_att_sed_ove']
-        c_p_att_no3_dra = dict_param['c_p_att_no3_dra']
-        c_p_att_nh4_dra = dict_param['c_p_att_nh4_dra']
-        c_p_att_dph_dra = dict_param['c_p_att_dph_dra']
-        c_p_att_pph_dra = dict_param['c_p_att_pph_dra']
-        c_p_att_sed_dra = dict_param['c_p_att_sed_dra']
-        c_p_att_no3_int = dict_param['c_p_att_no3_int']
-        c_p_att_nh4_int = dict_param['c_p_att_nh4_int']
-        c_p_att_dph_int = dict_param['c_p_att_dph_int']
-        c_p_att_pph_int = dict_param['c_p_att_pph_int']
-        c_p_att_sed_int = dict_param['c_p_att_sed_int']
-        c_p_att_no3_sgw = dict_param['c_p_att_no3_sgw']
-        c_p_att_nh4_sgw = dict_param['c_p_att_nh4_sgw']
-        c_p_att_dph_sgw = dict_param['c_p_att_dph_sgw']
-        c_p_att_pph_sgw = dict_param['c_p_att_pph_sgw']
-        c_p_att_sed_sgw = dict_param['c_p_att_sed_sgw']
-        c_p_att_no3_dgw = dict_param['c_p_att_no3_dgw']
-        c_p_att_nh4_dgw = dict_param['c_p_att_nh4_dgw']
-        c_p_att_dph_dgw = dict_param['c_p_att_dph_dgw']
-        c_p_att_pph_dgw = dict_param['c_p_att_pph_dgw']
-        c_p_att_sed_dgw = dict_param['c_p_att_sed_dgw']
-        c_p_att_no3_soil = dict_param['c_p_att_no3_soil']
-        c_p_att_nh4_soil = dict_param['c_p_att_nh4_soil']
-        c_p_att_p_org_ra_soil = dict_param['c_p_att_p_org_ra_soil']
-        c_p_att_p_ino_ra_soil = dict_param['c_p_att_p_ino_ra_soil']
-        c_p_att_p_org_fb_soil = dict_param['c_p_att_p_org_fb_soil']
-        c_p_att_p_ino_fb_soil = dict_param['c_p_att_p_ino_fb_soil']
-        c_p_att_sed_soil = dict_param['c_p_att_sed_soil']
-
-        # bring in water quality model states
-        c_s_c_no3_ove = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_no3_ove']
-        c_s_c_nh4_ove = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_nh4_ove']
-        c_s_c_dph_ove = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_dph_ove']
-        c_s_c_pph_ove = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_pph_ove']
-        c_s_c_sed_ove = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_sed_ove']
-        c_s_c_no3_dra = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_no3_dra']
-        c_s_c_nh4_dra = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_nh4_dra']
-        c_s_c_dph_dra = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_dph_dra']
-        c_s_c_pph_dra = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_pph_dra']
-        c_s_c_sed_dra = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_sed_dra']
-        c_s_c_no3_int = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_no3_int']
-        c_s_c_nh4_int = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_nh4_int']
-        c_s_c_dph_int = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_dph_int']
-        c_s_c_pph_int = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_pph_int']
-        c_s_c_sed_int = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_sed_int']
-        c_s_c_no3_sgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_no3_sgw']
-        c_s_c_nh4_sgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_nh4_sgw']
-        c_s_c_dph_sgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_dph_sgw']
-        c_s_c_pph_sgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_pph_sgw']
-        c_s_c_sed_sgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_sed_sgw']
-        c_s_c_no3_dgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_no3_dgw']
-        c_s_c_nh4_dgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_nh4_dgw']
-        c_s_c_dph_dgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_dph_dgw']
-        c_s_c_pph_dgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_pph_dgw']
-        c_s_c_sed_dgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_sed_dgw']
-        c_s_c_no3_soil = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_no3_soil']
-        c_s_c_nh4_soil = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_nh4_soil']
-        c_s_c_p_org_ra_soil = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_p_org_ra_soil']
-        c_s_c_p_ino_ra_soil = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_c_p_ino_ra_soil']
-        c_s_m_p_org_fb_soil = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_m_p_org_fb_soil']
-        c_s_m_p_ino_fb_soil = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_m_p_ino_fb_soil']
-        c_s_m_sed_soil = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_m_sed_soil']
-
-        # bring in water quality model constants
-        c_cst_mob_no3_ove = dict_const['c_cst_mob_no3_ove']
-        c_cst_mob_nh4_ove = dict_const['c_cst_mob_nh4_ove']
-        c_cst_mob_dph_ove = dict_const['c_cst_mob_dph_ove']
-        c_cst_mob_pph_ove = dict_const['c_cst_mob_pph_ove']
-        c_cst_mob_sed_ove = dict_const['c_cst_mob_sed_ove']
-        c_cst_mob_no3_dra = dict_const['c_cst_mob_no3_dra']
-        c_cst_mob_nh4_dra = dict_const['c_cst_mob_nh4_dra']
-        c_cst_mob_dph_dra = dict_const['c_cst_mob_dph_dra']
-        c_cst_mob_pph_dra = dict_const['c_cst_mob_pph_dra']
-        c_cst_mob_sed_dra = dict_const['c_cst_mob_sed_dra']
-        c_cst_mob_no3_int = dict_const['c_cst_mob_no3_int']
-        c_cst_mob_nh4_int = dict_const['c_cst_mob_nh4_int']
-        c_cst_mob_dph_int = dict_const['c_cst_mob_dph_int']
-        c_cst_mob_pph_int = dict_const['c_cst_mob_pph_int']
-        c_cst_mob_sed_int = dict_const['c_cst_mob_sed_int']
-        c_cst_mob_no3_sgw = dict_const['c_cst_mob_no3_sgw']
-        c_cst_mob_nh4_sgw = dict_const['c_cst_mob_nh4_sgw']
-        c_cst_mob_dph_sgw = dict_const['c_cst_mob_dph_sgw']
-        c_cst_mob_pph_sgw = dict_const['c_cst_mob_pph_sgw']
-        c_cst_mob_sed_sgw = dict_const['c_cst_mob_sed_sgw']
-        c_cst_mob_no3_dgw = dict_const['c_cst_mob_no3_dgw']
-        c_cst_mob_nh4_dgw = dict_const['c_cst_mob_nh4_dgw']
-        c_cst_mob_dph_dgw = dict_const['c_cst_mob_dph_dgw']
-        c_cst_mob_pph_dgw = dict_const['c_cst_mob_pph_dgw']
-        c_cst_mob_sed_dgw = dict_const['c_cst_mob_sed_dgw']
-        c_cst_sed_daily_thr = dict_const['c_cst_sed_daily_thr']
-        c_cst_sed_k = dict_const['c_cst_sed_k']
-        c_cst_sed_p = dict_const['c_cst_sed_p']
-        c_cst_soil_test_p = dict_const['c_cst_soil_test_p']
-        c_cst_soil_c1n = dict_const['c_cst_soil_c1n']
-        c_cst_soil_c3n = dict_const['c_cst_soil_c3n']
-        c_cst_soil_c4n = dict_const['c_cst_soil_c4n']
-        c_cst_soil_c5n = dict_const['c_cst_soil_c5n']
-        c_cst_soil_c6n = dict_const['c_cst_soil_c6n']
-        c_cst_soil_c7n = dict_const['c_cst_soil_c7n']
-        c_cst_soil_c1p = dict_const['c_cst_soil_c1p']
-        c_cst_soil_c2p = dict_const['c_cst_soil_c2p']
-        c_cst_soil_c3p = dict_const['c_cst_soil_c3p']
-        c_cst_soil_c4p = dict_const['c_cst_soil_c4p']
-        c_cst_soil_c5p = dict_const['c_cst_soil_c5p']
-        c_cst_soil_c6p = dict_const['c_cst_soil_c6p']
-        c_cst_soil_c7p = dict_const['c_cst_soil_c7p']
-        c_cst_soil_c8p = dict_const['c_cst_soil_c8p']
-        c_cst_day_grow = dict_const['c_cst_day_grow']
-        c_cst_flow_tolerance = dict_const['c_cst_flow_tolerance']
-        c_cst_vol_tolerance = dict_const['c_cst_vol_tolerance']
-        c_cst_flow_thr_mm_for_ero_ove = dict_const['c_cst_flow_thr_mm_for_ero_ove']
-        c_cst_flow_thr_mm_for_ero_dra = dict_const['c_cst_flow_thr_mm_for_ero_dra']
+        c_in_temp, c_in_m_no3, c_in_m_nh4, c_in_m_p_ino, c_in_m_p_org = c_in
+        nb_links = area_m2.shape[0]
 
-        # bring in hydrology parameters, states, and outputs necessary for water quality model
-        c_p_z = dict_param['c_p_z']
-
-        # # level in the whole soil column at the beginning of time step [mm]
-        lvl_total_start = (
-                                  dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)][
-                                      'c_s_v_h2o_ly1'] +
-                                  dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)][
-                                      'c_s_v_h2o_ly2'] +
-                                  dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)][
-                                      'c_s_v_h2o_ly3'] +
-                                  dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)][
-                                      'c_s_v_h2o_ly4'] +
-                                  dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)][
-                                      'c_s_v_h2o_ly5'] +
-                                  dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)][
-                                      'c_s_v_h2o_ly6']
-                          ) / area_m2 * 1e3
-
-        # # level in the whole soil column at the end of time step [mm]
-        lvl_total_end = (
-                                dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly1'] +
-                                dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly2'] +
-                                dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly3'] +
-                                dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly4'] +
-                                dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly5'] +
-                                dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly6']
-                        ) / area_m2 * 1e3
-
-        # # volumes in stores at the beginning of time step [m3]
-        c_s_v_h2o_ove_old = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_ove']
-        c_s_v_h2o_dra_old = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_dra']
-        c_s_v_h2o_int_old = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_int']
-        c_s_v_h2o_sgw_old = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_sgw']
-        c_s_v_h2o_dgw_old = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_dgw']
-
-        # # volumes in stores at the end of time step [m3]
-        c_s_v_h2o_ove = dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ove']
-        c_s_v_h2o_dra = dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_dra']
-        c_s_v_h2o_int = dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_int']
-        c_s_v_h2o_sgw = dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_sgw']
-        c_s_v_h2o_dgw = dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_dgw']
-
-        # # flows leaving the different stores during time step [m3/s]
-        c_out_q_h2o_ove = dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_ove']
-        c_out_q_h2o_dra = dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_dra']
-        c_out_q_h2o_int = dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_int']
-        c_out_q_h2o_sgw = dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_sgw']
-        c_out_q_h2o_dgw = dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_dgw']
-
-        # # effective rainfall contributing to the different stores during time step [mm]
-        c_pr_eff_rain_to_ove = dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_ove']
-        c_pr_eff_rain_to_dra = dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_dra']
-        c_pr_eff_rain_to_int = dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_int']
-        c_pr_eff_rain_to_sgw = dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_sgw']
-        c_pr_eff_rain_to_dgw = dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_dgw']
-
-        # return constants, model inputs, model parameter values, model states, model constants + hydrology inheritance
-        return \
-            area_m2, time_gap_sec, \
-            c_in_temp, c_in_m_no3, c_in_m_nh4, c_in_m_p_ino, c_in_m_p_org, \
-            c_p_att_no3_ove, c_p_att_nh4_ove, c_p_att_dph_ove, c_p_att_pph_ove, c_p_att_sed_ove, \
-            c_p_att_no3_dra, c_p_att_nh4_dra, c_p_att_dph_dra, c_p_att_pph_dra, c_p_att_sed_dra, \
-            c_p_att_no3_int, c_p_att_nh4_int, c_p_att_dph_int, c_p_att_pph_int, c_p_att_sed_int, \
-            c_p_att_no3_sgw, c_p_att_nh4_sgw, c_p_att_dph_sgw, c_p_att_pph_sgw, c_p_att_sed_sgw, \
-            c_p_att_no3_dgw, c_p_att_nh4_dgw, c_p_att_dph_dgw, c_p_att_pph_dgw, c_p_att_sed_dgw, \
-            c_p_att_no3_soil, c_p_att_nh4_soil, c_p_att_p_org_ra_soil, c_p_att_p_ino_ra_soil, \
-            c_p_att_p_org_fb_soil, c_p_att_p_ino_fb_soil, c_p_att_sed_soil, \
-            c_s_c_no3_ove, c_s_c_nh4_ove, c_s_c_dph_ove, c_s_c_pph_ove, c_s_c_sed_ove, \
-            c_s_c_no3_dra, c_s_c_nh4_dra, c_s_c_dph_dra, c_s_c_pph_dra, c_s_c_sed_dra, \
-            c_s_c_no3_int, c_s_c_nh4_int, c_s_c_dph_int, c_s_c_pph_int, c_s_c_sed_int, \
-            c_s_c_no3_sgw, c_s_c_nh4_sgw, c_s_c_dph_sgw, c_s_c_pph_sgw, c_s_c_sed_sgw, \
-            c_s_c_no3_dgw, c_s_c_nh4_dgw, c_s_c_dph_dgw, c_s_c_pph_dgw, c_s_c_sed_dgw, \
-            c_s_c_no3_soil, c_s_c_nh4_soil, c_s_c_p_org_ra_soil, c_s_c_p_ino_ra_soil, \
-            c_s_m_p_org_fb_soil, c_s_m_p_ino_fb_soil, c_s_m_sed_soil, \
-            c_cst_mob_no3_ove, c_cst_mob_nh4_ove, c_cst_mob_dph_ove, c_cst_mob_pph_ove, c_cst_mob_sed_ove, \
-            c_cst_mob_no3_dra, c_cst_mob_nh4_dra, c_cst_mob_dph_dra, c_cst_mob_pph_dra, c_cst_mob_sed_dra, \
-            c_cst_mob_no3_int, c_cst_mob_nh4_int, c_cst_mob_dph_int, c_cst_mob_pph_int, c_cst_mob_sed_int, \
-            c_cst_mob_no3_sgw, c_cst_mob_nh4_sgw, c_cst_mob_dph_sgw, c_cst_mob_pph_sgw, c_cst_mob_sed_sgw, \
-            c_cst_mob_no3_dgw, c_cst_mob_nh4_dgw, c_cst_mob_dph_dgw, c_cst_mob_pph_dgw, c_cst_mob_sed_dgw, \
-            c_cst_sed_daily_thr, c_cst_sed_k, c_cst_sed_p, c_cst_soil_test_p, \
-            c_cst_soil_c1n, c_cst_soil_c3n, c_cst_soil_c4n, c_cst_soil_c5n, c_cst_soil_c6n, c_cst_soil_c7n, \
-            c_cst_soil_c1p, c_cst_soil_c2p, c_cst_soil_c3p, c_cst_soil_c4p, c_cst_soil_c5p, c_cst_soil_c6p, \
-            c_cst_soil_c7p, c_cst_soil_c8p, c_cst_day_grow, c_cst_flow_tolerance, c_cst_vol_tolerance, \
-            c_cst_flow_thr_mm_for_ero_ove, c_cst_flow_thr_mm_for_ero_dra, \
-            c_p_z, c_out_q_h2o_ove, c_out_q_h2o_dra, c_out_q_h2o_int, c_out_q_h2o_sgw, c_out_q_h2o_dgw, \
-            c_s_v_h2o_ove_old, c_s_v_h2o_dra_old, c_s_v_h2o_int_old, c_s_v_h2o_sgw_old, c_s_v_h2o_dgw_old, \
-            c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw, \
-            lvl_total_start, lvl_total_end, \
-            c_pr_eff_rain_to_ove, c_pr_eff_rain_to_dra, c_pr_eff_rain_to_int, c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw
+        # # 2.0. Convert units and store internal constants
+        time_factor = time_gap_sec / 86400.0
+        if time_factor < 0.005:
+            time_factor = 0.005
 
-    @staticmethod
-    def _get_out(waterbody, datetime_time_step, dict_data_frame,
-                 c_out_c_no3_ove, c_out_c_nh4_ove, c_out_c_dph_ove, c_out_c_pph_ove, c_out_c_sed_ove,
-                 c_out_c_no3_dra, c_out_c_nh4_dra, c_out_c_dph_dra, c_out_c_pph_dra, c_out_c_sed_dra,
-                 c_out_c_no3_int, c_out_c_nh4_int, c_out_c_dph_int, c_out_c_pph_int, c_out_c_sed_int,
-                 c_out_c_no3_sgw, c_out_c_nh4_sgw, c_out_c_dph_sgw, c_out_c_pph_sgw, c_out_c_sed_sgw,
-                 c_out_c_no3_dgw, c_out_c_nh4_dgw, c_out_c_dph_dgw, c_out_c_pph_dgw, c_out_c_sed_dgw,
-                 c_out_c_no3, c_out_c_nh4, c_out_c_dph, c_out_c_pph, c_out_c_sed,
-                 c_s_c_no3_ove, c_s_c_nh4_ove, c_s_c_dph_ove, c_s_c_pph_ove, c_s_c_sed_ove,
-                 c_s_c_no3_dra, c_s_c_nh4_dra, c_s_c_dph_dra, c_s_c_pph_dra, c_s_c_sed_dra,
-                 c_s_c_no3_int, c_s_c_nh4_int, c_s_c_dph_int, c_s_c_pph_int, c_s_c_sed_int,
-                 c_s_c_no3_sgw, c_s_c_nh4_sgw, c_s_c_dph_sgw, c_s_c_pph_sgw, c_s_c_sed_sgw,
-                 c_s_c_no3_dgw, c_s_c_nh4_dgw, c_s_c_dph_dgw, c_s_c_pph_dgw, c_s_c_sed_dgw,
-                 c_s_c_no3_soil, c_s_c_nh4_soil, c_s_c_p_org_ra_soil, c_s_c_p_ino_ra_soil,
-                 c_s_m_p_org_fb_soil, c_s_m_p_ino_fb_soil, c_s_m_sed_soil):
-        """
-        This function is the interface between the model and the data models of the simulator.
-        It stores the outputs, and updated states in the data frame.
-        """
-        # store water quality outputs in data frame
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_no3_ove'] = c_out_c_no3_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_nh4_ove'] = c_out_c_nh4_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_dph_ove'] = c_out_c_dph_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_pph_ove'] = c_out_c_pph_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_sed_ove'] = c_out_c_sed_ove
-
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_no3_dra'] = c_out_c_no3_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_nh4_dra'] = c_out_c_nh4_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_dph_dra'] = c_out_c_dph_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_pph_dra'] = c_out_c_pph_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_sed_dra'] = c_out_c_sed_dra
-
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_no3_int'] = c_out_c_no3_int
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_nh4_int'] = c_out_c_nh4_int
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_dph_int'] = c_out_c_dph_int
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_pph_int'] = c_out_c_pph_int
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_sed_int'] = c_out_c_sed_int
-
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_no3_sgw'] = c_out_c_no3_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_nh4_sgw'] = c_out_c_nh4_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_dph_sgw'] = c_out_c_dph_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_pph_sgw'] = c_out_c_pph_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_sed_sgw'] = c_out_c_sed_sgw
-
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_no3_dgw'] = c_out_c_no3_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_nh4_dgw'] = c_out_c_nh4_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_dph_dgw'] = c_out_c_dph_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_pph_dgw'] = c_out_c_pph_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_sed_dgw'] = c_out_c_sed_dgw
-
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_no3'] = c_out_c_no3
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_nh4'] = c_out_c_nh4
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_dph'] = c_out_c_dph
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_pph'] = c_out_c_pph
-        dict_data_frame[waterbody][datetime_time_step]['c_out_c_sed'] = c_out_c_sed
-
-        # store water quality states in data frame
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_no3_ove'] = c_s_c_no3_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_nh4_ove'] = c_s_c_nh4_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_dph_ove'] = c_s_c_dph_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_pph_ove'] = c_s_c_pph_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_sed_ove'] = c_s_c_sed_ove
-
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_no3_dra'] = c_s_c_no3_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_nh4_dra'] = c_s_c_nh4_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_dph_dra'] = c_s_c_dph_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_pph_dra'] = c_s_c_pph_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_sed_dra'] = c_s_c_sed_dra
-
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_no3_int'] = c_s_c_no3_int
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_nh4_int'] = c_s_c_nh4_int
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_dph_int'] = c_s_c_dph_int
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_pph_int'] = c_s_c_pph_int
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_sed_int'] = c_s_c_sed_int
-
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_no3_sgw'] = c_s_c_no3_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_nh4_sgw'] = c_s_c_nh4_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_dph_sgw'] = c_s_c_dph_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_pph_sgw'] = c_s_c_pph_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_sed_sgw'] = c_s_c_sed_sgw
-
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_no3_dgw'] = c_s_c_no3_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_nh4_dgw'] = c_s_c_nh4_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_dph_dgw'] = c_s_c_dph_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_pph_dgw'] = c_s_c_pph_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_sed_dgw'] = c_s_c_sed_dgw
-
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_no3_soil'] = c_s_c_no3_soil
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_nh4_soil'] = c_s_c_nh4_soil
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_p_org_ra_soil'] = c_s_c_p_org_ra_soil
-        dict_data_frame[waterbody][datetime_time_step]['c_s_c_p_ino_ra_soil'] = c_s_c_p_ino_ra_soil
-        dict_data_frame[waterbody][datetime_time_step]['c_s_m_p_org_fb_soil'] = c_s_m_p_org_fb_soil
-        dict_data_frame[waterbody][datetime_time_step]['c_s_m_p_ino_fb_soil'] = c_s_m_p_ino_fb_soil
-        dict_data_frame[waterbody][datetime_time_step]['c_s_m_sed_soil'] = c_s_m_sed_soil
+        sediment_threshold = cst['c_cst_sed_daily_thr'] * time_factor
+        flow_threshold_for_erosion = [cst['c_cst_flow_thr_mm_for_ero_ove'], cst['c_cst_flow_thr_mm_for_ero_dra']]
+        vol_tolerance = cst['c_cst_vol_tolerance']
+
+        # # 2.2. Prepare arrays for attenuation and mobilisation factors, outflow concentrations, and updated states
+        s_c = np.array(s_c, dtype=np.float64)
+        s_soil = np.array(s_soil, dtype=np.float64)
+        att = np.clip(p_att ** time_factor, 0.0, 1.0)
+        att_soil = p_att_soil ** time_factor
+        mob = np.where((cst_mob < 0.0) | (cst_mob > 1.0), 1.0, cst_mob)
+        c_out = np.zeros((6, 5, nb_links))
+        m_mobilised = np.zeros((5, nb_links))
+        soil_dissolved = [s_soil[0], s_soil[1], s_soil[2] + s_soil[3]]
+        resets = list()
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # # 2.3. Water quality calculations
+            # # 2.3.1. & 2.3.2. Dissolved contaminants in all stores
+            for i_s, store in enumerate(['ove', 'dra', 'int', 'sgw', 'dgw']):
+                for i_c, contaminant in enumerate(['no3', 'nh4', 'dph']):
+                    c_store = s_c[i_s, i_c]
+                    c_out[i_s, i_c] = c_store
+                    m_mob = (eff_rain[i_s] / 1e3 * area_m2) * soil_dissolved[i_c] * mob[i_s, i_c]
+                    m_store = c_store * v_old[i_s] * att[i_s, i_c] + m_mob - q_out[i_s] * time_gap_sec * c_store
+                    reset = (m_store < 0.0) | (v_new[i_s] < vol_tolerance)
+                    s_c[i_s, i_c] = np.where(reset, 0.0, m_store / v_new[i_s])
+                    resets.append(((contaminant, store), reset))
+                    m_mobilised[i_c] += m_mob
+
+                if store not in ['ove', 'dra']:
+                    continue
+
+                # sediment
+                no_erosion = (eff_rain[i_s] < sediment_threshold) | (eff_rain[i_s] < flow_threshold_for_erosion[i_s])
+                m_sediment_per_area = np.where(
+                    no_erosion, 0.0, (cst['c_cst_sed_k'] * eff_rain[i_s] ** cst['c_cst_sed_p']) * time_factor)
+                m_sediment = m_sediment_per_area * area_m2
+                c_out[i_s, 4] = np.where(no_erosion, 0.0, m_sediment / (eff_rain[i_s] / 1e3 * area_m2))
+                if store == 'dra':  # mass balance (only used to report the resets, the state is set to zero)
+                    m_store = s_c[i_s, 4] * v_old[i_s] * att[i_s, 4] + m_sediment - \
+                        q_out[i_s] * time_gap_sec * c_out[i_s, 4]
+                    resets.append((('sed', store), (m_store < 0.0) | (v_new[i_s] < vol_tolerance)))
+                m_mobilised[4] += m_sediment
+                s_c[i_s, 4] = 0.0
+
+                # particulate phosphorus (firmly bound phosphorus)
+                c_store = s_c[i_s, 3]
+                m_store_att = c_store * v_old[i_s] * att[i_s, 3]
+                soil_loss = m_sediment_per_area * 1e4 * 3.1536e7 / time_gap_sec  # [kg/ha/yr]
+                p_enrichment_ratio = np.clip(np.exp(2.48 - 0.27 * np.log(soil_loss)), 0.1, 6.0)  # [-]
+                m_particulate_p = np.where(
+                    no_erosion, 0.0, cst['c_cst_soil_test_p'] * m_sediment * p_enrichment_ratio)  # [kg]
+                # try to find the PPH 'demand' from the soil firmly bound P (inorganic first, then organic)
+                from_ino = m_particulate_p <= s_soil[5]
+                m_missing = np.where(from_ino, 0.0, m_particulate_p - s_soil[5])
+                from_org = m_missing <= s_soil[4]
+                p_ino_fb = np.where(from_ino, s_soil[5] - m_particulate_p, 0.0)
+                p_org_fb = np.where(from_ino, s_soil[4], np.where(from_org, s_soil[4] - m_missing, 0.0))
+                m_missing = np.where(from_ino | from_org, 0.0, m_missing - s_soil[4])
+                s_soil[5] = np.where(no_erosion, s_soil[5], p_ino_fb)
+                s_soil[4] = np.where(no_erosion, s_soil[4], p_org_fb)
+                m_particulate_p = np.where(no_erosion, 0.0, m_particulate_p - m_missing)
+                c_out[i_s, 3] = np.where(no_erosion, 0.0, m_particulate_p / (eff_rain[i_s] / 1e3 * area_m2))
+                m_store = m_store_att + m_particulate_p - q_out[i_s] * time_gap_sec * c_out[i_s, 3]
+                reset = (m_store < 0.0) | (v_new[i_s] < vol_tolerance)
+                s_c[i_s, 3] = np.where(reset, 0.0, m_store / v_new[i_s])
+                resets.append((('pph', store), reset))
+                m_mobilised[3] += m_particulate_p
+
+            # # 2.3.3. Soil store contamination
+            vol_start = lvl_total_start / 1e3 * area_m2
+            vol_end = lvl_total_end / 1e3 * area_m2
+            reset_soil = vol_end < vol_tolerance
+            s1 = np.clip(lvl_total_end / (c_p_z * 0.275), 0.0, 1.0)  # soil moisture factor
+            s2 = seasonal_growth
+            temp_factor = 1.047 ** (c_in_temp - 20.0)
+            frozen = c_in_temp < 0.0
+            no3_soil, nh4_soil, p_org_ra_soil, p_ino_ra_soil, p_org_fb_soil, p_ino_fb_soil = s_soil[:6].copy()
+
+            # nitrate
+            pu_no3 = cst['c_cst_soil_c3n'] * temp_factor * s1 * s2  # plant uptake [-/day]
+            dn = np.where(frozen, 0.0, cst['c_cst_soil_c1n'] * temp_factor * s1)  # denitrification [-/day]
+            ni = np.where(frozen, 0.0, cst['c_cst_soil_c4n'] * temp_factor * s1 * nh4_soil * vol_start)  # [kg]
+            attenuation = np.clip(((1.0 - pu_no3 - dn) * att_soil[0]) ** time_factor, 0.0, 1.0)
+            m_soil_new = no3_soil * vol_start * attenuation + ni * time_factor + c_in_m_no3 - m_mobilised[0]
+            reset = (m_soil_new < 0.0) | reset_soil
+            s_soil[0] = np.where(reset, 0.0, m_soil_new / vol_end)
+            resets.append((('no3', 'soil'), reset))
+
+            # ammonia
+            pu_nh4 = cst['c_cst_soil_c7n'] * temp_factor * s1 * s2  # plant uptake [-/day]
+            im = np.where(frozen, 0.0, cst['c_cst_soil_c6n'] * temp_factor * s1)  # immobilisation [-/day]
+            mi = np.where(frozen, 0.0, cst['c_cst_soil_c5n'] * temp_factor * s1 * area_m2 / 1e4)  # mineralisation
+            attenuation = np.clip(((1.0 - pu_nh4 - im) * att_soil[1]) ** time_factor, 0.0, 1.0)
+            m_soil_new = nh4_soil * vol_start * attenuation + c_in_m_nh4 - (mi + ni) * time_factor - m_mobilised[1]
+            reset = (m_soil_new < 0.0) | reset_soil
+            s_soil[1] = np.where(reset, 0.0, m_soil_new / vol_end)
+            resets.append((('nh4', 'soil'), reset))
+
+            # readily available inorganic phosphorus
+            pu_p_ino_ra = cst['c_cst_soil_c6p'] * temp_factor * s1 * s2  # plant uptake [-/day]
+            pmi = cst['c_cst_soil_c3p'] * temp_factor * s1 * p_org_ra_soil * vol_start  # mineralisation [kg]
+            pim = cst['c_cst_soil_c2p'] * temp_factor * s1 * p_ino_ra_soil * vol_start  # immobilisation [kg]
+            attenuation = np.clip(((1.0 - pu_p_ino_ra) * att_soil[3]) ** time_factor, 0.0, 1.0)
+            conversion_p_ino_fb_into_ra = cst['c_cst_soil_c8p'] * p_ino_fb_soil
+            conversion_p_ino_ra_into_fb = cst['c_cst_soil_c7p'] * p_ino_ra_soil * vol_start
+            m_soil_new = p_ino_ra_soil * vol_start * attenuation + c_in_m_p_ino - 0.5 * m_mobilised[2] + \
+                (pmi - pim + conversion_p_ino_fb_into_ra - conversion_p_ino_ra_into_fb) * time_factor
+            reset = (m_soil_new < 0.0) | reset_soil
+            s_soil[3] = np.where(reset, 0.0, m_soil_new / vol_end)
+            resets.append((('p_ino_ra', 'soil'), reset))
+
+            # firmly bound inorganic phosphorus
+            attenuation = np.clip((1.0 * att_soil[5]) ** time_factor, 0.0, 1.0)
+            m_soil_new = p_ino_fb_soil * attenuation - 0.5 * m_mobilised[3] + \
+                (conversion_p_ino_ra_into_fb - conversion_p_ino_fb_into_ra) * time_factor
+            reset = (m_soil_new < 0.0) | reset_soil
+            s_soil[5] = np.where(reset, 0.0, m_soil_new)
+            resets.append((('p_ino_fb', 'soil'), reset))
+
+            # readily available organic phosphorus
+            pu_p_org_ra = cst['c_cst_soil_c1p'] * temp_factor * s1 * s2  # plant uptake
+            attenuation = np.clip(((1.0 - pu_p_org_ra) * att_soil[2]) ** time_factor, 0.0, 1.0)
+            conversion_p_org_fb_into_ra = cst['c_cst_soil_c5p'] * p_org_fb_soil
+            conversion_p_org_ra_into_fb = cst['c_cst_soil_c4p'] * p_org_ra_soil * vol_start
+            m_soil_new = p_org_ra_soil * vol_start * attenuation + c_in_m_p_org - 0.5 * m_mobilised[2] + \
+                (pim - pmi + conversion_p_org_fb_into_ra - conversion_p_org_ra_into_fb) * time_factor
+            reset = (m_soil_new < 0.0) | reset_soil
+            s_soil[2] = np.where(reset, 0.0, m_soil_new / vol_end)
+            resets.append((('p_org_ra', 'soil'), reset))
+
+            # firmly bound organic phosphorus
+            attenuation = np.clip((1.0 * att_soil[4]) ** time_factor, 0.0, 1.0)
+            m_soil_new = p_org_fb_soil * attenuation - 0.5 * m_mobilised[3] + \
+                (conversion_p_org_ra_into_fb - conversion_p_org_fb_into_ra) * time_factor
+            reset = (m_soil_new < 0.0) | reset_soil
+            s_soil[4] = np.where(reset, 0.0, m_soil_new)
+            resets.append((('p_org_fb', 'soil'), reset))
+
+            # sediment: no calculation, unlimited availability assumed
+
+            # # 2.4. Outflow concentrations for the total outflow (flow-weighted)
+            c_out_q_h2o = q_out[0] + q_out[1] + q_out[2] + q_out[3] + q_out[4]
+            for i_c in range(5):
+                m_outflow = np.zeros(nb_links)
+                for i_s in range(5):
+                    m_outflow += np.where(q_out[i_s] >= cst['c_cst_flow_tolerance'], c_out[i_s, i_c] * q_out[i_s], 0.0)
+                c_out[5, i_c] = np.where(c_out_q_h2o > 0.0, m_outflow / c_out_q_h2o, 0.0)
+
+        return c_out, s_c, s_soil, resets
 
     @staticmethod
     def _infer_parameters_from_descriptors(dict_desc):
@@ -1297,6 +1247,14 @@ class INCAc(Model):
 
         return my_dict_param
 
+    @staticmethod
+    def _infer_parameters_for_links(links, descriptors):
+        """
+        This function infers the value of the model parameters for several links at once (the parameters are
+        inferred link by link because the rules are not formulated on arrays).
+        """
+        return [INCAc._infer_parameters_from_descriptors(link.descriptors) for link in links]
+
     @staticmethod
     def _initialise_states():
         """
@@ -1306,3 +1264,20 @@ class INCAc(Model):
         """
         # currently states are not initialised, but a warm-up run can be used to start with states not null
         return {}
+
+
+def _get_seasonal_growth(covariates, day_grow):
+    """
+    This function computes the seasonal plant growth factor for all the DateTime of the given CalendarCovariates
+    object, given the index of the starting day for the growing season in the year.
+    """
+    return [0.66 + 0.34 * sin(2.0 * pi * (day_of_year - day_grow) / days_in_year)
+            for day_of_year, days_in_year in zip(covariates.day_of_year.tolist(), covariates.days_in_year.tolist())]
+
+
+def _get_array(dicts, names):
+    """
+    This function gathers the values for the given names in a list of dictionaries (one for each Link) into an
+    array of dimensions names x links.
+    """
+    return np.array([[my_dict[name] for my_dict in dicts] for name in names], dtype=np.float64)
@@ -20,9 +20,9 @@
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
 from datetime import timedelta
-from math import exp, log
 import csv
 import os
+import numpy as np
 
 try:
     import smartcpp
@@ -40,10 +40,14 @@ class SMARTc(Model):
         Model.__init__(self, category, identifier)
         # set model variables names
         self.inputs_names = ['c_in_rain', 'c_in_peva']
+        self.inputs_sources = {'c_in_rain': ('meteo', 'rain'), 'c_in_peva': ('meteo', 'peva')}
         self.parameters_names = ['c_p_t', 'c_p_c', 'c_p_h', 'c_p_d', 'c_p_s', 'c_p_z', 'c_p_sk', 'c_p_fk', 'c_p_gk']
         self.states_names = ['c_s_v_h2o_ove', 'c_s_v_h2o_dra', 'c_s_v_h2o_int', 'c_s_v_h2o_sgw', 'c_s_v_h2o_dgw',
                              'c_s_v_h2o_ly1', 'c_s_v_h2o_ly2', 'c_s_v_h2o_ly3',
                              'c_s_v_h2o_ly4', 'c_s_v_h2o_ly5', 'c_s_v_h2o_ly6']
+        self.slow_states_names = ['c_s_v_h2o_sgw', 'c_s_v_h2o_dgw',
+                                  'c_s_v_h2o_ly1', 'c_s_v_h2o_ly2', 'c_s_v_h2o_ly3',
+                                  'c_s_v_h2o_ly4', 'c_s_v_h2o_ly5', 'c_s_v_h2o_ly6']
         self.processes_names = ['c_pr_eff_rain_to_ove', 'c_pr_eff_rain_to_dra', 'c_pr_eff_rain_to_int',
                                 'c_pr_eff_rain_to_sgw', 'c_pr_eff_rain_to_dgw']
         self.outputs_names = ['c_out_aeva', 'c_out_q_h2o_ove', 'c_out_q_h2o_dra', 'c_out_q_h2o_int',
@@ -59,27 +63,33 @@ class SMARTc(Model):
         else:
             self._infer_parameters(link, catchment, outlet, output_folder)
 
+    @staticmethod
+    def set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder):
+        Model._set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder)
+
     def _infer_parameters(self, link, catchment, outlet, output_folder):
 
-        dict_for_file = self._infer_parameters_from_descriptors(link.descriptors)
+        dict_for_file = {name: float(value) for name, value in
+                         self._infer_parameters_from_descriptors(link.descriptors).items()}
 
         my_dict = dict(dict_for_file)
         dict_for_file['WaterBody'] = link.name
 
-        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                           self.identifier, self.category)):
-            with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writerow(dict_for_file)
-        else:
-            with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writeheader()
-                my_writer.writerow(dict_for_file)
+        if output_folder:  # the inferred parameters are only saved if there is an output folder
+            if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                               self.identifier, self.category)):
+                with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writerow(dict_for_file)
+            else:
+                with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writeheader()
+                    my_writer.writerow(dict_for_file)
 
         self.parameters = my_dict
         link.models_parameters.update(my_dict)
@@ -89,29 +99,53 @@ class SMARTc(Model):
         return self._initialise_states(link.descriptors, self.parameters, link.extra)
 
     def simulate(self, db, tf, step, link, logger):
+        my_bindings = self.bindings if self.bindings else self.bind(link)
+        previous = step + timedelta(minutes=-tf.simu_gap)
+        my_frame = db.simulation[link.name][step]
 
-        self._simulate(link.name, step, tf.simu_gap,
-                       self.parameters,
-                       db.simulation, link.descriptors, db.meteo,
-                       logger)
-
-    def _simulate(self, waterbody, datetime_time_step, time_gap,
-                  dict_param,
-                  dict_data_frame, dict_desc, dict_meteo,
-                  logger):
-
-        smart_in = self._get_in(waterbody, datetime_time_step, time_gap,
-                                dict_data_frame, dict_desc, dict_param, dict_meteo)
+        # bring in model constants, inputs, parameter values, and states
+        smart_in = \
+            (my_bindings.area, tf.simu_gap * 60.0) + \
+            my_bindings.get_inputs(db, step, previous) + \
+            my_bindings.get_parameters(self.parameters) + \
+            my_bindings.get_states(db.simulation[link.name][previous])
 
         if smart_in_cpp:
             smart_out = smartcpp.onestep_c(*smart_in)
         else:
-            smart_out = self._run(waterbody, datetime_time_step, logger, *smart_in)
+            smart_out = self._run(link.name, step, self.diagnostics, *smart_in)
+
+        # store outputs (with total outflow), updated states, and process variables in data frame
+        my_bindings.set_outputs(my_frame, tuple(smart_out[0:6]) + (sum(smart_out[1:6]),))
+        my_bindings.set_states(my_frame, smart_out[6:17])
+        my_bindings.set_processes(my_frame, smart_out[17:22])
+
+    def simulate_slice(self, db, tf, timeslice, link, logger):
+        my_bindings = self.bindings if self.bindings else self.bind(link)
+        my_frames = db.simulation[link.name]
 
-        self._get_out(waterbody, datetime_time_step, dict_data_frame, *smart_out)
+        # bring in model constants and parameter values (constant over the slice), and initial states
+        my_constants = (my_bindings.area, tf.simu_gap * 60.0)
+        my_parameters = my_bindings.get_parameters(self.parameters)
+        my_states = my_bindings.get_states(my_frames[timeslice[0]])
+
+        for previous, step in zip(timeslice[:-1], timeslice[1:]):
+            my_frame = my_frames[step]
+            smart_in = my_constants + my_bindings.get_inputs(db, step, previous) + my_parameters + my_states
+
+            if smart_in_cpp:
+                smart_out = smartcpp.onestep_c(*smart_in)
+            else:
+                smart_out = self._run(link.name, step, self.diagnostics, *smart_in)
+
+            # store outputs (with total outflow), updated states, and process variables in data frame
+            my_states = tuple(smart_out[6:17])
+            my_bindings.set_outputs(my_frame, tuple(smart_out[0:6]) + (sum(smart_out[1:6]),))
+            my_bindings.set_states(my_frame, my_states)
+            my_bindings.set_processes(my_frame, smart_out[17:22])
 
     @staticmethod
-    def _run(waterbody, datetime_time_step, logger,
+    def _run(waterbody, datetime_time_step, diagnostics,
              area_m2, time_gap_sec,
              c_in_rain, c_in_peva,
              c_p_t, c_p_c, c_p_h, c_p_d, c_p_s, c_p_z, c_p_sk, c_p_fk, c_p_gk,
@@ -285,41 +319,36 @@ class SMARTc(Model):
         c_out_q_h2o_ove = c_s_v_h2o_ove / c_p_sk  # [m3/s]
         c_s_v_h2o_ove += (c_pr_eff_rain_to_ove / 1e3 * area_m2) - (c_out_q_h2o_ove * time_gap_sec)  # [m3] - [m3]
         if c_s_v_h2o_ove < 0.0:
-            logger.debug(''.join([
-                'SMART # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                ' - Volume in OVE Store has gone negative, volume reset to zero.']))
+            diagnostics.record(waterbody, 'SMART # Volume in OVE Store has gone negative, volume reset to zero.',
+                               datetime_time_step)
             c_s_v_h2o_ove = 0.0
         # route drain flow (quick interflow runoff)
         c_out_q_h2o_dra = c_s_v_h2o_dra / c_p_sk  # [m3/s]
         c_s_v_h2o_dra += (c_pr_eff_rain_to_dra / 1e3 * area_m2) - (c_out_q_h2o_dra * time_gap_sec)  # [m3] - [m3]
         if c_s_v_h2o_dra < 0.0:
-            logger.debug(''.join([
-                'SMART # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                ' - Volume in DRA Store has gone negative, volume reset to zero.']))
+            diagnostics.record(waterbody, 'SMART # Volume in DRA Store has gone negative, volume reset to zero.',
+                               datetime_time_step)
             c_s_v_h2o_dra = 0.0
         # route interflow (slow interflow runoff)
         c_out_q_h2o_int = c_s_v_h2o_int / c_p_fk  # [m3/s]
         c_s_v_h2o_int += (c_pr_eff_rain_to_int / 1e3 * area_m2) - (c_out_q_h2o_int * time_gap_sec)  # [m3] - [m3]
         if c_s_v_h2o_int < 0.0:
-            logger.debug(''.join([
-                'SMART # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                ' - Volume in INT Store has gone negative, volume reset to zero.']))
+            diagnostics.record(waterbody, 'SMART # Volume in INT Store has gone negative, volume reset to zero.',
+                               datetime_time_step)
             c_s_v_h2o_int = 0.0
         # route shallow groundwater flow (slow shallow GW runoff)
         c_out_q_h2o_sgw = c_s_v_h2o_sgw / c_p_gk  # [m3/s]
         c_s_v_h2o_sgw += (c_pr_eff_rain_to_sgw / 1e3 * area_m2) - (c_out_q_h2o_sgw * time_gap_sec)  # [m3] - [m3]
         if c_s_v_h2o_sgw < 0.0:
-            logger.debug(''.join([
-                'SMART # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                ' - Volume in SGW Store has gone negative, volume reset to zero.']))
+            diagnostics.record(waterbody, 'SMART # Volume in SGW Store has gone negative, volume reset to zero.',
+                               datetime_time_step)
             c_s_v_h2o_sgw = 0.0
         # route deep groundwater flow (slow deep GW runoff)
         c_out_q_h2o_dgw = c_s_v_h2o_dgw / c_p_gk  # [m3/s]
         c_s_v_h2o_dgw += (c_pr_eff_rain_to_dgw / 1e3 * area_m2) - (c_out_q_h2o_dgw * time_gap_sec)  # [m3] - [m3]
         if c_s_v_h2o_dgw < 0.0:
-            logger.debug(''.join([
-                'SMART # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                ' - Volume in DGW Store has gone negative, volume reset to zero.']))
+            diagnostics.record(waterbody, 'SMART # Volume in DGW Store has gone negative, volume reset to zero.',
+                               datetime_time_step)
             c_s_v_h2o_dgw = 0.0
 
         # # 1.3. Returns outputs, updated states, and internal process variables
@@ -330,117 +359,13 @@ class SMARTc(Model):
             dict_lvl_lyr[4] / 1e3 * area_m2, dict_lvl_lyr[5] / 1e3 * area_m2, dict_lvl_lyr[6] / 1e3 * area_m2, \
             c_pr_eff_rain_to_ove, c_pr_eff_rain_to_dra, c_pr_eff_rain_to_int, c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw
 
-    @staticmethod
-    def _get_in(waterbody, datetime_time_step, time_gap_min,
-                dict_data_frame, dict_desc, dict_param, dict_meteo):
-        """
-        This function is the interface between the data models of the simulator and the model.
-        It provides the inputs, parameters, processes, and states to the model.
-        It also saves the inputs into the data frame.
-        It can only return a tuple of scalar variables.
-        """
-        # bring in model constants
-        area_m2 = dict_desc['area']
-        time_gap_sec = time_gap_min * 60.0
-
-        # bring in model inputs
-        c_in_rain = dict_meteo[waterbody]['rain'][datetime_time_step]
-        c_in_peva = dict_meteo[waterbody]['peva'][datetime_time_step]
-        # store input in data frame
-        dict_data_frame[waterbody][datetime_time_step]['c_in_rain'] = c_in_rain
-        dict_data_frame[waterbody][datetime_time_step]['c_in_peva'] = c_in_peva
-
-        # bring in model parameter values
-        c_p_t = dict_param['c_p_t']
-        c_p_c = dict_param['c_p_c']
-        c_p_h = dict_param['c_p_h']
-        c_p_d = dict_param['c_p_d']
-        c_p_s = dict_param['c_p_s']
-        c_p_z = dict_param['c_p_z']
-        c_p_sk = dict_param['c_p_sk']
-        c_p_fk = dict_param['c_p_fk']
-        c_p_gk = dict_param['c_p_gk']
-
-        # bring in model states
-        c_s_v_h2o_ove = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_ove']
-        c_s_v_h2o_dra = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_dra']
-        c_s_v_h2o_int = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_int']
-        c_s_v_h2o_sgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_sgw']
-        c_s_v_h2o_dgw = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_dgw']
-        c_s_v_h2o_ly1 = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_ly1']
-        c_s_v_h2o_ly2 = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_ly2']
-        c_s_v_h2o_ly3 = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_ly3']
-        c_s_v_h2o_ly4 = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_ly4']
-        c_s_v_h2o_ly5 = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_ly5']
-        c_s_v_h2o_ly6 = \
-            dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_s_v_h2o_ly6']
-
-        # return constants, model inputs, model parameter values, and model states
-        return \
-            area_m2, time_gap_sec, \
-            c_in_rain, c_in_peva, \
-            c_p_t, c_p_c, c_p_h, c_p_d, c_p_s, c_p_z, c_p_sk, c_p_fk, c_p_gk, \
-            c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw, \
-            c_s_v_h2o_ly1, c_s_v_h2o_ly2, c_s_v_h2o_ly3, c_s_v_h2o_ly4, c_s_v_h2o_ly5, c_s_v_h2o_ly6
-
-    @staticmethod
-    def _get_out(waterbody, datetime_time_step, dict_data_frame,
-                 c_out_aeva, c_out_q_h2o_ove, c_out_q_h2o_dra, c_out_q_h2o_int, c_out_q_h2o_sgw, c_out_q_h2o_dgw,
-                 c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw,
-                 c_s_v_h2o_ly1, c_s_v_h2o_ly2, c_s_v_h2o_ly3, c_s_v_h2o_ly4, c_s_v_h2o_ly5, c_s_v_h2o_ly6,
-                 c_pr_eff_rain_to_ove, c_pr_eff_rain_to_dra, c_pr_eff_rain_to_int,
-                 c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw):
-        """
-        This function is the interface between the model and the data models of the simulator.
-        It stores the outputs, updated states, and processed in the data frame.
-        """
-        # calculate total outflow (total runoff)
-        c_out_q_h2o = c_out_q_h2o_ove + c_out_q_h2o_dra + c_out_q_h2o_int + c_out_q_h2o_sgw + c_out_q_h2o_dgw  # [m3/s]
-        # store outputs in data frame
-        dict_data_frame[waterbody][datetime_time_step]['c_out_aeva'] = c_out_aeva
-        dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_ove'] = c_out_q_h2o_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_dra'] = c_out_q_h2o_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_int'] = c_out_q_h2o_int
-        dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_sgw'] = c_out_q_h2o_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o_dgw'] = c_out_q_h2o_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_out_q_h2o'] = c_out_q_h2o
-
-        # store states in data frame
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ove'] = c_s_v_h2o_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_dra'] = c_s_v_h2o_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_int'] = c_s_v_h2o_int
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_sgw'] = c_s_v_h2o_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_dgw'] = c_s_v_h2o_dgw
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly1'] = c_s_v_h2o_ly1
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly2'] = c_s_v_h2o_ly2
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly3'] = c_s_v_h2o_ly3
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly4'] = c_s_v_h2o_ly4
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly5'] = c_s_v_h2o_ly5
-        dict_data_frame[waterbody][datetime_time_step]['c_s_v_h2o_ly6'] = c_s_v_h2o_ly6
-
-        # store process variables in data frame
-        dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_ove'] = c_pr_eff_rain_to_ove
-        dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_dra'] = c_pr_eff_rain_to_dra
-        dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_int'] = c_pr_eff_rain_to_int
-        dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_sgw'] = c_pr_eff_rain_to_sgw
-        dict_data_frame[waterbody][datetime_time_step]['c_pr_eff_rain_to_dgw'] = c_pr_eff_rain_to_dgw
-
     @staticmethod
     def _infer_parameters_from_descriptors(dict_desc):
         """
         This function infers the value of the model parameters from catchment descriptors
         using regression relationships developed for EPA Pathways Project by Dr. Eva Mockler
         (using equations available in CMT Fortran code by Prof. Michael Bruen and Dr. Eva Mockler).
+        The descriptors can be given as scalars (for one link) or as arrays (for several links at once).
         """
         my_dict_param = dict()
 
@@ -448,43 +373,34 @@ class SMARTc(Model):
         my_dict_param['c_p_t'] = 1.0  # set to 1 because rainfall value assumed to be best estimate if no calibration
 
         # Parameter C: Evaporation decay parameter
-        my_dict_param['c_p_c'] = log((9.04064 * dict_desc['SAAR'] ** (-0.71009) *
-                                      dict_desc['Q.mm'] ** 0.57326 *
-                                      dict_desc['FLATWET'] ** (-0.75321) *
-                                      (dict_desc['AlluvMIN'] + 1.0) ** (-3.3778) *
-                                      (dict_desc['FOREST'] + 1.0) ** (-0.71328) *
-                                      ((dict_desc['Pu'] + dict_desc['Pl']) ** 0.5 + 1.0) ** 0.22084) -
-                                     1.0)
-
-        if my_dict_param['c_p_c'] < 0.1:
-            my_dict_param['c_p_c'] = 0.1
-        elif my_dict_param['c_p_c'] > 1.0:
-            my_dict_param['c_p_c'] = 1.0
+        my_dict_param['c_p_c'] = np.log((9.04064 * dict_desc['SAAR'] ** (-0.71009) *
+                                         dict_desc['Q.mm'] ** 0.57326 *
+                                         dict_desc['FLATWET'] ** (-0.75321) *
+                                         (dict_desc['AlluvMIN'] + 1.0) ** (-3.3778) *
+                                         (dict_desc['FOREST'] + 1.0) ** (-0.71328) *
+                                         ((dict_desc['Pu'] + dict_desc['Pl']) ** 0.5 + 1.0) ** 0.22084) -
+                                        1.0)
+
+        my_dict_param['c_p_c'] = np.clip(my_dict_param['c_p_c'], 0.1, 1.0)
 
         # Parameter H: Quick runoff coefficient
-        my_dict_param['c_p_h'] = log((2.7886 * dict_desc['DRAIND'] ** 0.15655 *
-                                      dict_desc['WtdReCoMod'] ** 0.03626 *
-                                      (dict_desc['PoorDrain'] + 1.0) ** (-0.08069) *
-                                      (dict_desc['Water'] ** 0.25 + 1.0) ** 0.10238 *
-                                      (dict_desc['ModP'] + 1.0) ** (-0.14992) *
-                                      ((dict_desc['Rkc'] + dict_desc['Rk']) + 1.0) ** (-0.14598) *
-                                      ((dict_desc['Pu'] + dict_desc['Pl']) ** 0.5 + 1.0) ** (-0.17896) *
-                                      ((dict_desc['Lg'] + dict_desc['Rg']) ** 0.5 + 1.0) ** 0.22405) -
-                                     1.0)
-
-        if my_dict_param['c_p_h'] < 0.0:
-            my_dict_param['c_p_h'] = 0.0
-        elif my_dict_param['c_p_h'] > 1.0:
-            my_dict_param['c_p_h'] = 1.0
+        my_dict_param['c_p_h'] = np.log((2.7886 * dict_desc['DRAIND'] ** 0.15655 *
+                                         dict_desc['WtdReCoMod'] ** 0.03626 *
+                                         (dict_desc['PoorDrain'] + 1.0) ** (-0.08069) *
+                                         (dict_desc['Water'] ** 0.25 + 1.0) ** 0.10238 *
+                                         (dict_desc['ModP'] + 1.0) ** (-0.14992) *
+                                         ((dict_desc['Rkc'] + dict_desc['Rk']) + 1.0) ** (-0.14598) *
+                                         ((dict_desc['Pu'] + dict_desc['Pl']) ** 0.5 + 1.0) ** (-0.17896) *
+                                         ((dict_desc['Lg'] + dict_desc['Rg']) ** 0.5 + 1.0) ** 0.22405) -
+                                        1.0)
+
+        my_dict_param['c_p_h'] = np.clip(my_dict_param['c_p_h'], 0.0, 1.0)
 
         # Parameter D: Drain flow parameter - fraction of saturation excess diverted to drain flow
         drain_eff_factor = 0.6
         my_dict_param['c_p_d'] = dict_desc['land_drain_ratio'] * drain_eff_factor
 
-        if my_dict_param['c_p_d'] < 0.0:
-            my_dict_param['c_p_d'] = 0.0
-        elif my_dict_param['c_p_d'] > 1.0:
-            my_dict_param['c_p_d'] = 1.0
+        my_dict_param['c_p_d'] = np.clip(my_dict_param['c_p_d'], 0.0, 1.0)
 
         # Parameter S: Soil outflow coefficient
         my_dict_param['c_p_s'] = 8.61144e-14 * dict_desc['SAAR'] ** 3.207 * \
@@ -496,12 +412,9 @@ class SMARTc(Model):
             (dict_desc['HighP'] ** 0.5 + 1.0) ** (-6.206) * \
             ((dict_desc['Rkd'] + dict_desc['Lk']) + 1.0) ** 1.553 * \
             ((dict_desc['Lm'] + dict_desc['Rf']) + 1.0) ** 4.251 * \
-            exp(dict_desc['Ll']) ** (-1.186)
+            np.exp(dict_desc['Ll']) ** (-1.186)
 
-        if my_dict_param['c_p_s'] < 0.0:
-            my_dict_param['c_p_s'] = 0.0
-        elif my_dict_param['c_p_s'] > 1.0:
-            my_dict_param['c_p_s'] = 1.0
+        my_dict_param['c_p_s'] = np.clip(my_dict_param['c_p_s'], 0.0, 1.0)
 
         # Parameter Z: Effective soil depth (mm)
         my_dict_param['c_p_z'] = 9183325.942 * dict_desc['SAAR'] ** (-1.8501) * \
@@ -511,7 +424,7 @@ class SMARTc(Model):
             (dict_desc['URBEXT'] ** 0.5 + 1.0) ** (-5.6337) * \
             (dict_desc['HighP'] ** 0.5 + 1.0) ** 3.0505 * \
             ((dict_desc['Lm'] + dict_desc['Rf']) + 1.0) ** (-2.1927) * \
-            exp(dict_desc['Ll']) ** 0.5544 + \
+            np.exp(dict_desc['Ll']) ** 0.5544 + \
             1.0
 
         # Parameter SK: Surface routing parameter (hours)
@@ -547,11 +460,22 @@ class SMARTc(Model):
             dict_desc['SAAR'] * (-5.379) + \
             dict_desc['WtdReCoMod'] * dict_desc['SAAR'] * 41.68
 
-        if my_dict_param['c_p_gk'] < 0.3 * my_dict_param['c_p_fk']:
-            my_dict_param['c_p_gk'] = 3.0 * my_dict_param['c_p_fk']
+        my_dict_param['c_p_gk'] = np.where(my_dict_param['c_p_gk'] < 0.3 * my_dict_param['c_p_fk'],
+                                           3.0 * my_dict_param['c_p_fk'], my_dict_param['c_p_gk'])
 
         return my_dict_param
 
+    @staticmethod
+    def _infer_parameters_for_links(links, descriptors):
+        """
+        This function infers the value of the model parameters for several links at once from their descriptors
+        given as columns (arrays in the order of the links).
+        """
+        my_columns = SMARTc._infer_parameters_from_descriptors(descriptors)
+        my_columns = {name: np.broadcast_to(my_columns[name], (len(links),)).tolist() for name in my_columns}
+
+        return [{name: my_columns[name][i] for name in my_columns} for i in range(len(links))]
+
     @staticmethod
     def _initialise_states(dict_desc, dict_param, kwa):
         """
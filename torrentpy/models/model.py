@@ -19,9 +19,12 @@
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
 from logging import getLogger
-from csv import DictReader
+from csv import DictReader, DictWriter
+from operator import itemgetter
+import os
 
-from ..inout import open_csv_rb
+from ..inout import open_csv_rb, open_csv_wb, open_csv_ab
+from ..diagnostics import Diagnostics
 
 
 class Model(object):
@@ -38,6 +41,8 @@ class Model(object):
         self.constants_names = list()
         # list of the names for the states of the Model
         self.states_names = list()
+        # list of the names for the states of the Model that are slow to reach equilibrium (used for spin-up)
+        self.slow_states_names = list()
         # list of the names for the processes of the Model
         self.processes_names = list()
         # list of the names for the outputs of the Model
@@ -46,14 +51,57 @@ class Model(object):
         self.parameters = None
         # dict of values for the constants of the Model
         self.constants = None
+        # dict of the sources of the inputs of the Model {key: input name, value: (source, variable name)}, where
+        # source is 'meteo' or 'contamination' (for the Link at the current time step) or 'node_up' (for the Node
+        # upstream of the Link at the previous time step)
+        self.inputs_sources = dict()
+        # list of the names for the parameters of other Models of the Link needed by the Model
+        self.inherited_parameters_names = list()
+        # list of the names for the states of other Models of the Link needed by the Model (at the previous and
+        # current time steps)
+        self.inherited_states_names = list()
+        # list of the names for the inputs, processes, or outputs of other Models of the Link needed by the Model
+        # (at the current time step)
+        self.inherited_fluxes_names = list()
         # reference to the Link object it works on
         self.link = None
+        # Bindings object giving access to the values of the Model for the Link (set the first time it is needed)
+        self.bindings = None
+        # ModelFilesStore object shared by the Models to read their parameters and constants files (None if not shared)
+        self.store = None
+        # Diagnostics object counting the events reported by the Model during the simulation (shared by the Models
+        # of a Network once they are assigned to its Links)
+        self.diagnostics = Diagnostics()
+
+    def __getstate__(self):
+        # the Bindings are not pickled with the Model (their accessors cannot be), they are built again when needed
+        my_state = dict(self.__dict__)
+        my_state['bindings'] = None
+
+        return my_state
+
+    def bind(self, link):
+        """
+        This method binds the Model to the Link it works on, i.e. it builds the accessors to the values the Model
+        reads from and writes to the data structures of the simulator, using the names declared by the Model
+        (inputs, parameters, constants, states, processes, outputs, and the ones inherited from other Models).
+
+        :param link: Link object the Model works on
+        :type link: Link
+        :return: Bindings object for the Model and the Link
+        :rtype: Bindings
+        """
+        self.link = link
+        self.bindings = Bindings(self, link)
+
+        return self.bindings
 
     def _set_constants_with_file(self, input_folder):
         """
         This method get the list of the names for the constants of the Model in its specification file in the
         specifications folder. Then, the methods reads the constants values in the constant file for the Model located
-        in the specifications folder.
+        in the specifications folder. The file is read through the ModelFilesStore of the Model (if any), so that it is
+        only read once for all the Models sharing the store.
 
         :param input_folder: path to the input folder where to find the constants file
         :return: dictionary containing the constants names and values
@@ -61,33 +109,17 @@ class Model(object):
         """
         logger = getLogger('TORRENTpy.md')
         if self.constants_names:
-            try:
-                my_dict = dict()
-                with open_csv_rb('{}{}.constants'.format(input_folder, self.identifier)) as my_file:
-                    my_reader = DictReader(my_file)
-                    for row in my_reader:
-                        try:
-                            if row['ConstantName'] in self.constants_names:
-                                try:
-                                    my_dict[row['ConstantName']] = float(row['ConstantValue'])
-                                except KeyError:
-                                    logger.error(
-                                        "The column header 'ConstantValue' is not present in the constants file.")
-                                    raise Exception(
-                                        "The column header 'ConstantValue' is not present in the constants file.")
-                        except KeyError:
-                            logger.error("The column header 'ConstantName' is not present in the constants file.")
-                            raise Exception("The column header 'ConstantName' is not present in the constants file.")
-                    for name in self.constants_names:
-                        if name not in my_dict:
-                            logger.error("The constant {} is not available for {}.".format(name, self.identifier))
-                            raise Exception("The constant {} is not available for {}.".format(name, self.identifier))
-
-                self.constants = my_dict
-
-            except IOError:
-                logger.error("{}{}.constants does not exist.".format(input_folder, self.identifier))
-                raise Exception("{}{}.constants does not exist.".format(input_folder, self.identifier))
+            my_store = self.store if self.store else ModelFilesStore()
+            my_constants = my_store.get_constants('{}{}.constants'.format(input_folder, self.identifier))
+            my_dict = dict()
+            for name in self.constants_names:
+                try:
+                    my_dict[name] = float(my_constants[name])
+                except KeyError:
+                    logger.error("The constant {} is not available for {}.".format(name, self.identifier))
+                    raise Exception("The constant {} is not available for {}.".format(name, self.identifier))
+
+            self.constants = my_dict
 
     def _set_parameters_with_file(self, link, catchment, outlet, input_folder):
         """
@@ -95,7 +127,8 @@ class Model(object):
         specifications folder. Then, the methods reads the parameters values in the parameter file for the Model located
         in the input folder. If this file does not exist, it uses the descriptors of the catchment that owns the Model
         in order to infer the parameters from the descriptors. In any case, it saves the parameters used in a file in
-        the output folder.
+        the output folder. The file is read through the ModelFilesStore of the Model (if any), so that it is only read
+        once for all the Models sharing the store.
 
         :param input_folder: path to the specification folder where to find the parameter file
         :return: dictionary containing the constants names and values
@@ -103,33 +136,268 @@ class Model(object):
         """
         logger = getLogger('TORRENTpy.md')
         if self.parameters_names:
+            my_store = self.store if self.store else ModelFilesStore()
+            my_rows = my_store.get_parameters(
+                '{}{}_{}.{}{}.parameters'.format(input_folder, catchment, outlet, self.identifier, self.category),
+                self)
             try:
-                my_dict = dict()
-                with open_csv_rb(
-                        '{}{}_{}.{}{}.parameters'.format(
-                            input_folder, catchment, outlet, self.identifier, self.category)) as my_file:
-                    my_reader = DictReader(my_file)
-                    found = False
-                    for row in my_reader:
-                        if row['WaterBody'] == link.name:
-                            found = True
-                            for name in self.parameters_names:
-                                try:
-                                    my_dict[name] = float(row[name])
-                                except KeyError:
-                                    logger.error("The {}{} parameter {} is not available for {}.".format(
-                                        self.identifier, self.category, name, link.name))
-                                    raise Exception("The {}{} parameter {} is not available for {}.".format(
-                                        self.identifier, self.category, name, link.name))
-                    if not found:
-                        logger.error(
-                            "The WaterBody {} is not available in the parameters file.".format(link.name))
-                        raise Exception(
-                            "The WaterBody {} is not available in the parameters file.".format(link.name))
-
-                self.parameters = my_dict
+                my_row = my_rows[link.name]
+            except KeyError:
+                logger.error(
+                    "The WaterBody {} is not available in the parameters file.".format(link.name))
+                raise Exception(
+                    "The WaterBody {} is not available in the parameters file.".format(link.name))
+            my_dict = {name: float(my_row[name]) for name in self.parameters_names}
+
+            self.parameters = my_dict
+            link.models_parameters.update(my_dict)
+
+    @staticmethod
+    def _set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder):
+        """
+        This method sets the parameters of several Models of the same class at once (one for each Link). If the
+        parameters file exists in the input folder, the parameters are read from it. Otherwise, they are inferred
+        for all the Links at once using the method '_infer_parameters_for_links' of the class of the Models, and they
+        are saved in the output folder in one write (if there is one).
+
+        :param models: list of Model objects of the same class (one for each Link, in the same order as the Links)
+        :type models: list
+        :param links: list of Link objects
+        :type links: list
+        :param descriptors: descriptors of the Links as columns {key: descriptor name, value: array (one per Link)}
+        :type descriptors: dict
+        """
+        my_model = models[0]
+        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(
+                input_folder, catchment, outlet, my_model.identifier, my_model.category)):
+            for model, link in zip(models, links):
+                model._set_parameters_with_file(link, catchment, outlet, input_folder)
+        else:
+            my_rows = type(my_model)._infer_parameters_for_links(links, descriptors)
+            if output_folder:  # the inferred parameters are only saved if there is an output folder
+                my_model._write_parameters_file(links, my_rows, catchment, outlet, output_folder)
+            for model, link, my_dict in zip(models, links, my_rows):
+                model.parameters = my_dict
                 link.models_parameters.update(my_dict)
 
-            except IOError:
-                logger.error("{}{}.parameters does not exist.".format(input_folder, self.identifier))
-                raise Exception("{}{}.parameters does not exist.".format(input_folder, self.identifier))
+    def _write_parameters_file(self, links, rows, catchment, outlet, output_folder):
+        """
+        This method writes the parameters of the Model for the given Links in the parameters file in the output
+        folder (appending to it if it already exists).
+
+        :param links: list of Link objects
+        :type links: list
+        :param rows: list of the parameters for each Link [{key: parameter name, value: parameter value}]
+        :type rows: list
+        """
+        my_file_path = '{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                        self.identifier, self.category)
+        my_exists = os.path.isfile(my_file_path)
+        with (open_csv_ab(my_file_path) if my_exists else open_csv_wb(my_file_path)) as my_file:
+            my_writer = DictWriter(my_file, fieldnames=['WaterBody'] + self.parameters_names)
+            if not my_exists:
+                my_writer.writeheader()
+            for link, my_dict in zip(links, rows):
+                my_row = dict(my_dict)
+                my_row['WaterBody'] = link.name
+                my_writer.writerow(my_row)
+
+
+class ModelFilesStore(object):
+    """
+    This class reads the parameters files and the constants files of the Models, and keeps their contents so that
+    each file is only read once for all the Models (and all the Links) sharing the store (typically all the Models of
+    a Network). The parameters are indexed by WaterBody.
+    """
+    def __init__(self, expected_waterbodies=None):
+        # dict of the names of the WaterBody expected in each parameters file, used to report all the missing rows
+        # at once {key: (model identifier, model category), value: list of WaterBody}
+        self.expected_waterbodies = expected_waterbodies if expected_waterbodies else dict()
+        # contents of the files already read {key: file path, value: contents}
+        self._parameters = dict()
+        self._constants = dict()
+
+    def get_parameters(self, file_path, model):
+        """
+        This method returns the parameters values in the given parameters file for all the WaterBody. The file is
+        only read the first time. The WaterBody featuring more than once, the parameters missing for the Model,
+        and the WaterBody expected for the Model (see attribute 'expected_waterbodies') but missing are all reported
+        in one go.
+
+        :param file_path: path to the parameters file
+        :type file_path: str
+        :param model: Model object the parameters file is for
+        :type model: Model
+        :return: dictionary {key: WaterBody, value: {key: column header, value: value as read in the file}}
+        :rtype: dict
+        """
+        logger = getLogger('TORRENTpy.md')
+        try:
+            return self._parameters[file_path]
+        except KeyError:
+            pass
+
+        my_rows = dict()
+        my_duplicates = list()
+        try:
+            with open_csv_rb(file_path) as my_file:
+                my_reader = DictReader(my_file)
+                my_missing = [name for name in ['WaterBody'] + model.parameters_names
+                              if name not in (my_reader.fieldnames or [])]
+                if my_missing:
+                    logger.error("The {}{} parameters {} are not available in {}.".format(
+                        model.identifier, model.category, my_missing, file_path))
+                    raise Exception("The {}{} parameters {} are not available in {}.".format(
+                        model.identifier, model.category, my_missing, file_path))
+                for row in my_reader:
+                    if row['WaterBody'] in my_rows:
+                        my_duplicates.append(row['WaterBody'])
+                    my_rows[row['WaterBody']] = row
+        except IOError:
+            logger.error("{} does not exist.".format(file_path))
+            raise Exception("{} does not exist.".format(file_path))
+
+        if my_duplicates:
+            logger.error("The WaterBody {} feature more than once in {}.".format(sorted(set(my_duplicates)), file_path))
+            raise Exception("The WaterBody {} feature more than once in {}.".format(
+                sorted(set(my_duplicates)), file_path))
+        my_missing = [waterbody for waterbody in self.expected_waterbodies.get((model.identifier, model.category), [])
+                      if waterbody not in my_rows]
+        if my_missing:
+            logger.error("The WaterBody {} are not available in {}.".format(my_missing, file_path))
+            raise Exception("The WaterBody {} are not available in {}.".format(my_missing, file_path))
+
+        self._parameters[file_path] = my_rows
+
+        return my_rows
+
+    def get_constants(self, file_path):
+        """
+        This method returns the constants values in the given constants file. The file is only read the first time.
+
+        :param file_path: path to the constants file
+        :type file_path: str
+        :return: dictionary {key: constant name, value: constant value as read in the file}
+        :rtype: dict
+        """
+        logger = getLogger('TORRENTpy.md')
+        try:
+            return self._constants[file_path]
+        except KeyError:
+            pass
+
+        my_dict = dict()
+        try:
+            with open_csv_rb(file_path) as my_file:
+                my_reader = DictReader(my_file)
+                for row in my_reader:
+                    try:
+                        my_name = row['ConstantName']
+                    except KeyError:
+                        logger.error("The column header 'ConstantName' is not present in the constants file.")
+                        raise Exception("The column header 'ConstantName' is not present in the constants file.")
+                    try:
+                        my_dict[my_name] = row['ConstantValue']
+                    except KeyError:
+                        logger.error("The column header 'ConstantValue' is not present in the constants file.")
+                        raise Exception("The column header 'ConstantValue' is not present in the constants file.")
+        except IOError:
+            logger.error("{} does not exist.".format(file_path))
+            raise Exception("{} does not exist.".format(file_path))
+
+        self._constants[file_path] = my_dict
+
+        return my_dict
+
+
+class Bindings(object):
+    """
+    This class holds the accessors to the values that a Model reads from and writes to the data structures of the
+    simulator for a given Link. The accessors are built once from the names declared by the Model, so that the
+    values are gathered and stored all at once at each time step rather than one name at a time.
+    """
+    def __init__(self, model, link):
+        logger = getLogger('TORRENTpy.md')
+        self.waterbody = link.name
+        # name of the Node upstream of the Link
+        self.node_up = link.connections[1]
+        # area of the catchment of the Link (None if the Link has no descriptors)
+        self.area = link.get_descriptor('area')
+        # inputs: list of (source, variable name) in the order of the names of the inputs
+        self._inputs = list()
+        for name in model.inputs_names:
+            my_source = model.inputs_sources.get(name, (None, None))
+            if my_source[0] not in ['meteo', 'contamination', 'node_up']:
+                logger.error("The source of the input {} of {}{} is not valid.".format(
+                    name, model.identifier, model.category))
+                raise Exception("The source of the input {} of {}{} is not valid.".format(
+                    name, model.identifier, model.category))
+            self._inputs.append(my_source)
+        # names of the values stored at each time step
+        self.inputs_names = tuple(model.inputs_names)
+        self.states_names = tuple(model.states_names)
+        self.processes_names = tuple(model.processes_names)
+        self.outputs_names = tuple(model.outputs_names)
+        # accessors to the values read at each time step
+        self.get_parameters = _get_getter(model.parameters_names)
+        self.get_constants = _get_getter(model.constants_names)
+        self.get_states = _get_getter(model.states_names)
+        self.get_inherited_parameters = _get_getter(model.inherited_parameters_names)
+        self.get_inherited_states = _get_getter(model.inherited_states_names)
+        self.get_inherited_fluxes = _get_getter(model.inherited_fluxes_names)
+
+    def get_inputs(self, db, step, previous):
+        """
+        This method gathers the inputs of the Model for the Link at the given time step, and stores them in the
+        data frame of the Link.
+
+        :param db: DataBase object containing the input data and the simulation data frames
+        :type db: DataBase
+        :param step: DateTime of the current time step
+        :type step: datetime.datetime
+        :param previous: DateTime of the previous time step
+        :type previous: datetime.datetime
+        :return: tuple of the values of the inputs (in the order of the names of the inputs)
+        :rtype: tuple
+        """
+        my_inputs = list()
+        for source, variable in self._inputs:
+            if source == 'node_up':
+                my_inputs.append(db.simulation[self.node_up][previous][variable])
+            else:
+                my_inputs.append(getattr(db, source)[self.waterbody][variable][step])
+        db.simulation[self.waterbody][step].update(zip(self.inputs_names, my_inputs))
+
+        return tuple(my_inputs)
+
+    def set_states(self, frame, values):
+        """
+        This method stores the given values of the states in the given data frame (for one time step).
+        """
+        frame.update(zip(self.states_names, values))
+
+    def set_processes(self, frame, values):
+        """
+        This method stores the given values of the processes in the given data frame (for one time step).
+        """
+        frame.update(zip(self.processes_names, values))
+
+    def set_outputs(self, frame, values):
+        """
+        This method stores the given values of the outputs in the given data frame (for one time step).
+        """
+        frame.update(zip(self.outputs_names, values))
+
+
+def _get_getter(names):
+    """
+    This function returns a callable that extracts the values for the given names from a dictionary as a tuple
+    (an empty tuple if there is no name, a 1-element tuple if there is only one name).
+    """
+    if not names:
+        return lambda my_dict: ()
+    elif len(names) == 1:
+        my_name = names[0]
+        return lambda my_dict: (my_dict[my_name],)
+    else:
+        return itemgetter(*names)
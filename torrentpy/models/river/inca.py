@@ -22,20 +22,34 @@
 from datetime import timedelta
 import os
 import csv
+import numpy as np
 
 from ..model import Model
 from ...inout import open_csv_wb, open_csv_ab
 
+# messages of the events recorded in the Diagnostics (the details are the determinands concerned)
+_INFLOW_LOW = 'INCAS # Inflow to River Store too low, inflow concentrations set to zero.'
+_VOLUME_LOW = 'INCAS # Volume in River Store too low, in-store contaminant quantities and outflow concentrations ' \
+              'set to zero.'
+_STORE_RESET = 'INCAS # Quantity has gone negative in River Store, quantity reset to zero'
+_OUTFLOW_LOW = 'INCAS # Volume/Flow in River Store too low, outflow concentration set to zero'
+
 
 class INCAr(Model):
     def __init__(self, category, identifier):
         Model.__init__(self, category, identifier)
         # set model variables names
         self.inputs_names = ['r_in_temp', 'r_in_c_no3', 'r_in_c_nh4', 'r_in_c_dph', 'r_in_c_pph', 'r_in_c_sed']
+        self.inputs_sources = {'r_in_temp': ('meteo', 'airt'), 'r_in_c_no3': ('node_up', 'c_no3'),
+                               'r_in_c_nh4': ('node_up', 'c_nh4'), 'r_in_c_dph': ('node_up', 'c_dph'),
+                               'r_in_c_pph': ('node_up', 'c_pph'), 'r_in_c_sed': ('node_up', 'c_sed')}
         self.parameters_names = ['r_p_att_no3', 'r_p_att_nh4', 'r_p_att_dph', 'r_p_att_pph', 'r_p_att_sed']
         self.states_names = ['r_s_m_no3', 'r_s_m_nh4', 'r_s_m_dph', 'r_s_m_pph', 'r_s_m_sed']
         self.constants_names = ['r_cst_c_dn', 'r_cst_c_ni', 'r_cst_flow_tolerance', 'r_cst_vol_tolerance']
         self.outputs_names = ['r_out_c_no3', 'r_out_c_nh4', 'r_out_c_dph', 'r_out_c_pph', 'r_out_c_sed']
+        # set variables names inherited from the hydrological model
+        self.inherited_states_names = ['r_s_v_h2o']
+        self.inherited_fluxes_names = ['r_in_q_h2o', 'r_out_q_h2o']
 
     def set_constants(self, input_folder):
         self._set_constants_with_file(input_folder)
@@ -47,6 +61,10 @@ class INCAr(Model):
         else:
             self._infer_parameters(link, catchment, outlet, output_folder)
 
+    @staticmethod
+    def set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder):
+        Model._set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder)
+
     def _infer_parameters(self, link, catchment, outlet, output_folder):
 
         dict_for_file = self._infer_parameters_from_descriptors()
@@ -54,20 +72,21 @@ class INCAr(Model):
         my_dict = dict(dict_for_file)
         dict_for_file['WaterBody'] = link.name
 
-        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                           self.identifier, self.category)):
-            with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writerow(dict_for_file)
-        else:
-            with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writeheader()
-                my_writer.writerow(dict_for_file)
+        if output_folder:  # the inferred parameters are only saved if there is an output folder
+            if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                               self.identifier, self.category)):
+                with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writerow(dict_for_file)
+            else:
+                with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writeheader()
+                    my_writer.writerow(dict_for_file)
 
         self.parameters = my_dict
         link.models_parameters.update(my_dict)
@@ -77,28 +96,90 @@ class INCAr(Model):
         return self._initialise_states()
 
     def simulate(self, db, tf, step, link, logger):
+        my_bindings = self.bindings if self.bindings else self.bind(link)
+        previous = step + timedelta(minutes=-tf.simu_gap)
+        my_frame_prev = db.simulation[link.name][previous]
+        my_frame = db.simulation[link.name][step]
 
-        self._simulate(link.name, link.connections,
-                       step, tf.simu_gap,
-                       self.parameters, self.constants,
-                       db.simulation, db.meteo,
-                       logger)
+        # bring in variables originating from the hydrological model
+        r_in_q_h2o, r_out_q_h2o = my_bindings.get_inherited_fluxes(my_frame)
 
-    def _simulate(self, waterbody, connections,
-                  datetime_time_step, time_gap,
-                  dict_param, dict_const,
-                  dict_data_frame, dict_meteo,
-                  logger):
+        # bring in constants, model inputs, parameter values, states, and constants + hydrology inheritance
+        inca_in = \
+            (tf.simu_gap * 60.0,) + \
+            my_bindings.get_inputs(db, step, previous) + \
+            my_bindings.get_parameters(self.parameters) + \
+            my_bindings.get_states(my_frame_prev) + \
+            my_bindings.get_constants(self.constants) + \
+            (r_in_q_h2o,) + my_bindings.get_inherited_states(my_frame_prev) + \
+            my_bindings.get_inherited_states(my_frame) + (r_out_q_h2o,)
 
-        inca_in = self._get_in(connections, waterbody, datetime_time_step, time_gap,
-                               dict_data_frame, dict_param, dict_meteo, dict_const)
+        inca_out = self._run(link.name, step, self.diagnostics, *inca_in)
 
-        inca_out = self._run(waterbody, datetime_time_step, logger, *inca_in)
+        # store outputs and updated states in data frame
+        my_bindings.set_outputs(my_frame, inca_out[0:5])
+        my_bindings.set_states(my_frame, inca_out[5:10])
 
-        self._get_out(waterbody, datetime_time_step, dict_data_frame, *inca_out)
+    @staticmethod
+    def simulate_links(models, db, tf, step, links, logger):
+        """
+        This method runs the Model for several Links at once for a given time step (e.g. all the river Links of a
+        level of the Network when it runs by slice). The determinands (NO3, NH4, DPH, PPH, SED) of all the Links are
+        gathered in arrays (determinands x links) so that the calculations are vectorised across the determinands and
+        the Links. The results are the same as running 'simulate' Link by Link.
+
+        :param models: list of INCAr objects (one for each Link, in the same order as the Links)
+        :type models: list
+        :param db: DataBase object containing the simulation data frames and the input data
+        :type db: DataBase
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param step: DateTime of the time step to simulate
+        :type step: datetime.datetime
+        :param links: list of Link objects to simulate
+        :type links: list
+        :param logger: logger to use for the simulation messages
+        :type logger: logging.Logger
+        """
+        determinands = ['no3', 'nh4', 'dph', 'pph', 'sed']
+        previous = step + timedelta(minutes=-tf.simu_gap)
+        my_frames_prev = [db.simulation[link.name][previous] for link in links]
+        my_frames = [db.simulation[link.name][step] for link in links]
+        my_params = [model.parameters for model in models]
+        my_consts = [model.constants for model in models]
+
+        # bring in inputs (temperature, concentrations at inlet) and store them in data frames
+        my_inputs = np.array([(model.bindings if model.bindings else model.bind(link)).get_inputs(db, step, previous)
+                              for model, link in zip(models, links)], dtype=np.float64).T
+
+        # bring in parameters, states, and constants (determinands x links, or links)
+        p_att = _get_array(my_params, ['r_p_att_{}'.format(d) for d in determinands])
+        s_m = _get_array(my_frames_prev, ['r_s_m_{}'.format(d) for d in determinands])
+        cst_c_dn, cst_c_ni, cst_flow_tolerance, cst_vol_tolerance = _get_array(my_consts, models[0].constants_names)
+
+        # bring in hydrology states and fluxes necessary for water quality model
+        q_in, q_out = _get_array(my_frames, ['r_in_q_h2o', 'r_out_q_h2o'])
+        v_old = _get_array(my_frames_prev, ['r_s_v_h2o'])[0]
+        v_new = _get_array(my_frames, ['r_s_v_h2o'])[0]
+
+        c_out, s_m, events = INCAr._run_links(
+            tf.simu_gap * 60.0, my_inputs[0], my_inputs[1:], p_att, s_m, cst_c_dn, cst_c_ni,
+            cst_flow_tolerance, cst_vol_tolerance, q_in, v_old, v_new, q_out)
+
+        # count the events (identical to the ones of the scalar implementation)
+        diagnostics = models[0].diagnostics
+        for my_event, my_mask in events:
+            for i in np.flatnonzero(my_mask):
+                diagnostics.record(links[i].name, my_event, step)
+
+        # store water quality outputs and states in data frames
+        my_names = ['r_out_c_{}'.format(d) for d in determinands] + ['r_s_m_{}'.format(d) for d in determinands]
+        my_values = np.concatenate([c_out, s_m]).T.tolist()
+        for my_frame, my_link_values in zip(my_frames, my_values):
+            my_frame.update(zip(my_names, my_link_values))
 
     @staticmethod
-    def _run(waterbody, datetime_time_step, logger,
+    def _run(waterbody, datetime_time_step, diagnostics,
              time_gap_sec,
              r_in_temp,
              r_in_c_no3, r_in_c_nh4, r_in_c_dph, r_in_c_pph, r_in_c_sed,
@@ -167,8 +248,7 @@ class INCAr(Model):
 
         # check if inflow negligible, if so set all concentrations to zero
         if r_in_q_h2o < r_cst_flow_tolerance:
-            logger.debug(''.join(['INCAS # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - Inflow to River Store too low, inflow concentrations set to zero.']))
+            diagnostics.record(waterbody, _INFLOW_LOW, datetime_time_step)
             r_in_c_no3 = 0.0
             r_in_c_nh4 = 0.0
             r_in_c_dph = 0.0
@@ -176,9 +256,7 @@ class INCAr(Model):
             r_in_c_sed = 0.0
         # check if storage negligible, if so set all quantities to zero, all out concentrations to zero
         if r_s_v_h2o_old < r_cst_vol_tolerance:
-            logger.debug(''.join(['INCAS # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - Volume in River Store too low, in-store contaminant quantities '
-                                  'and outflow concentrations set to zero.']))
+            diagnostics.record(waterbody, _VOLUME_LOW, datetime_time_step)
             r_s_m_no3 = 0.0
             r_s_m_nh4 = 0.0
             r_s_m_dph = 0.0
@@ -215,15 +293,13 @@ class INCAr(Model):
             r_s_m_no3 = r_s_m_no3_old + rni - rdn + \
                 ((r_in_c_no3 * r_in_q_h2o) - (concentration_no3 * r_out_q_h2o)) * time_gap_sec
             if r_s_m_no3 < 0.0:
-                logger.debug(''.join(['INCAS # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                      ' - NO3 Quantity has gone negative in River Store, quantity reset to zero.']))
+                diagnostics.record(waterbody, (_STORE_RESET, 'no3'), datetime_time_step)
                 r_s_m_no3 = 0.0
             # calculate outflow concentration
             if (r_s_v_h2o > r_cst_vol_tolerance) and (r_out_q_h2o > r_cst_flow_tolerance):
                 r_out_c_no3 = r_s_m_no3 / r_s_v_h2o
             else:
-                logger.debug(''.join(['INCAS # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                      ' - Volume/Flow in River Store too low, outflow NO3 concentration set to zero.']))
+                diagnostics.record(waterbody, (_OUTFLOW_LOW, 'no3'), datetime_time_step)
                 r_out_c_no3 = 0.0
 
             # # 2.1.2. Ammonia NH4
@@ -239,8 +315,7 @@ class INCAr(Model):
             if (r_s_v_h2o > r_cst_vol_tolerance) and (r_out_q_h2o > r_cst_flow_tolerance):
                 r_out_c_nh4 = r_s_m_nh4 / r_s_v_h2o
             else:
-                logger.debug(''.join(['INCAS # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                      ' - Volume/Flow in River Store too low, outflow NH4 concentration set to zero.']))
+                diagnostics.record(waterbody, (_OUTFLOW_LOW, 'nh4'), datetime_time_step)
                 r_out_c_nh4 = 0.0
 
             # # 2.1.3. Dissolved phosphorus DPH
@@ -257,8 +332,7 @@ class INCAr(Model):
             if (r_s_v_h2o > r_cst_vol_tolerance) and (r_out_q_h2o > r_cst_flow_tolerance):
                 r_out_c_dph = r_s_m_dph / r_s_v_h2o
             else:
-                logger.debug(''.join(['INCAS # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                      ' - Volume/Flow in River Store too low, outflow DPH concentration set to zero.']))
+                diagnostics.record(waterbody, (_OUTFLOW_LOW, 'dph'), datetime_time_step)
                 r_out_c_dph = 0.0
 
             # # 2.1.4. Particulate phosphorus PPH
@@ -275,8 +349,7 @@ class INCAr(Model):
             if (r_s_v_h2o > r_cst_vol_tolerance) and (r_out_q_h2o > r_cst_flow_tolerance):
                 r_out_c_pph = r_s_m_pph / r_s_v_h2o
             else:
-                logger.debug(''.join(['INCAS # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                      ' - Volume/Flow in River Store too low, outflow PPH concentration set to zero.']))
+                diagnostics.record(waterbody, (_OUTFLOW_LOW, 'pph'), datetime_time_step)
                 r_out_c_pph = 0.0
 
             # # 2.1.5. Sediments SED
@@ -293,8 +366,7 @@ class INCAr(Model):
             if (r_s_v_h2o > r_cst_vol_tolerance) and (r_out_q_h2o > r_cst_flow_tolerance):
                 r_out_c_sed = r_s_m_sed / r_s_v_h2o
             else:
-                logger.debug(''.join(['INCAS # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                      ' - Volume/Flow in River Store too low, outflow SED concentration set to zero.']))
+                diagnostics.record(waterbody, (_OUTFLOW_LOW, 'sed'), datetime_time_step)
                 r_out_c_sed = 0.0
 
         # # 2.2. Return outputs and updated states
@@ -303,93 +375,69 @@ class INCAr(Model):
             r_s_m_no3, r_s_m_nh4, r_s_m_dph, r_s_m_pph, r_s_m_sed
 
     @staticmethod
-    def _get_in(connections, waterbody, datetime_time_step, time_gap_min,
-                dict_data_frame, dict_param, dict_meteo, dict_const):
+    def _run_links(time_gap_sec, r_in_temp, r_in_c, r_p_att, r_s_m, r_cst_c_dn, r_cst_c_ni,
+                   r_cst_flow_tolerance, r_cst_vol_tolerance, r_in_q_h2o, r_s_v_h2o_old, r_s_v_h2o, r_out_q_h2o):
         """
-        This function is the interface between the data models of the simulator and the model.
-        It provides the inputs, parameters, processes, and states to the model.
-        It also saves the inputs into the data frame.
-        It can only return a tuple of scalar variables.
+        This function is the vectorised equivalent of the function '_run' for several Links at once. The determinands
+        are ordered as ['no3', 'nh4', 'dph', 'pph', 'sed'], and nitrification and denitrification are treated as
+        transfers between the determinands (NH4 to NO3, and NO3 out of the store, respectively).
+
+        :param time_gap_sec: time gap between two simulation time steps [seconds]
+        :param r_in_temp: water temperature [degree celsius] (links)
+        :param r_in_c: concentrations at inlet [kg/m3] determinands x links
+        :param r_p_att: daily attenuation factors [-] determinands x links
+        :param r_s_m: quantities in store at the beginning of the time step [kg] determinands x links
+        :param r_cst_c_dn: denitrification rate constant [-] (links)
+        :param r_cst_c_ni: nitrification rate constant [-] (links)
+        :param r_cst_flow_tolerance: minimum flow to consider equal to no flow [m3/s] (links)
+        :param r_cst_vol_tolerance: minimum volume to consider equal to empty [m3] (links)
+        :param r_in_q_h2o: flow at inlet [m3/s] (links)
+        :param r_s_v_h2o_old: volume in store at the beginning of the time step [m3] (links)
+        :param r_s_v_h2o: volume in store at the end of the time step [m3] (links)
+        :param r_out_q_h2o: flow at outlet [m3/s] (links)
+        :return: outflow concentrations determinands x links, quantities in store at the end of the time step
+            determinands x links, and list of the events [(event, boolean mask over the links)]
         """
-        # find the node that is the input for the waterbody
-        node_up = connections[1]
-
-        # convert constants
-        time_gap_sec = time_gap_min * 60.0
-
-        # bring in water quality river model inputs
-        r_in_temp = dict_meteo[waterbody]['airt'][datetime_time_step]
-        r_in_c_no3 = dict_data_frame[node_up][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_no3']
-        r_in_c_nh4 = dict_data_frame[node_up][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_nh4']
-        r_in_c_dph = dict_data_frame[node_up][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_dph']
-        r_in_c_pph = dict_data_frame[node_up][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_pph']
-        r_in_c_sed = dict_data_frame[node_up][datetime_time_step + timedelta(minutes=-time_gap_min)]['c_sed']
-        # store water quality inputs in data frame
-        dict_data_frame[waterbody][datetime_time_step]['r_in_temp'] = r_in_temp
-        dict_data_frame[waterbody][datetime_time_step]['r_in_c_no3'] = r_in_c_no3
-        dict_data_frame[waterbody][datetime_time_step]['r_in_c_nh4'] = r_in_c_nh4
-        dict_data_frame[waterbody][datetime_time_step]['r_in_c_dph'] = r_in_c_dph
-        dict_data_frame[waterbody][datetime_time_step]['r_in_c_pph'] = r_in_c_pph
-        dict_data_frame[waterbody][datetime_time_step]['r_in_c_sed'] = r_in_c_sed
-
-        # bring in water quality river model parameters
-        r_p_att_no3 = dict_param['r_p_att_no3']
-        r_p_att_nh4 = dict_param['r_p_att_nh4']
-        r_p_att_dph = dict_param['r_p_att_dph']
-        r_p_att_pph = dict_param['r_p_att_pph']
-        r_p_att_sed = dict_param['r_p_att_sed']
-
-        # bring in water quality river model states
-        r_s_m_no3 = dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['r_s_m_no3']
-        r_s_m_nh4 = dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['r_s_m_nh4']
-        r_s_m_dph = dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['r_s_m_dph']
-        r_s_m_pph = dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['r_s_m_pph']
-        r_s_m_sed = dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['r_s_m_sed']
-
-        # bring in water quality river model constants
-        r_cst_c_dn = dict_const['r_cst_c_dn']
-        r_cst_c_ni = dict_const['r_cst_c_ni']
-        r_cst_flow_tolerance = dict_const['r_cst_flow_tolerance']
-        r_cst_vol_tolerance = dict_const['r_cst_vol_tolerance']
-
-        # bring in variables originating from the hydrological model
-        r_in_q_h2o = dict_data_frame[waterbody][datetime_time_step]['r_in_q_h2o']
-        r_s_v_h2o_old = dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['r_s_v_h2o']
-        r_s_v_h2o = dict_data_frame[waterbody][datetime_time_step]['r_s_v_h2o']
-        r_out_q_h2o = dict_data_frame[waterbody][datetime_time_step]['r_out_q_h2o']
-
-        # return constants, model inputs, model parameter values, model states, model constants + hydrology inheritance
-        return \
-            time_gap_sec, \
-            r_in_temp, \
-            r_in_c_no3, r_in_c_nh4, r_in_c_dph, r_in_c_pph, r_in_c_sed, \
-            r_p_att_no3, r_p_att_nh4, r_p_att_dph, r_p_att_pph, r_p_att_sed, \
-            r_s_m_no3, r_s_m_nh4, r_s_m_dph, r_s_m_pph, r_s_m_sed, \
-            r_cst_c_dn, r_cst_c_ni, r_cst_flow_tolerance, r_cst_vol_tolerance, \
-            r_in_q_h2o, r_s_v_h2o_old, r_s_v_h2o, r_out_q_h2o
+        events = list()
 
-    @staticmethod
-    def _get_out(waterbody, datetime_time_step, dict_data_frame,
-                 r_out_c_no3, r_out_c_nh4, r_out_c_dph, r_out_c_pph, r_out_c_sed,
-                 r_s_m_no3, r_s_m_nh4, r_s_m_dph, r_s_m_pph, r_s_m_sed
-                 ):
-        """
-        This function is the interface between the model and the data models of the simulator.
-        It stores the outputs, and updated states in the data frame.
-        """
-        # store water quality river model outputs in data frame
-        dict_data_frame[waterbody][datetime_time_step]['r_out_c_no3'] = r_out_c_no3
-        dict_data_frame[waterbody][datetime_time_step]['r_out_c_nh4'] = r_out_c_nh4
-        dict_data_frame[waterbody][datetime_time_step]['r_out_c_dph'] = r_out_c_dph
-        dict_data_frame[waterbody][datetime_time_step]['r_out_c_pph'] = r_out_c_pph
-        dict_data_frame[waterbody][datetime_time_step]['r_out_c_sed'] = r_out_c_sed
-
-        # store water quality river model states in data frame
-        dict_data_frame[waterbody][datetime_time_step]['r_s_m_no3'] = r_s_m_no3
-        dict_data_frame[waterbody][datetime_time_step]['r_s_m_nh4'] = r_s_m_nh4
-        dict_data_frame[waterbody][datetime_time_step]['r_s_m_dph'] = r_s_m_dph
-        dict_data_frame[waterbody][datetime_time_step]['r_s_m_pph'] = r_s_m_pph
-        dict_data_frame[waterbody][datetime_time_step]['r_s_m_sed'] = r_s_m_sed
+        # check if inflow negligible, if so set all concentrations to zero
+        low_inflow = r_in_q_h2o < r_cst_flow_tolerance
+        events.append((_INFLOW_LOW, low_inflow))
+        r_in_c = np.where(low_inflow, 0.0, r_in_c)
+        # check if storage negligible, if so set all quantities to zero, all out concentrations to zero
+        empty = r_s_v_h2o_old < r_cst_vol_tolerance
+        events.append((_VOLUME_LOW, empty))
+
+        # calculate concentrations in store at beginning of time step
+        concentration = r_s_m / np.where(empty, 1.0, r_s_v_h2o_old)
+        # nitrification and denitrification rate constants (zero if frozen, between 0 and 1 otherwise)
+        frozen = r_in_temp < 0.0
+        correction = 1.047 ** (r_in_temp - 20.0)
+        c10 = np.where(frozen, 0.0, np.clip(r_cst_c_ni * correction, 0.0, 1.0))
+        c11 = np.where(frozen, 0.0, np.clip(r_cst_c_dn * correction, 0.0, 1.0))
+        rni = c10 * r_s_m[1]  # nitrification rate [kg]
+        rdn = c11 * r_s_m[0]  # denitrification rate [kg]
+        zeros = np.zeros(rni.shape)
+        gains = np.array([rni, zeros, zeros, zeros, zeros])  # NH4 nitrified into NO3
+        losses = np.array([rdn, rni, zeros, zeros, zeros])  # NO3 denitrified, NH4 nitrified
+        # update of amounts in store
+        r_s_m = r_s_m + gains - losses + ((r_in_c * r_in_q_h2o) - (concentration * r_out_q_h2o)) * time_gap_sec
+        negative = r_s_m < 0.0
+        events.append(((_STORE_RESET, 'no3'), negative[0] & ~empty))
+        r_s_m = np.where(negative, 0.0, r_s_m)
+        # apply attenuation factor to store (only for phosphorus and sediments)
+        r_s_m = r_s_m * np.concatenate([np.ones((2, rni.size)), r_p_att[2:]])
+        # calculate outflow concentrations
+        flowing = (r_s_v_h2o > r_cst_vol_tolerance) & (r_out_q_h2o > r_cst_flow_tolerance)
+        r_out_c = np.where(flowing, r_s_m / np.where(flowing, r_s_v_h2o, 1.0), 0.0)
+        for determinand in ['no3', 'nh4', 'dph', 'pph', 'sed']:
+            events.append(((_OUTFLOW_LOW, determinand), ~flowing & ~empty))
+
+        # set all quantities and out concentrations to zero if storage negligible
+        r_s_m = np.where(empty, 0.0, r_s_m)
+        r_out_c = np.where(empty, 0.0, r_out_c)
+
+        return r_out_c, r_s_m, events
 
     @staticmethod
     def _infer_parameters_from_descriptors():
@@ -409,6 +457,16 @@ class INCAr(Model):
 
         return my_dict_param
 
+    @staticmethod
+    def _infer_parameters_for_links(links, descriptors):
+        """
+        This function infers the value of the model parameters for several links at once (the parameters do not
+        depend on the descriptors of the links).
+        """
+        my_dict_param = INCAr._infer_parameters_from_descriptors()
+
+        return [dict(my_dict_param) for link in links]
+
     @staticmethod
     def _initialise_states():
         """
@@ -418,3 +476,11 @@ class INCAr(Model):
         """
         # currently states are not initialised, but a warm-up run can be used to start with states not null
         return {}
+
+
+def _get_array(dicts, names):
+    """
+    This function gathers the values for the given names in a list of dictionaries (one for each Link) into an
+    array of dimensions names x links.
+    """
+    return np.array([[my_dict[name] for my_dict in dicts] for name in names], dtype=np.float64)
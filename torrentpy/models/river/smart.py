@@ -22,6 +22,7 @@
 from datetime import timedelta
 import os
 import csv
+import numpy as np
 
 try:
     import smartcpp
@@ -39,6 +40,7 @@ class SMARTr(Model):
         Model.__init__(self, category, identifier)
         # set model variables names
         self.inputs_names = ['r_in_q_h2o']
+        self.inputs_sources = {'r_in_q_h2o': ('node_up', 'q_h2o')}
         self.parameters_names = ['r_p_rk']
         self.states_names = ['r_s_v_h2o']
         self.outputs_names = ['r_out_q_h2o']
@@ -53,6 +55,10 @@ class SMARTr(Model):
         else:
             self._infer_parameters(link, catchment, outlet, output_folder)
 
+    @staticmethod
+    def set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder):
+        Model._set_parameters_for_links(models, links, descriptors, catchment, outlet, input_folder, output_folder)
+
     def _infer_parameters(self, link, catchment, outlet, output_folder):
 
         dict_for_file = self._infer_parameters_from_descriptors(link.descriptors)
@@ -60,20 +66,21 @@ class SMARTr(Model):
         my_dict = dict(dict_for_file)
         dict_for_file['WaterBody'] = link.name
 
-        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                           self.identifier, self.category)):
-            with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writerow(dict_for_file)
-        else:
-            with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writeheader()
-                my_writer.writerow(dict_for_file)
+        if output_folder:  # the inferred parameters are only saved if there is an output folder
+            if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                               self.identifier, self.category)):
+                with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writerow(dict_for_file)
+            else:
+                with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writeheader()
+                    my_writer.writerow(dict_for_file)
 
         self.parameters = my_dict
         link.models_parameters.update(my_dict)
@@ -83,31 +90,51 @@ class SMARTr(Model):
         return self._initialise_states(link.descriptors, self.parameters, link.extra)
 
     def simulate(self, db, tf, step, link, logger):
+        my_bindings = self.bindings if self.bindings else self.bind(link)
+        previous = step + timedelta(minutes=-tf.simu_gap)
+        my_frame = db.simulation[link.name][step]
 
-        self._simulate(link.name, link.connections,
-                       step, tf.simu_gap,
-                       self.parameters,
-                       db.simulation,
-                       logger)
-
-    def _simulate(self, waterbody, connections,
-                  datetime_time_step, time_gap,
-                  dict_param,
-                  dict_data_frame,
-                  logger):
-
-        smart_in = self._get_in(connections, waterbody, datetime_time_step, time_gap,
-                                dict_data_frame, dict_param)
+        # bring in model constants, inputs, parameter values, and states
+        smart_in = \
+            (tf.simu_gap * 60.0,) + \
+            my_bindings.get_inputs(db, step, previous) + \
+            my_bindings.get_parameters(self.parameters) + \
+            my_bindings.get_states(db.simulation[link.name][previous])
 
         if smart_in_cpp:
             smart_out = smartcpp.onestep_r(*smart_in)
         else:
-            smart_out = self._run(waterbody, datetime_time_step, logger, *smart_in)
+            smart_out = self._run(link.name, step, self.diagnostics, *smart_in)
+
+        # store outputs and updated states in data frame
+        my_bindings.set_outputs(my_frame, smart_out[0:1])
+        my_bindings.set_states(my_frame, smart_out[1:2])
+
+    def simulate_slice(self, db, tf, timeslice, link, logger):
+        my_bindings = self.bindings if self.bindings else self.bind(link)
+        my_frames = db.simulation[link.name]
+
+        # bring in model constants and parameter values (constant over the slice), and initial states
+        my_constants = (tf.simu_gap * 60.0,)
+        my_parameters = my_bindings.get_parameters(self.parameters)
+        my_states = my_bindings.get_states(my_frames[timeslice[0]])
 
-        self._get_out(waterbody, datetime_time_step, dict_data_frame, *smart_out)
+        for previous, step in zip(timeslice[:-1], timeslice[1:]):
+            my_frame = my_frames[step]
+            smart_in = my_constants + my_bindings.get_inputs(db, step, previous) + my_parameters + my_states
+
+            if smart_in_cpp:
+                smart_out = smartcpp.onestep_r(*smart_in)
+            else:
+                smart_out = self._run(link.name, step, self.diagnostics, *smart_in)
+
+            # store outputs and updated states in data frame
+            my_states = tuple(smart_out[1:2])
+            my_bindings.set_outputs(my_frame, smart_out[0:1])
+            my_bindings.set_states(my_frame, my_states)
 
     @staticmethod
-    def _run(waterbody, datetime_time_step, logger,
+    def _run(waterbody, datetime_time_step, diagnostics,
              time_gap_sec,
              r_in_q_h2o, r_p_rk, r_s_v_h2o):
         """
@@ -144,9 +171,8 @@ class SMARTr(Model):
         r_s_v_h2o_temp = r_s_v_h2o_old + (r_in_q_h2o - r_out_q_h2o) * time_gap_sec
         # check if storage has gone negative
         if r_s_v_h2o_temp < 0.0:  # temporary cannot be used
-            logger.debug(''.join(['LINRES # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
-                                  ' - Volume in River Store has gone negative, '
-                                  'outflow constrained to 95% of what is in store.']))
+            diagnostics.record(waterbody, 'LINRES # Volume in River Store has gone negative, outflow constrained to 95%'
+                                          ' of what is in store.', datetime_time_step)
             # constrain outflow: allow maximum outflow at 95% of what was in store
             r_out_q_h2o = 0.95 * (r_in_q_h2o + r_s_v_h2o_old / time_gap_sec)
             # calculate final storage with constrained outflow
@@ -158,55 +184,13 @@ class SMARTr(Model):
         return \
             r_out_q_h2o, r_s_v_h2o
 
-    @staticmethod
-    def _get_in(connections, waterbody, datetime_time_step, time_gap_min,
-                dict_data_frame, dict_param):
-        """
-        This function is the interface between the data models of the simulator and the model.
-        It provides the inputs, parameters, processes, and states to the model.
-        It also saves the inputs into the data frame.
-        It can only return a tuple of scalar variables.
-        """
-        # find the node that is the input for the waterbody
-        node_up = connections[1]
-
-        # convert constants
-        time_gap_sec = time_gap_min * 60.0
-
-        # bring in model inputs
-        r_in_q_h2o = dict_data_frame[node_up][datetime_time_step + timedelta(minutes=-time_gap_min)]['q_h2o']
-        # store input in data frame
-        dict_data_frame[waterbody][datetime_time_step]['r_in_q_h2o'] = r_in_q_h2o
-
-        # bring in model parameter values
-        r_p_rk = dict_param['r_p_rk']
-
-        # bring in model states
-        r_s_v_h2o = dict_data_frame[waterbody][datetime_time_step + timedelta(minutes=-time_gap_min)]['r_s_v_h2o']
-
-        # return constants, model inputs, model parameter values, and model states
-        return \
-            time_gap_sec, \
-            r_in_q_h2o, r_p_rk, r_s_v_h2o
-
-    @staticmethod
-    def _get_out(waterbody, datetime_time_step, dict_data_frame,
-                 r_out_q_h2o, r_s_v_h2o):
-        """
-        This function is the interface between the model and the data models of the simulator.
-        It stores the outputs, and updated states in the data frame.
-        """
-        # store outputs in data frame
-        dict_data_frame[waterbody][datetime_time_step]['r_out_q_h2o'] = r_out_q_h2o
-        # store states in data frame
-        dict_data_frame[waterbody][datetime_time_step]['r_s_v_h2o'] = r_s_v_h2o
-
     @staticmethod
     def _infer_parameters_from_descriptors(dict_desc):
         """
         This function infers the value of the model parameters from catchment descriptors
         using regression relationships developed for EPA Pathways Project by Dr. Eva Mockler
         (using equations available in CMT Fortran code by Prof. Michael Bruen and Dr. Eva Mockler).
+        The descriptors can be given as scalars (for one link) or as arrays (for several links at once).
         """
         my_dict_param = dict()
         # Parameter RK: River routing parameter (hours)
@@ -217,6 +201,17 @@ class SMARTr(Model):
 
         return my_dict_param
 
+    @staticmethod
+    def _infer_parameters_for_links(links, descriptors):
+        """
+        This function infers the value of the model parameters for several links at once from their descriptors
+        given as columns (arrays in the order of the links).
+        """
+        my_columns = SMARTr._infer_parameters_from_descriptors(descriptors)
+        my_columns = {name: np.broadcast_to(my_columns[name], (len(links),)).tolist() for name in my_columns}
+
+        return [{name: my_columns[name][i] for name in my_columns} for i in range(len(links))]
+
     @staticmethod
     def _initialise_states(dict_desc, dict_param, kwa):
         """
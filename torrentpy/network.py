@@ -23,19 +23,34 @@ from logging import getLogger
 import os
 import csv
 from glob import glob
+from collections import deque
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # Python 2
+    from collections import MutableMapping
 from datetime import timedelta
-from builtins import zip
+from builtins import zip, range
+from timeit import default_timer
+import numpy as np
 
 from .inout import create_simulation_files, update_simulation_files, open_csv_rb
+from .diagnostics import Diagnostics
+from .models.model import ModelFilesStore
+from .profiling import Instrumentation, ModelProfiler
+from .results import SimulationResults
+from .states import get_warm_up_key, get_slow_states, get_maximum_relative_change, load_states, save_states, \
+    save_snapshot
 
 
 class Network(object):
     """
     This class defines all the constituting parts of a catchment models as a node-link network, as well as the
-    different relationships between the nodes and the links, and the characteristics of the links.
+    different relationships between the nodes and the links, and the characteristics of the links. The Network can
+    be restricted to the part of the catchment upstream of a given Node or Link (parameter 'upstream_of'), so that
+    only the Links needed for the results at this location are simulated (and have their inputs loaded).
     """
     def __init__(self, catchment, outlet, in_fld, out_fld,
-                 variable_h, variables_q=None, verbose=True, water_quality=False):
+                 variable_h, variables_q=None, verbose=True, water_quality=False, upstream_of=None):
         # identifier for the catchment
         self.catchment = catchment
         # identifier for the catchment outlet
@@ -43,8 +58,11 @@ class Network(object):
         # path of the folders and files necessary to generate the Network object
         self.in_fld = in_fld
         self.out_fld = out_fld
-        # clean it up the output folder if it already exists, otherwise create it
-        if os.path.exists(out_fld):
+        # clean it up the output folder if it already exists, otherwise create it (no output folder if None is given,
+        # e.g. to simulate in memory only)
+        if out_fld is None:
+            pass
+        elif os.path.exists(out_fld):
             for ext in [".parameters", ".node*", ".inputs*", ".outputs*", ".states*"]:
                 my_files = glob("{}{}*{}".format(out_fld, catchment, ext))
                 for my_file in my_files:
@@ -55,20 +73,29 @@ class Network(object):
         self.network_file = '{}{}_{}.network'.format(in_fld, catchment, outlet)
         self.waterbodies_file = '{}{}_{}.waterbodies'.format(in_fld, catchment, outlet)
         self.descriptors_file = '{}{}_{}.descriptors'.format(in_fld, catchment, outlet)
-        # Logger to output in console and in log file
+        # Logger to output in console and in log file (list of the handlers created for the Network)
+        self.log_handlers = None
         self._set_logger(verbose)
         # Write the first logging message to inform of the start of the simulation for this catchment
         logger = getLogger('TORRENTpy.nw')
         logger.warning("Starting TORRENTpy session for {} at {}.".format(self.catchment, self.outlet))
         # boolean for water quality simulations
         self.water_quality = water_quality
+        # name of the Node or of the Link the Network is restricted to the upstream part of (None for all the Links)
+        self.upstream_of = upstream_of
+        # compact representation of the connections between the Links and the Nodes (arrays indexed by their IDs)
+        self.topology = None
         # list of the Nodes contained in the Network, mapping of Nodes to find them using their name
         # list of the Links contained in the Network, mapping of Links to find them using their name
         self.nodes, self.nodes_mapping, self.links, self.links_mapping = self._set_network_connectivity()
+        # name of the most downstream Link of the Network (the outlet, or the Link where the upstream part ends)
+        self.outlet_link = self._get_outlet_link()
         # list of the different unique link categories in the network (rivers only or lakes and rivers)
         self.links_categories = None
         # set the categories for the links = code to identify the type of catchment (1 for river or 2 for lake)
         self._set_links_categories()
+        # table of the descriptors of the links as columns {key: descriptor name, value: array in the order of links}
+        self.descriptors = None
         # set the descriptors for the links = physical descriptors characteristic of a given catchment
         self._set_links_descriptors()
         # list of the variables to be propagated through the node-link network
@@ -77,25 +104,52 @@ class Network(object):
         self.variables = [self.variable_h] + self.variables_q
         # boolean to state whether Links were assigned Models
         self.links_have_models = False
+        # number of cycles of the warm-up period run to determine the initial conditions (None if no warm-up)
+        self.spin_up_cycles = None
+        # Instrumentation object recording timings and memory for each slice (None if not instrumented)
+        self.instrumentation = None
+        # ModelProfiler object recording calls and timings for each Model of each Link (None if not profiled)
+        self.profiler = None
+        # Diagnostics object counting the events reported by the Models of all the Links (shared by the Models)
+        self.diagnostics = Diagnostics()
+        # boolean to use the Models able to simulate several Links at once (method 'simulate_links') as such
+        self.vectorise = True
+        # boolean to run the simulation slice by slice rather than step by step (i.e. the catchment Models over the
+        # whole slice, then the Nodes and the river and lake Models over the whole slice from upstream to downstream)
+        self.by_slice = True
+        # levels of the Nodes and groups of Models to simulate a slice, with the settings they were gathered for
+        # (see method '_get_slice_plan')
+        self._slice_plan = None
+
+    def __getstate__(self):
+        # the logging handlers are not copied or pickled with the Network (they hold locks and open files)
+        my_state = dict(self.__dict__)
+        my_state['log_handlers'] = None
+        # the plan of the slices is gathered again when needed (it holds references to all the Links and Models)
+        my_state['_slice_plan'] = None
+
+        return my_state
 
     def _set_logger(self, verbose):
         """
         This function creates a logger in order to print in console as well as to save in .log file information
         about the simulation. The level of detail displayed is the console is customisable using the 'verbose'
         parameter. If it is True, more information will be displayed (logging.INFO) than if it is False
-        (logging.WARNING only).
+        (logging.WARNING only). If the Network has no output folder, the information is only printed in console.
 
         :param verbose: boolean to define the level of information the logger should report
         """
         # Create Logger [ levels: debug < info < warning < error < critical ]
         logger = logging.getLogger('TORRENTpy')
         logger.setLevel(logging.INFO)
-        # Create FileHandler
-        log_file = '{}{}_{}.simu.log'.format(self.out_fld, self.catchment, self.outlet)
-        if os.path.isfile(log_file):  # del file if already exists
-            os.remove(log_file)
-        f_handler = logging.FileHandler(log_file)
-        f_handler.setLevel(logging.INFO)
+        # Create FileHandler (if there is an output folder)
+        f_handler = None
+        if self.out_fld is not None:
+            log_file = '{}{}_{}.simu.log'.format(self.out_fld, self.catchment, self.outlet)
+            if os.path.isfile(log_file):  # del file if already exists
+                os.remove(log_file)
+            f_handler = logging.FileHandler(log_file)
+            f_handler.setLevel(logging.INFO)
         # Create StreamHandler
         s_handler = logging.StreamHandler()
         if verbose:  # specify level of information required by the user
@@ -106,46 +160,37 @@ class Network(object):
         formatter = logging.Formatter(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                                       datefmt='%d/%m/%Y - %H:%M:%S')
         # Apply Formatter and Handler
-        f_handler.setFormatter(formatter)
-        s_handler.setFormatter(formatter)
-        logger.addHandler(f_handler)
-        logger.addHandler(s_handler)
+        self.log_handlers = [s_handler] if f_handler is None else [f_handler, s_handler]
+        for my_handler in self.log_handlers:
+            my_handler.setFormatter(formatter)
+            logger.addHandler(my_handler)
 
     def _set_network_connectivity(self):
         """
         This method reads all the information contained in the network file in order to get the list of the nodes and
         the links as well as the connections, and the links adding to the nodes and routed by the nodes.
-        :return: dictionary containing nodes, links, connections, routing, and adding
+        :return: lists and mappings of the Nodes and of the Links
         """
         logger = getLogger('TORRENTpy.nw')
         try:
             with open_csv_rb(self.network_file) as my_file:
                 my_reader = csv.DictReader(my_file)
-                my_nodes = list()  # list of all nodes
                 my_links = list()  # list of all links (i.e. waterbodies)
                 my_connections = dict()  # key: waterbody, value: 2-element list (node down, node up)
-                my_routing = dict()  # key: node, value: list of links whose reaches are pouring into the node
-                my_adding = dict()  # key: node, value: list of links whose catchments are pouring into the node
                 for row in my_reader:
-                    my_nodes.append(row['NodeDown'])
-                    my_nodes.append(row['NodeUp'])
-                    my_links.append(row['WaterBody'])
+                    if row['WaterBody'] not in my_connections:
+                        my_links.append(row['WaterBody'])
                     my_connections[row['WaterBody']] = (row['NodeDown'], row['NodeUp'])
-                my_nodes = list(set(my_nodes))  # get rid of the duplicates
-                for node in my_nodes:
-                    my_routing[node] = list()
-                    my_adding[node] = list()
-                for link in my_connections:
-                    my_routing[my_connections[link][0]].append(link)
-                    my_adding[my_connections[link][1]].append(link)
-
-                links = [Link(link, my_connections[link]) for link in my_links]
+                if self.upstream_of is not None:
+                    my_links = self._get_upstream_links(my_links, my_connections)
+
+                # the topology is held in arrays, the Links and the Nodes being views on them through their IDs
+                self.topology = Topology(my_links, my_connections)
+                links = [Link(link, my_connections[link], self.topology) for link in my_links]
+                self.topology.set_links(links)
                 links_mapping = {link.name: link for link in links}
 
-                nodes = [Node(node,
-                              [links_mapping[link] for link in my_routing[node]],
-                              [links_mapping[link] for link in my_adding[node]])
-                         for node in my_nodes]
+                nodes = [Node(node, self.topology) for node in self.topology.nodes_names]
                 nodes_mapping = {node.name: node for node in nodes}
 
             return (
@@ -158,6 +203,63 @@ class Network(object):
             logger.error("No link-node network file found for {} at {}.".format(self.catchment, self.network_file))
             raise Exception("No link-node network file found for {} at {}.".format(self.catchment, self.network_file))
 
+    def _get_outlet_link(self):
+        """
+        This method finds the most downstream Link of the Network, i.e. the outlet if it is one of the Links,
+        otherwise the first Link (in the order of the network file) whose Node downstream is not upstream of a Link.
+
+        :return: name of the most downstream Link
+        :rtype: str
+        """
+        if self.outlet in self.links_mapping:
+            return self.outlet
+        my_downstream = ~np.isin(self.topology.nodes_down, self.topology.nodes_up)
+
+        return self.topology.links_names[int(np.argmax(my_downstream))] if np.any(my_downstream) else None
+
+    def _get_upstream_links(self, links, connections):
+        """
+        This method selects the Links needed to simulate the part of the Network upstream of the Node or of the Link
+        given by the attribute 'upstream_of' (a name of Link being looked for before a name of Node). For a Link, it
+        is the Link itself and all the Links upstream of it. For a Node, it is all the Links upstream of it, as well as
+        the Links downstream of it (i.e. whose catchments are pouring into the Node, which the results at the Node
+        depend on). The Links are found from their connections going upstream from Node to Node.
+
+        :param links: list of the names of all the Links in the order of the network file
+        :type links: list
+        :param connections: dictionary {key: name of Link, value: 2-element tuple (Node down, Node up)}
+        :type connections: dict
+        :return: list of the names of the Links selected in the order of the network file
+        :rtype: list
+        """
+        logger = getLogger('TORRENTpy.nw')
+        my_routing = dict()  # key: node, value: list of links whose reaches are pouring into the node
+        for link in links:
+            my_routing.setdefault(connections[link][0], list()).append(link)
+
+        if self.upstream_of in connections:
+            my_queue = deque([self.upstream_of])
+        else:
+            my_queue = deque([link for link in links if connections[link][1] == self.upstream_of] +
+                             my_routing.get(self.upstream_of, []))
+            if not my_queue:
+                logger.error("{} is neither a Node nor a Link of the link-node network for {} at {}.".format(
+                    self.upstream_of, self.catchment, self.outlet))
+                raise Exception("{} is neither a Node nor a Link of the link-node network for {} at {}.".format(
+                    self.upstream_of, self.catchment, self.outlet))
+
+        my_selected = set(my_queue)
+        while my_queue:
+            for link in my_routing.get(connections[my_queue.popleft()][1], []):
+                if link not in my_selected:
+                    my_selected.add(link)
+                    my_queue.append(link)
+
+        logger.info("The link-node network is restricted to the {} Links (out of {}) upstream of {}.".format(
+            len(my_selected), len(links), self.upstream_of))
+
+        return [link for link in links if link in my_selected]
+
     def _set_links_categories(self):
         """
         This method reads the attributes of the links from the waterBodies file. It associates the waterbody type code
@@ -174,7 +276,7 @@ class Network(object):
                     if row['WaterBody'] in self.links_mapping:
                         self.links_mapping[row['WaterBody']].category = int(row['WaterBodyTypeCode'])
                         categories.append(int(row['WaterBodyTypeCode']))
-                    else:
+                    elif self.upstream_of is None:  # otherwise, it may be outside of the upstream part
                         logger.error("{} is in the .waterbodies file but it is not "
                                      "in the .connectivity file.".format(row['WaterBody']))
                         raise Exception("{} is in the .waterbodies file but it is not "
@@ -203,30 +305,30 @@ class Network(object):
                 my_reader = csv.DictReader(my_file)
                 fields = my_reader.fieldnames[:]
                 fields.remove('WaterBody')
-                found = list()
+                found = dict()
                 for row in my_reader:
-                    my_dict = dict()
-                    for field in fields:
-                        my_dict[field] = float(row[field])
                     if row['WaterBody'] in self.links_mapping:
-                        self.links_mapping[row['WaterBody']].descriptors = my_dict
-                    else:
+                        found[row['WaterBody']] = [float(row[field]) for field in fields]
+                    elif self.upstream_of is None:  # otherwise, it may be outside of the upstream part
                         logger.exception("{} is in the .descriptors file but it is not "
                                          "in the .connectivity file.".format(row['WaterBody']))
-                    found.append(row['WaterBody'])
 
             missing = [wb for wb in self.links_mapping if wb not in found]
             if missing:
                 logger.error("The following waterbodies are not in the descriptors file: {}.".format(missing))
                 raise Exception("The following waterbodies are not in the descriptors file: {}.".format(missing))
 
+            my_table = np.array([found[link] for link in self.topology.links_names], dtype=np.float64)
+            self.descriptors = {field: my_table[:, i].copy() for i, field in enumerate(fields)}
+            self.topology.descriptors = self.descriptors
+
         except IOError:
             logger.error("No descriptors file found for {}.".format(self.catchment))
             raise Exception("No descriptors file found for {}.".format(self.catchment))
 
     def set_links_models(self, kb,
                          catchment_h=None, river_h=None, lake_h=None,
-                         catchment_q=None, river_q=None, lake_q=None):
+                         catchment_q=None, river_q=None, lake_q=None, store=None):
         logger = getLogger('TORRENTpy.nw')
 
         # check that the models needed are provided
@@ -294,21 +396,17 @@ class Network(object):
                         raise Exception("Link {}: {} is not a registered type of waterbody.".format(
                             link, link.category))
 
-            for link in self.links:
-                # gather all models in one list
-                link.all_models = link.c_models + link.r_models + link.l_models
-                # set the parameters for all Models of the Links
-                for model in link.all_models:
-                    model.set_parameters(link, self.catchment, self.outlet, self.in_fld, self.out_fld)
-                    model.set_constants(self.in_fld)
+            # set the parameters and constants for all Models of the Links
+            self._set_links_models_parameters(store)
 
             # change Network attributes to state that assignment of Models for all Links is now complete
             self.links_have_models = True
+            self._slice_plan = None
         else:  # assignment already done, ignore reassignment
             logger.warning("Assignment of Models to Links was already done, reassignment was ignored.")
 
     def set_links_models_from_dict(self, kb,
-                                   the_dict):
+                                   the_dict, store=None):
         logger = getLogger('TORRENTpy.nw')
         if not self.links_have_models:  # check that assignment was not already done
             # assign Models to the Links
@@ -438,84 +536,211 @@ class Network(object):
                         logger.error("The following links have not been given any model: {}.".format(missing))
                         raise Exception("The following links have not been given any model: {}.".format(missing))
 
-            for link in self.links:
-                # gather all models in one list
-                link.all_models = link.c_models + link.r_models + link.l_models
-                # set the parameters and constants for all Models of the Links
-                for model in link.all_models:
-                    model.set_parameters(link, self.catchment, self.outlet, self.in_fld, self.out_fld)
-                    model.set_constants(self.in_fld)
+            # set the parameters and constants for all Models of the Links
+            self._set_links_models_parameters(store)
 
             # change Network attributes to state that assignment of Models for all Links is now complete
             self.links_have_models = True
+            self._slice_plan = None
         else:  # assignment already done, ignore reassignment
             logger.warning("Assignment of Models to Links was already done, reassignment was ignored.")
 
-    def simulate(self, db, tf, out_format):
+    def _set_links_models_parameters(self, store=None):
+        """
+        This method gathers all the Models of each Link in one list, and it sets their parameters and constants. The
+        Models share a ModelFilesStore so that each parameters file and each constants file is only read once for the
+        whole Network (or for several Networks if a store is given, e.g. kept by a Batch worker). The Models of the
+        same class that can set their parameters for several Links at once (i.e. with a method
+        'set_parameters_for_links') are given the parameters of all their Links in one call, so that the parameters
+        are inferred from the columns of the descriptors and saved in one write.
+
+        :param store: ModelFilesStore to share with other Networks (optional, a new one is used if not given)
+        :type store: ModelFilesStore
+        """
+        my_expected = dict()
+        my_groups = list()  # list of (class, identifier, category) in the order they are found
+        my_models_links = dict()  # key: (class, identifier, category), value: (list of Models, list of Links)
+        for link in self.links:
+            # gather all models in one list
+            link.all_models = link.c_models + link.r_models + link.l_models
+            for model in link.all_models:
+                my_expected.setdefault((model.identifier, model.category), list()).append(link.name)
+                my_key = (type(model), model.identifier, model.category)
+                if my_key not in my_models_links:
+                    my_groups.append(my_key)
+                    my_models_links[my_key] = (list(), list())
+                my_models_links[my_key][0].append(model)
+                my_models_links[my_key][1].append(link)
+
+        if store:
+            my_store = store
+            my_store.expected_waterbodies.update(my_expected)
+        else:
+            my_store = ModelFilesStore(expected_waterbodies=my_expected)
+        for my_key in my_groups:
+            my_models, my_links = my_models_links[my_key]
+            for model in my_models:
+                model.store = my_store
+                model.diagnostics = self.diagnostics
+            my_method = getattr(my_key[0], 'set_parameters_for_links', None)
+            if my_method:
+                my_method(my_models, my_links, self._get_descriptors_columns(my_links),
+                          self.catchment, self.outlet, self.in_fld, self.out_fld)
+            else:
+                for model, link in zip(my_models, my_links):
+                    model.set_parameters(link, self.catchment, self.outlet, self.in_fld, self.out_fld)
+            for model in my_models:
+                model.set_constants(self.in_fld)
+
+    def _get_descriptors_columns(self, links):
+        """
+        This method extracts the columns of the descriptors for the given Links.
+
+        :param links: list of Link objects
+        :type links: list
+        :return: dictionary {key: descriptor name, value: array in the order of the given Links}
+        :rtype: dict
+        """
+        my_indices = np.array([link.id for link in links], dtype=int)
+
+        return {name: self.descriptors[name][my_indices] for name in self.descriptors}
 
+    def simulate(self, db, tf, out_format=None, warm_up_cache=None, spin_up_tolerance=None, spin_up_max_cycles=10,
+                 out_precision='float64', instrument=False, profile=False, diagnostics_samples=0,
+                 out_nodes=None, out_links=None, out_states=None):
+        """
+        This method runs the simulation for the Network slice by slice (after a warm-up period if required by the
+        TimeFrame), and writes the results in the output files. If no output format is given, nothing is written in
+        the output folder, the results for the requested Nodes and Links are kept in memory and returned instead.
+
+        :param db: DataBase object containing the input data for the Links of the Network
+        :type db: DataBase
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param out_format: format of the output files ('csv' or 'netcdf'), or None to keep the results in memory
+        :type out_format: str
+        :param warm_up_cache: path to the folder where to store/retrieve the states at the end of the warm-up period
+            (optional, if not given the warm-up period is always run)
+        :type warm_up_cache: str
+        :param spin_up_tolerance: relative change in the slow states below which the warm-up period is considered
+            converged (optional, if not given the warm-up period is run only once)
+        :type spin_up_tolerance: float
+        :param spin_up_max_cycles: maximum number of times the warm-up period is repeated to reach convergence
+        :type spin_up_max_cycles: int
+        :param out_precision: floating point precision of the values stored in the output files or in memory
+            ('float64' or 'float32'), the simulation itself always runs in double precision
+        :type out_precision: str
+        :param instrument: whether to record the wall time spent in each phase of each slice and the peak memory,
+            the report is available in the attribute 'instrumentation' and saved in the output folder
+        :type instrument: bool
+        :param profile: whether to record the number of calls and the time spent in each Model for each Link, the
+            profile is available in the attribute 'profiler' and saved as folded stacks in the output folder
+        :type profile: bool
+        :param diagnostics_samples: number of DateTime to keep for each event reported by the Models for each Link
+            (the events are always counted and summarised at the end of each slice), if not zero, the report is
+            saved in the output folder
+        :type diagnostics_samples: int
+        :param out_nodes: names of the Nodes whose results are kept in memory (optional, all the Nodes if not given)
+        :type out_nodes: list
+        :param out_links: names of the Links whose results are kept in memory (optional, all the Links if not given)
+        :type out_links: list
+        :param out_states: path of the file where to write the states at the end of the simulation period (optional,
+            e.g. to start a forecast from them, see class EnsembleForecast)
+        :type out_states: str
+        :return: results kept in memory if no output format is given, None otherwise
+        :rtype: SimulationResults
+        """
         logger = getLogger('TORRENTpy.nw')
 
-        # create empty output files
-        create_simulation_files(self, out_format)
+        # set up the instrumentation and the profiling if required
+        self.instrumentation = Instrumentation() if instrument else None
+        self.profiler = ModelProfiler() if profile else None
+        if self.profiler and self.vectorise:
+            logger.info("The Models able to simulate several Links at once are run Link by Link while profiling, "
+                        "so that their time is attributed to each Link.")
+        self.diagnostics.clear(samples=diagnostics_samples)
+
+        # create empty output files, or the arrays to keep the results in memory
+        my_results = None
+        if out_format:
+            if self.out_fld is None:
+                logger.error("The Network has no output folder to write the output files in.")
+                raise Exception("The Network has no output folder to write the output files in.")
+            create_simulation_files(self, out_format, out_precision)
+        else:
+            my_results = SimulationResults(self, tf, out_nodes, out_links, out_precision)
 
         # Set the initial conditions ('blank' warm up run slice by slice) if required
-        my_last_lines = dict()
-        if tf.warm_up:  # Warm-up run required
-            logger.info("Determining initial conditions.")
-            # Initialise dicts needed to link time slices together (use last time step of one as first for the other)
-            for link in self.links:
-                # For links, get a dict of the models states initial conditions from "educated guesses"
-                my_last_lines[link.name] = dict()
-                for model in link.all_models:
-                    my_last_lines[link.name].update(model.initialise(link))
-            for node in self.nodes:
-                # For nodes, no states so no initial conditions, but instantiation of dict required
-                my_last_lines[node.name] = dict()
+        my_last_lines = self._get_initial_conditions(db, tf, warm_up_cache, spin_up_tolerance, spin_up_max_cycles)
 
-            for my_simu_slice, my_save_slice in zip(tf.warm_up.simu_slices, tf.warm_up.save_slices):
-                logger.info("Running Warm-Up Period {} - {}.".format(my_simu_slice[1].strftime('%d/%m/%Y %H:%M:%S'),
-                                                                     my_simu_slice[-1].strftime('%d/%m/%Y %H:%M:%S')))
-                # Initialise data models
-                db.set_db_for_links_and_nodes(my_simu_slice)
+        # Simulate (run slice by slice) and write results in files (or keep them in memory)
+        def my_write_slice(my_db, my_simu_slice, my_save_slice):
+            if self.instrumentation:
+                my_start = default_timer()
+            if my_results is not None:
+                my_results.update(my_db, my_save_slice)
+            else:
+                update_simulation_files(self, tf, my_save_slice, my_db, out_format, method='summary')
+            if self.instrumentation:
+                self.instrumentation.add('files', default_timer() - my_start)
 
-                # Get history of previous time slice last time step for initial conditions of current time slice
-                for link in self.links:
-                    db.simulation[link.name][my_simu_slice[0]].update(my_last_lines[link.name])
-                for node in self.nodes:
-                    db.simulation[node.name][my_simu_slice[0]].update(my_last_lines[node.name])
+        self._simulate_slices(db, tf, my_last_lines, my_write_slice)
 
-                # Simulate
-                self._run(db, tf, my_simu_slice)
+        if out_states:
+            save_snapshot(out_states, tf.simu_slices[-1][-1], my_last_lines)
 
-                # Save history (last time step) for next slice
-                for link in self.links:
-                    my_last_lines[link.name].update(db.simulation[link.name][my_simu_slice[-1]])
-                for node in self.nodes:
-                    my_last_lines[node.name].update(db.simulation[node.name][my_simu_slice[-1]])
+        if self.profiler:
+            self.profiler.log_summary()
+        if self.out_fld is not None:
+            if self.instrumentation:
+                self.instrumentation.save_report(
+                    '{}{}_{}.simu.report.json'.format(self.out_fld, self.catchment, self.outlet))
+            if self.profiler:
+                self.profiler.save_folded_stacks(
+                    '{}{}_{}.simu.profile.folded'.format(self.out_fld, self.catchment, self.outlet))
+            if diagnostics_samples:
+                self.diagnostics.save_report(
+                    '{}{}_{}.simu.diagnostics.json'.format(self.out_fld, self.catchment, self.outlet))
 
-            # "Garbage collection"
-            db.simulation = None
+        logger.warning("Ending TORRENTpy session for {} at {}.".format(self.catchment, self.outlet))
 
-        else:  # Warm-up run not required
-            # Initialise dicts needed to link time slices together (use last time step of one as first for the other)
-            for link in self.links:
-                # For links, get a dict of the models states initial conditions from "educated guesses"
-                my_last_lines[link.name] = dict()
-                for model in link.all_models:
-                    my_last_lines[link.name].update(model.initialise(link))
-            for node in self.nodes:
-                # For nodes, no states so no initial conditions, but instantiation of dict required
-                my_last_lines[node.name] = dict()
+        return my_results
+
+    def _simulate_slices(self, db, tf, my_last_lines, on_slice):
+        """
+        This method runs the Models of the Network over the simulation period of the TimeFrame (slice by slice)
+        starting from the given initial conditions, and it hands each slice over to the given callable once it is
+        simulated (e.g. to write the results in files, or to keep some of them in memory).
+
+        :param db: DataBase object containing the input data for the Links of the Network
+        :type db: DataBase
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param my_last_lines: dictionary of the initial conditions for each link and node (updated in place)
+            {key: link/node, value: {key: variable, value: value}}
+        :type my_last_lines: dict
+        :param on_slice: callable receiving the DataBase, the simulation slice, and the save slice once the slice is
+            simulated, returning True to stop the simulation after this slice (False or None to carry on)
+        :type on_slice: callable
+        :return: whether the simulation was stopped before the end of the simulation period
+        :rtype: bool
+        """
+        logger = getLogger('TORRENTpy.nw')
 
-        # Simulate (run slice by slice)
         logger.info("Starting the simulation.")
-        # Get meteo input data
+        my_stopped = False
         for my_simu_slice, my_save_slice in zip(tf.simu_slices, tf.save_slices):
 
             logger.info("Running Period {} - {}.".format(my_simu_slice[1].strftime('%d/%m/%Y %H:%M:%S'),
                                                          my_simu_slice[-1].strftime('%d/%m/%Y %H:%M:%S')))
+            self.diagnostics.start_slice('simulation', my_simu_slice)
+            if self.instrumentation:
+                self.instrumentation.start_slice('simulation', my_simu_slice)
+                my_start = default_timer()
             # Initialise data models
             db.set_db_for_links_and_nodes(my_simu_slice)
+            if self.instrumentation:
+                self.instrumentation.add('inputs', default_timer() - my_start)
 
             # Get history of previous time step for initial conditions of current time step
             for link in self.links:
@@ -526,8 +751,8 @@ class Network(object):
             # Simulate
             self._run(db, tf, my_simu_slice)
 
-            # Write results in files
-            update_simulation_files(self, tf, my_save_slice, db, out_format, method='summary')
+            # Hand the results over (e.g. write them in files)
+            my_stopped = bool(on_slice(db, my_simu_slice, my_save_slice))
 
             # Save history (last time step) for next slice
             for link in self.links:
@@ -538,13 +763,358 @@ class Network(object):
             # "Garbage collection"
             db.simulation = None
 
-        logger.warning("Ending TORRENTpy session for {} at {}.".format(self.catchment, self.outlet))
+            self.diagnostics.end_slice()
+            if self.instrumentation:
+                self.instrumentation.end_slice()
+
+            if my_stopped:
+                logger.info("Stopping the simulation after Period {} - {}.".format(
+                    my_simu_slice[1].strftime('%d/%m/%Y %H:%M:%S'), my_simu_slice[-1].strftime('%d/%m/%Y %H:%M:%S')))
+                break
+
+        return my_stopped
+
+    def _get_initial_conditions(self, db, tf, warm_up_cache=None, spin_up_tolerance=None, spin_up_max_cycles=10):
+        """
+        This method determines the initial conditions for the links and the nodes of the Network. If the TimeFrame
+        requires a warm-up period, the Models are run over the warm-up period starting from their 'educated guesses',
+        otherwise the 'educated guesses' are used directly.
+
+        If a folder is given for the warm-up cache, the states at the end of the warm-up period are stored in it, and
+        they are retrieved instead of running the warm-up period again when the Network, the Models, the inputs and
+        the warm-up window are identical to a previous run.
+
+        If a spin-up tolerance is given, the warm-up period is repeated (the states at the end of one cycle being the
+        initial conditions of the next cycle) until the largest relative change in the slow states of the Models
+        between two consecutive cycles falls below the tolerance, or until the maximum number of cycles is reached.
+
+        :param db: DataBase object containing the input data for the Links of the Network
+        :type db: DataBase
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param warm_up_cache: path to the folder where to store/retrieve the states at the end of the warm-up
+        :type warm_up_cache: str
+        :param spin_up_tolerance: relative change in the slow states below which the warm-up is considered converged
+        :type spin_up_tolerance: float
+        :param spin_up_max_cycles: maximum number of times the warm-up period is repeated to reach convergence
+        :type spin_up_max_cycles: int
+        :return: dictionary of the initial conditions for each link and node
+            {key: link/node, value: {key: variable, value: value}}
+        :rtype: dict
+        """
+        logger = getLogger('TORRENTpy.nw')
+
+        # Initialise dicts needed to link time slices together (use last time step of one as first for the other)
+        my_last_lines = dict()
+        for link in self.links:
+            # For links, get a dict of the models states initial conditions from "educated guesses"
+            my_last_lines[link.name] = dict()
+            for model in link.all_models:
+                my_last_lines[link.name].update(model.initialise(link))
+        for node in self.nodes:
+            # For nodes, no states so no initial conditions, but instantiation of dict required
+            my_last_lines[node.name] = dict()
+
+        self.spin_up_cycles = None
+        if tf.warm_up:  # Warm-up run required
+            logger.info("Determining initial conditions.")
+            my_spin_up = (spin_up_tolerance, spin_up_max_cycles) if spin_up_tolerance else None
+            my_key = None
+            if warm_up_cache:
+                my_key = get_warm_up_key(self, db, tf, my_spin_up)
+                my_cached_lines = load_states(warm_up_cache, my_key)
+                if my_cached_lines:
+                    logger.info("Retrieving initial conditions from warm-up cache ({}).".format(my_key))
+                    for name in my_last_lines:
+                        my_last_lines[name].update(my_cached_lines[name])
+                    self.spin_up_cycles = 0
+                    return my_last_lines
+
+            if my_spin_up:  # Repeat the warm-up period until the slow states converge
+                my_change = None
+                for cycle in range(1, spin_up_max_cycles + 1):
+                    my_slow_states = get_slow_states(self, my_last_lines)
+                    self._warm_up(db, tf, my_last_lines)
+                    my_change = get_maximum_relative_change(my_slow_states, get_slow_states(self, my_last_lines))
+                    self.spin_up_cycles = cycle
+                    logger.info("Spin-Up Cycle {}: largest relative change in slow states {:e}.".format(
+                        cycle, my_change))
+                    if my_change < spin_up_tolerance:
+                        break
+                if my_change < spin_up_tolerance:
+                    logger.info("Spin-Up converged after {} cycle(s).".format(self.spin_up_cycles))
+                else:
+                    logger.warning("Spin-Up did not converge after {} cycle(s) (largest relative change {:e} "
+                                   "for a tolerance of {:e}).".format(self.spin_up_cycles, my_change,
+                                                                     spin_up_tolerance))
+            else:
+                self._warm_up(db, tf, my_last_lines)
+                self.spin_up_cycles = 1
+
+            if warm_up_cache:
+                save_states(warm_up_cache, my_key, my_last_lines)
+
+        return my_last_lines
+
+    def _warm_up(self, db, tf, my_last_lines):
+        """
+        This method runs the Models of the Network over the warm-up period of the TimeFrame (slice by slice), and
+        updates the given initial conditions with the last time step of the warm-up period.
+
+        :param db: DataBase object containing the input data for the Links of the Network
+        :type db: DataBase
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param my_last_lines: dictionary of the initial conditions for each link and node (updated in place)
+            {key: link/node, value: {key: variable, value: value}}
+        :type my_last_lines: dict
+        """
+        logger = getLogger('TORRENTpy.nw')
+
+        for my_simu_slice, my_save_slice in zip(tf.warm_up.simu_slices, tf.warm_up.save_slices):
+            logger.info("Running Warm-Up Period {} - {}.".format(my_simu_slice[1].strftime('%d/%m/%Y %H:%M:%S'),
+                                                                 my_simu_slice[-1].strftime('%d/%m/%Y %H:%M:%S')))
+            self.diagnostics.start_slice('warm-up', my_simu_slice)
+            if self.instrumentation:
+                self.instrumentation.start_slice('warm-up', my_simu_slice)
+                my_start = default_timer()
+            # Initialise data models
+            db.set_db_for_links_and_nodes(my_simu_slice)
+            if self.instrumentation:
+                self.instrumentation.add('inputs', default_timer() - my_start)
+
+            # Get history of previous time slice last time step for initial conditions of current time slice
+            for link in self.links:
+                db.simulation[link.name][my_simu_slice[0]].update(my_last_lines[link.name])
+            for node in self.nodes:
+                db.simulation[node.name][my_simu_slice[0]].update(my_last_lines[node.name])
+
+            # Simulate
+            self._run(db, tf, my_simu_slice)
+
+            # Save history (last time step) for next slice
+            for link in self.links:
+                my_last_lines[link.name].update(db.simulation[link.name][my_simu_slice[-1]])
+            for node in self.nodes:
+                my_last_lines[node.name].update(db.simulation[node.name][my_simu_slice[-1]])
+
+            self.diagnostics.end_slice()
+            if self.instrumentation:
+                self.instrumentation.end_slice()
+
+        # "Garbage collection"
+        db.simulation = None
+
+    def _get_models_groups(self, category, links=None):
+        """
+        This method gathers the Models of the given category for all the Links (or the given Links) in groups that
+        can be run one after the other for a given time step. The Models are taken in the order they were assigned to
+        the Links (e.g. the hydrology Model before the water quality Model), and at each position, the Models of the
+        same class that can simulate several Links at once (i.e. with a method 'simulate_links') are grouped together
+        (unless the Network is profiled, the time spent in the Models being recorded for each Link). Because the Links
+        are independent of each other within a category for a given time step, this order gives the same results as
+        running all the Models Link by Link.
+
+        :param category: category of the Models ('c' for catchment, 'r' for river, 'l' for lake)
+        :type category: str
+        :param links: list of the Links to consider (all the Links of the Network if None)
+        :type links: list
+        :return: list of the groups [(method to simulate the Links at once or None, list of Models, list of Links)]
+        :rtype: list
+        """
+        my_groups = list()
+        my_vectorise = self.vectorise and not self.profiler
+        my_models_lists = [(link, getattr(link, '{}_models'.format(category)))
+                           for link in (self.links if links is None else links)]
+        for position in range(max([len(my_models) for link, my_models in my_models_lists] + [0])):
+            my_vectorised = dict()
+            for link, my_models in my_models_lists:
+                if position < len(my_models):
+                    model = my_models[position]
+                    my_method = getattr(type(model), 'simulate_links', None) if my_vectorise else None
+                    if my_method:
+                        if type(model) not in my_vectorised:
+                            my_vectorised[type(model)] = (my_method, list(), list())
+                            my_groups.append(my_vectorised[type(model)])
+                        my_vectorised[type(model)][1].append(model)
+                        my_vectorised[type(model)][2].append(link)
+                    else:
+                        my_groups.append((None, [model], [link]))
+
+        return my_groups
+
+    def _run_models_groups(self, groups, db, tf, step, logger_simu):
+        """
+        This method runs the groups of Models (see method '_get_models_groups') for a given time step.
+        """
+        my_profiler = self.profiler
+        for my_method, my_models, my_links in groups:
+            if my_method:  # never the case if the Network is profiled (see method '_get_models_groups')
+                my_method(my_models, db, tf, step, my_links, logger_simu)
+            else:
+                if my_profiler:
+                    my_profiler.simulate(my_models[0], db, tf, step, my_links[0], logger_simu)
+                else:
+                    my_models[0].simulate(db, tf, step, my_links[0], logger_simu)
+
+    def _run_models_groups_on_slice(self, groups, db, tf, timeslice, logger_simu):
+        """
+        This method runs the groups of Models (see method '_get_models_groups') for all the time steps of a
+        simulation slice, one group after the other. A Model that can simulate a whole slice (i.e. with a method
+        'simulate_slice') is run once for the slice, the other groups are run one time step at a time.
+        """
+        my_profiler = self.profiler
+        for my_group in groups:
+            my_method, my_models, my_links = my_group
+            if not my_method and getattr(my_models[0], 'simulate_slice', None):
+                if my_profiler:
+                    my_profiler.simulate_slice(my_models[0], db, tf, timeslice, my_links[0], logger_simu)
+                else:
+                    my_models[0].simulate_slice(db, tf, timeslice, my_links[0], logger_simu)
+            else:
+                for step in timeslice[1:]:
+                    self._run_models_groups([my_group], db, tf, step, logger_simu)
+
+    def _get_nodes_levels(self):
+        """
+        This method sorts the Nodes of the Network from upstream to downstream in levels, a Node belonging to the
+        level following the one of the last of the Nodes upstream of the Links routed by it. The Nodes of a level
+        only depend on the Links downstream of the Nodes of the previous levels.
+
+        :return: list of the levels [list of Nodes]
+        :rtype: list
+        """
+        logger = getLogger('TORRENTpy.nw')
+        my_counts = {node.name: len(node.routing) for node in self.nodes}
+        my_levels = list()
+        my_level = [node for node in self.nodes if not node.routing]
+        while my_level:
+            my_levels.append(my_level)
+            my_next_level = list()
+            for node in my_level:
+                for link in node.adding:
+                    my_counts[link.connections[0]] -= 1
+                    if my_counts[link.connections[0]] == 0:
+                        my_next_level.append(self.nodes_mapping[link.connections[0]])
+            my_level = my_next_level
+
+        if sum([len(my_level) for my_level in my_levels]) != len(self.nodes):
+            logger.error("The link-node network for {} at {} contains a loop.".format(self.catchment, self.outlet))
+            raise Exception("The link-node network for {} at {} contains a loop.".format(self.catchment, self.outlet))
+
+        return my_levels
+
+    def _get_slice_plan(self):
+        """
+        This method gives the levels of the Nodes (see method '_get_nodes_levels') and the groups of Models to run
+        for the Links downstream of the Nodes of each level (see method '_get_models_groups') to simulate a slice.
+        They are only gathered again if the Models of the Links or the settings of the Network they depend on (i.e.
+        the profiling, the vectorisation, and the simulation by slice) changed since the last time.
+
+        :return: groups of the catchment Models, and list of the levels
+            [(list of Nodes, groups of the river Models, groups of the lake Models)]
+        :rtype: tuple
+        """
+        my_settings = (self.profiler is not None, self.vectorise, self.by_slice)
+        if self._slice_plan is None or self._slice_plan[0] != my_settings:
+            my_levels = list()
+            for my_level in self._get_nodes_levels():
+                my_links = [link for node in my_level for link in node.adding]
+                my_levels.append((my_level, self._get_models_groups('r', my_links),
+                                  self._get_models_groups('l', my_links)))
+            self._slice_plan = (my_settings, (self._get_models_groups('c'), my_levels))
+
+        return self._slice_plan[1]
+
+    def _sum_node_on_slice(self, node, db, timeslice):
+        """
+        This method sums up everything arriving at the given Node for all the time steps of a simulation slice, i.e.
+        what is routed by the streams of the Links upstream of the Node at a given time step, and what comes from the
+        catchment of the Link downstream of the Node at the following time step (except at the end of the slice).
+        """
+        variable_h = self.variable_h
+        my_prefixes = {1: 'r_out_', 2: 'l_out_'}  # river basin, lake
+        my_routing = [(db.simulation[link.name], my_prefixes[link.category]) for link in node.routing
+                      if link.category in my_prefixes]
+        my_adding = [db.simulation[link.name] for link in node.adding if link.category == 1]
+        my_node_frames = db.simulation[node.name]
+        for index, dt in enumerate(timeslice):
+            my_next_dt = timeslice[index + 1] if index + 1 < len(timeslice) else None
+            # Sum up outputs for hydrology
+            my_h = 0.0
+            for my_frames, my_prefix in my_routing:  # for the streams of the links upstream of the node
+                my_h += my_frames[dt][''.join([my_prefix, variable_h])]
+            if my_next_dt:
+                for my_frames in my_adding:  # for the catchment of the link downstream of this node
+                    my_h += my_frames[my_next_dt][''.join(['c_out_', variable_h])]
+            my_node_frames[dt][variable_h] = my_h
+            # Sum up outputs for water quality
+            if self.water_quality:
+                for variable in self.variables_q:
+                    my_q = 0.0
+                    for my_frames, my_prefix in my_routing:
+                        my_q += my_frames[dt][''.join([my_prefix, variable])] * \
+                            my_frames[dt][''.join([my_prefix, variable_h])]
+                    if my_next_dt:
+                        for my_frames in my_adding:
+                            my_q += my_frames[my_next_dt][''.join(['c_out_', variable])] * \
+                                my_frames[my_next_dt][''.join(['c_out_', variable_h])]
+                    if my_h > 0.0:
+                        my_node_frames[dt][variable] = my_q / my_h
+
+    def _run_by_slice(self, db, tf, timeslice):
+        """
+        This function runs the simulations for a given catchment (defined by a Network object) and given time period
+        (defined by the time slice) slice by slice rather than step by step. Because the catchment Models only depend
+        on the inputs of their Link, they are first run for the whole slice. Then, from upstream to downstream, it
+        sums up all of what is arriving at each Node for the whole slice, and it runs the river and lake Models of the
+        Links downstream of these Nodes for the whole slice. The results are the same as the ones of method '_run'.
+
+        N.B. The first time step in the time slice is ignored because it is for the initial or previous conditions that
+        are needed for the models to get the previous states of the links.
+        """
+        logger_simu = getLogger('TORRENTpy.sm')
+        # wall times spent in each phase (only recorded if the Network is instrumented)
+        my_instrumentation = self.instrumentation
+        my_times = {'catchment': 0.0, 'nodes': 0.0, 'river': 0.0, 'lake': 0.0}
+        my_start = None
+
+        # Calculate water (and contaminant) runoff from catchment for each link
+        if my_instrumentation:
+            my_start = default_timer()
+        my_catchment_groups, my_levels = self._get_slice_plan()
+        self._run_models_groups_on_slice(my_catchment_groups, db, tf, timeslice, logger_simu)
+        if my_instrumentation:
+            my_times['catchment'] += default_timer() - my_start
+
+        for my_level, my_river_groups, my_lake_groups in my_levels:
+            if my_instrumentation:
+                my_start = default_timer()
+            # Sum up everything coming towards each node
+            for node in my_level:
+                self._sum_node_on_slice(node, db, timeslice)
+            if my_instrumentation:
+                my_times['nodes'] += default_timer() - my_start
+                my_start = default_timer()
+            # Calculate water (and contaminant) routing in river reach and in lake for each link downstream
+            self._run_models_groups_on_slice(my_river_groups, db, tf, timeslice, logger_simu)
+            if my_instrumentation:
+                my_times['river'] += default_timer() - my_start
+                my_start = default_timer()
+            self._run_models_groups_on_slice(my_lake_groups, db, tf, timeslice, logger_simu)
+            if my_instrumentation:
+                my_times['lake'] += default_timer() - my_start
+
+        if my_instrumentation:
+            for phase in my_times:
+                my_instrumentation.add(phase, my_times[phase])
 
     def _run(self, db, tf, timeslice):
         """
         This function runs the simulations for a given catchment (defined by a Network object) and given time period
         (defined by the time slice). For each time step, it first runs the models associated with the links (defined
-        as Model objects), then it sums up all of what is arriving at each node.
+        as Model objects), then it sums up all of what is arriving at each node. If the Network runs by slice (attribute
+        'by_slice'), the simulations are run using method '_run_by_slice' instead.
 
         N.B. The first time step in the time slice is ignored because it is for the initial or previous conditions that
         are needed for the models to get the previous states of the links.
@@ -563,16 +1133,27 @@ class Network(object):
         """
         logger = getLogger('TORRENTpy.nw')
         logger.info("> Simulating.")
+        if self.by_slice:
+            self._run_by_slice(db, tf, timeslice)
+            return
         my_dict_variables = dict()
         logger_simu = getLogger('TORRENTpy.sm')
         for variable in self.variables:
             my_dict_variables[variable] = 0.0
+        # wall times spent in each phase (only recorded if the Network is instrumented)
+        my_instrumentation = self.instrumentation
+        my_times = {'catchment': 0.0, 'nodes': 0.0, 'river': 0.0, 'lake': 0.0}
+        my_start = None
+        # groups of Models to run together for each category (catchment, river, lake)
+        my_groups = {category: self._get_models_groups(category) for category in ['c', 'r', 'l']}
         for step in timeslice[1:]:  # ignore the index 0 because it is the initial conditions
+            if my_instrumentation:
+                my_start = default_timer()
             # Calculate water (and contaminant) runoff from catchment for each link
-            for link in self.links:
-                if link.c_models:
-                    for model in link.c_models:
-                        model.simulate(db, tf, step, link, logger_simu)
+            self._run_models_groups(my_groups['c'], db, tf, step, logger_simu)
+            if my_instrumentation:
+                my_times['catchment'] += default_timer() - my_start
+                my_start = default_timer()
             # Sum up everything coming towards each node
             delta = timedelta(minutes=tf.simu_gap)
             for node in self.nodes:
@@ -612,18 +1193,22 @@ class Network(object):
                 # Reset values to zero for next node
                 for variable in self.variables:
                     my_dict_variables[variable] = 0.0
+            if my_instrumentation:
+                my_times['nodes'] += default_timer() - my_start
+                my_start = default_timer()
             # Calculate water (and contaminant) routing in river reach for each link
-            for link in self.links:
-                if link.r_models:
-                    for model in link.r_models:
-                        model.simulate(db, tf, step, link, logger_simu)
+            self._run_models_groups(my_groups['r'], db, tf, step, logger_simu)
+            if my_instrumentation:
+                my_times['river'] += default_timer() - my_start
+                my_start = default_timer()
             # Calculate water (and contaminant) routing in lake for each link
-            for link in self.links:
-                if link.l_models:
-                    for model in link.l_models:
-                        model.simulate(db, tf, step, link, logger_simu)
+            self._run_models_groups(my_groups['l'], db, tf, step, logger_simu)
+            if my_instrumentation:
+                my_times['lake'] += default_timer() - my_start
 
         # Sum up everything that was routed towards each node at penultimate time step
+        if my_instrumentation:
+            my_start = default_timer()
         step = timeslice[-1]
         for node in self.nodes:
             # Sum up outputs for hydrology
@@ -653,25 +1238,223 @@ class Network(object):
                             variable_h]
                     my_dict_variables[variable] = 0.0
             my_dict_variables[variable_h] = 0.0
+        if my_instrumentation:
+            my_times['nodes'] += default_timer() - my_start
+            for phase in my_times:
+                my_instrumentation.add(phase, my_times[phase])
+
+
+class Topology(object):
+    """
+    This class holds the compact representation of a node-link network. The Links and the Nodes are identified by
+    integer IDs (their positions in the lists of names), the Nodes at both ends of the Links and the categories of the
+    Links are stored in arrays, and the Links routed by and added to each Node are stored in compressed sparse row
+    (CSR) format. The names are only mapped to the IDs at the boundary of the API.
+    """
+    def __init__(self, links, connections):
+        # names of the Links and of the Nodes in the order of their IDs (the Nodes in order of first appearance)
+        self.links_names = list(links)
+        self.nodes_names = list()
+        self.links_ids = {link: i for i, link in enumerate(self.links_names)}
+        self.nodes_ids = dict()
+        for link in self.links_names:
+            for node in connections[link]:
+                if node not in self.nodes_ids:
+                    self.nodes_ids[node] = len(self.nodes_names)
+                    self.nodes_names.append(node)
+        # IDs of the Node downstream and of the Node upstream of each Link
+        self.nodes_down = np.array([self.nodes_ids[connections[link][0]] for link in self.links_names], dtype=np.int64)
+        self.nodes_up = np.array([self.nodes_ids[connections[link][1]] for link in self.links_names], dtype=np.int64)
+        # category of each Link (1 for river, 2 for lake, 0 if not set yet)
+        self.categories = np.zeros((len(self.links_names),), dtype=np.int8)
+        # IDs of the Links whose reaches are pouring into each Node, and of the Links whose catchments are pouring
+        # into each Node (Links of Node i in indices[indptr[i]:indptr[i + 1]], in the order of their IDs)
+        self.routing_indptr, self.routing_indices = get_csr_adjacency(self.nodes_down, len(self.nodes_names))
+        self.adding_indptr, self.adding_indices = get_csr_adjacency(self.nodes_up, len(self.nodes_names))
+        # descriptors of the Links as columns {key: descriptor name, value: array in the order of the IDs}
+        self.descriptors = None
+        # Link objects in the order of the IDs, and in the order of the routing and adding indices
+        self.links = None
+        self.routing_links = None
+        self.adding_links = None
+
+    def set_links(self, links):
+        """
+        This method stores the Link objects viewing the topology so that the Nodes can give their Links.
+
+        :param links: list of Link objects in the order of their IDs
+        :type links: list
+        """
+        self.links = links
+        self.routing_links = [links[i] for i in self.routing_indices]
+        self.adding_links = [links[i] for i in self.adding_indices]
+
+
+def get_csr_adjacency(rows, size):
+    """
+    This function gives the compressed sparse row (CSR) format of the adjacency between the Nodes and the Links, i.e.
+    the Links with the ID j are listed for the Node with the ID rows[j].
+
+    :param rows: array of the IDs of the Nodes for each Link
+    :type rows: numpy.ndarray
+    :param size: number of Nodes
+    :type size: int
+    :return: pointers to the start of the Links of each Node (size + 1), IDs of the Links sorted by Node
+    :rtype: tuple
+    """
+    my_indptr = np.zeros((size + 1,), dtype=np.int64)
+    my_indptr[1:] = np.cumsum(np.bincount(rows, minlength=size))
+    my_indices = np.argsort(rows, kind='mergesort').astype(np.int64)  # stable sort keeps the order of the IDs
+
+    return my_indptr, my_indices
 
 
 class Link(object):
-    def __init__(self, name, connections):
+    __slots__ = ('_topology', 'id', 'name', 'c_models', 'r_models', 'l_models', 'all_models', 'models_parameters',
+                 '_extra')
+
+    def __init__(self, name, connections, topology=None):
+        if topology is None:  # stand-alone Link
+            topology = Topology([name], {name: connections})
+            topology.set_links([self])
+        self._topology = topology
+        self.id = topology.links_ids[name]
         self.name = name
-        self.connections = connections
-        self.category = None
-        self.descriptors = None
         self.c_models = []
         self.r_models = []
         self.l_models = []
         self.all_models = None
         self.models_parameters = dict()
-        self.extra = dict()
+        self._extra = None
+
+    @property
+    def connections(self):
+        my_topology = self._topology
+        return (my_topology.nodes_names[my_topology.nodes_down[self.id]],
+                my_topology.nodes_names[my_topology.nodes_up[self.id]])
+
+    @property
+    def category(self):
+        my_category = int(self._topology.categories[self.id])
+        return my_category if my_category else None
+
+    @category.setter
+    def category(self, category):
+        self._topology.categories[self.id] = category if category else 0
+
+    @property
+    def descriptors(self):
+        my_columns = self._topology.descriptors
+        if my_columns is None:
+            return None
+        return LinkDescriptors(self._topology, self.id)
+
+    @descriptors.setter
+    def descriptors(self, descriptors):
+        # the values are written in the columns of the topology (the descriptors not given are set to NaN)
+        my_topology = self._topology
+        if my_topology.descriptors is None:
+            my_topology.descriptors = dict()
+        my_columns = my_topology.descriptors
+        my_descriptors = descriptors if descriptors else dict()
+        for name in my_descriptors:
+            if name not in my_columns:
+                my_columns[name] = np.full((len(my_topology.links_names),), np.nan, dtype=np.float64)
+        for name in my_columns:
+            my_columns[name][self.id] = my_descriptors.get(name, np.nan)
+
+    def get_descriptor(self, name):
+        """
+        This method gives the value of one descriptor of the Link, read directly from the columns of the topology.
+
+        :param name: name of the descriptor
+        :type name: str
+        :return: value of the descriptor (None if the Link has no such descriptor)
+        :rtype: float
+        """
+        my_columns = self._topology.descriptors
+        if my_columns is None or name not in my_columns:
+            return None
+        return float(my_columns[name][self.id])
+
+    @property
+    def extra(self):
+        if self._extra is None:
+            self._extra = dict()
+        return self._extra
+
+    @extra.setter
+    def extra(self, extra):
+        self._extra = extra
+
+
+class LinkDescriptors(MutableMapping):
+    """
+    This class gives access to the descriptors of a Link as a dictionary {key: descriptor name, value: value} whose
+    values are read from and written to the columns of the topology (i.e. the descriptors of the Network).
+    """
+    __slots__ = ('_topology', '_id')
+
+    def __init__(self, topology, link_id):
+        self._topology = topology
+        self._id = link_id
+
+    def __getitem__(self, name):
+        return float(self._topology.descriptors[name][self._id])
+
+    def __setitem__(self, name, value):
+        my_columns = self._topology.descriptors
+        if name not in my_columns:  # the descriptor is added for all the Links (NaN for the other Links)
+            my_columns[name] = np.full((len(self._topology.links_names),), np.nan, dtype=np.float64)
+        my_columns[name][self._id] = value
+
+    def __delitem__(self, name):
+        raise TypeError("The descriptor {} cannot be deleted for one Link only.".format(name))
+
+    def __iter__(self):
+        return iter(self._topology.descriptors)
+
+    def __len__(self):
+        return len(self._topology.descriptors)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
 
 
 class Node(object):
-    def __init__(self, name, routing, adding):
+    __slots__ = ('_topology', 'id', 'name', '_extra', '_routing', '_adding')
+
+    def __init__(self, name, topology):
+        self._topology = topology
+        self.id = topology.nodes_ids[name]
         self.name = name
-        self.routing = routing
-        self.adding = adding
-        self.extra = dict()
+        self._extra = None
+        # lists of the Links routed by and added to the Node (taken from the topology the first time they are needed)
+        self._routing = None
+        self._adding = None
+
+    @property
+    def routing(self):
+        if self._routing is None:
+            my_topology = self._topology
+            self._routing = my_topology.routing_links[
+                my_topology.routing_indptr[self.id]:my_topology.routing_indptr[self.id + 1]]
+        return self._routing
+
+    @property
+    def adding(self):
+        if self._adding is None:
+            my_topology = self._topology
+            self._adding = my_topology.adding_links[
+                my_topology.adding_indptr[self.id]:my_topology.adding_indptr[self.id + 1]]
+        return self._adding
+
+    @property
+    def extra(self):
+        if self._extra is None:
+            self._extra = dict()
+        return self._extra
+
+    @extra.setter
+    def extra(self, extra):
+        self._extra = extra
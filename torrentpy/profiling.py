@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from logging import getLogger
+from timeit import default_timer
+from io import open
+import json
+import sys
+try:
+    import resource
+except ImportError:  # e.g. on Windows
+    resource = None
+
+
+class Instrumentation(object):
+    """
+    This class records, for each simulation slice run by a Network, the wall time spent in the different phases
+    of the simulation (preparation of the data structures, catchment models, aggregation at the nodes, river models,
+    lake models, and update of the output files), as well as the peak memory used by the process at the end of the
+    slice.
+    """
+    phases = ['inputs', 'catchment', 'nodes', 'river', 'lake', 'files']
+
+    def __init__(self):
+        # list of the records for each slice (in the order they were run)
+        self.slices = list()
+        # record of the slice currently running
+        self.current = None
+        self._start = None
+
+    def start_slice(self, stage, simu_slice):
+        """
+        This method starts the record for a new simulation slice.
+
+        :param stage: stage of the simulation the slice belongs to ('warm-up' or 'simulation')
+        :type stage: str
+        :param simu_slice: list of DateTime to be simulated
+        :type simu_slice: list
+        """
+        self.current = {'stage': stage,
+                        'start': simu_slice[1].isoformat(), 'end': simu_slice[-1].isoformat(),
+                        'steps': len(simu_slice) - 1}
+        for phase in self.phases:
+            self.current[phase] = 0.0
+        self.slices.append(self.current)
+        self._start = default_timer()
+
+    def add(self, phase, seconds):
+        """
+        This method adds the given wall time to the given phase of the slice currently running.
+
+        :param phase: name of the phase (one of Instrumentation.phases)
+        :type phase: str
+        :param seconds: wall time in seconds
+        :type seconds: float
+        """
+        self.current[phase] += seconds
+
+    def end_slice(self):
+        """
+        This method closes the record for the slice currently running, and logs it.
+        """
+        logger = getLogger('TORRENTpy.pf')
+        self.current['total'] = default_timer() - self._start
+        self.current['peak_memory_mb'] = get_peak_memory_in_mb()
+        logger.info("> Timings: {} [total {:.3f}s, peak memory {}MB].".format(
+            ', '.join(['{} {:.3f}s'.format(phase, self.current[phase]) for phase in self.phases]),
+            self.current['total'], self.current['peak_memory_mb']))
+        self.current = None
+
+    def get_report(self):
+        """
+        This method gathers the records for all the slices and the totals for each phase in a dictionary.
+
+        :return: dictionary with the records for each slice and the totals
+            {'slices': [{key: phase/info, value: value}], 'totals': {key: phase, value: seconds},
+             'peak_memory_mb': value}
+        :rtype: dict
+        """
+        my_totals = {phase: sum([my_slice[phase] for my_slice in self.slices]) for phase in self.phases}
+        my_totals['total'] = sum([my_slice.get('total', 0.0) for my_slice in self.slices])
+        my_totals['steps'] = sum([my_slice['steps'] for my_slice in self.slices])
+
+        return {
+            'slices': [dict(my_slice) for my_slice in self.slices],
+            'totals': my_totals,
+            'peak_memory_mb': get_peak_memory_in_mb()
+        }
+
+    def save_report(self, file_path):
+        """
+        This method writes the report in a JSON file.
+
+        :param file_path: location where to save the JSON file
+        :type file_path: str
+        """
+        with open(file_path, 'w', encoding='utf-8') as my_file:
+            my_file.write(u'{}'.format(json.dumps(self.get_report(), indent=2, sort_keys=True)))
+
+
+def get_peak_memory_in_mb():
+    """
+    This function returns the peak resident memory used by the current process so far (in MB). It returns None
+    if it cannot be determined on the platform (i.e. the module 'resource' is not available).
+
+    :return: peak memory in MB
+    :rtype: float
+    """
+    if resource:
+        my_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':  # in bytes
+            return round(my_peak / 1048576.0, 1)
+        else:  # in kilobytes
+            return round(my_peak / 1024.0, 1)
+    return None
+
+
+class ModelProfiler(object):
+    """
+    This class accumulates the number of calls and the cumulative wall time spent in the 'simulate' method of each
+    Model for each Link of a Network. It can summarise them per Model class or per Link, and it can write them in the
+    'folded stacks' format used by flame graph tools (e.g. flamegraph.pl, speedscope).
+    """
+    def __init__(self):
+        # key: (category, model class name, link name), value: [number of calls, cumulative time in seconds]
+        self.records = dict()
+
+    def simulate(self, model, db, tf, step, link, logger):
+        """
+        This method runs the 'simulate' method of the given Model for the given Link and time step, and records
+        the wall time spent in it.
+        """
+        my_start = default_timer()
+        model.simulate(db, tf, step, link, logger)
+        my_time = default_timer() - my_start
+
+        self._record((model.category, type(model).__name__, link.name), my_time)
+
+    def simulate_slice(self, model, db, tf, timeslice, link, logger):
+        """
+        This method runs the 'simulate_slice' method of the given Model for the given Link and simulation slice, and
+        records the wall time spent in it (as one call).
+        """
+        my_start = default_timer()
+        model.simulate_slice(db, tf, timeslice, link, logger)
+        my_time = default_timer() - my_start
+
+        self._record((model.category, type(model).__name__, link.name), my_time)
+
+    def _record(self, key, seconds):
+        try:
+            my_record = self.records[key]
+        except KeyError:
+            my_record = [0, 0.0]
+            self.records[key] = my_record
+        my_record[0] += 1
+        my_record[1] += seconds
+
+    def get_summary_by_model(self):
+        """
+        This method summarises the records per Model class.
+
+        :return: dictionary {key: model class name, value: {'calls': number of calls, 'seconds': cumulative time}}
+        :rtype: dict
+        """
+        return self._get_summary(1)
+
+    def get_summary_by_link(self):
+        """
+        This method summarises the records per Link (all Models of the Link together).
+
+        :return: dictionary {key: link name, value: {'calls': number of calls, 'seconds': cumulative time}}
+        :rtype: dict
+        """
+        return self._get_summary(2)
+
+    def _get_summary(self, index):
+        my_summary = dict()
+        for my_key, my_record in self.records.items():
+            if my_key[index] not in my_summary:
+                my_summary[my_key[index]] = {'calls': 0, 'seconds': 0.0}
+            my_summary[my_key[index]]['calls'] += my_record[0]
+            my_summary[my_key[index]]['seconds'] += my_record[1]
+
+        return my_summary
+
+    def get_folded_stacks(self):
+        """
+        This method formats the records as 'folded stacks' (one line per Model and Link, the frames being separated
+        by semicolons and followed by the cumulative time in microseconds), as expected by flame graph tools.
+
+        :return: list of lines (e.g. 'simulate;catchment;SMARTc;RiverReachA 123456')
+        :rtype: list
+        """
+        my_categories = {'c': 'catchment', 'r': 'river', 'l': 'lake'}
+        return ['simulate;{};{};{} {}'.format(my_categories.get(my_key[0], my_key[0]), my_key[1], my_key[2],
+                                              int(round(my_record[1] * 1e6)))
+                for my_key, my_record in sorted(self.records.items())]
+
+    def save_folded_stacks(self, file_path):
+        """
+        This method writes the folded stacks in a text file.
+
+        :param file_path: location where to save the text file
+        :type file_path: str
+        """
+        with open(file_path, 'w', encoding='utf-8') as my_file:
+            for my_line in self.get_folded_stacks():
+                my_file.write(u'{}\n'.format(my_line))
+
+    def log_summary(self):
+        """
+        This method logs the number of calls and the cumulative time per Model class (slowest first).
+        """
+        logger = getLogger('TORRENTpy.pf')
+        my_summary = self.get_summary_by_model()
+        for my_model in sorted(my_summary, key=lambda x: -my_summary[x]['seconds']):
+            logger.info("> Profile: {} called {} times for {:.3f}s.".format(
+                my_model, my_summary[my_model]['calls'], my_summary[my_model]['seconds']))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import timedelta
+from logging import getLogger
+import numpy as np
+
+from .inout import get_precision_dtype
+
+
+class SimulationResults(object):
+    """
+    This class holds in memory the results of a simulation for the requested Nodes and Links, as arrays aggregated
+    at the save gap of the TimeFrame in the same way as in the output files with the 'summary' method, i.e. the inputs
+    are summed up across the simulation time steps included in each save step, and the states, the outputs, and the
+    variables of the Nodes are averaged across them.
+    """
+    def __init__(self, nw, tf, nodes=None, links=None, precision='float64'):
+        """
+        :param nw: Network object for the simulated catchment
+        :type nw: Network
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param nodes: names of the Nodes to keep (optional, all the Nodes if not given)
+        :type nodes: list
+        :param links: names of the Links to keep (optional, all the Links if not given)
+        :type links: list
+        :param precision: floating point precision of the arrays ('float64' or 'float32')
+        :type precision: str
+        """
+        logger = getLogger('TORRENTpy.rs')
+
+        my_dtype = get_precision_dtype(precision)
+        my_nodes = [node.name for node in nw.nodes] if nodes is None else list(nodes)
+        my_links = [link.name for link in nw.links] if links is None else list(links)
+        for name in my_nodes:
+            if name not in nw.nodes_mapping:
+                logger.error("The Node {} does not exist in the Network.".format(name))
+                raise Exception("The Node {} does not exist in the Network.".format(name))
+        for name in my_links:
+            if name not in nw.links_mapping:
+                logger.error("The Link {} does not exist in the Network.".format(name))
+                raise Exception("The Link {} does not exist in the Network.".format(name))
+
+        # list of the DateTime of the save steps (i.e. the index of the arrays)
+        self.datetimes = tf.save_series[1:]
+        # mapping of the position of each save step in the arrays
+        self.positions = {step: i for i, step in enumerate(self.datetimes)}
+        # arrays for the Nodes {key: node, value: {key: variable, value: array}}
+        self.nodes = {name: {variable: np.zeros(len(self.datetimes), dtype=my_dtype) for variable in nw.variables}
+                      for name in my_nodes}
+        # arrays for the Links {key: link, value: {key: input/state/output, value: array}}
+        self.links = dict()
+        # names of the inputs for each Link (i.e. the values summed up rather than averaged)
+        self.inputs_names = dict()
+        for name in my_links:
+            my_inputs, my_others = list(), list()
+            for model in nw.links_mapping[name].all_models:
+                my_inputs += model.inputs_names
+                my_others += model.states_names + model.outputs_names
+            self.inputs_names[name] = set(my_inputs)
+            self.links[name] = {variable: np.zeros(len(self.datetimes), dtype=my_dtype)
+                                for variable in my_inputs + my_others}
+        # offsets of the simulation time steps included in a save step (ending with the save step itself)
+        self._offsets = [timedelta(minutes=my_sub_step * tf.simu_gap)
+                         for my_sub_step in range(0, -(tf.save_gap // tf.simu_gap), -1)]
+
+    def update(self, db, timeslice):
+        """
+        This method stores the results of the given simulation slice for the save steps it covers.
+
+        :param db: DataBase object containing the simulation data frames of the slice
+        :type db: DataBase
+        :param timeslice: list of DateTime to be saved (the first one being the last one of the previous slice)
+        :type timeslice: list
+        """
+        my_count = float(len(self._offsets))
+        for step in timeslice[1:]:
+            i = self.positions[step]
+            my_steps = [step + my_offset for my_offset in self._offsets]
+            for name, my_arrays in self.nodes.items():
+                my_frames = [db.simulation[name][my_step] for my_step in my_steps]
+                for variable, my_array in my_arrays.items():
+                    my_array[i] = sum(my_frame[variable] for my_frame in my_frames) / my_count
+            for name, my_arrays in self.links.items():
+                my_frames = [db.simulation[name][my_step] for my_step in my_steps]
+                my_inputs = self.inputs_names[name]
+                for variable, my_array in my_arrays.items():
+                    my_sum = sum(my_frame[variable] for my_frame in my_frames)
+                    my_array[i] = my_sum if variable in my_inputs else my_sum / my_count
+
+    def get_node(self, node, variable):
+        """
+        This method returns the series of a variable for a Node.
+
+        :return: array of the values for each save step (see attribute 'datetimes')
+        :rtype: numpy.ndarray
+        """
+        return self.nodes[node][variable]
+
+    def get_link(self, link, variable):
+        """
+        This method returns the series of an input, a state, or an output for a Link.
+
+        :return: array of the values for each save step (see attribute 'datetimes')
+        :rtype: numpy.ndarray
+        """
+        return self.links[link][variable]
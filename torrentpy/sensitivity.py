@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from multiprocessing import Pool
+from logging import getLogger
+import logging
+import numpy as np
+
+from .calibration import ParametersSpace
+from .results import SimulationResults
+
+
+class Sensitivity(object):
+    """
+    This class analyses the sensitivity of scalar metrics of the simulation (e.g. the average flow at a Node) to the
+    parameters of the Models of a Network, with the elementary effects method (Morris, 1991) or with the variance-based
+    method (Sobol' indices estimated from Saltelli samples, Saltelli et al., 2010). Each sample is simulated in memory
+    (the Network, the TimeFrame, and the DataBase are loaded once and reused for all the samples), only the series of
+    the Nodes needed by the metrics are kept, and only the metrics are returned. The samples can be simulated in
+    parallel workers, each holding a copy of the Network, the TimeFrame, and the DataBase for the whole analysis.
+    """
+    def __init__(self, nw, tf, db, parameters, metrics, multiplicative=False, spin_up_tolerance=None,
+                 spin_up_max_cycles=10):
+        """
+        :param nw: Network object whose Links were assigned Models
+        :type nw: Network
+        :param tf: TimeFrame object for the period to analyse
+        :type tf: TimeFrame
+        :param db: DataBase object containing the input data for the Links of the Network
+        :type db: DataBase
+        :param parameters: bounds of the parameters to analyse {key: parameter name, value: (lower, upper)}, a
+            parameter is set for all the Models of all the Links having a parameter with this name
+        :type parameters: dict
+        :param metrics: metrics to compute for each sample {key: metric name, value: (node, variable, function)},
+            the function reducing the array of the variable at the save steps to a scalar (e.g. numpy.mean), it must
+            be defined at the top level of a module to be used in parallel workers
+        :type metrics: dict
+        :param multiplicative: whether the values sampled are factors applied to the parameters the Links were given
+            initially rather than values given to all the Links
+        :type multiplicative: bool
+        :param spin_up_tolerance: relative change in the slow states below which the warm-up period is considered
+            converged (optional, if not given the warm-up period is run only once for each sample)
+        :type spin_up_tolerance: float
+        :param spin_up_max_cycles: maximum number of times the warm-up period is repeated to reach convergence
+        :type spin_up_max_cycles: int
+        """
+        logger = getLogger('TORRENTpy.sa')
+
+        if not nw.links_have_models:
+            logger.error("The Links of the Network must be assigned Models before the sensitivity analysis.")
+            raise Exception("The Links of the Network must be assigned Models before the sensitivity analysis.")
+
+        self.nw = nw
+        self.tf = tf
+        self.db = db
+        # parameters to analyse, with their bounds, and the Models they are set for
+        self.space = ParametersSpace(nw, parameters, multiplicative)
+        # names of the metrics and their definitions (in the same order)
+        self.metrics = sorted(metrics)
+        self.definitions = [metrics[name] for name in self.metrics]
+        for my_node, my_variable, _ in self.definitions:
+            if my_node not in nw.nodes_mapping:
+                logger.error("The Node {} does not exist in the Network.".format(my_node))
+                raise Exception("The Node {} does not exist in the Network.".format(my_node))
+            if my_variable not in nw.variables:
+                logger.error("The variable {} is not simulated for the Nodes.".format(my_variable))
+                raise Exception("The variable {} is not simulated for the Nodes.".format(my_variable))
+        # names of the Nodes needed by the metrics
+        self.nodes = sorted(set(my_node for my_node, _, _ in self.definitions))
+        # warm-up arguments
+        self.spin_up_tolerance = spin_up_tolerance
+        self.spin_up_max_cycles = spin_up_max_cycles
+
+    def evaluate(self, values):
+        """
+        This method simulates the Network in memory with the given values of the parameters, and computes the
+        metrics.
+
+        :param values: values in the order of the names of the parameters
+        :type values: sequence
+        :return: array of the metrics in the order of their names
+        :rtype: numpy.ndarray
+        """
+        nw, tf, db = self.nw, self.tf, self.db
+
+        self.space.set_parameters(values)
+
+        nw.instrumentation = None
+        nw.profiler = None
+        nw.diagnostics.clear()
+
+        my_results = SimulationResults(nw, tf, nodes=self.nodes, links=[])
+
+        def my_keep_slice(my_db, my_simu_slice, my_save_slice):
+            my_results.update(my_db, my_save_slice)
+
+        my_last_lines = nw._get_initial_conditions(db, tf, None, self.spin_up_tolerance, self.spin_up_max_cycles)
+        nw._simulate_slices(db, tf, my_last_lines, my_keep_slice)
+
+        return np.array([my_function(my_results.get_node(my_node, my_variable))
+                         for my_node, my_variable, my_function in self.definitions], dtype=np.float64)
+
+    def evaluate_samples(self, samples, processes=1):
+        """
+        This method computes the metrics for each of the given samples of values of the parameters, in parallel
+        workers if several processes are requested. The Models of the Network are given their initial parameters
+        back at the end.
+
+        N.B. Each sample is one whole simulation of the Network: the Models hold one set of parameters for each Link,
+        so the samples are not simulated together in one pass (i.e. as members of an ensemble). The cost of the
+        analysis is spread across the workers instead.
+
+        :param samples: array of values (one row per sample, one column per parameter in the order of their names)
+        :type samples: numpy.ndarray
+        :param processes: number of samples simulated in parallel
+        :type processes: int
+        :return: array of the metrics (one row per sample, one column per metric in the order of their names)
+        :rtype: numpy.ndarray
+        """
+        logger = getLogger('TORRENTpy.sa')
+
+        if processes < 1:
+            logger.error("The number of processes for the sensitivity analysis must be at least 1.")
+            raise Exception("The number of processes for the sensitivity analysis must be at least 1.")
+
+        my_samples = [np.asarray(my_sample, dtype=np.float64) for my_sample in samples]
+        logger.warning("Sensitivity - Simulating {} samples on {} processes.".format(len(my_samples), processes))
+        if processes > 1:
+            my_pool = Pool(processes=processes, initializer=_initialise_worker, initargs=(self,))
+            try:
+                my_metrics = my_pool.map(_evaluate_in_worker, my_samples,
+                                         chunksize=max(1, len(my_samples) // (4 * processes)))
+            finally:
+                my_pool.close()
+                my_pool.join()
+        else:
+            try:
+                my_metrics = [self.evaluate(my_sample) for my_sample in my_samples]
+            finally:
+                self.space.reset()
+
+        return np.array(my_metrics, dtype=np.float64).reshape((len(my_samples), len(self.metrics)))
+
+    def morris(self, trajectories=10, levels=4, processes=1, seed=None):
+        """
+        This method estimates the elementary effects of the parameters on the metrics from random trajectories in
+        the space of the parameters (one parameter changing at a time along a trajectory).
+
+        :param trajectories: number of trajectories (i.e. (number of parameters + 1) x trajectories simulations)
+        :type trajectories: int
+        :param levels: number of levels of the grid the trajectories are drawn on (an even number)
+        :type levels: int
+        :param processes: number of samples simulated in parallel
+        :type processes: int
+        :param seed: seed of the random number generator (optional)
+        :type seed: int
+        :return: mean, mean of the absolute values, and standard deviation of the elementary effects (relative to the
+            range of the parameters) for each metric and each parameter
+            {key: metric, value: {'mu': {key: parameter, value: value}, 'mu_star': {...}, 'sigma': {...}}}
+        :rtype: dict
+        """
+        my_unit = get_morris_samples(len(self.space.names), trajectories, levels, np.random.RandomState(seed))
+        my_metrics = self.evaluate_samples(self.space.scale(my_unit), processes)
+        my_indices = get_morris_indices(my_unit, my_metrics, trajectories)
+
+        return {metric: {my_index: dict(zip(self.space.names, my_indices[my_index][:, j].tolist()))
+                         for my_index in my_indices}
+                for j, metric in enumerate(self.metrics)}
+
+    def sobol(self, samples=256, processes=1, seed=None):
+        """
+        This method estimates the first-order and the total Sobol' indices of the parameters for the metrics from
+        Saltelli samples in the space of the parameters.
+
+        :param samples: size of the base samples (i.e. (number of parameters + 2) x samples simulations)
+        :type samples: int
+        :param processes: number of samples simulated in parallel
+        :type processes: int
+        :param seed: seed of the random number generator (optional)
+        :type seed: int
+        :return: first-order and total indices for each metric and each parameter
+            {key: metric, value: {'S1': {key: parameter, value: value}, 'ST': {...}}}
+        :rtype: dict
+        """
+        my_unit = get_saltelli_samples(len(self.space.names), samples, np.random.RandomState(seed))
+        my_metrics = self.evaluate_samples(self.space.scale(my_unit), processes)
+        my_indices = get_sobol_indices(my_metrics, samples, len(self.space.names))
+
+        return {metric: {my_index: dict(zip(self.space.names, my_indices[my_index][:, j].tolist()))
+                         for my_index in my_indices}
+                for j, metric in enumerate(self.metrics)}
+
+
+def get_morris_samples(dimensions, trajectories, levels, random):
+    """
+    This function generates random Morris trajectories in the unit hypercube (Morris, 1991): each trajectory has
+    (dimensions + 1) points on a grid of the given number of levels, two consecutive points differing by +/- delta
+    in one dimension only, with delta = levels / (2 x (levels - 1)).
+
+    :return: array of the points (trajectories x (dimensions + 1) rows, dimensions columns)
+    :rtype: numpy.ndarray
+    """
+    my_delta = levels / (2.0 * (levels - 1))
+    my_lower_triangle = np.tril(np.ones((dimensions + 1, dimensions)), -1)
+    my_ones = np.ones((dimensions + 1, dimensions))
+
+    my_points = list()
+    for _ in range(trajectories):
+        # base point on the grid of the levels such that a step of delta stays in the hypercube
+        my_base = random.randint(0, levels // 2, size=dimensions) / (levels - 1.0)
+        my_directions = np.diag(random.choice([-1.0, 1.0], size=dimensions))
+        my_permutation = np.eye(dimensions)[random.permutation(dimensions)]
+        my_points.append(np.dot(my_ones * my_base + (my_delta / 2.0) *
+                                (np.dot(2.0 * my_lower_triangle - my_ones, my_directions) + my_ones),
+                                my_permutation))
+
+    return np.vstack(my_points)
+
+
+def get_morris_indices(samples, metrics, trajectories):
+    """
+    This function computes the statistics of the elementary effects from the metrics of Morris trajectories.
+
+    :param samples: array of the points of the trajectories in the unit hypercube (see get_morris_samples)
+    :type samples: numpy.ndarray
+    :param metrics: array of the metrics for each point (one column per metric)
+    :type metrics: numpy.ndarray
+    :return: arrays (one row per dimension, one column per metric) {'mu': mean, 'mu_star': mean of the absolute
+        values, 'sigma': standard deviation}
+    :rtype: dict
+    """
+    my_dimensions = samples.shape[1]
+    my_samples = samples.reshape((trajectories, my_dimensions + 1, my_dimensions))
+    my_metrics = metrics.reshape((trajectories, my_dimensions + 1, metrics.shape[1]))
+
+    # change in each dimension between consecutive points (only one is not zero for each step)
+    my_steps = np.diff(my_samples, axis=1)
+    my_dimension_changed = np.argmax(np.abs(my_steps), axis=2)
+    my_trajectories = np.arange(trajectories)[:, np.newaxis]
+    my_points = np.arange(my_dimensions)[np.newaxis, :]
+    my_delta = my_steps[my_trajectories, my_points, my_dimension_changed]
+    my_effects = np.diff(my_metrics, axis=1) / my_delta[:, :, np.newaxis]
+
+    # gather the effects by dimension changed: (trajectories, dimensions, metrics)
+    my_effects = my_effects[my_trajectories, np.argsort(my_dimension_changed, axis=1)]
+
+    return {'mu': np.mean(my_effects, axis=0),
+            'mu_star': np.mean(np.abs(my_effects), axis=0),
+            'sigma': np.std(my_effects, axis=0, ddof=1) if trajectories > 1 else np.zeros(my_effects.shape[1:])}
+
+
+def get_saltelli_samples(dimensions, samples, random):
+    """
+    This function generates Saltelli samples in the unit hypercube (Saltelli et al., 2010): two independent random
+    matrices A and B, followed by the matrices AB_i (A with its i-th column taken from B) for each dimension.
+
+    :return: array of the samples ((dimensions + 2) x samples rows, dimensions columns) in the order A, B, AB_1, ...
+    :rtype: numpy.ndarray
+    """
+    my_a = random.uniform(size=(samples, dimensions))
+    my_b = random.uniform(size=(samples, dimensions))
+    my_matrices = [my_a, my_b]
+    for i in range(dimensions):
+        my_ab = my_a.copy()
+        my_ab[:, i] = my_b[:, i]
+        my_matrices.append(my_ab)
+
+    return np.vstack(my_matrices)
+
+
+def get_sobol_indices(metrics, samples, dimensions):
+    """
+    This function computes the first-order (Saltelli et al., 2010) and the total (Jansen, 1999) Sobol' indices from
+    the metrics of Saltelli samples.
+
+    :param metrics: array of the metrics for each sample in the order of get_saltelli_samples (one column per metric)
+    :type metrics: numpy.ndarray
+    :return: arrays (one row per dimension, one column per metric) {'S1': first-order indices, 'ST': total indices}
+    :rtype: dict
+    """
+    my_metrics = metrics.reshape((dimensions + 2, samples, metrics.shape[1]))
+    my_a, my_b, my_ab = my_metrics[0], my_metrics[1], my_metrics[2:]
+    my_variance = np.var(np.vstack([my_a, my_b]), axis=0)
+    my_variance[my_variance == 0.0] = np.nan  # no index for a metric that does not vary
+
+    return {'S1': np.mean(my_b * (my_ab - my_a), axis=1) / my_variance,
+            'ST': 0.5 * np.mean((my_a - my_ab) ** 2, axis=1) / my_variance}
+
+
+# state of the sensitivity analysis in a worker process (the Sensitivity object it was given when it started)
+_worker = dict()
+
+
+def _initialise_worker(sensitivity):
+    # the progress of each sample is not reported by the workers
+    logging.getLogger('TORRENTpy').setLevel(logging.WARNING)
+    _worker['sensitivity'] = sensitivity
+
+
+def _evaluate_in_worker(values):
+    return _worker['sensitivity'].evaluate(values)
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from logging import getLogger
+from datetime import datetime
+from hashlib import sha1
+from io import open
+import json
+import os
+
+
+def get_warm_up_key(network, db, tf, spin_up=None):
+    """
+    This function generates a key identifying uniquely the states obtained at the end of the warm-up period of a
+    simulation. The key is a hash of everything that has an influence on the warm-up run: the network files, the
+    variables simulated, the Models (identifiers, parameters, constants) and the extra attributes of each Link,
+    the warm-up window, and the input data for each Link over the warm-up window.
+
+    :param network: Network object for which the warm-up is run
+    :type network: Network
+    :param db: DataBase object containing the input data for the Links of the Network
+    :type db: DataBase
+    :param tf: TimeFrame object containing the warm-up TimeFrame
+    :type tf: TimeFrame
+    :param spin_up: settings of the spin-up (tolerance and maximum number of cycles) if the warm-up window is repeated
+    :type spin_up: tuple
+    :return: hexadecimal digest of the hash
+    :rtype: str
+    """
+    my_hash = sha1()
+
+    # network files (content)
+    for my_file in [network.network_file, network.waterbodies_file, network.descriptors_file]:
+        if os.path.isfile(my_file):
+            with open(my_file, 'rb') as my_content:
+                my_hash.update(my_content.read())
+
+    # variables propagated through the network
+    _update_hash(my_hash, [network.variables, network.water_quality])
+
+    # warm-up window
+    my_warm_up = tf.warm_up
+    _update_hash(my_hash, [my_warm_up.simu_start.isoformat(), my_warm_up.simu_end.isoformat(),
+                           my_warm_up.simu_gap, [len(my_slice) for my_slice in my_warm_up.simu_slices], spin_up])
+
+    for link in sorted(network.links, key=lambda x: x.name):
+        # models, parameters, constants, and extra attributes for the link
+        _update_hash(my_hash, [link.name, link.category, link.extra])
+        for model in link.all_models:
+            _update_hash(my_hash, [model.category, model.identifier, type(model).__name__,
+                                   model.parameters, model.constants])
+        # input data over the warm-up window for the link
+        for my_inputs in [db.meteo, db.contamination]:
+            if my_inputs:
+                for data_type in sorted(my_inputs[link.name]):
+                    _update_hash(my_hash, [data_type, [my_inputs[link.name][data_type].get(dt)
+                                                       for dt in my_warm_up.simu_series]])
+
+    return my_hash.hexdigest()
+
+
+def get_slow_states(network, states):
+    """
+    This function extracts the values of the states that are slow to reach equilibrium (as defined by the attribute
+    'slow_states_names' of each Model) for all the links of the Network. A state missing from the given states is
+    taken as zero, as it would be in the DataBase at the start of a simulation slice.
+
+    :param network: Network object whose Links have been assigned Models
+    :type network: Network
+    :param states: dictionary of the states for each link and node
+        {key: link/node, value: {key: variable, value: value}}
+    :type states: dict
+    :return: dictionary of the slow states values
+        {key: (link, variable), value: value}
+    :rtype: dict
+    """
+    my_slow_states = dict()
+    for link in network.links:
+        for model in link.all_models:
+            for name in model.slow_states_names:
+                my_slow_states[(link.name, name)] = states[link.name].get(name, 0.0)
+
+    return my_slow_states
+
+
+def get_maximum_relative_change(previous, current):
+    """
+    This function determines the largest relative change between two sets of states values. The change is relative
+    to the largest absolute value of the two values, so that states equal to zero do not cause a division by zero.
+
+    :param previous: dictionary of the states values before the change {key: state, value: value}
+    :type previous: dict
+    :param current: dictionary of the states values after the change {key: state, value: value}
+    :type current: dict
+    :return: largest relative change (0.0 if there is no state)
+    :rtype: float
+    """
+    my_max_change = 0.0
+    for key in current:
+        my_scale = max(abs(previous[key]), abs(current[key]))
+        if my_scale > 0.0:
+            my_max_change = max(my_max_change, abs(current[key] - previous[key]) / my_scale)
+
+    return my_max_change
+
+
+def load_states(cache_fld, key):
+    """
+    This function reads the states stored in the cache folder under the given key.
+
+    :param cache_fld: path to the folder containing the cached states
+    :type cache_fld: str
+    :param key: key identifying the cached states (see get_warm_up_key)
+    :type key: str
+    :return: dictionary of the states for each link and node (or None if not in the cache)
+        {key: link/node, value: {key: variable, value: value}}
+    :rtype: dict
+    """
+    logger = getLogger('TORRENTpy.st')
+    my_file = '{}{}.states.json'.format(cache_fld, key)
+    if os.path.isfile(my_file):
+        with open(my_file, 'r', encoding='utf-8') as my_content:
+            try:
+                return json.load(my_content)
+            except ValueError:
+                logger.warning("The cached states in {} are corrupted, they are ignored.".format(my_file))
+    return None
+
+
+def save_states(cache_fld, key, states):
+    """
+    This function writes the states in the cache folder under the given key. The file is written under a temporary
+    name before being renamed so that a cached file can never be read partially written.
+
+    :param cache_fld: path to the folder containing the cached states
+    :type cache_fld: str
+    :param key: key identifying the cached states (see get_warm_up_key)
+    :type key: str
+    :param states: dictionary of the states for each link and node
+        {key: link/node, value: {key: variable, value: value}}
+    :type states: dict
+    """
+    if not os.path.exists(cache_fld):
+        os.makedirs(cache_fld)
+    _write_json('{}{}.states.json'.format(cache_fld, key), states)
+
+
+def save_snapshot(file_path, step, states):
+    """
+    This function writes a snapshot of the states of a Network at a given DateTime (e.g. at the end of a simulation)
+    so that another simulation can start from them (e.g. a forecast, see class EnsembleForecast).
+
+    :param file_path: path of the file of the snapshot
+    :type file_path: str
+    :param step: DateTime the states correspond to
+    :type step: datetime.datetime
+    :param states: dictionary of the states for each link and node
+        {key: link/node, value: {key: variable, value: value}}
+    :type states: dict
+    """
+    _write_json(file_path, {'DateTime': step.strftime('%Y-%m-%d %H:%M:%S'), 'states': states})
+
+
+def load_snapshot(file_path):
+    """
+    This function reads a snapshot of the states of a Network written by the function 'save_snapshot'.
+
+    :param file_path: path of the file of the snapshot
+    :type file_path: str
+    :return: DateTime the states correspond to, and dictionary of the states for each link and node
+        {key: link/node, value: {key: variable, value: value}}
+    :rtype: tuple
+    """
+    logger = getLogger('TORRENTpy.st')
+    try:
+        with open(file_path, 'r', encoding='utf-8') as my_content:
+            my_snapshot = json.load(my_content)
+    except (IOError, ValueError):
+        logger.error("The snapshot of states {} could not be read.".format(file_path))
+        raise Exception("The snapshot of states {} could not be read.".format(file_path))
+
+    return datetime.strptime(my_snapshot['DateTime'], '%Y-%m-%d %H:%M:%S'), my_snapshot['states']
+
+
+def _write_json(file_path, obj):
+    # the file is written under a temporary name before being renamed so that it can never be read partially written
+    my_tmp_file = '{}.{}.tmp'.format(file_path, os.getpid())
+    with open(my_tmp_file, 'w', encoding='utf-8') as my_content:
+        my_content.write(u'{}'.format(json.dumps(obj, sort_keys=True)))
+    if os.path.isfile(file_path):
+        os.remove(file_path)
+    os.rename(my_tmp_file, file_path)
+
+
+def _update_hash(my_hash, obj):
+    my_hash.update(json.dumps(obj, sort_keys=True, default=str).encode('utf-8'))
@@ -23,6 +23,8 @@ from datetime import timedelta
 from fractions import gcd
 from math import ceil
 from logging import getLogger
+from calendar import isleap
+import numpy as np
 
 
 class TimeFrame(object):
@@ -96,6 +98,10 @@ class TimeFrame(object):
                                      data_increment_in_minutes, save_increment_in_minutes, simu_increment_in_minutes,
                                      expected_simu_slice_length)
 
+        # Calendar covariates for all the DateTime that can be simulated (including the warm-up period if any)
+        self.covariates = CalendarCovariates(
+            self.simu_series + (self.warm_up.simu_series if self.warm_up else []))
+
     def _get_most_possible_extreme_simu_start_end(self):
         logger = getLogger('TORRENTpy.tf')
 
@@ -227,6 +233,46 @@ class TimeFrame(object):
         return my_save_slices, my_simu_slices
 
 
+class CalendarCovariates(object):
+    """
+    This class holds the calendar covariates (i.e. the variables that only depend on the DateTime) for a series of
+    simulation time steps, computed once as arrays, so that the Models do not need to compute them from the DateTime
+    at each time step for each Link. The Models can read them by time step index (see attribute 'index'), and they can
+    register derived covariates (e.g. a seasonal factor depending on a constant of the Model) that are also computed
+    once for all the time steps.
+    """
+    def __init__(self, datetime_series):
+        # mapping of the DateTime to their index in the arrays of covariates {key: DateTime, value: index}
+        self.index = {my_dt: i for i, my_dt in enumerate(datetime_series)}
+        self.series = list(datetime_series)
+        # calendar covariates as arrays (in the order of the DateTime series)
+        self.day_of_year = np.array([float(my_dt.timetuple().tm_yday) for my_dt in self.series])
+        self.days_in_year = np.array([366.0 if isleap(my_dt.year) else 365.0 for my_dt in self.series])
+        self.hour = np.array([my_dt.hour for my_dt in self.series], dtype=int)
+        self.month = np.array([my_dt.month for my_dt in self.series], dtype=int)
+        # derived covariates registered by the Models {key: name, value: list or array (one value per DateTime)}
+        self._derived = dict()
+
+    def get_derived(self, name, function, *args):
+        """
+        This method returns the derived covariate registered under the given name. If it was not registered yet, it is
+        computed with the given function and registered.
+
+        :param name: name of the derived covariate (any hashable, e.g. a tuple (name, value of a constant))
+        :param function: function taking the CalendarCovariates object (and the given extra arguments) and returning
+            the values for all the DateTime
+        :type function: callable
+        :param args: extra arguments for the function (e.g. the value of a constant of the Model)
+        :return: values of the derived covariate (one for each DateTime, to be read by index)
+        :rtype: list or numpy.ndarray
+        """
+        try:
+            return self._derived[name]
+        except KeyError:
+            self._derived[name] = function(self, *args)
+            return self._derived[name]
+
+
 def get_required_resolution(start_data, start_simu, delta_data, delta_simu):
     # GCD(delta_data, delta_simu) gives the maximum time resolution possible to match data and simu
     # shift = start_data - start_simu gives the data shift (e.g. data starting at 8am, simu starting at 9am)
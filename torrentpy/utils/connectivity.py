@@ -18,6 +18,8 @@
 # You should have received a copy of the GNU General Public License
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
+from logging import getLogger
+from collections import OrderedDict, deque
 from csv import DictReader, writer
 import os
 try:
@@ -52,8 +54,8 @@ def network_from_connectivity(in_fld, catchment, outlet, plot=False):
 def _write_nodes_links_network_in_csv(file_path, dict_link_and_surrounding_nodes):
     """
     This function creates a CSV file describing the hydrological connectivity as a nodes-links network.
-    It creates one line per waterbody. The first column contains the 'NodeDown' as a 4-digit code,
-    the second the 'WaterBody' name, and the third column the 'NodeUp' as a 4-digit code.
+    It creates one line per waterbody. The first column contains the 'NodeDown' code (of at least 4 digits),
+    the second the 'WaterBody' name, and the third column the 'NodeUp' code (of at least 4 digits).
 
     :param dict_link_and_surrounding_nodes: key: waterbody, val: tup(code of node downstream, code of node upstream)
     :type dict_link_and_surrounding_nodes: dict
@@ -69,8 +71,15 @@ def _write_nodes_links_network_in_csv(file_path, dict_link_and_surrounding_nodes
 
 def _create_network(list_consecutive_links_up, outlet):
     """
-    This function reads a CSV file containing the hydrological connectivity of a given network.
-    It can only read CSV file containing the headers 'WaterBody' and 'NeighbourUp'.
+    This function creates the nodes-links network from the hydrological connectivity of a given network.
+    The connectivity is inverted once into an index of the links directly upstream of each link, and the network is
+    built with a breadth-first search from the outlet, so that the time taken is proportional to the number of links.
+    The nodes are numbered in the order they are reached (i.e. level by level from the outlet), with codes of four
+    digits, or more if the network has more than 10,000 nodes (all the codes having the same number of digits).
+
+    The links that are not connected to the outlet (i.e. draining to another outlet) are left out of the network
+    with a warning, as are the links given more than one downstream neighbour (only the last one is kept), while a
+    cycle in the connectivity raises an exception.
 
     :param list_consecutive_links_up: list of tuples for each couple of connected WaterBodies
     :type list_consecutive_links_up: list
@@ -79,35 +88,75 @@ def _create_network(list_consecutive_links_up, outlet):
     :return: a dictionary with key: waterbody, val: tup(code of node downstream, code of node upstream)
     :rtype: dict
     """
-    list_nodes = list()
-    dict_consecutive_links_down = dict()
-    dict_link_to_node_down = dict()
-    dict_link_and_surrounding_nodes = dict()
-    future_rivers = list()
+    logger = getLogger('TORRENTpy.ut')
 
-    for tup in list_consecutive_links_up:
-        dict_consecutive_links_down[tup[1]] = tup[0]
+    dict_consecutive_links_down = dict()
+    for link_down, link_up in list_consecutive_links_up:
+        if dict_consecutive_links_down.get(link_up, link_down) != link_down:
+            logger.warning("The WaterBody {} has more than one neighbour downstream ({} and {}), "
+                           "only the last one is kept.".format(link_up, dict_consecutive_links_down[link_up],
+                                                               link_down))
+        dict_consecutive_links_down[link_up] = link_down
+
+    # invert the connectivity: key: waterbody, value: list of waterbodies directly upstream (in the order of the file)
+    dict_consecutive_links_up = dict()
+    for link_up, link_down in dict_consecutive_links_down.items():
+        dict_consecutive_links_up.setdefault(link_down, list()).append(link_up)
 
     # create the nodes-links network by defining the nodes codes and linking nodes with up link and down link
-    river_outlet = [outlet]
+    list_links = list()  # list of tuples (waterbody, number of node downstream, number of node upstream)
+    dict_link_to_node_down = {outlet: 0}
+    rivers = deque([outlet])
     node_code = 0
-    dict_link_to_node_down[outlet] = '%04d' % node_code  # format integer to get a 4-digit code
-    list_nodes.append('%04d' % node_code)
-
-    rivers = river_outlet[:]
-
     while rivers:
-        for river in rivers:
-            node_code += 1
-            list_nodes.append('%04d' % node_code)
-            dict_link_and_surrounding_nodes[river] = (dict_link_to_node_down[river], '%04d' % node_code)
-            for key in dict_consecutive_links_down:
-                if dict_consecutive_links_down[key] == river:
-                    dict_link_to_node_down[key] = '%04d' % node_code
-                    future_rivers.append(key)
-        del rivers[:]
-        rivers = future_rivers[:]
-        del future_rivers[:]
+        river = rivers.popleft()
+        node_code += 1
+        list_links.append((river, dict_link_to_node_down[river], node_code))
+        for link_up in dict_consecutive_links_up.get(river, list()):
+            if link_up in dict_link_to_node_down:  # i.e. the outlet is upstream of itself
+                logger.error("The connectivity contains a cycle through the WaterBody {}.".format(link_up))
+                raise Exception("The connectivity contains a cycle through the WaterBody {}.".format(link_up))
+            dict_link_to_node_down[link_up] = node_code
+            rivers.append(link_up)
+
+    # check that all the waterbodies in the connectivity are connected to the outlet
+    list_orphans = [link for link in list(dict_consecutive_links_down) + list(dict_consecutive_links_up)
+                    if link not in dict_link_to_node_down]
+    if list_orphans:
+        set_orphans = set(list_orphans)
+        list_other_outlets = [link for link in dict_consecutive_links_up
+                              if link in set_orphans and link not in dict_consecutive_links_down]
+        # the waterbodies draining to another outlet can be reached from it (without going through the network of
+        # the outlet, which is the case if the outlet has waterbodies downstream), the others are part of a cycle
+        set_reached = set(list_other_outlets)
+        others = deque(list_other_outlets)
+        while others:
+            for link_up in dict_consecutive_links_up.get(others.popleft(), list()):
+                if link_up not in dict_link_to_node_down and link_up not in set_reached:
+                    set_reached.add(link_up)
+                    others.append(link_up)
+        set_cycle = set_orphans - set_reached
+        if set_cycle:
+            link_cycle = [link for link in list_orphans if link in set_cycle][0]
+            logger.error("The connectivity contains a cycle through the WaterBody {}.".format(link_cycle))
+            raise Exception("The connectivity contains a cycle through the WaterBody {}.".format(link_cycle))
+        # the waterbodies downstream of the outlet are not part of its network by definition
+        set_downstream = set()
+        link_down = dict_consecutive_links_down.get(outlet)
+        while link_down is not None and link_down not in set_downstream:
+            set_downstream.add(link_down)
+            link_down = dict_consecutive_links_down.get(link_down)
+        set_disconnected = set_orphans - set_downstream
+        if set_disconnected:
+            logger.warning("{} WaterBodies are not connected to the outlet {} (they drain to {}), they are left out "
+                           "of the network.".format(len(set_disconnected), outlet,
+                                                    ', '.join(list_other_outlets)))
+
+    # format the node codes with the same number of digits for all the nodes (at least 4 digits)
+    digits = max(4, len(str(node_code)))
+    list_nodes = ['%0*d' % (digits, code) for code in range(node_code + 1)]
+    dict_link_and_surrounding_nodes = OrderedDict(
+        (river, (list_nodes[code_down], list_nodes[code_up])) for river, code_down, code_up in list_links)
 
     return dict_link_and_surrounding_nodes, list_nodes
 
@@ -147,7 +196,7 @@ def _plot_graph_network(path_for_plot, dict_link_and_surrounding_nodes, list_nod
     :type path_for_plot: str
     :param dict_link_and_surrounding_nodes: key: WaterBody, val: tup(code of node downstream, code of node upstream)
     :type dict_link_and_surrounding_nodes: dict
-    :param list_nodes: list of the 4-digit codes in the network
+    :param list_nodes: list of the node codes in the network
     :type list_nodes: list
     :param dict_waterbodies: dict ( key: WaterBody,
         value: tup( WaterBody Type [1 for river, 2 for lake], OPTIONAL Headwater Status [1 for True, 0 for False] )